@@ -2,9 +2,15 @@
 import asyncio
 import logging
 import random
-from typing import Optional, Dict, Any
+import time
+from typing import Optional, Dict, Any, List
 
-logger = logging.getLogger("MelodyBotCore")
+from brain.core_intelligence.prompt_budget import PromptSection, token_budgeter
+from services.ai_providers.rate_limiter import Priority
+from services.structured_logging import elapsed_ms
+from services.tracing import traced, tracer
+
+logger = logging.getLogger("MelodyBotCore.orchestrator")
 
 class IntelligenceOrchestrator:
     """Main intelligence orchestrator that coordinates all AI systems"""
@@ -40,107 +46,111 @@ class IntelligenceOrchestrator:
             self._semantic_memory = semantic_memory
         return self._semantic_memory
 
-    async def generate_response(self, user_id: str, user_message: str, ai_provider=None) -> str:
+    @traced("orchestrator")
+    async def generate_response(self, user_id: str, user_message: str, ai_provider=None,
+                                priority: int = Priority.MENTION, history: Optional[List[Dict]] = None) -> str:
         """Main method to generate AI responses with full context"""
         try:
-            # ADDED DEBUG LOGGING
-            print(f"🎯 DEBUG: Generating response for user {user_id}: '{user_message[:50]}...'")
-            
+            started = time.perf_counter()
+
             # Step 1: Get emotional context
-            emotional_context = self.emotional_core.get_emotional_context(user_id, user_message)
-            print(f"🎭 DEBUG: Emotional score: {emotional_context.get('score', 50)}")
+            with tracer.span("emotion"):
+                emotional_context = self.emotional_core.get_emotional_context(user_id, user_message)
             
-            # Step 2: Extract and store new facts from message - ADDED DEBUG
+            # Step 2: Extract and store new facts from message
             new_facts = await self.permanent_facts.extract_personal_facts(user_id, user_message)
-            print(f"📝 DEBUG: Extracted {len(new_facts)} new facts from: '{user_message}'")
-            
             if new_facts:
-                print(f"💾 DEBUG: Storing facts: {new_facts}")
                 await self.permanent_facts.store_facts(user_id, new_facts)
             
-            # Step 3: Get relevant memories - ADDED DEBUG
-            memory_context = await self.semantic_memory.get_conversation_context(user_id, user_message)
-            if memory_context:
-                print("🧠 DEBUG: Found relevant memories")
-            else:
-                print("🧠 DEBUG: No relevant memories found")
+            # Step 3: Get relevant memories
+            memories = await self.semantic_memory.search_relevant_memories(user_id, user_message, top_k=3)
 
-            # Step 4: Get permanent facts context - ADDED DEBUG
-            user_context = await self.permanent_facts.get_user_context(user_id)
-            if user_context:
-                print("📚 DEBUG: Loaded user context")
-            else:
-                print("📚 DEBUG: No user context found")
-            
-            # Step 5: Build comprehensive prompt
-            full_prompt = self._build_comprehensive_prompt(
-                user_message, 
-                emotional_context,
-                memory_context,
-                user_context
+            # Step 4: Get permanent facts context
+            user_context = await self.permanent_facts.get_user_context(user_id, user_message)
+            logger.debug(
+                f"🧠 Context ready: mood {emotional_context.get('score', 50)}, {len(new_facts)} new facts, "
+                f"{len(memories)} memories, facts {'loaded' if user_context else 'empty'}",
+                extra={"user": user_id, "stage": "context", "latency_ms": elapsed_ms(started)}
             )
             
+            conversation_summary = await self.permanent_facts.get_conversation_summary(user_id)
+
+            # Step 5: Build the notes block (persona + user turn are added by the provider)
+            with tracer.span("prompt.build"):
+                full_prompt = self._build_comprehensive_prompt(
+                    emotional_context,
+                    memories,
+                    user_context,
+                    conversation_summary
+                )
+            
             # Step 6: Generate AI response
             if ai_provider:
-                print("🤖 DEBUG: Calling AI provider...")
                 response = await ai_provider.get_response(
                     message=user_message,
                     user_id=user_id,
                     context=full_prompt,
-                    sentiment_data=emotional_context
+                    sentiment_data=emotional_context,
+                    priority=priority,
+                    history=history
                 )
                 
                 # Step 7: Store conversation in semantic memory
                 await self._store_conversation_memory(user_id, user_message, response)
                 
-                print(f"✅ DEBUG: Response generated: {response[:80]}...")
+                logger.debug(f"✅ Response generated ({len(response)} chars)",
+                             extra={"user": user_id, "stage": "orchestrator", "latency_ms": elapsed_ms(started)})
                 return response
             else:
-                fallback = self._get_fallback_response(emotional_context)
-                print(f"⚠️ DEBUG: Using fallback: {fallback[:80]}...")
-                return fallback
+                logger.warning("⚠️ No AI provider - using fallback", extra={"user": user_id})
+                return self._get_fallback_response(emotional_context)
                 
         except Exception as e:
             logger.error(f"❌ Intelligence orchestrator error: {e}")
             return "Oops! My brain had a moment 😭 Try again? 💫"
 
-    def _build_comprehensive_prompt(self, user_message: str, emotional_context: Dict, 
-                                  memory_context: str, user_context: str) -> str:
-        """Build comprehensive prompt for AI"""
-        prompt_parts = []
+    def _build_comprehensive_prompt(self, emotional_context: Dict, memories: List[Dict],
+                                    user_context: str, conversation_summary: str = "") -> str:
+        """Build the memory/facts/mood notes sent alongside the user's message (token budgeted)"""
+        mood_lines = []
         
         # Emotional context
         if emotional_context:
             mood_score = emotional_context.get('score', 50)
             if mood_score >= 80:
-                prompt_parts.append("USER MOOD: Very happy/affectionate - be extra sweet!")
+                mood_lines.append("USER MOOD: Very happy/affectionate - be extra sweet!")
             elif mood_score >= 60:
-                prompt_parts.append("USER MOOD: Positive/playful - be fun and chaotic!") 
+                mood_lines.append("USER MOOD: Positive/playful - be fun and chaotic!") 
             elif mood_score >= 40:
-                prompt_parts.append("USER MOOD: Neutral/chill - be friendly and engaging")
+                mood_lines.append("USER MOOD: Neutral/chill - be friendly and engaging")
             elif mood_score >= 20:
-                prompt_parts.append("USER MOOD: Slightly negative - be supportive")
+                mood_lines.append("USER MOOD: Slightly negative - be supportive")
             else:
-                prompt_parts.append("USER MOOD: Negative/upset - be comforting")
+                mood_lines.append("USER MOOD: Negative/upset - be comforting")
                 
             if emotional_context.get('is_friendly_banter'):
-                prompt_parts.append("CONTEXT: Friendly banter - be playful and roast back nicely!")
+                mood_lines.append("CONTEXT: Friendly banter - be playful and roast back nicely!")
             if emotional_context.get('should_roast_defense'):
-                prompt_parts.append("CONTEXT: User might be testing you - be confident but friendly")
-        
-        # Memory context
-        if memory_context:
-            prompt_parts.append(memory_context)
-            
-        # User facts context
-        if user_context:
-            prompt_parts.append(user_context)
-            
-        # Final message
-        prompt_parts.append(f"USER MESSAGE: {user_message}")
-        prompt_parts.append("MelodyAI:")
+                mood_lines.append("CONTEXT: User might be testing you - be confident but friendly")
         
-        return "\n".join(prompt_parts)
+        # User facts context (drop the header line, the section adds its own)
+        fact_lines = [line for line in (user_context or "").splitlines()[1:] if line.strip()]
+
+        # Memory context - best match first, one line per exchange so truncation drops whole memories
+        memory_lines = [
+            f"- User: {m['user_message']} | Melody: {m['bot_response']}"
+            for m in sorted(memories or [], key=lambda m: m.get('score', m.get('similarity_score', 0)), reverse=True)
+        ]
+
+        summary_lines = [conversation_summary.strip()] if conversation_summary else []
+
+        sections = [
+            PromptSection("mood", 0, 40, mood_lines),
+            PromptSection("facts", 1, 120, fact_lines, "📝 USER FACTS:"),
+            PromptSection("summary", 2, 100, summary_lines, "📝 Previous chat summary:"),
+            PromptSection("memories", 3, 200, memory_lines, "🎭 RELEVANT PAST CONVERSATIONS:"),
+        ]
+        return token_budgeter.assemble(sections).text
 
     async def _store_conversation_memory(self, user_id: str, user_message: str, bot_response: str):
         """Store conversation in semantic memory"""
@@ -158,7 +168,7 @@ class IntelligenceOrchestrator:
                 bot_response=bot_response,
                 importance=importance
             )
-            print(f"💾 DEBUG: Stored conversation with importance {importance}")
+            logger.debug(f"💾 Stored conversation with importance {importance}", extra={"user": user_id})
         except Exception as e:
             logger.warning(f"⚠️ Failed to store conversation memory: {e}")
 
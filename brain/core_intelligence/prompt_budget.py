@@ -0,0 +1,150 @@
+# melody_ai_v2/brain/core_intelligence/prompt_budget.py - TOKEN BUDGETED PROMPT NOTES
+import logging
+import re
+from typing import Dict, List, NamedTuple, Optional
+
+from services.ai_providers.prompt_builder import estimate_tokens
+
+logger = logging.getLogger("MelodyBotCore")
+
+_NORMALIZE_RE = re.compile(r"[^a-z0-9]+")
+
+
+class PromptSection(NamedTuple):
+    """One block of context. Lower priority number = kept first when over budget."""
+    name: str
+    priority: int
+    max_tokens: int
+    lines: List[str]
+    header: str = ""
+
+
+class BudgetedPrompt(NamedTuple):
+    text: str
+    section_tokens: Dict[str, int]
+    dropped_lines: Dict[str, int]
+    duplicates: int
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(self.section_tokens.values())
+
+
+def _normalize(text: str) -> str:
+    return _NORMALIZE_RE.sub(" ", text.lower()).strip()
+
+
+def _truncate_to_tokens(line: str, max_tokens: int) -> str:
+    """Cut a line on word boundaries so it fits - same input always gives the same output"""
+    words = line.split()
+    kept = []
+    for word in words:
+        if estimate_tokens(" ".join(kept + [word]) + "...") > max_tokens:
+            break
+        kept.append(word)
+    return " ".join(kept) + "..." if kept else ""
+
+
+class TokenBudgeter:
+    """Assembles the orchestrator's notes block under a hard token budget.
+
+    Sections are filled in priority order. Each one is capped at its own
+    `max_tokens` and by whatever is left of the overall budget. Lines that
+    already appeared in a higher priority section (e.g. a fact that is also
+    quoted in a memory or the chat summary) are skipped.
+    """
+
+    def __init__(self, max_tokens: int = 400):
+        self.max_tokens = max_tokens
+        self.calls = 0
+        self.total_tokens_used = 0
+        self.lines_dropped = 0
+        self.duplicates_removed = 0
+        self.last_call: Dict = {}
+
+    def assemble(self, sections: List[PromptSection], max_tokens: Optional[int] = None) -> BudgetedPrompt:
+        budget = self.max_tokens if max_tokens is None else max_tokens
+        remaining = budget
+        seen = set()
+        duplicates = 0
+        rendered = {}
+        section_tokens = {}
+        dropped_lines = {}
+
+        for section in sorted(sections, key=lambda s: s.priority):
+            header_tokens = estimate_tokens(section.header) if section.header else 0
+            section_budget = min(section.max_tokens, remaining) - header_tokens
+            kept = []
+            used = 0
+            dropped = 0
+
+            for line in section.lines:
+                key = _normalize(line)
+                if not key:
+                    continue
+                if key in seen or (len(key) > 12 and any(key in other for other in seen)):
+                    duplicates += 1
+                    continue
+                line_tokens = estimate_tokens(line)
+                if used + line_tokens > section_budget:
+                    # Only the first line that doesn't fit gets shortened; the rest are dropped
+                    if not kept and section_budget - used > 8:
+                        line = _truncate_to_tokens(line, section_budget - used)
+                        line_tokens = estimate_tokens(line)
+                        if line:
+                            kept.append(line)
+                            used += line_tokens
+                            seen.add(key)
+                            continue
+                    dropped += 1
+                    continue
+                kept.append(line)
+                used += line_tokens
+                seen.add(key)
+
+            if dropped:
+                dropped_lines[section.name] = dropped
+            if not kept:
+                section_tokens[section.name] = 0
+                continue
+            block = "\n".join(([section.header] if section.header else []) + kept)
+            rendered[section.name] = block
+            section_tokens[section.name] = used + header_tokens
+            remaining -= used + header_tokens
+
+        # Keep the original section order in the text so the prompt reads naturally
+        text = "\n".join(rendered[s.name] for s in sections if s.name in rendered)
+        result = BudgetedPrompt(text, section_tokens, dropped_lines, duplicates)
+        self._record(result, budget)
+        return result
+
+    def _record(self, result: BudgetedPrompt, budget: int):
+        self.calls += 1
+        self.total_tokens_used += result.total_tokens
+        self.lines_dropped += sum(result.dropped_lines.values())
+        self.duplicates_removed += result.duplicates
+        self.last_call = {
+            "tokens": result.total_tokens,
+            "budget": budget,
+            "section_tokens": result.section_tokens,
+            "dropped_lines": result.dropped_lines,
+            "duplicates": result.duplicates,
+        }
+        logger.debug(
+            f"🧮 Prompt notes: {result.total_tokens}/{budget} tokens {result.section_tokens}"
+            f" dropped={result.dropped_lines} dupes={result.duplicates}"
+        )
+
+    def get_stats(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "max_tokens": self.max_tokens,
+            "avg_tokens": round(self.total_tokens_used / self.calls, 1) if self.calls else 0,
+            "lines_dropped": self.lines_dropped,
+            "duplicates_removed": self.duplicates_removed,
+            "last_call": self.last_call,
+        }
+
+
+# Global instance
+token_budgeter = TokenBudgeter()
@@ -0,0 +1,247 @@
+# melody_ai_v2/brain/memory_systems/conversation_history.py - PER-CHANNEL RING BUFFER HISTORY
+import itertools
+import logging
+import sqlite3
+import time
+from collections import deque
+from typing import Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger("MelodyBotCore")
+
+ChannelKey = Tuple[int, int]  # (guild_id, channel_id) - guild 0 for DMs
+
+
+class HistoryEntry:
+    """One chat turn. Supports entry['user'] style access for older call sites."""
+    __slots__ = ("seq", "guild_id", "channel_id", "user_id", "user", "message", "response", "role", "timestamp")
+
+    def __init__(self, seq: int, guild_id: int, channel_id: int, user_id: str, user: str,
+                 message: str, response: Optional[str] = None, role: str = "user",
+                 timestamp: Optional[float] = None):
+        self.seq = seq
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.user_id = user_id
+        self.user = user
+        self.message = message
+        self.response = response
+        self.role = role
+        self.timestamp = timestamp if timestamp is not None else time.time()
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def as_dict(self) -> Dict:
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    def __repr__(self):
+        return f"HistoryEntry({self.user}: {self.message[:30]!r})"
+
+
+class ConversationHistory:
+    """Fixed-capacity deque per (guild, channel) plus a small per-user index.
+
+    Appends are O(1) and old turns fall off the left end automatically, so
+    nothing ever re-slices a list. Views only walk as many entries as asked for.
+    Pass `db_path` to load the buffers on start and `save()` them on shutdown.
+    Saves only rewrite channels this process appended to, so shard processes
+    sharing one file never clobber each other's history.
+    """
+
+    def __init__(self, capacity: int = 50, per_user_capacity: int = 20, db_path: Optional[str] = None):
+        self.capacity = capacity
+        self.per_user_capacity = per_user_capacity
+        self.db_path = db_path
+        self._channels: Dict[ChannelKey, deque] = {}
+        self._users: Dict[str, deque] = {}
+        self._dirty: Set[ChannelKey] = set()  # channels appended to since the last save
+        self._seq = itertools.count(1)
+        self.appended = 0
+
+        if db_path:
+            self.load()
+
+    @staticmethod
+    def key(guild_id: Optional[int], channel_id: int) -> ChannelKey:
+        return (guild_id or 0, channel_id)
+
+    # ---------- WRITES ----------
+    def append(self, guild_id: Optional[int], channel_id: int, user: str, message: str,
+               user_id: str = "", response: Optional[str] = None, role: str = "user",
+               timestamp: Optional[float] = None) -> HistoryEntry:
+        key = self.key(guild_id, channel_id)
+        entry = HistoryEntry(next(self._seq), key[0], channel_id, user_id, user, message,
+                             response, role, timestamp)
+        self._insert(key, entry)
+        self._dirty.add(key)
+        self.appended += 1
+        return entry
+
+    def _insert(self, key: ChannelKey, entry: HistoryEntry):
+        buffer = self._channels.get(key)
+        if buffer is None:
+            buffer = self._channels[key] = deque(maxlen=self.capacity)
+        buffer.append(entry)
+
+        if entry.user_id:
+            user_buffer = self._users.get(entry.user_id)
+            if user_buffer is None:
+                user_buffer = self._users[entry.user_id] = deque(maxlen=self.per_user_capacity)
+            user_buffer.append(entry)
+
+    # ---------- VIEWS ----------
+    def recent(self, guild_id: Optional[int], channel_id: int, limit: int = 5) -> List[HistoryEntry]:
+        """Last `limit` turns in a channel, oldest first"""
+        buffer = self._channels.get(self.key(guild_id, channel_id))
+        if not buffer:
+            return []
+        return list(itertools.islice(reversed(buffer), limit))[::-1]
+
+    def since(self, guild_id: Optional[int], channel_id: int, after_seq: int) -> List[HistoryEntry]:
+        """Turns newer than `after_seq`, oldest first (used by the summarizer)"""
+        buffer = self._channels.get(self.key(guild_id, channel_id))
+        if not buffer:
+            return []
+        newer = list(itertools.takewhile(lambda e: e.seq > after_seq, reversed(buffer)))
+        return newer[::-1]
+
+    def chat_turns(self, guild_id: Optional[int], channel_id: int, limit: int = 6,
+                   before_seq: Optional[int] = None) -> List[Dict[str, str]]:
+        """Last `limit` chat messages before `before_seq` as {"role", "content"} for the prompt"""
+        buffer = self._channels.get(self.key(guild_id, channel_id))
+        if not buffer:
+            return []
+        turns = []
+        for entry in reversed(buffer):
+            if len(turns) >= limit:
+                break
+            if before_seq is not None and entry.seq >= before_seq:
+                continue
+            # Newest first here, flipped at the end
+            if entry.role == "assistant":
+                turns.append({"role": "assistant", "content": entry.message})
+                continue
+            if entry.response:
+                turns.append({"role": "assistant", "content": entry.response})
+            turns.append({"role": "user", "content": f"{entry.user}: {entry.message}"})
+        return turns[:limit][::-1]
+
+    def last_seq(self, guild_id: Optional[int], channel_id: int) -> int:
+        buffer = self._channels.get(self.key(guild_id, channel_id))
+        return buffer[-1].seq if buffer else 0
+
+    def for_user(self, user_id: str, limit: int = 5) -> List[HistoryEntry]:
+        """A user's last `limit` turns across all channels, oldest first"""
+        buffer = self._users.get(user_id)
+        if not buffer:
+            return []
+        return list(itertools.islice(reversed(buffer), limit))[::-1]
+
+    def channels(self) -> List[ChannelKey]:
+        return list(self._channels)
+
+    def __len__(self):
+        return sum(len(buffer) for buffer in self._channels.values())
+
+    def get_stats(self) -> Dict:
+        return {
+            "channels": len(self._channels),
+            "users": len(self._users),
+            "entries": len(self),
+            "capacity_per_channel": self.capacity,
+            "appended": self.appended,
+        }
+
+    # ---------- PERSISTENCE ----------
+    _COLUMNS = "seq, guild_id, channel_id, user_id, user, message, response, role, timestamp"
+
+    @classmethod
+    def _create_table(cls, conn: sqlite3.Connection):
+        # seq is per process, so it's only unique within a channel
+        pk_columns = [row[1] for row in conn.execute("PRAGMA table_info(conversation_history)") if row[5]]
+        if pk_columns == ["seq"]:
+            # Old layout keyed on seq alone - shard processes' counters collide there
+            conn.execute("ALTER TABLE conversation_history RENAME TO conversation_history_old")
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS conversation_history (
+                seq INTEGER NOT NULL,
+                guild_id INTEGER NOT NULL,
+                channel_id INTEGER NOT NULL,
+                user_id TEXT,
+                user TEXT,
+                message TEXT,
+                response TEXT,
+                role TEXT,
+                timestamp REAL,
+                PRIMARY KEY (guild_id, channel_id, seq)
+            )
+        ''')
+        if pk_columns == ["seq"]:
+            conn.execute(f"INSERT INTO conversation_history ({cls._COLUMNS}) "
+                         f"SELECT {cls._COLUMNS} FROM conversation_history_old")
+            conn.execute("DROP TABLE conversation_history_old")
+            logger.info("💬 Migrated conversation_history to per-channel keys")
+
+    def load(self):
+        """Warm start: refill the ring buffers from the last save"""
+        from services.async_db import get_database
+        try:
+            db = get_database(self.db_path)
+            db.write_sync(self._create_table)
+            rows = db.fetchall_sync(
+                f'SELECT {self._COLUMNS} FROM conversation_history ORDER BY guild_id, channel_id, seq'
+            )
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Could not load conversation history: {e}")
+            return
+
+        for row in rows:
+            entry = HistoryEntry(*row)
+            self._insert((entry.guild_id, entry.channel_id), entry)
+        if rows:
+            self._seq = itertools.count(max(row[0] for row in rows) + 1)
+        logger.info(f"💬 Loaded {len(rows)} history turns across {len(self._channels)} channels")
+
+    def save(self):
+        """Replace the persisted snapshot of every channel appended to since the last save"""
+        if not self.db_path:
+            return
+        from services.async_db import get_database
+        dirty, rows, replace = self._save_job()
+        try:
+            get_database(self.db_path).write_sync(replace)
+            self._saved(dirty, rows)
+        except (sqlite3.Error, RuntimeError) as e:
+            logger.warning(f"⚠️ Could not save conversation history: {e}")
+
+    async def save_async(self):
+        """save() for the event loop - the rows are snapshotted here, written on the writer thread"""
+        if not self.db_path:
+            return
+        from services.async_db import get_database
+        dirty, rows, replace = self._save_job()
+        try:
+            await get_database(self.db_path).write(replace)
+            self._saved(dirty, rows)
+        except (sqlite3.Error, RuntimeError) as e:
+            logger.warning(f"⚠️ Could not save conversation history: {e}")
+
+    def _save_job(self):
+        dirty = list(self._dirty)
+        rows = [(e.seq, e.guild_id, e.channel_id, e.user_id, e.user, e.message, e.response, e.role, e.timestamp)
+                for key in dirty for e in self._channels.get(key, ())]
+
+        def replace(conn):
+            self._create_table(conn)
+            conn.executemany('DELETE FROM conversation_history WHERE guild_id = ? AND channel_id = ?', dirty)
+            conn.executemany(
+                f'INSERT INTO conversation_history ({self._COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows
+            )
+        return dirty, rows, replace
+
+    def _saved(self, dirty: List[ChannelKey], rows: List[tuple]):
+        self._dirty.difference_update(dirty)
+        logger.info(f"💾 Saved {len(rows)} history turns across {len(dirty)} channels")
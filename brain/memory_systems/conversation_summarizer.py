@@ -0,0 +1,188 @@
+# melody_ai_v2/brain/memory_systems/conversation_summarizer.py - ROLLING CHAT SUMMARIES
+import asyncio
+import json
+import logging
+import re
+from typing import Callable, Dict, List, Optional
+
+from services.ai_providers.rate_limiter import Priority
+
+logger = logging.getLogger("MelodyBotCore.summarizer")
+
+SUMMARY_SYSTEM_PROMPT = (
+    "You keep short running memory notes about Discord users for a chat bot. "
+    "For each user, merge their NEW messages into their PREVIOUS summary. "
+    "Keep durable details (interests, plans, life events, mood), drop small talk. "
+    "Max 2 sentences per user. Reply with ONLY a JSON object mapping user id to summary."
+)
+
+_JSON_OBJECT_RE = re.compile(r"\{.*\}", re.DOTALL)
+
+
+class ConversationSummarizer:
+    """Folds new channel turns into each user's previous summary in the background.
+
+    Several users go into one structured request (`batch_size` per call) at
+    BACKGROUND priority. Results are written straight to the facts store as the
+    `conversation_summary` fact - nothing goes through the orchestrator, so the
+    summary prompt never lands in semantic memory or fact extraction.
+    """
+
+    def __init__(self, batch_size: int = 5, max_messages_per_user: int = 20,
+                 max_message_chars: int = 200, max_summary_chars: int = 500, facts_store=None):
+        self.batch_size = batch_size
+        self.max_messages_per_user = max_messages_per_user
+        self.max_message_chars = max_message_chars
+        self.max_summary_chars = max_summary_chars
+        self._facts_store = facts_store
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_task: Optional[asyncio.Task] = None
+        self.jobs = 0
+        self.llm_calls = 0
+        self.users_summarized = 0
+        self.failures = 0
+
+    @property
+    def facts_store(self):
+        """Lazy load permanent facts"""
+        if self._facts_store is None:
+            from brain.memory_systems.permanent_facts import permanent_facts
+            self._facts_store = permanent_facts
+        return self._facts_store
+
+    # ---------- BACKGROUND QUEUE ----------
+    def submit(self, entries: List, ai_provider, on_done: Optional[Callable[[bool], None]] = None) -> bool:
+        """Queue channel turns for summarizing - returns immediately.
+
+        `on_done(ok)` runs once the job finishes; ok is False if any batch
+        failed, so the caller can keep those turns for the next try.
+        """
+        if not entries or ai_provider is None or not hasattr(ai_provider, "get_completion"):
+            return False
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._worker_task is None or self._worker_task.done():
+            self._worker_task = asyncio.create_task(self._worker())
+        self._queue.put_nowait((list(entries), ai_provider, on_done))
+        return True
+
+    async def _worker(self):
+        while True:
+            entries, ai_provider, on_done = await self._queue.get()
+            ok = False
+            try:
+                failures = self.failures  # only this worker bumps it
+                await self.summarize(entries, ai_provider)
+                ok = self.failures == failures
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"❌ Conversation summary job failed: {e}")
+            finally:
+                # Before task_done so drain() callers see the caller's cursor already updated
+                if on_done:
+                    try:
+                        on_done(ok)
+                    except Exception as e:
+                        logger.error(f"❌ Summary callback failed: {e}")
+                self._queue.task_done()
+
+    async def drain(self):
+        """Wait until every queued job has been processed"""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def close(self):
+        if self._worker_task:
+            self._worker_task.cancel()
+            await asyncio.gather(self._worker_task, return_exceptions=True)
+            self._worker_task = None
+
+    # ---------- SUMMARIZING ----------
+    async def summarize(self, entries: List, ai_provider) -> Dict[str, str]:
+        """Summarize a chunk of turns; returns {user_id: new summary} for what was stored"""
+        self.jobs += 1
+        users: Dict[str, Dict] = {}
+        for entry in entries:
+            if entry["role"] != "user" or not entry["user_id"]:
+                continue
+            user = users.setdefault(entry["user_id"], {"name": entry["user"], "messages": []})
+            user["messages"].append(entry["message"][:self.max_message_chars])
+
+        stored = {}
+        user_ids = list(users)
+        for start in range(0, len(user_ids), self.batch_size):
+            batch = {uid: users[uid] for uid in user_ids[start:start + self.batch_size]}
+            summaries = await self._summarize_batch(batch, ai_provider)
+            for uid, summary in summaries.items():
+                await self.facts_store.store_facts(uid, [{
+                    "key": "conversation_summary",
+                    "value": summary,
+                    "category": "general",
+                    "confidence": 3
+                }])
+                stored[uid] = summary
+
+        self.users_summarized += len(stored)
+        logger.info(f"📝 Summarized {len(stored)}/{len(users)} users in {-(-len(users) // self.batch_size)} call(s)",
+                    extra={"stage": "summary"})
+        return stored
+
+    async def _summarize_batch(self, batch: Dict[str, Dict], ai_provider) -> Dict[str, str]:
+        previous = await asyncio.gather(*(self.facts_store.get_conversation_summary(uid) for uid in batch))
+        request = {"users": [
+            {
+                "id": uid,
+                "name": data["name"],
+                "previous_summary": summary,
+                "new_messages": data["messages"][-self.max_messages_per_user:],
+            }
+            for (uid, data), summary in zip(batch.items(), previous)
+        ]}
+        messages = [
+            {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+            {"role": "user", "content": json.dumps(request, ensure_ascii=False)},
+        ]
+
+        self.llm_calls += 1
+        raw = await ai_provider.get_completion(messages, priority=Priority.BACKGROUND,
+                                               max_tokens=80 * len(batch) + 40)
+        if raw is None:
+            # Provider down - keep the old summaries, the turns stay in history
+            self.failures += 1
+            return {}
+
+        parsed = self._parse(raw)
+        if parsed is None:
+            self.failures += 1
+            logger.warning(f"⚠️ Summary reply was not JSON: {raw[:80]}")
+            return {}
+
+        return {
+            uid: str(summary).strip()[:self.max_summary_chars]
+            for uid, summary in parsed.items()
+            if uid in batch and str(summary).strip()
+        }
+
+    @staticmethod
+    def _parse(raw: str) -> Optional[Dict]:
+        match = _JSON_OBJECT_RE.search(raw)
+        if not match:
+            return None
+        try:
+            parsed = json.loads(match.group())
+        except ValueError:
+            return None
+        return parsed if isinstance(parsed, dict) else None
+
+    def get_stats(self) -> Dict:
+        return {
+            "jobs": self.jobs,
+            "llm_calls": self.llm_calls,
+            "users_summarized": self.users_summarized,
+            "failures": self.failures,
+            "queued": self._queue.qsize() if self._queue else 0,
+        }
+
+
+# Global instance
+conversation_summarizer = ConversationSummarizer()
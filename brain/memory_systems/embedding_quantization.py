@@ -0,0 +1,223 @@
+# melody_ai_v2/brain/memory_systems/embedding_quantization.py - COMPACT EMBEDDINGS + QUANTIZED FAISS INDEXES
+# MELODY_MEMORY_QUANTIZATION picks the index semantic memory builds:
+#   flat  - exact IndexFlatIP, 1536 B/memory (default)
+#   sq8   - IndexScalarQuantizer 8-bit, 384 B/memory (4x)
+#   pq    - IndexPQ, 96 x 8-bit codes, 96 B/memory (16x) - needs ~1k memories to train
+#   ivfpq - IndexIVFPQ, same codes + coarse lists, only scans nprobe lists per search
+# Any mode other than flat also stores int8 blobs in SQLite (388 B instead of 1536 B).
+#
+#   python brain/memory_systems/embedding_quantization.py migrate --db melody_memory.db --to int8
+#   python brain/memory_systems/embedding_quantization.py benchmark --db melody_memory.db
+import argparse
+import logging
+import os
+import sys
+import time
+from typing import Dict, List, Optional
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger("MelodyBotCore.quantization")
+
+MODES = ("flat", "sq8", "pq", "ivfpq")
+PQ_SUBQUANTIZERS = 96
+MIN_PQ_TRAIN = 1024  # 4 points per centroid x 256 centroids
+IVF_NPROBE = 16
+_SCALE = np.dtype("<f4")
+
+
+def quantization_mode() -> str:
+    mode = os.getenv("MELODY_MEMORY_QUANTIZATION", "flat").lower()
+    return mode if mode in MODES else "flat"
+
+
+# ---------- BLOB CODEC ----------
+def encode_embedding(vector: np.ndarray, int8: bool) -> bytes:
+    """float32 blob, or a 4-byte scale + int8 components (max |component| -> 127)"""
+    vector = np.asarray(vector, dtype=np.float32).ravel()
+    if not int8:
+        return vector.tobytes()
+    scale = float(np.abs(vector).max()) / 127.0 or 1.0
+    codes = np.clip(np.rint(vector / scale), -127, 127).astype(np.int8)
+    return np.array([scale], dtype=_SCALE).tobytes() + codes.tobytes()
+
+
+def decode_embedding(blob: bytes, dim: int = 384) -> np.ndarray:
+    """Either blob format -> float32 vector (the length tells them apart)"""
+    if len(blob) == dim * 4:
+        return np.frombuffer(blob, dtype=np.float32)
+    scale = np.frombuffer(blob[:4], dtype=_SCALE)[0]
+    return np.frombuffer(blob[4:], dtype=np.int8).astype(np.float32) * scale
+
+
+def is_int8_blob(blob: bytes, dim: int = 384) -> bool:
+    return len(blob) == dim + 4
+
+
+# ---------- INDEXES ----------
+def build_index(dim: int, mode: str, train_vectors: Optional[np.ndarray] = None):
+    """Empty, trained inner-product index keyed by rowid (add_with_ids / remove_ids / reconstruct).
+
+    `train_vectors` must be L2-normalized. Modes that can't train on what we have
+    fall back to sq8 until there are enough memories (restart or migrate later).
+    """
+    count = 0 if train_vectors is None else len(train_vectors)
+    if mode in ("pq", "ivfpq") and count < MIN_PQ_TRAIN:
+        logger.warning(f"⚠️ {mode} needs {MIN_PQ_TRAIN} memories to train, have {count} - using sq8 for now")
+        mode = "sq8"
+
+    if mode == "flat":
+        return faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+
+    if mode == "sq8":
+        quantizer = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+        if count:
+            quantizer.train(train_vectors)
+        else:
+            # No data yet: a uniform [-1, 1] range is exact for any normalized vector
+            quantizer.train(np.vstack([np.full(dim, -1.0), np.full(dim, 1.0)]).astype(np.float32))
+        return faiss.IndexIDMap2(quantizer)
+
+    if mode == "pq":
+        quantizer = faiss.IndexPQ(dim, PQ_SUBQUANTIZERS, 8, faiss.METRIC_INNER_PRODUCT)
+        quantizer.pq.cp.min_points_per_centroid = 4
+        quantizer.train(train_vectors)
+        return faiss.IndexIDMap2(quantizer)
+
+    # ivfpq keeps its own ids; a hashtable direct map gives reconstruct + remove by id
+    nlist = int(min(max(np.sqrt(count), 1), count // 39 or 1))
+    index = faiss.IndexIVFPQ(faiss.IndexFlatIP(dim), dim, nlist, PQ_SUBQUANTIZERS, 8, faiss.METRIC_INNER_PRODUCT)
+    index.cp.min_points_per_centroid = 4
+    index.pq.cp.min_points_per_centroid = 4
+    index.train(train_vectors)
+    index.set_direct_map_type(faiss.DirectMap.Hashtable)
+    index.nprobe = min(IVF_NPROBE, nlist)
+    return index
+
+
+def index_bytes(index) -> int:
+    """What the index costs in RAM, measured as its serialized size"""
+    return len(faiss.serialize_index(index))
+
+
+# ---------- MIGRATION ----------
+def migrate(db_path: str, to: str = "int8", dim: int = 384, batch_size: int = 500, vacuum: bool = False) -> Dict:
+    """Rewrite every stored embedding (live + archive) in the target blob format"""
+    from services.async_db import get_database
+    db = get_database(db_path)
+    int8 = to == "int8"
+    stats = {"converted": 0, "skipped": 0, "bytes_before": 0, "bytes_after": 0}
+
+    def write(table: str, updates: List):
+        # Batches go through the writer thread, so a running bot's stores interleave instead of timing out
+        db.write_sync(lambda conn: conn.executemany(f"UPDATE {table} SET embedding = ? WHERE rowid = ?", updates))
+        stats["converted"] += len(updates)
+
+    for table in ("semantic_memories", "semantic_memories_archive"):
+        exists = db.fetchone_sync("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+        if not exists:
+            continue
+        rows = db.fetchall_sync(f"SELECT rowid, embedding FROM {table} WHERE embedding IS NOT NULL")
+        updates = []
+        for rowid, blob in rows:
+            stats["bytes_before"] += len(blob)
+            if is_int8_blob(blob, dim) == int8:
+                stats["skipped"] += 1
+                stats["bytes_after"] += len(blob)
+                continue
+            new_blob = encode_embedding(decode_embedding(blob, dim), int8)
+            stats["bytes_after"] += len(new_blob)
+            updates.append((new_blob, rowid))
+            if len(updates) >= batch_size:
+                write(table, updates)
+                updates = []
+        if updates:
+            write(table, updates)
+    if vacuum:
+        db.write_sync(lambda conn: conn.execute("VACUUM"), exclusive=True)
+    return stats
+
+
+# ---------- BENCHMARK ----------
+def load_vectors(db_path: str, dim: int = 384) -> np.ndarray:
+    from services.async_db import get_database
+    rows = get_database(db_path).fetchall_sync("SELECT embedding FROM semantic_memories WHERE embedding IS NOT NULL")
+    if not rows:
+        return np.zeros((0, dim), dtype=np.float32)
+    vectors = np.stack([decode_embedding(blob, dim) for (blob,) in rows]).astype(np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def benchmark(vectors: np.ndarray, modes: List[str] = MODES, queries: int = 200, k: int = 10,
+              seed: int = 1234) -> Dict[str, Dict]:
+    """Index size, recall@k against exact search, and search time per mode - on the given memories"""
+    dim = vectors.shape[1]
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(len(vectors), size=min(queries, len(vectors)), replace=False)
+    query_vectors = vectors[sample]
+    ids = np.arange(len(vectors), dtype=np.int64)
+    k = min(k, len(vectors))
+
+    exact = None
+    results = {}
+    for mode in modes:
+        index = build_index(dim, mode, vectors)
+        index.add_with_ids(vectors, ids)
+        started = time.perf_counter()
+        _, found = index.search(query_vectors, k)
+        search_us = (time.perf_counter() - started) / len(query_vectors) * 1e6
+        if exact is None:
+            exact = build_index(dim, "flat")
+            exact.add_with_ids(vectors, ids)
+            _, exact_ids = exact.search(query_vectors, k)
+        recall = np.mean([len(set(row) & set(truth)) / k for row, truth in zip(found, exact_ids)])
+        size = index_bytes(index)
+        results[mode] = {
+            "index_bytes": size,
+            "bytes_per_memory": round(size / len(vectors), 1),
+            f"recall@{k}": round(float(recall), 4),
+            "search_us": round(search_us, 1),
+        }
+    flat_size = results.get("flat", {}).get("index_bytes")
+    for result in results.values():
+        if flat_size:
+            result["compression"] = round(flat_size / result["index_bytes"], 1)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Semantic memory embedding quantization tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    migrate_parser = sub.add_parser("migrate", help="convert stored embedding blobs")
+    migrate_parser.add_argument("--db", default="melody_memory.db")
+    migrate_parser.add_argument("--to", choices=("int8", "float32"), default="int8")
+    migrate_parser.add_argument("--vacuum", action="store_true", help="reclaim the freed disk space afterwards")
+    bench_parser = sub.add_parser("benchmark", help="memory vs recall for every index mode on this database")
+    bench_parser.add_argument("--db", default="melody_memory.db")
+    bench_parser.add_argument("--queries", type=int, default=200)
+    bench_parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        stats = migrate(args.db, args.to, vacuum=args.vacuum)
+        print(f"✅ Converted {stats['converted']} embeddings to {args.to} ({stats['skipped']} already were): "
+              f"{stats['bytes_before'] / 1024:.0f} KB -> {stats['bytes_after'] / 1024:.0f} KB")
+        return
+
+    vectors = load_vectors(args.db)
+    if len(vectors) < 2:
+        print(f"❌ Only {len(vectors)} memories in {args.db} - nothing to benchmark")
+        sys.exit(1)
+    print(f"\n📏 INDEX QUANTIZATION on {len(vectors)} memories from {args.db}")
+    for mode, result in benchmark(vectors, queries=args.queries, k=args.k).items():
+        print(f"   {mode:<6} {result['index_bytes'] / 1024:>9.0f} KB  {result['bytes_per_memory']:>7.1f} B/memory  "
+              f"{result.get('compression', 1.0):>5.1f}x  recall@{args.k} {result[f'recall@{args.k}']:.3f}  "
+              f"{result['search_us']:>8.1f} µs/query")
+
+
+if __name__ == "__main__":
+    # Ensure root is in Python path (run as a script)
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+    main()
@@ -0,0 +1,198 @@
+# melody_ai_v2/brain/memory_systems/lexical_search.py - FTS5 KEYWORD SEARCH + RANK FUSION
+# Embeddings blur exact names ("Nice" from To Be Hero X, champion names, anime titles);
+# BM25 over an FTS5 mirror of the same rows catches them. Triggers keep the mirrors in
+# sync with semantic_memories / user_permanent_facts, so writers don't need to know.
+import logging
+import re
+import sqlite3
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger("MelodyBotCore.lexical")
+
+RRF_K = 60
+MAX_QUERY_TERMS = 16
+# Column weights for bm25(): user_id (only used as a filter), user_message, bot_response
+MEMORY_BM25_WEIGHTS = "0.0, 1.0, 0.5"
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "can", "do", "did", "does", "for", "from",
+    "have", "how", "i", "im", "in", "is", "it", "its", "me", "my", "of", "on", "or", "so", "that", "the",
+    "this", "to", "u", "was", "we", "what", "when", "where", "who", "why", "with", "you", "your",
+}
+
+_MEMORY_SCHEMA = [
+    # user_id is indexed so `user_id : "<id>" AND (...)` intersects one user's doclist inside
+    # FTS5, instead of scoring every user's matches and filtering afterwards
+    '''CREATE VIRTUAL TABLE IF NOT EXISTS semantic_memories_fts USING fts5(
+        user_id, user_message, bot_response,
+        content='semantic_memories', tokenize='porter unicode61 remove_diacritics 2')''',
+    '''CREATE TRIGGER IF NOT EXISTS semantic_memories_fts_insert AFTER INSERT ON semantic_memories BEGIN
+        INSERT INTO semantic_memories_fts(rowid, user_id, user_message, bot_response)
+        VALUES (new.rowid, new.user_id, new.user_message, new.bot_response);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS semantic_memories_fts_delete AFTER DELETE ON semantic_memories BEGIN
+        INSERT INTO semantic_memories_fts(semantic_memories_fts, rowid, user_id, user_message, bot_response)
+        VALUES ('delete', old.rowid, old.user_id, old.user_message, old.bot_response);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS semantic_memories_fts_update
+        AFTER UPDATE OF user_id, user_message, bot_response ON semantic_memories BEGIN
+        INSERT INTO semantic_memories_fts(semantic_memories_fts, rowid, user_id, user_message, bot_response)
+        VALUES ('delete', old.rowid, old.user_id, old.user_message, old.bot_response);
+        INSERT INTO semantic_memories_fts(rowid, user_id, user_message, bot_response)
+        VALUES (new.rowid, new.user_id, new.user_message, new.bot_response);
+    END''',
+]
+
+_FACTS_SCHEMA = [
+    '''CREATE VIRTUAL TABLE IF NOT EXISTS user_permanent_facts_fts USING fts5(
+        user_id UNINDEXED, category, fact_key, fact_value,
+        content='user_permanent_facts', tokenize='porter unicode61 remove_diacritics 2')''',
+    '''CREATE TRIGGER IF NOT EXISTS user_permanent_facts_fts_insert AFTER INSERT ON user_permanent_facts BEGIN
+        INSERT INTO user_permanent_facts_fts(rowid, user_id, category, fact_key, fact_value)
+        VALUES (new.rowid, new.user_id, new.category, new.fact_key, new.fact_value);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS user_permanent_facts_fts_delete AFTER DELETE ON user_permanent_facts BEGIN
+        INSERT INTO user_permanent_facts_fts(user_permanent_facts_fts, rowid, user_id, category, fact_key, fact_value)
+        VALUES ('delete', old.rowid, old.user_id, old.category, old.fact_key, old.fact_value);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS user_permanent_facts_fts_update
+        AFTER UPDATE OF user_id, category, fact_key, fact_value ON user_permanent_facts BEGIN
+        INSERT INTO user_permanent_facts_fts(user_permanent_facts_fts, rowid, user_id, category, fact_key, fact_value)
+        VALUES ('delete', old.rowid, old.user_id, old.category, old.fact_key, old.fact_value);
+        INSERT INTO user_permanent_facts_fts(rowid, user_id, category, fact_key, fact_value)
+        VALUES (new.rowid, new.user_id, new.category, new.fact_key, new.fact_value);
+    END''',
+]
+
+
+def _ensure(conn: sqlite3.Connection, fts_table: str, schema: List[str]) -> bool:
+    """Create an FTS5 mirror + sync triggers (backfilling on first run). False if SQLite lacks FTS5.
+
+    A mirror whose definition differs from `schema` is dropped and rebuilt (the triggers
+    only name columns, so they carry over). Runs inside the caller's transaction (an
+    async_db write callback) - no commit here.
+    """
+    existing = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?",
+                            (fts_table,)).fetchone()
+    if existing and " ".join(existing[0].split()) != " ".join(schema[0].replace(" IF NOT EXISTS", "").split()):
+        logger.info(f"🔁 Rebuilding {fts_table} for a new schema")
+        conn.execute(f"DROP TABLE {fts_table}")
+        existing = None
+    exists = existing is not None
+    try:
+        for statement in schema:
+            conn.execute(statement)
+    except sqlite3.OperationalError as e:
+        # The virtual table comes first, so nothing was created
+        logger.warning(f"⚠️ FTS5 unavailable, keyword search on {fts_table[:-4]} disabled: {e}")
+        return False
+    if not exists:
+        conn.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
+    return True
+
+
+def ensure_memory_fts(conn: sqlite3.Connection) -> bool:
+    """Keyword mirror of semantic_memories (the table must exist)"""
+    return _ensure(conn, "semantic_memories_fts", _MEMORY_SCHEMA)
+
+
+def ensure_facts_fts(conn: sqlite3.Connection) -> bool:
+    """Keyword mirror of user_permanent_facts (the table must exist)"""
+    return _ensure(conn, "user_permanent_facts_fts", _FACTS_SCHEMA)
+
+
+def fts_query(text: str) -> Optional[str]:
+    """Free text -> FTS5 OR-query of its distinct non-stopword terms (None if nothing is left)"""
+    terms = []
+    for term in re.findall(r"\w+", text.lower()):
+        if term not in STOPWORDS and (len(term) > 1 or term.isdigit()) and term not in terms:
+            terms.append(term)
+    if not terms:
+        return None
+    return " OR ".join(f'"{term}"' for term in terms[:MAX_QUERY_TERMS])
+
+
+def search_memories(conn: sqlite3.Connection, user_id: str, query: str, limit: int) -> List[Dict[str, Any]]:
+    """BM25-ranked memories for one user, best first ('bm25' is negative - lower is better)"""
+    match = fts_query(query)
+    if match is None:
+        return []
+    user_filter = 'user_id : "' + str(user_id).replace('"', '""') + '"'
+    rows = conn.execute(f'''
+        SELECT m.rowid, m.memory_id, m.user_message, m.bot_response,
+               bm25(semantic_memories_fts, {MEMORY_BM25_WEIGHTS}) AS rank_score
+        FROM semantic_memories_fts JOIN semantic_memories m ON m.rowid = semantic_memories_fts.rowid
+        WHERE semantic_memories_fts MATCH ? AND m.user_id = ?
+        ORDER BY rank_score LIMIT ?
+    ''', (f"{user_filter} AND ({match})", user_id, limit)).fetchall()
+    return [{"rowid": rowid, "memory_id": memory_id, "user_message": user_message, "bot_response": bot_response,
+             "bm25": rank_score} for rowid, memory_id, user_message, bot_response, rank_score in rows]
+
+
+def search_facts(conn: sqlite3.Connection, user_id: str, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+    """BM25-ranked permanent facts for one user, best first"""
+    match = fts_query(query)
+    if match is None:
+        return []
+    rows = conn.execute('''
+        SELECT category, fact_key, fact_value, bm25(user_permanent_facts_fts) AS rank_score
+        FROM user_permanent_facts_fts
+        WHERE user_permanent_facts_fts MATCH ? AND user_id = ?
+        ORDER BY rank_score LIMIT ?
+    ''', (match, user_id, limit)).fetchall()
+    return [{"category": category, "fact_key": fact_key, "fact_value": fact_value, "bm25": rank_score}
+            for category, fact_key, fact_value, rank_score in rows]
+
+
+def reciprocal_rank_fusion(rankings: Iterable[List[Any]], k: int = RRF_K,
+                           weights: Optional[List[float]] = None) -> Dict[Any, float]:
+    """Sum of weight / (k + rank) over every ranking an item appears in (rank starts at 1)"""
+    fused = defaultdict(float)
+    rankings = list(rankings)
+    for ranking, weight in zip(rankings, weights or [1.0] * len(rankings)):
+        for rank, item in enumerate(ranking, 1):
+            fused[item] += weight / (k + rank)
+    return dict(fused)
+
+
+def lexical_results(hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """search_memories() hits -> the memory result shape; relevance is BM25 relative to the best hit"""
+    if not hits:
+        return []
+    best = min(hit["bm25"] for hit in hits) or -1.0
+    return [{
+        "user_message": hit["user_message"],
+        "bot_response": hit["bot_response"],
+        "similarity_score": float(hit["bm25"] / best),
+        "score": float(hit["bm25"] / best),
+        "memory_id": hit["memory_id"],
+        "rowid": hit["rowid"],
+        "lexical": True,
+    } for hit in hits]
+
+
+class LexicalMemoryReader:
+    """Read-only keyword search straight from the database file.
+
+    Used by shards while the memory worker is still loading its model (or
+    unreachable), so prompts keep getting exact-name memories in the meantime.
+    """
+
+    def __init__(self, db_path: str = "melody_memory.db"):
+        self.db_path = db_path
+        self._db = None
+
+    def search(self, user_id: str, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+        if self._db is None:
+            from services.async_db import get_database
+            self._db = get_database(self.db_path)
+        try:
+            # Read-only pool connection - never touches the writer
+            return lexical_results(self._db.read_sync(lambda conn: search_memories(conn, user_id, query, top_k)))
+        except (sqlite3.Error, RuntimeError) as e:
+            logger.debug(f"⚠️ Lexical memory search failed: {e}")
+            return []
+
+    def close(self):
+        # The database itself is shared - close_databases() shuts it down
+        self._db = None
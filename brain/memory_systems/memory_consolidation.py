@@ -0,0 +1,202 @@
+# melody_ai_v2/brain/memory_systems/memory_consolidation.py - SEMANTIC MEMORY BUDGET + DEDUP
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from brain.memory_systems.embedding_quantization import decode_embedding
+
+logger = logging.getLogger("MelodyBotCore.consolidation")
+
+
+class MemoryConsolidator:
+    """Keeps each user's semantic memories under a budget so RAM and search cost stay flat.
+
+    A user is consolidated once they pass `per_user_budget` by `slack`:
+      1. near-duplicates (cosine > `merge_threshold`) fold into their most
+         valuable member, which inherits the importance, hits and merge count;
+      2. if still over budget, the lowest-value memories are evicted.
+    value = importance x 0.5^(age / half_life) x (1 + ln(1 + access_count)).
+    Removed rows move to semantic_memories_archive and leave the FAISS index by id.
+    """
+
+    def __init__(self, per_user_budget: Optional[int] = None, merge_threshold: float = 0.92,
+                 half_life_days: float = 30.0, slack: float = 0.1):
+        self.per_user_budget = per_user_budget or int(os.getenv("MELODY_MEMORY_BUDGET", "300"))
+        self.merge_threshold = merge_threshold
+        self.half_life_days = half_life_days
+        self.slack = slack
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_task: Optional[asyncio.Task] = None
+        self._queued = set()
+        self.runs = 0
+        self.merged = 0
+        self.evicted = 0
+        self.failures = 0
+
+    # ---------- POLICY ----------
+    def users_over_budget(self, memory, user_ids: Iterable[str]) -> List[str]:
+        trigger = self.per_user_budget * (1 + self.slack)
+        return [user_id for user_id in user_ids if memory.user_counts.get(user_id, 0) > trigger]
+
+    def score(self, importance: np.ndarray, age_days: np.ndarray, access_count: np.ndarray) -> np.ndarray:
+        decay = np.power(0.5, np.maximum(age_days, 0.0) / self.half_life_days)
+        return importance * decay * (1.0 + np.log1p(access_count))
+
+    @staticmethod
+    def _age_days(timestamps: List[Optional[str]], now: datetime) -> np.ndarray:
+        ages = []
+        for value in timestamps:
+            try:
+                ages.append((now - datetime.fromisoformat(value)).total_seconds() / 86400)
+            except (TypeError, ValueError):
+                ages.append(0.0)
+        return np.array(ages, dtype=np.float64)
+
+    def consolidate_user(self, memory, user_id: str) -> Dict[str, int]:
+        """Merge + evict one user's memories (sync - runs in an executor / the memory worker thread)"""
+        memory.flush_access_hits(wait=True)  # the values below count the latest recalls
+        # SQLite hands a deleted max rowid to the next insert, so no store may commit between our
+        # DELETE and remove_memories() - it would get an id we're about to drop from the index
+        with memory.write_lock:
+            return self._consolidate_locked(memory, user_id)
+
+    def _consolidate_locked(self, memory, user_id: str) -> Dict[str, int]:
+        rows = memory.db.fetchall_sync(
+            'SELECT rowid, embedding, timestamp, last_accessed, importance_score, access_count, merged_count '
+            'FROM semantic_memories WHERE user_id = ? AND embedding IS NOT NULL', (user_id,)
+        )
+        with memory.lock:
+            # Only what this process has indexed (another process may share the file)
+            rows = [row for row in rows if row[0] in memory.memory_map]
+        if len(rows) < 2:
+            return {"merged": 0, "evicted": 0}
+
+        rowids = [row[0] for row in rows]
+        vectors = np.stack([decode_embedding(row[1], memory.embedding_dim) for row in rows])
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        now = datetime.utcnow()
+        # Recency = last time it was created or recalled, whichever is later
+        age_days = np.minimum(self._age_days([row[2] for row in rows], now),
+                              self._age_days([row[3] or row[2] for row in rows], now))
+        importance = np.array([row[4] if row[4] is not None else 1.0 for row in rows], dtype=np.float64)
+        access = np.array([row[5] or 0 for row in rows], dtype=np.float64)
+        merged_count = np.array([row[6] or 0 for row in rows], dtype=np.int64)
+        value = self.score(importance, age_days, access)
+
+        # 1. Greedy near-duplicate merge, most valuable memory first
+        order = np.argsort(-value)
+        similarity = vectors @ vectors.T
+        absorbed_into = {}
+        for position in order:
+            if position in absorbed_into:
+                continue
+            duplicates = [other for other in np.nonzero(similarity[position] > self.merge_threshold)[0]
+                          if other != position and other not in absorbed_into and value[other] <= value[position]]
+            for other in duplicates:
+                absorbed_into[other] = position
+                importance[position] = max(importance[position], importance[other])
+                access[position] += access[other]
+                merged_count[position] += merged_count[other] + 1
+
+        # 2. Evict the lowest-value survivors past the budget
+        survivors = [position for position in order if position not in absorbed_into]
+        value = self.score(importance, age_days, access)
+        survivors.sort(key=lambda position: value[position], reverse=True)
+        evicted = survivors[self.per_user_budget:]
+        kept = set(survivors[:self.per_user_budget])
+        if not absorbed_into and not evicted:
+            return {"merged": 0, "evicted": 0}
+
+        archive = [(rowids[other], "merged", rowids[keeper]) for other, keeper in absorbed_into.items()]
+        archive += [(rowids[position], "evicted", None) for position in evicted]
+        keepers = set(absorbed_into.values()) & kept
+
+        def archive_rows(cursor):
+            cursor.executemany('''
+                INSERT INTO semantic_memories_archive
+                (user_id, memory_id, user_message, bot_response, embedding, timestamp, importance_score,
+                 access_count, archived_at, reason, merged_into)
+                SELECT user_id, memory_id, user_message, bot_response, embedding, timestamp, importance_score,
+                       access_count, datetime('now'), ?, ?
+                FROM semantic_memories WHERE rowid = ?
+            ''', [(reason, merged_into, rowid) for rowid, reason, merged_into in archive])
+            cursor.executemany('DELETE FROM semantic_memories WHERE rowid = ?', [(rowid,) for rowid, _, _ in archive])
+            cursor.executemany(
+                'UPDATE semantic_memories SET importance_score = ?, access_count = ?, merged_count = ? WHERE rowid = ?',
+                [(float(importance[p]), int(access[p]), int(merged_count[p]), rowids[p]) for p in keepers]
+            )
+
+        # Archive + delete + update commit together on the writer thread
+        memory.db.write_sync(archive_rows)
+        with memory.lock:
+            memory.remove_memories([rowid for rowid, _, _ in archive])
+            for p in keepers:  # the reranker reads importance from the in-RAM map
+                entry = memory.memory_map.get(rowids[p])
+                if entry:
+                    entry['importance'] = float(importance[p])
+
+        self.runs += 1
+        self.merged += len(absorbed_into)
+        self.evicted += len(evicted)
+        logger.info(f"🧹 Consolidated memories for {user_id}: {len(absorbed_into)} merged, {len(evicted)} evicted, "
+                    f"{len(kept)} kept", extra={"user": user_id, "stage": "consolidation"})
+        return {"merged": len(absorbed_into), "evicted": len(evicted)}
+
+    def consolidate_all(self, memory) -> Dict[str, int]:
+        """Every user, regardless of budget (maintenance / first run on an old database)"""
+        totals = {"merged": 0, "evicted": 0}
+        for user_id in list(memory.user_counts):
+            result = self.consolidate_user(memory, user_id)
+            totals["merged"] += result["merged"]
+            totals["evicted"] += result["evicted"]
+        return totals
+
+    # ---------- BACKGROUND QUEUE (in-process semantic memory) ----------
+    def submit(self, memory, user_ids: Iterable[str]) -> bool:
+        """Queue over-budget users for consolidation - returns immediately"""
+        pending = [user_id for user_id in self.users_over_budget(memory, user_ids) if user_id not in self._queued]
+        if not pending:
+            return False
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._worker_task is None or self._worker_task.done():
+            self._worker_task = asyncio.create_task(self._worker())
+        for user_id in pending:
+            self._queued.add(user_id)
+            self._queue.put_nowait((memory, user_id))
+        return True
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            memory, user_id = await self._queue.get()
+            self._queued.discard(user_id)  # stores that land mid-run can queue this user again
+            try:
+                await loop.run_in_executor(None, self.consolidate_user, memory, user_id)
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"❌ Memory consolidation failed for {user_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def drain(self):
+        """Wait until every queued user has been consolidated"""
+        if self._queue is not None:
+            await self._queue.join()
+
+    def get_stats(self) -> Dict:
+        return {
+            "per_user_budget": self.per_user_budget,
+            "runs": self.runs,
+            "merged": self.merged,
+            "evicted": self.evicted,
+            "failures": self.failures,
+        }
+
+
+# Global instance
+memory_consolidator = MemoryConsolidator()
@@ -1,145 +1,186 @@
-# brain/memory_systems/permanent_facts.py - FIXED VERSION (NO DEADLOCKS)
-import json
+# brain/memory_systems/permanent_facts.py - SQLITE-BACKED FACTS (user_permanent_facts / user_health_status)
+import argparse
 import asyncio
+import json
 import os
+import time
 from datetime import datetime, timedelta
 import re
 from typing import List, Dict, Optional
 import logging
 
-logger = logging.getLogger("MelodyBotCore")
+from brain.memory_systems.lexical_search import ensure_facts_fts, search_facts
+from services.async_db import get_database
+from services.tracing import traced
+
+logger = logging.getLogger("MelodyBotCore.facts")
+
+# --------------------------
+# Schema + Prepared Statements
+# --------------------------
+# Same tables as the ones already shipped in melody_memory.db
+FACTS_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS user_permanent_facts (
+        user_id TEXT,
+        category TEXT,
+        fact_key TEXT,
+        fact_value TEXT,
+        confidence_score INTEGER DEFAULT 1,
+        first_mentioned TEXT,
+        last_mentioned TEXT,
+        mention_count INTEGER DEFAULT 1,
+        source_message TEXT,
+        is_verified BOOLEAN DEFAULT FALSE,
+        PRIMARY KEY (user_id, category, fact_key)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS user_health_status (
+        user_id TEXT,
+        status TEXT,
+        severity INTEGER DEFAULT 1,
+        reported_at TEXT,
+        follow_up_scheduled TEXT,
+        is_resolved BOOLEAN DEFAULT FALSE,
+        PRIMARY KEY (user_id, reported_at)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS user_life_events (
+        user_id TEXT,
+        event_type TEXT,
+        event_date TEXT,
+        details TEXT,
+        importance INTEGER DEFAULT 1,
+        remembered_at TEXT,
+        PRIMARY KEY (user_id, event_type, event_date)
+    )''',
+    # Follow-up sweep: open reports, oldest first
+    'CREATE INDEX IF NOT EXISTS idx_health_open ON user_health_status (is_resolved, reported_at)',
+]
+
+UPSERT_FACT = '''
+    INSERT INTO user_permanent_facts
+    (user_id, category, fact_key, fact_value, confidence_score, first_mentioned, last_mentioned,
+     mention_count, source_message)
+    VALUES (?, ?, ?, ?, ?, ?, ?, 1, ?)
+    ON CONFLICT (user_id, category, fact_key) DO UPDATE SET
+        fact_value = excluded.fact_value,
+        confidence_score = MAX(confidence_score, excluded.confidence_score),
+        last_mentioned = excluded.last_mentioned,
+        mention_count = mention_count + 1
+'''
+# Importer: keeps what's already in the table, so re-running it is harmless
+IMPORT_FACT = '''
+    INSERT INTO user_permanent_facts
+    (user_id, category, fact_key, fact_value, confidence_score, first_mentioned, last_mentioned, mention_count)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (user_id, category, fact_key) DO NOTHING
+'''
+INSERT_HEALTH = '''
+    INSERT INTO user_health_status (user_id, status, severity, reported_at, is_resolved)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (user_id, reported_at) DO UPDATE SET status = excluded.status, severity = excluded.severity
+'''
+IMPORT_HEALTH = '''
+    INSERT INTO user_health_status (user_id, status, severity, reported_at, is_resolved)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (user_id, reported_at) DO NOTHING
+'''
+CONTEXT_CATEGORIES = ("personal", "location", "media_knowledge", "anime_characters")
+
 
 # --------------------------
 # Permanent Facts Storage
 # --------------------------
 class PermanentFacts:
-    """Ultra-optimized async permanent facts storage with caching and health tracking"""
+    """Permanent facts in melody_memory.db - one indexed upsert per fact instead of a JSON rewrite.
+
+    Every shard process can open the same database (WAL), so there's no
+    separate shared-store path. permanent_facts.json is imported once.
+    Queries run on async_db's reader pool / writer thread, never on the loop.
+    """
 
     CACHE_DURATION = 5  # seconds
 
-    def __init__(self, file_path: str = "permanent_facts.json"):
-        self.file_path = file_path
-        self.lock = asyncio.Lock()
-        self.data: Dict = {"users": {}}
-        self._cache: Dict[str, str] = {}
+    def __init__(self, db_path: str = "melody_memory.db", json_path: Optional[str] = "permanent_facts.json"):
+        self.db_path = db_path
+        self.json_path = json_path
+        self._cache: Dict[str, List[tuple]] = {}
         self._cache_time: Dict[str, float] = {}
+        self.db = get_database(db_path)
+        self._setup_tables()
 
-        if os.path.exists(self.file_path):
-            try:
-                with open(self.file_path, "r", encoding="utf-8") as f:
-                    loaded_data = json.load(f)
-                self.data = self._convert_to_new_structure(loaded_data)
-                logger.info(f"✅ Loaded permanent facts: {len(self.data['users'])} users")
-                print(f"✅ DEBUG: Loaded {len(self.data['users'])} users from permanent_facts.json")
-            except Exception as e:
-                logger.error(f"❌ Failed to load permanent facts: {e}")
-                print(f"❌ DEBUG: Failed to load permanent facts: {e}")
-                self.data = {"users": {}}
+        if self.count_facts() == 0 and json_path and os.path.exists(json_path):
+            imported = self.import_json(json_path)
+            logger.info(f"🗄️ Imported permanent facts for {imported} users from {json_path}")
         else:
-            logger.info("🆕 No existing permanent_facts.json - starting fresh")
-            print("🆕 DEBUG: No existing permanent_facts.json - starting fresh")
+            logger.info(f"✅ Permanent facts ready: {self.count_facts()} facts in {db_path}")
 
-    # --------------------------
-    # Data Conversion
-    # --------------------------
-    @staticmethod
-    def _convert_to_new_structure(old_data: Dict) -> Dict:
-        new_data = {"users": {}}
-        print("🔄 DEBUG: Converting old JSON structure to new facts array format")
-        for user_id, user_data in old_data.get("users", {}).items():
-            facts = []
-            for category, items in user_data.items():
-                if isinstance(items, dict):
-                    for key, value in items.items():
-                        facts.append({
-                            "key": key,
-                            "value": str(value),
-                            "category": category,
-                            "confidence": 2,
-                            "first_mentioned": datetime.now().isoformat(),
-                            "last_mentioned": datetime.now().isoformat(),
-                            "mention_count": 1
-                        })
-                        print(f"   🔄 Converted: {user_id}.{category}.{key} = {value}")
-                elif category == "health_status" and isinstance(items, list):
-                    new_data["users"][user_id] = {"facts": facts, "health_status": items}
-                    print(f"   🔄 Preserved health status for {user_id}")
-                    continue
-            new_data["users"][user_id] = {"facts": facts}
-            print(f"✅ DEBUG: Converted {user_id} - {len(facts)} facts")
-        return new_data
+    def _setup_tables(self):
+        def create(conn):
+            for statement in FACTS_SCHEMA:
+                conn.execute(statement)
+            return ensure_facts_fts(conn)
+        self.fts_enabled = self.db.write_sync(create)
+
+    def count_facts(self) -> int:
+        return self.db.fetchone_sync("SELECT COUNT(*) FROM user_permanent_facts")[0]
 
     # --------------------------
-    # Internal Async Save
+    # JSON Import
     # --------------------------
-    async def _save(self):
-        """Save data without lock (lock should be handled by caller)"""
-        try:
-            # 🆕 REMOVED the lock here - caller should handle locking
-            with open(self.file_path, "w", encoding="utf-8") as f:
-                json.dump(self.data, f, indent=2, ensure_ascii=False)
-            print("💾 DEBUG: Saved permanent_facts.json")
-        except Exception as e:
-            logger.error(f"❌ Failed to save permanent facts: {e}")
-            print(f"❌ DEBUG: Save failed: {e}")
+    @staticmethod
+    def _normalize_user(user_data: Dict) -> Dict:
+        """Either permanent_facts.json layout -> {"facts": [...], "health_status": [...]}"""
+        if isinstance(user_data.get("facts"), list):
+            return {"facts": user_data["facts"], "health_status": user_data.get("health_status", [])}
+        # Oldest layout: {category: {key: value}}
+        now = datetime.now().isoformat()
+        facts = [{"key": key, "value": str(value), "category": category, "confidence": 2,
+                  "first_mentioned": now, "last_mentioned": now, "mention_count": 1}
+                 for category, items in user_data.items() if isinstance(items, dict)
+                 for key, value in items.items()]
+        health = user_data.get("health_status", [])
+        return {"facts": facts, "health_status": health if isinstance(health, list) else []}
+
+    def import_users(self, users: Dict[str, Dict]) -> int:
+        """Import {user_id: user_data} in one transaction; facts already in the table win"""
+        fact_rows, health_rows = [], []
+        for user_id, user_data in users.items():
+            normalized = self._normalize_user(user_data or {})
+            for fact in normalized["facts"]:
+                fact_rows.append((user_id, fact.get("category", "general"), fact["key"], str(fact["value"]),
+                                  fact.get("confidence", 1), fact.get("first_mentioned"),
+                                  fact.get("last_mentioned"), fact.get("mention_count", 1)))
+            for entry in normalized["health_status"]:
+                health_rows.append((user_id, entry["status"], entry.get("severity", 1), entry["reported_at"],
+                                    bool(entry.get("is_resolved", False))))
+        def insert(conn):
+            conn.executemany(IMPORT_FACT, fact_rows)
+            conn.executemany(IMPORT_HEALTH, health_rows)
+        self.db.write_sync(insert)
+        self._cache.clear()
+        return len(users)
+
+    def import_json(self, json_path: str) -> int:
+        with open(json_path, "r", encoding="utf-8") as f:
+            return self.import_users(json.load(f).get("users", {}))
 
     # --------------------------
-    # Facts Management - FIXED VERSION
+    # Facts Management
     # --------------------------
-    async def store_facts(self, user_id: str, facts: List[Dict]):
-        """Store multiple facts efficiently with single save - FIXED DEADLOCK"""
-        print(f"💾 DEBUG: Storing {len(facts)} facts for {user_id}")
-        
+    @traced("facts.store")
+    async def store_facts(self, user_id: str, facts: List[Dict], source_message: Optional[str] = None):
+        """Upsert up to 5 facts keyed on (user_id, category, fact_key) - one commit"""
         if not facts:
             return
-            
-        async with self.lock:  # 🆕 SINGLE LOCK for all operations
-            user_data = self.data["users"].setdefault(user_id, {"facts": []})
-            existing_facts = user_data["facts"]
-            
-            for fact in facts[:5]:  # Limit per message
-                key = fact["key"]
-                value = fact["value"]
-                category = fact.get("category", "general")
-                confidence = fact.get("confidence", 1)
-                
-                # Check if fact already exists
-                found = False
-                for existing_fact in existing_facts:
-                    if existing_fact["key"] == key and existing_fact["category"] == category:
-                        old_value = existing_fact["value"]
-                        old_confidence = existing_fact.get("confidence", 1)
-                        existing_fact.update({
-                            "value": value,
-                            "confidence": max(old_confidence, confidence),
-                            "last_mentioned": datetime.now().isoformat(),
-                            "mention_count": existing_fact.get("mention_count", 1) + 1
-                        })
-                        print(f"🔄 DEBUG: Updated fact {user_id}.{category}.{key}: '{old_value}' -> '{value}' (conf: {old_confidence}->{existing_fact['confidence']})")
-                        found = True
-                        break
-                
-                if not found:
-                    existing_facts.append({
-                        "key": key,
-                        "value": value,
-                        "category": category,
-                        "confidence": confidence,
-                        "first_mentioned": datetime.now().isoformat(),
-                        "last_mentioned": datetime.now().isoformat(),
-                        "mention_count": 1
-                    })
-                    print(f"✅ DEBUG: Added new fact {user_id}.{category}.{key} = '{value}' (conf: {confidence})")
-            
-            # 🆕 SINGLE SAVE after all facts are processed
-            self._invalidate_cache(user_id)
-            await self._save()
-            print(f"✅ DEBUG: All facts stored successfully for {user_id}")
+        now = datetime.now().isoformat()
+        rows = [(user_id, fact.get("category", "general"), fact["key"], fact["value"], fact.get("confidence", 1),
+                 now, now, source_message) for fact in facts[:5]]  # Limit per message
+        await self.db.executemany(UPSERT_FACT, rows)
+        self._invalidate_cache(user_id)
+        logger.debug(f"💾 Stored {len(rows)} facts", extra={"user": user_id, "stage": "facts"})
 
     async def add_fact(self, user_id: str, key: str, value: str,
                        category: str = "general", confidence: int = 1):
         """Add or update a single fact - COMPATIBILITY METHOD"""
-        print(f"🔧 DEBUG: add_fact called for {user_id}.{category}.{key}")
         await self.store_facts(user_id, [{
             "key": key, 
             "value": value, 
@@ -148,60 +189,72 @@ class PermanentFacts:
         }])
 
     async def search_facts(self, user_id: str, min_confidence: int = 1) -> List[tuple]:
-        async with self.lock:
-            facts = self.data.get("users", {}).get(user_id, {}).get("facts", [])
-            result = [(f["category"], f["key"], f["value"]) for f in facts if f.get("confidence", 1) >= min_confidence]
-            print(f"🔍 DEBUG: Search for {user_id} (min_conf: {min_confidence}) -> {len(result)} facts")
-            return result
+        return await self.db.fetchall(
+            "SELECT category, fact_key, fact_value FROM user_permanent_facts "
+            "WHERE user_id = ? AND confidence_score >= ? ORDER BY rowid", (user_id, min_confidence)
+        )
+
+    async def find_facts(self, user_id: str, text: str, limit: int = 3) -> List[tuple]:
+        """Facts whose words appear in `text` (FTS5/BM25, best first)"""
+        if not self.fts_enabled:
+            return []
+        hits = await self.db.read(lambda conn: search_facts(conn, user_id, text, limit))
+        return [(hit["category"], hit["fact_key"], hit["fact_value"]) for hit in hits]
+
+    async def get_conversation_summary(self, user_id: str) -> str:
+        """Latest rolling chat summary (stored as a 'conversation_summary' fact)"""
+        row = await self.db.fetchone(
+            "SELECT fact_value FROM user_permanent_facts WHERE user_id = ? AND fact_key = 'conversation_summary' "
+            "ORDER BY last_mentioned DESC LIMIT 1", (user_id,)
+        )
+        return row[0] if row else ""
 
     # --------------------------
     # Ultra-fast User Context
     # --------------------------
-    async def get_user_context(self, user_id: str) -> str:
-        now = asyncio.get_event_loop().time()
+    async def _context_facts(self, user_id: str) -> List[tuple]:
+        now = time.monotonic()
         if user_id in self._cache and now - self._cache_time.get(user_id, 0) < self.CACHE_DURATION:
-            print(f"⚡ DEBUG: Using cached context for {user_id}")
             return self._cache[user_id]
-
-        facts = self.data.get("users", {}).get(user_id, {}).get("facts", [])
+        rows = await self.db.fetchall(
+            f"SELECT category, fact_key, fact_value FROM user_permanent_facts "
+            f"WHERE user_id = ? AND confidence_score >= 2 AND category IN ({','.join('?' * len(CONTEXT_CATEGORIES))}) "
+            f"ORDER BY rowid", (user_id, *CONTEXT_CATEGORIES)
+        )
+        personal_facts = [row for row in rows if row[0] in ("personal", "location")][:3]
+        media_facts = [row for row in rows if row[0] in ("media_knowledge", "anime_characters")][:2]
+        self._cache[user_id] = personal_facts + media_facts
+        self._cache_time[user_id] = now
+        return self._cache[user_id]
+
+    @traced("facts.context")
+    async def get_user_context(self, user_id: str, message: Optional[str] = None) -> str:
+        """High-confidence personal/media facts; with `message`, facts it mentions come first"""
+        facts = await self._context_facts(user_id)
+        if message:
+            mentioned = [fact for fact in await self.find_facts(user_id, message) if fact[1] != "conversation_summary"]
+            facts = mentioned + [fact for fact in facts if fact not in mentioned]
         if not facts:
-            self._cache[user_id] = ""
-            self._cache_time[user_id] = now
-            print(f"📭 DEBUG: No facts for {user_id} - empty context")
             return ""
 
         context_parts = []
+        for _, key, value in facts:
+            value = value if len(value) <= 80 else value[:77] + "..."
+            context_parts.append(f"- {key.replace('_',' ').title()}: {value}")
 
-        # High confidence facts
-        high_facts = [f for f in facts if f.get("confidence", 1) >= 2]
-        personal_facts = [f for f in high_facts if f["category"] in ["personal", "location"]][:3]
-        media_facts = [f for f in high_facts if f["category"] in ["media_knowledge", "anime_characters"]][:2]
-
-        print(f"🔧 DEBUG: Building context for {user_id} - {len(personal_facts)} personal, {len(media_facts)} media facts")
-
-        for f in personal_facts + media_facts:
-            value = f["value"] if len(f["value"]) <= 80 else f["value"][:77] + "..."
-            context_parts.append(f"- {f['key'].replace('_',' ').title()}: {value}")
-
-        context = f"📝 USER FACTS:\n" + "\n".join(context_parts) if context_parts else ""
-        
-        self._cache[user_id] = context
-        self._cache_time[user_id] = now
-        print(f"📋 DEBUG: Context built for {user_id} ({len(context)} chars)")
+        context = f"📝 USER FACTS:\n" + "\n".join(context_parts)
+        logger.debug(f"📋 Context built: {len(facts)} facts ({len(context)} chars)", extra={"user": user_id})
         return context
 
     # --------------------------
     # Extract Facts with ENHANCED DEBUG
     # --------------------------
+    @traced("facts.extract")
     async def extract_personal_facts(self, user_id: str, message: str) -> List[Dict]:
         """Extract personal facts from a message with COMPLETE DEBUG"""
         facts = []
         msg = message.lower()
         
-        print(f"\n🔍 FACT DEBUG: Analyzing message: '{message}'")
-        print(f"🔍 FACT DEBUG: Lowercase version: '{msg}'")
-        
-        patterns_checked = []
         facts_found = []
 
         # Name detection with more patterns
@@ -212,16 +265,12 @@ class PermanentFacts:
         ]
         
         for pat in name_patterns:
-            patterns_checked.append(f"name: {pat}")
             match = re.search(pat, msg)
             if match:
                 name = match.group(1).title()
                 facts.append({"category": "personal", "key": "name", "value": name, "confidence": 3})
                 facts_found.append(f"name: {name}")
-                print(f"✅ FACT DEBUG: Found name: {name} using pattern: {pat}")
                 break
-        else:
-            print(f"❌ FACT DEBUG: No name patterns matched")
 
         # Location with more patterns
         location_patterns = [
@@ -230,16 +279,12 @@ class PermanentFacts:
         ]
         
         for pat in location_patterns:
-            patterns_checked.append(f"location: {pat}")
             match = re.search(pat, msg)
             if match:
                 location = match.group(1).title()
                 facts.append({"category": "location", "key": "location", "value": location, "confidence": 2})
                 facts_found.append(f"location: {location}")
-                print(f"✅ FACT DEBUG: Found location: {location} using pattern: {pat}")
                 break
-        else:
-            print(f"❌ FACT DEBUG: No location patterns matched")
 
         # Age detection
         age_patterns = [
@@ -248,17 +293,13 @@ class PermanentFacts:
         ]
         
         for pat in age_patterns:
-            patterns_checked.append(f"age: {pat}")
             match = re.search(pat, msg)
             if match:
                 age = match.group(1)
                 age_value = f"{age} years old"
                 facts.append({"category": "personal", "key": "age", "value": age_value, "confidence": 2})
                 facts_found.append(f"age: {age_value}")
-                print(f"✅ FACT DEBUG: Found age: {age_value} using pattern: {pat}")
                 break
-        else:
-            print(f"❌ FACT DEBUG: No age patterns matched")
 
         # Favorites with better categorization
         fav_patterns = [
@@ -267,7 +308,6 @@ class PermanentFacts:
         ]
         
         for pat in fav_patterns:
-            patterns_checked.append(f"favorite: {pat}")
             match = re.search(pat, msg)
             if match:
                 if "favorite" in pat:
@@ -275,15 +315,11 @@ class PermanentFacts:
                     item = match.group(2)
                     facts.append({"category": "preferences", "key": f"favorite_{category}", "value": item, "confidence": 2})
                     facts_found.append(f"favorite_{category}: {item}")
-                    print(f"✅ FACT DEBUG: Found favorite: {category} = {item} using pattern: {pat}")
                 else:
                     item = match.group(1)
                     facts.append({"category": "preferences", "key": f"likes_{item}", "value": "yes", "confidence": 1})
                     facts_found.append(f"likes_{item}: yes")
-                    print(f"✅ FACT DEBUG: Found likes: {item} using pattern: {pat}")
                 break
-        else:
-            print(f"❌ FACT DEBUG: No favorite/like patterns matched")
 
         # Anime character detection
         if "nice" in msg and "to be hero" in msg:
@@ -294,36 +330,21 @@ class PermanentFacts:
                 "confidence": 3
             })
             facts_found.append("anime: Nice from To Be Hero")
-            print(f"✅ FACT DEBUG: Found anime reference: Nice from To Be Hero")
 
         # Health detection
-        health_updated = False
         if any(x in msg for x in ["sick", "ill", "not feeling well"]):
             await self.update_health(user_id, "sick", 2)
-            print(f"🏥 FACT DEBUG: Detected health issue - marked as sick")
-            health_updated = True
+            facts_found.append("health: sick")
         elif any(x in msg for x in ["better", "well", "good", "recovered"]):
             await self.update_health(user_id, "recovered", 1)
-            print(f"🏥 FACT DEBUG: Detected health improvement - marked as recovered")
-            health_updated = True
-        
-        if not health_updated:
-            print(f"❌ FACT DEBUG: No health patterns matched")
+            facts_found.append("health: recovered")
 
-        # COMPREHENSIVE DEBUG SUMMARY
-        if facts:
-            print(f"🎉 FACT DEBUG: SUCCESS! Extracted {len(facts)} facts: {facts_found}")
-        else:
-            print(f"🔍 FACT DEBUG: NO FACTS EXTRACTED - Checked {len(patterns_checked)} patterns:")
-            for i, pattern in enumerate(patterns_checked[:12], 1):
-                print(f"   {i:2d}. {pattern}")
-            if len(patterns_checked) > 12:
-                print(f"   ... and {len(patterns_checked) - 12} more patterns")
+        # One line per message - matched fact keys only, never the message text
+        logger.debug(f"🔍 Extracted {len(facts)} facts: {facts_found}", extra={"user": user_id, "stage": "facts"})
 
         # Invalidate cache when new facts are added
         if facts and user_id in self._cache:
             del self._cache[user_id]
-            print(f"🔄 FACT DEBUG: Invalidated cache for {user_id}")
 
         return facts
 
@@ -331,38 +352,23 @@ class PermanentFacts:
     # Health Management
     # --------------------------
     async def update_health(self, user_id: str, status: str, severity: int = 1):
-        async with self.lock:
-            user_data = self.data["users"].setdefault(user_id, {"facts": []})
-            health = user_data.setdefault("health_status", [])
-            health.append({
-                "status": status,
-                "severity": severity,
-                "reported_at": datetime.now().isoformat(),
-                "is_resolved": False
-            })
-            await self._save()
-            print(f"🏥 DEBUG: Updated health for {user_id}: {status} (severity: {severity})")
+        await self.db.execute(INSERT_HEALTH, (user_id, status, severity, datetime.now().isoformat(), False))
+        logger.debug(f"🏥 Updated health: {status} (severity: {severity})", extra={"user": user_id})
 
     async def check_health_follow_ups(self) -> List[tuple]:
-        async with self.lock:
-            now = datetime.now()
-            results = []
-            for uid, udata in self.data["users"].items():
-                for entry in udata.get("health_status", []):
-                    if not entry.get("is_resolved", False) and datetime.fromisoformat(entry["reported_at"]) + timedelta(hours=1) < now:
-                        results.append((uid, entry["status"], entry["reported_at"]))
-            print(f"🏥 DEBUG: Health follow-ups check: {len(results)} pending")
-            return results[:10]
+        cutoff = (datetime.now() - timedelta(hours=1)).isoformat()
+        results = await self.db.fetchall(
+            "SELECT user_id, status, reported_at FROM user_health_status "
+            "WHERE is_resolved = 0 AND reported_at < ? ORDER BY reported_at LIMIT 10", (cutoff,)
+        )
+        logger.debug(f"🏥 Health follow-ups check: {len(results)} pending")
+        return results
 
     async def mark_health_resolved(self, user_id: str):
-        async with self.lock:
-            resolved_count = 0
-            for entry in self.data.get("users", {}).get(user_id, {}).get("health_status", []):
-                if not entry.get("is_resolved", False):
-                    entry["is_resolved"] = True
-                    resolved_count += 1
-            await self._save()
-            print(f"🏥 DEBUG: Marked {resolved_count} health entries as resolved for {user_id}")
+        resolved = await self.db.write(lambda conn: conn.execute(
+            "UPDATE user_health_status SET is_resolved = 1 WHERE user_id = ? AND is_resolved = 0", (user_id,)
+        ).rowcount)
+        logger.debug(f"🏥 Marked {resolved} health entries as resolved", extra={"user": user_id})
 
     # --------------------------
     # Cache Helper
@@ -371,7 +377,6 @@ class PermanentFacts:
         if user_id in self._cache:
             del self._cache[user_id]
             del self._cache_time[user_id]
-            print(f"🔄 DEBUG: Invalidated cache for {user_id}")
 
 
 # --------------------------
@@ -379,37 +384,70 @@ class PermanentFacts:
 # --------------------------
 class PermanentFactsAdapter:
     def __init__(self):
-        self.storage = PermanentFacts()
-        print("🔧 DEBUG: PermanentFactsAdapter initialized")
+        self._storage: Optional[PermanentFacts] = None
+        self._opening: Optional[asyncio.Future] = None
+
+    @property
+    def storage(self) -> PermanentFacts:
+        """Opened on first use, so importing this module doesn't touch the database"""
+        if self._storage is None:
+            self._storage = PermanentFacts()
+        return self._storage
+
+    async def _open(self) -> PermanentFacts:
+        """Like `storage`, but table setup + the one-time JSON import run in an executor"""
+        if self._storage is None:
+            if self._opening is None:
+                # Shared, so a burst of first messages opens the database once
+                self._opening = asyncio.get_running_loop().run_in_executor(None, PermanentFacts)
+            try:
+                storage = await self._opening
+            finally:
+                self._opening = None
+            if self._storage is None:
+                self._storage = storage
+        return self._storage
 
     async def extract_personal_facts(self, user_id: str, message: str) -> List[Dict]:
-        print(f"🔧 ADAPTER DEBUG: extract_personal_facts({user_id}, '{message}')")
-        return await self.storage.extract_personal_facts(user_id, message)
+        return await (await self._open()).extract_personal_facts(user_id, message)
 
     async def store_facts(self, user_id: str, facts: List[Dict]):
-        print(f"🔧 ADAPTER DEBUG: store_facts({user_id}, {len(facts)} facts)")
-        await self.storage.store_facts(user_id, facts)
+        await (await self._open()).store_facts(user_id, facts)
+
+    async def get_user_context(self, user_id: str, message: Optional[str] = None) -> str:
+        return await (await self._open()).get_user_context(user_id, message)
 
-    async def get_user_context(self, user_id: str) -> str:
-        print(f"🔧 ADAPTER DEBUG: get_user_context({user_id})")
-        return await self.storage.get_user_context(user_id)
+    async def get_conversation_summary(self, user_id: str) -> str:
+        return await (await self._open()).get_conversation_summary(user_id)
 
     async def get_media_knowledge(self, user_id: str) -> str:
-        print(f"🔧 ADAPTER DEBUG: get_media_knowledge({user_id})")
         context = await self.get_user_context(user_id)
         if "anime_characters" in context or "media_knowledge" in context:
             return context
         return ""
 
     async def check_health_follow_ups(self):
-        print("🔧 ADAPTER DEBUG: check_health_follow_ups()")
-        return await self.storage.check_health_follow_ups()
+        return await (await self._open()).check_health_follow_ups()
 
     async def mark_health_resolved(self, user_id: str):
-        print(f"🔧 ADAPTER DEBUG: mark_health_resolved({user_id})")
-        await self.storage.mark_health_resolved(user_id)
+        await (await self._open()).mark_health_resolved(user_id)
 
 
 # Global instance
 permanent_facts = PermanentFactsAdapter()
-print("🎯 DEBUG: Global permanent_facts instance created")
\ No newline at end of file
+
+
+def main():
+    # python -m brain.memory_systems.permanent_facts [permanent_facts.json] [--db melody_memory.db]
+    parser = argparse.ArgumentParser(description="Import permanent_facts.json into melody_memory.db")
+    parser.add_argument("json_path", nargs="?", default="permanent_facts.json")
+    parser.add_argument("--db", default="melody_memory.db")
+    args = parser.parse_args()
+    storage = PermanentFacts(db_path=args.db, json_path=None)
+    before = storage.count_facts()
+    users = storage.import_json(args.json_path)
+    print(f"✅ Imported {storage.count_facts() - before} new facts for {users} users into {args.db}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,46 +1,162 @@
 # brain/memory_systems/semantic_memory.py
 import sqlite3
 import numpy as np
-from sentence_transformers import SentenceTransformer
 import faiss
 import datetime
 import asyncio
+import hashlib
 import logging
-from typing import List, Dict, Any
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Dict, Any, Optional, Tuple
+
+from brain.memory_systems.embedding_quantization import (build_index, decode_embedding, encode_embedding,
+                                                         quantization_mode)
+from brain.memory_systems.lexical_search import (RRF_K, ensure_memory_fts, fts_query, lexical_results,
+                                                 reciprocal_rank_fusion, search_memories)
+from brain.memory_systems.memory_consolidation import memory_consolidator
+from services.async_db import get_database
+from services.tracing import traced
+
+logger = logging.getLogger("MelodyBotCore.semantic")
+
+def memory_worker_enabled() -> bool:
+    """Shards (and `--memory-worker`) share one embedding/search process instead of loading the model each"""
+    return os.getenv("MELODY_MEMORY_WORKER", "0") == "1"
+
+
+# Search results for the message being handled - the same (user, query) is searched once per request
+_request_cache: ContextVar[Optional[Dict]] = ContextVar("memory_request_cache", default=None)
+
+
+@contextmanager
+def memory_request_scope():
+    """Cache memory searches until the block exits (one human message)"""
+    token = _request_cache.set({})
+    try:
+        yield
+    finally:
+        _request_cache.reset(token)
+
+
+def request_cache_key(user_id: str, query: str, top_k: int, diversity: Optional[float]) -> Optional[Tuple]:
+    """Key into the active request cache, or None outside a request"""
+    if _request_cache.get() is None:
+        return None
+    return user_id, hashlib.sha1(query.encode("utf-8")).hexdigest(), top_k, diversity
+
+
+def cached_search(key: Optional[Tuple]) -> Optional[List[Dict[str, Any]]]:
+    cache = _request_cache.get()
+    return cache.get(key) if cache is not None and key is not None else None
+
+
+def remember_search(key: Optional[Tuple], results: List[Dict[str, Any]]):
+    cache = _request_cache.get()
+    if cache is not None and key is not None:
+        cache[key] = results
+
+
+def _to_epoch(value: Optional[str]) -> float:
+    """SQLite datetime('now') text (UTC) -> epoch seconds"""
+    try:
+        return datetime.datetime.fromisoformat(value).replace(tzinfo=datetime.timezone.utc).timestamp()
+    except (TypeError, ValueError):
+        return time.time()
+
+
+def format_memory_context(memories: List[Dict[str, Any]]) -> str:
+    """Relevant memories -> prompt block (shared by the in-process system and the worker client)"""
+    if not memories:
+        return ""
+
+    context_parts = ["🎭 RELEVANT PAST CONVERSATIONS:"]
+    for i, memory in enumerate(memories, 1):
+        context_parts.append(f"{i}. User: {memory['user_message']}")
+        context_parts.append(f"   Bot: {memory['bot_response']}")
+        context_parts.append(f"   [Relevance: {memory['similarity_score']:.3f}]")
+        context_parts.append("")
+
+    return "\n".join(context_parts)
 
-logger = logging.getLogger("MelodyBotCore")
 
 class SemanticMemorySystem:
-    def __init__(self, db_path='melody_memory.db'):
+    # Two-stage retrieval: FAISS fetches top_k x OVERSAMPLE candidates, then a NumPy rerank
+    # score = similarity + IMPORTANCE_WEIGHT x (importance - 1) + RECENCY_WEIGHT x 0.5^(age / half-life)
+    # With FTS5, BM25 hits join the candidates and the final order is a reciprocal rank
+    # fusion of that score with BM25 (score is then the fused value, 1.0 = top of both lists).
+    # BM25 is skipped when a candidate is already this close to the query (a near-duplicate
+    # already carries its exact names) or when the query has no searchable terms.
+    LEXICAL_SKIP_SIMILARITY = 0.9
+    OVERSAMPLE = 4
+    IMPORTANCE_WEIGHT = 0.1
+    RECENCY_WEIGHT = 0.05
+    RECENCY_HALF_LIFE_DAYS = 14.0
+
+    def __init__(self, db_path='melody_memory.db', model=None, consolidator=None, quantization=None):
         self.db_path = db_path
-        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.consolidator = consolidator or memory_consolidator
+        # flat | sq8 | pq | ivfpq - see embedding_quantization.py
+        self.quantization = quantization or quantization_mode()
+        # Writes go through the shared writer thread, reads through its read-only pool
+        self.db = get_database(db_path)
+        # Index + map mutations (store, consolidation) vs. searches running in executor threads
+        self.lock = threading.RLock()
+        # Held across a DB write + the matching index change (store vs. consolidation)
+        self.write_lock = threading.Lock()
+        self.user_counts = Counter()
+        self.access_hits = Counter()  # rowid -> searches that returned it, flushed with the next write
+        # More encodes than this in flight -> answer searches from FTS5 alone instead of queueing
+        self.lexical_backlog = int(os.getenv("MELODY_MEMORY_LEXICAL_BACKLOG", "8"))
+        self._encodes_in_flight = 0
+        self.fts_enabled = False
+        self.lexical_searches = 0
         try:
-            self.model = SentenceTransformer('all-MiniLM-L6-v2')
+            if model is None:
+                # Imported here so worker-mode shards never load torch
+                from sentence_transformers import SentenceTransformer
+                model = SentenceTransformer('all-MiniLM-L6-v2')
+            self.model = model
             self.embedding_dim = 384
-            self.index = faiss.IndexFlatIP(self.embedding_dim)
+            self.index = None
             self.memory_map = {}
             self._setup_semantic_tables()
             self._load_existing_memories()
-            print("✅ FAISS Semantic Memory initialized!")
+            logger.info(f"✅ FAISS Semantic Memory initialized! ({self.quantization} index)")
         except Exception as e:
-            print(f"❌ FAISS initialization failed: {e}")
+            logger.error(f"❌ FAISS initialization failed: {e}")
             self.index = None
 
     # ---------- INTERNAL UTILITIES ----------
+    @traced("memory.encode")
     async def _encode_async(self, text: str) -> np.ndarray:
         """Run embedding generation in a background thread (non-blocking)."""
         loop = asyncio.get_event_loop()
         return await loop.run_in_executor(None, lambda: self.model.encode([text])[0])
 
-    async def _search_async(self, vector: np.ndarray, top_k: int):
-        """Run FAISS search in a background thread."""
+    @traced("memory.faiss")
+    async def _search_async(self, user_id: str, vector: np.ndarray, top_k: int, diversity: Optional[float],
+                            query: Optional[str] = None):
+        """Run FAISS (+ FTS5) search + rerank in a background thread."""
         loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, lambda: self.index.search(vector, top_k))
+        queries = [query] if query is not None else None
+        return await loop.run_in_executor(None, self.search_vectors, [user_id], vector, top_k, diversity, queries)
+
+    def _locked_search(self, vector: np.ndarray, top_k: int):
+        with self.lock:
+            return self.index.search(vector, top_k)
 
     # ---------- DATABASE SETUP ----------
     def _setup_semantic_tables(self):
         """Create tables for semantic memory."""
-        cursor = self.conn.cursor()
+        self.fts_enabled = self.db.write_sync(self._create_tables)
+
+    @staticmethod
+    def _create_tables(cursor: sqlite3.Connection) -> bool:
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS semantic_memories (
                 user_id TEXT,
@@ -54,100 +170,314 @@ class SemanticMemorySystem:
                 PRIMARY KEY (user_id, memory_id)
             )
         ''')
-        self.conn.commit()
+        # Consolidation bookkeeping (added later - migrate older databases in place)
+        columns = {row[1] for row in cursor.execute('PRAGMA table_info(semantic_memories)')}
+        for column, definition in (('access_count', 'INTEGER DEFAULT 0'), ('last_accessed', 'TEXT'),
+                                   ('merged_count', 'INTEGER DEFAULT 0')):
+            if column not in columns:
+                cursor.execute(f'ALTER TABLE semantic_memories ADD COLUMN {column} {definition}')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS semantic_memories_archive (
+                user_id TEXT,
+                memory_id INTEGER,
+                user_message TEXT,
+                bot_response TEXT,
+                embedding BLOB,
+                timestamp TEXT,
+                importance_score REAL,
+                access_count INTEGER,
+                archived_at TEXT,
+                reason TEXT,
+                merged_into INTEGER
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_semantic_archive_user ON semantic_memories_archive (user_id)')
+        return ensure_memory_fts(cursor)
 
     def _load_existing_memories(self):
-        """Load existing memories into FAISS index."""
-        if self.index is None:
-            return
-            
-        cursor = self.conn.cursor()
-        cursor.execute('SELECT user_id, memory_id, user_message, bot_response, embedding FROM semantic_memories')
-        memories = cursor.fetchall()
+        """Load existing memories and build the FAISS index (quantized indexes train on them)."""
+        memories = self.db.fetchall_sync(
+            'SELECT rowid, user_id, memory_id, user_message, bot_response, embedding, importance_score, '
+            'timestamp FROM semantic_memories')
         
         embeddings_list = []
+        ids_list = []
         self.memory_map.clear()
+        self.user_counts.clear()
         
-        for idx, (user_id, memory_id, user_msg, bot_resp, embedding_blob) in enumerate(memories):
+        for rowid, user_id, memory_id, user_msg, bot_resp, embedding_blob, importance, timestamp in memories:
             if embedding_blob:
-                embedding = np.frombuffer(embedding_blob, dtype=np.float32)
+                embedding = decode_embedding(embedding_blob, self.embedding_dim)
                 embeddings_list.append(embedding)
-                self.memory_map[idx] = {
+                ids_list.append(rowid)
+                self.user_counts[user_id] += 1
+                self.memory_map[rowid] = {
                     'user_id': user_id,
                     'memory_id': memory_id, 
                     'user_message': user_msg,
-                    'bot_response': bot_resp
+                    'bot_response': bot_resp,
+                    'importance': importance if importance is not None else 1.0,
+                    'created': _to_epoch(timestamp)
                 }
                 
+        embedding_matrix = np.array(embeddings_list, dtype=np.float32).reshape(len(embeddings_list), self.embedding_dim)
+        # CRITICAL FIX: Normalize embeddings before adding to FAISS
+        faiss.normalize_L2(embedding_matrix)
+        # Keyed by SQLite rowid so consolidation can drop single memories without a rebuild
+        self.index = build_index(self.embedding_dim, self.quantization, embedding_matrix)
         if embeddings_list:
-            embedding_matrix = np.array(embeddings_list).astype('float32')
-            # CRITICAL FIX: Normalize embeddings before adding to FAISS
-            faiss.normalize_L2(embedding_matrix)
-            self.index.add(embedding_matrix)
-            print(f"✅ Loaded {len(embeddings_list)} memories into FAISS")
+            self.index.add_with_ids(embedding_matrix, np.array(ids_list, dtype=np.int64))
+            logger.info(f"✅ Loaded {len(embeddings_list)} memories into FAISS")
+
+    # ---------- BATCH PRIMITIVES (sync - the memory worker calls these directly) ----------
+    def encode_batch(self, texts: List[str]) -> np.ndarray:
+        """One model call for many texts -> float32 matrix"""
+        return np.asarray(self.model.encode(texts), dtype=np.float32).reshape(len(texts), -1)
+
+    def store_vectors(self, rows: List[Tuple[str, str, str, float]], embeddings: np.ndarray) -> List[str]:
+        """Insert (user_id, user_message, bot_response, importance) rows with their embeddings, one commit.
+
+        Returns the users that got new memories (the caller decides whether to consolidate them).
+        """
+        int8 = self.quantization != "flat"
+
+        def insert(cursor: sqlite3.Connection):
+            next_ids = {}
+            new_ids = []
+            new_entries = []
+            for (user_id, user_message, bot_response, importance), embedding in zip(rows, embeddings):
+                if user_id not in next_ids:
+                    # Archived ids count too - a memory_id is never reused after consolidation
+                    next_ids[user_id] = cursor.execute(
+                        'SELECT MAX(COALESCE((SELECT MAX(memory_id) FROM semantic_memories WHERE user_id = ?), 0), '
+                        'COALESCE((SELECT MAX(memory_id) FROM semantic_memories_archive WHERE user_id = ?), 0)) + 1',
+                        (user_id, user_id)
+                    ).fetchone()[0]
+                memory_id = next_ids[user_id]
+                next_ids[user_id] += 1
+
+                new_ids.append(cursor.execute('''
+                    INSERT INTO semantic_memories 
+                    (user_id, memory_id, user_message, bot_response, embedding, timestamp, importance_score)
+                    VALUES (?, ?, ?, ?, ?, datetime('now'), ?)
+                ''', (user_id, memory_id, user_message, bot_response,
+                      encode_embedding(embedding, int8=int8), importance)).lastrowid)
+                new_entries.append({
+                    'user_id': user_id,
+                    'memory_id': memory_id,
+                    'user_message': user_message,
+                    'bot_response': bot_response,
+                    'importance': importance,
+                    'created': time.time()
+                })
+            return list(next_ids), new_ids, new_entries
+
+        # Queued right before the insert, so both normally share one commit
+        self.flush_access_hits()
+        embedding_np = np.array(embeddings, dtype=np.float32).reshape(len(rows), -1)
+        faiss.normalize_L2(embedding_np)
+        # The writer thread serializes memory_id allocation; write_lock keeps a consolidation from
+        # deleting (and freeing the rowid of) anything between our commit and the index add.
+        # Searches only take self.lock, so they never wait on the commit.
+        with self.write_lock:
+            touched, new_ids, new_entries = self.db.write_sync(insert)
+            with self.lock:
+                self.index.add_with_ids(embedding_np, np.array(new_ids, dtype=np.int64))
+                for rowid, entry in zip(new_ids, new_entries):
+                    self.memory_map[rowid] = entry
+                    self.user_counts[entry['user_id']] += 1
+        return touched
+
+    def flush_access_hits(self, wait: bool = False):
+        """Write buffered search hits to access_count - joins the next write batch, never its own fsync"""
+        if not self.access_hits:
+            return
+        with self.lock:
+            hits, self.access_hits = self.access_hits, Counter()
+        future = self.db.submit(lambda conn: conn.executemany(
+            "UPDATE semantic_memories SET access_count = COALESCE(access_count, 0) + ?, "
+            "last_accessed = datetime('now') WHERE rowid = ?",
+            [(count, rowid) for rowid, count in hits.items()]
+        ))
+        if wait:
+            future.result()
+
+    def remove_memories(self, rowids: List[int]):
+        """Drop memories from the index + map (rows are already archived/deleted by the caller)"""
+        with self.lock:
+            if rowids:
+                self.index.remove_ids(np.array(rowids, dtype=np.int64))
+            for rowid in rowids:
+                entry = self.memory_map.pop(rowid, None)
+                if entry:
+                    self.user_counts[entry['user_id']] -= 1
+                self.access_hits.pop(rowid, None)
+
+    def search_vectors(self, user_ids: List[str], vectors: np.ndarray, top_k: int,
+                       diversity: Optional[float] = None,
+                       queries: Optional[List[str]] = None) -> List[List[Dict[str, Any]]]:
+        """One FAISS call for several queries, then a per-user rerank (see OVERSAMPLE).
+
+        Passing the query `queries` texts adds BM25 hits and fuses both rankings.
+        """
+        if self.index is None or self.index.ntotal == 0:
+            return [[] for _ in user_ids]
+
+        query_np = np.array(vectors, dtype=np.float32).reshape(len(user_ids), -1)
+        faiss.normalize_L2(query_np)
+        similarities, indices = self._locked_search(query_np, min(top_k * self.OVERSAMPLE, self.index.ntotal))
+        results = []
+        for row, user_id in enumerate(user_ids):
+            results.append(self._rerank(user_id, similarities[row], indices[row], top_k, diversity,
+                                        query_np[row], queries[row] if queries else None))
+        return results
+
+    def _lexical_hits(self, user_id: str, query: str, limit: int) -> Optional[List[Dict[str, Any]]]:
+        if not self.fts_enabled or fts_query(query) is None:
+            return None
+        try:
+            # Always called from an executor / worker thread - read on its own connection, no hop
+            return self.db.read_local(lambda conn: search_memories(conn, user_id, query, limit))
+        except sqlite3.Error as e:
+            logger.debug(f"⚠️ FTS memory search failed: {e}")
+            return None
+
+    def search_lexical(self, user_id: str, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+        """Keyword-only search - no encoder needed (warming up / overloaded)"""
+        self.lexical_searches += 1
+        results = lexical_results(self._lexical_hits(user_id, query, top_k) or [])
+        for result in results:
+            self.access_hits[result['rowid']] += 1
+        return results
+
+    def _rerank(self, user_id: str, similarities: np.ndarray, indices: np.ndarray, top_k: int,
+                diversity: Optional[float] = None, query_vector: Optional[np.ndarray] = None,
+                query: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Blend similarity with importance + recency; `diversity` (MMR lambda, 0..1) trades relevance for variety"""
+        candidates = [(position, self.memory_map.get(int(idx))) for position, idx in enumerate(indices)]
+        candidates = [(position, entry) for position, entry in candidates
+                      if entry is not None and entry['user_id'] == user_id]
+        ids = [int(indices[position]) for position, _ in candidates]
+        similarity = [float(similarities[position]) for position, _ in candidates]
+        entries = [entry for _, entry in candidates]
+
+        lexical = None
+        if query is not None and (not similarity or max(similarity) < self.LEXICAL_SKIP_SIMILARITY):
+            lexical = self._lexical_hits(user_id, query, top_k * self.OVERSAMPLE)
+
+        # Keyword hits the vector search missed join with their true cosine similarity
+        lexical_ids = [hit['rowid'] for hit in lexical or [] if hit['rowid'] in self.memory_map]
+        seen = set(ids)
+        missing = [rowid for rowid in lexical_ids if rowid not in seen]
+        if missing and query_vector is not None:
+            with self.lock:
+                missing = [rowid for rowid in missing if rowid in self.memory_map]
+                vectors = self.index.reconstruct_batch(np.array(missing, dtype=np.int64)) if missing else []
+            if missing:
+                # One matrix-vector product instead of a norm + dot per hit
+                vectors = np.asarray(vectors, dtype=np.float32)
+                cosine = vectors @ query_vector / np.maximum(np.linalg.norm(vectors, axis=1), 1e-12)
+                ids.extend(missing)
+                similarity.extend(cosine.tolist())
+                entries.extend(self.memory_map[rowid] for rowid in missing)
+        if not entries:
+            return []
+
+        ids = np.array(ids, dtype=np.int64)
+        similarity = np.array(similarity, dtype=np.float64)
+        importance = np.array([entry['importance'] for entry in entries], dtype=np.float64)
+        age_days = (time.time() - np.array([entry['created'] for entry in entries])) / 86400
+        score = (similarity + self.IMPORTANCE_WEIGHT * (importance - 1.0)
+                 + self.RECENCY_WEIGHT * np.power(0.5, np.maximum(age_days, 0.0) / self.RECENCY_HALF_LIFE_DAYS))
+
+        if lexical_ids:
+            vector_order = [int(ids[i]) for i in np.argsort(-score, kind="stable")]
+            # Equal BM25 (same words, e.g. a repeated line) keeps the importance/recency order
+            vector_rank = {rowid: rank for rank, rowid in enumerate(vector_order)}
+            bm25 = {hit['rowid']: round(hit['bm25'], 6) for hit in lexical}
+            lexical_order = sorted((rowid for rowid in lexical_ids if rowid in vector_rank),
+                                   key=lambda rowid: (bm25[rowid], vector_rank[rowid]))
+            fused = reciprocal_rank_fusion([vector_order, lexical_order])
+            # Normalized so 1.0 = first in both rankings, comparable with MMR's similarity term
+            score = np.array([fused.get(int(rowid), 0.0) for rowid in ids]) * (RRF_K + 1) / 2
+
+        if diversity is not None and len(entries) > top_k:
+            with self.lock:
+                candidate_vectors = self.index.reconstruct_batch(ids.astype(np.int64))
+            order = self._mmr(score, candidate_vectors, top_k, diversity)
+        else:
+            order = np.argsort(-score, kind="stable")[:top_k]
+
+        relevant_memories = []
+        for i in order:
+            entry = entries[i]
+            relevant_memories.append({
+                'user_message': entry['user_message'],
+                'bot_response': entry['bot_response'],
+                'similarity_score': float(similarity[i]),
+                'score': float(score[i]),
+                'memory_id': entry['memory_id'],
+                'rowid': int(ids[i])
+            })
+            self.access_hits[int(ids[i])] += 1
+        return relevant_memories
+
+    @staticmethod
+    def _mmr(relevance: np.ndarray, vectors: np.ndarray, top_k: int, diversity: float) -> List[int]:
+        """Maximal marginal relevance: diversity x relevance - (1 - diversity) x closest already-picked memory"""
+        pairwise = vectors @ vectors.T
+        selected = [int(np.argmax(relevance))]
+        closest = pairwise[selected[0]].copy()
+        while len(selected) < min(top_k, len(relevance)):
+            marginal = diversity * relevance - (1.0 - diversity) * closest
+            marginal[selected] = -np.inf
+            pick = int(np.argmax(marginal))
+            selected.append(pick)
+            closest = np.maximum(closest, pairwise[pick])
+        return selected
 
     # ---------- CORE FUNCTIONS ----------
+    @traced("memory.store")
     async def store_conversation(self, user_id: str, user_message: str, bot_response: str, importance: float = 1.0):
         """Store a new user/bot exchange asynchronously."""
         if self.index is None:
             return
-            
-        cursor = self.conn.cursor()
-        cursor.execute(
-            'SELECT COALESCE(MAX(memory_id), 0) + 1 FROM semantic_memories WHERE user_id = ?',
-            (user_id,)
-        )
-        memory_id = cursor.fetchone()[0]
-        
+
         conversation_text = f"User: {user_message} Bot: {bot_response}"
         embedding = await self._encode_async(conversation_text)
-        embedding_blob = embedding.tobytes()
-        
-        cursor.execute('''
-            INSERT INTO semantic_memories 
-            (user_id, memory_id, user_message, bot_response, embedding, timestamp, importance_score)
-            VALUES (?, ?, ?, ?, ?, datetime('now'), ?)
-        ''', (user_id, memory_id, user_message, bot_response, embedding_blob, importance))
-        self.conn.commit()
-        
-        embedding_np = np.array(embedding, dtype=np.float32).reshape(1, -1)
-        faiss.normalize_L2(embedding_np)
-        self.index.add(embedding_np)
-        
-        new_index = self.index.ntotal - 1
-        self.memory_map[new_index] = {
-            'user_id': user_id,
-            'memory_id': memory_id,
-            'user_message': user_message,
-            'bot_response': bot_response
-        }
+        touched = await asyncio.get_event_loop().run_in_executor(
+            None, self.store_vectors, [(user_id, user_message, bot_response, importance)], embedding.reshape(1, -1))
+        self.consolidator.submit(self, touched)
 
-    async def search_relevant_memories(self, user_id: str, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
-        """Async semantic similarity search."""
+    @traced("memory.search")
+    async def search_relevant_memories(self, user_id: str, query: str, top_k: int = 5,
+                                       diversity: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Async semantic similarity search, reranked by importance + recency."""
         if self.index is None or self.index.ntotal == 0:
             return []
+
+        cache_key = request_cache_key(user_id, query, top_k, diversity)
+        cached = cached_search(cache_key)
+        if cached is not None:
+            return cached
             
         try:
-            query_embedding = await self._encode_async(query)
+            if self.fts_enabled and self._encodes_in_flight >= self.lexical_backlog:
+                # Encoder is backed up - exact keyword matches now beat better matches later
+                results = await asyncio.get_event_loop().run_in_executor(
+                    None, self.search_lexical, user_id, query, top_k)
+                remember_search(cache_key, results)
+                return results
+
+            self._encodes_in_flight += 1
+            try:
+                query_embedding = await self._encode_async(query)
+            finally:
+                self._encodes_in_flight -= 1
             query_np = np.array(query_embedding, dtype=np.float32).reshape(1, -1)
-            faiss.normalize_L2(query_np)
-            
-            k = min(top_k, self.index.ntotal)
-            similarities, indices = await self._search_async(query_np, k)
-            
-            relevant_memories = []
-            for similarity, idx in zip(similarities[0], indices[0]):
-                if idx in self.memory_map and self.memory_map[idx]['user_id'] == user_id:
-                    memory_data = self.memory_map[idx]
-                    relevant_memories.append({
-                        'user_message': memory_data['user_message'],
-                        'bot_response': memory_data['bot_response'],
-                        'similarity_score': float(similarity),
-                        'memory_id': memory_data['memory_id']
-                    })
-                    
-            relevant_memories.sort(key=lambda x: x['similarity_score'], reverse=True)
-            return relevant_memories[:top_k]
+            results = (await self._search_async(user_id, query_np, top_k, diversity, query))[0]
+            remember_search(cache_key, results)
+            return results
             
         except Exception as e:
             logger.error(f"❌ Semantic search error: {e}")
@@ -156,29 +486,29 @@ class SemanticMemorySystem:
     async def get_conversation_context(self, user_id: str, current_message: str) -> str:
         """Return recent relevant memory context for AI prompt."""
         relevant_memories = await self.search_relevant_memories(user_id, current_message, top_k=3)
-        if not relevant_memories:
-            return ""
-            
-        context_parts = ["🎭 RELEVANT PAST CONVERSATIONS:"]
-        for i, memory in enumerate(relevant_memories, 1):
-            context_parts.append(f"{i}. User: {memory['user_message']}")
-            context_parts.append(f"   Bot: {memory['bot_response']}")
-            context_parts.append(f"   [Relevance: {memory['similarity_score']:.3f}]")
-            context_parts.append("")
-            
-        return "\n".join(context_parts)
+        return format_memory_context(relevant_memories)
 
     def get_memory_stats(self, user_id: str) -> Dict[str, Any]:
         """Quick stats about stored semantic memories."""
-        cursor = self.conn.cursor()
-        cursor.execute('SELECT COUNT(*) FROM semantic_memories WHERE user_id = ?', (user_id,))
-        memory_count = cursor.fetchone()[0]
-        
+        memory_count = self.db.fetchone_sync('SELECT COUNT(*) FROM semantic_memories WHERE user_id = ?',
+                                             (user_id,))[0]
+
         return {
             'semantic_memories': memory_count,
             'faiss_index_size': self.index.ntotal if self.index else 0,
-            'semantic_search_enabled': self.index is not None
+            'semantic_search_enabled': self.index is not None,
+            'keyword_search_enabled': self.fts_enabled,
+            'lexical_searches': self.lexical_searches
         }
 
-# Global instance
-semantic_memory = SemanticMemorySystem()
\ No newline at end of file
+    async def close(self):
+        """Shutdown: commit buffered access hits (close_databases() stops the writer)"""
+        self.flush_access_hits()
+        await asyncio.get_event_loop().run_in_executor(None, self.db.flush)
+
+# Global instance - in worker mode this process only holds a socket client, no model or index
+if memory_worker_enabled():
+    from services.memory_worker import MemoryWorkerClient
+    semantic_memory = MemoryWorkerClient()
+else:
+    semantic_memory = SemanticMemorySystem()
@@ -5,10 +5,13 @@
 # Semantic + Predictable Extremes + Gen Alpha slang + Reduced Smoothing + Roast Defense
 # ==========================================================
 
+import logging
 import re
 import statistics
 from typing import Dict, List, Tuple
 
+logger = logging.getLogger("MelodyBotCore.emotions")
+
 class EmotionalCore:
     """Advanced emotional reasoning system for MelodyAI v3.0 with roast defense."""
     
@@ -285,8 +288,9 @@ class EmotionalCore:
         extremes_info = f" | EXTREMES={extremes_triggered}" if extremes_triggered else ""
         roast_info = f" | ROAST_DEFENSE={roast_defense_level}" if roast_defense else ""
         
-        print(f"🎭 Emotional Debug | User={user_id} | Raw={raw_score} | Final={final_score} | "
-              f"Trust={trust:.1f} | Banter={is_banter} | Defense={roast_defense}{roast_info}{extremes_info}")
+        logger.debug(f"🎭 Emotional Debug | Raw={raw_score} | Final={final_score} | "
+                     f"Trust={trust:.1f} | Banter={is_banter} | Defense={roast_defense}{roast_info}{extremes_info}",
+                     extra={"user": user_id, "stage": "emotion"})
         
         return {
             'sentiment': sentiment,
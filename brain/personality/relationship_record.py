@@ -0,0 +1,149 @@
+# melody_ai_v2/brain/personality/relationship_record.py - COMPACT PER-USER RELATIONSHIP RECORD
+import time
+from array import array
+from datetime import datetime
+from typing import Dict, Iterator, List
+
+
+def _to_epoch(value) -> int:
+    """ISO strings from old saves -> epoch seconds (UTC)"""
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str) and value:
+        try:
+            return int((datetime.fromisoformat(value) - datetime(1970, 1, 1)).total_seconds())
+        except ValueError:
+            pass
+    return int(time.time())
+
+
+class CompatibilityRing:
+    """Fixed-size ring of (epoch, score) pairs backed by two typed arrays"""
+    __slots__ = ("_times", "_scores", "_start", "_size")
+
+    CAPACITY = 10
+
+    def __init__(self):
+        self._times = array("q", bytes(8 * self.CAPACITY))
+        self._scores = array("b", bytes(self.CAPACITY))
+        self._start = 0
+        self._size = 0
+
+    def append(self, timestamp: int, score: int):
+        if self._size < self.CAPACITY:
+            idx = (self._start + self._size) % self.CAPACITY
+            self._size += 1
+        else:
+            idx = self._start
+            self._start = (self._start + 1) % self.CAPACITY
+        self._times[idx] = timestamp
+        self._scores[idx] = score
+
+    def recent_scores(self, count: int) -> List[int]:
+        count = min(count, self._size)
+        first = self._start + self._size - count
+        return [self._scores[(first + i) % self.CAPACITY] for i in range(count)]
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self) -> Iterator[Dict]:
+        """Old list-of-dicts view - only used when saving to JSON"""
+        for i in range(self._size):
+            idx = (self._start + i) % self.CAPACITY
+            yield {"timestamp": self._times[idx], "compatibility": self._scores[idx]}
+
+
+class UserRecord:
+    """One user's relationship state. Ints + typed arrays instead of a 13-key dict.
+
+    record["points"] / record.get("likes", 0) / record["x"] = y keep working for
+    the embed code; keys the bot doesn't know about are kept in `extra` so
+    nothing is lost on save.
+    """
+    __slots__ = ("points", "likes", "dislikes", "neutral_interactions", "gifts_received", "gifts_given",
+                 "conversation_depth", "interactions", "last_sync", "trust_score", "onboarding_complete",
+                 "collected_facts", "compatibility", "compatibility_history", "extra")
+
+    FIELDS = __slots__[:-1]
+
+    def __init__(self):
+        self.points = 100
+        self.likes = 0
+        self.dislikes = 0
+        self.neutral_interactions = 0
+        self.gifts_received = 0
+        self.gifts_given = 0
+        self.conversation_depth = 0
+        self.interactions = 0
+        self.last_sync = int(time.time())
+        self.trust_score = 50
+        self.onboarding_complete = False
+        self.collected_facts = []
+        self.compatibility = None
+        self.compatibility_history = CompatibilityRing()
+        self.extra = None
+
+    # ---------- DICT COMPATIBILITY ----------
+    def __getitem__(self, key):
+        if key in self.FIELDS:
+            return getattr(self, key)
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in self.FIELDS:
+            setattr(self, key, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __contains__(self, key):
+        return key in self.FIELDS or bool(self.extra and key in self.extra)
+
+    def get(self, key, default=None):
+        try:
+            value = self[key]
+        except KeyError:
+            return default
+        return default if value is None else value
+
+    def copy_from(self, other: "UserRecord"):
+        """Overwrite this record in place (shared-store refresh keeps existing references valid)"""
+        for slot in self.__slots__:
+            setattr(self, slot, getattr(other, slot))
+
+    def recent_compatibility(self, count: int) -> List[int]:
+        return self.compatibility_history.recent_scores(count)
+
+    # ---------- SERIALIZATION ----------
+    @classmethod
+    def from_dict(cls, data: Dict) -> "UserRecord":
+        """Migrate a saved (possibly very old) dict - runs once per user at load"""
+        record = cls()
+        for key, value in data.items():
+            if key == "compatibility_history":
+                for entry in value[-CompatibilityRing.CAPACITY:]:
+                    record.compatibility_history.append(_to_epoch(entry.get("timestamp")),
+                                                        int(entry.get("compatibility", 50)))
+            elif key == "last_sync":
+                record.last_sync = _to_epoch(value)
+            else:
+                record[key] = value
+
+        if "neutral_interactions" not in data:
+            if "interactions" in data and "likes" in data and "dislikes" in data:
+                total_specific = data.get("likes", 0) + data.get("dislikes", 0)
+                record.neutral_interactions = max(0, data.get("interactions", 0) - total_specific)
+        return record
+
+    def to_dict(self) -> Dict:
+        data = {field: getattr(self, field) for field in self.FIELDS}
+        data["compatibility_history"] = list(self.compatibility_history)
+        if data["compatibility"] is None:
+            del data["compatibility"]
+        if self.extra:
+            data.update(self.extra)
+        return data
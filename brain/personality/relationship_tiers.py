@@ -0,0 +1,121 @@
+# melody_ai_v2/brain/personality/relationship_tiers.py - SHARED TIER TABLE + COMPATIBILITY
+# Used by launch/main.py, test_suite_v3.py and dashboard_test_suit_v3.py so the
+# three of them can't drift apart again.
+import bisect
+from typing import Dict, Optional, Tuple
+
+# Relationship Tiers with points, emojis, and emotional messages (highest first)
+RELATIONSHIP_TIERS = [
+    {"name": "Soulmate", "min_points": 5000, "emoji": "💫", "color": 0xFF66CC,
+     "message": "You complete me... our souls are connected forever 💫",
+     "busy_response": "I'm so sorry my baby 😔 I'm undergoing intensive tests to improve myself 💝 See you soon!"},
+    {"name": "Twin Flame", "min_points": 3500, "emoji": "🔥", "color": 0xFF3366,
+     "message": "We just GET each other on another level! 🔥",
+     "busy_response": "Aww my flame 🔥 I'm busy with testing but I'll be back for you soon!"},
+    {"name": "Kindred Spirit", "min_points": 2500, "emoji": "🌟", "color": 0xFF9966,
+     "message": "We have such amazing chemistry! 💫",
+     "busy_response": "Hey bestie! 🌟 I'm in testing mode right now, catch you later?"},
+    {"name": "Bestie", "min_points": 1500, "emoji": "💖", "color": 0xFFD166,
+     "message": "You're my favorite person to talk with! 💕",
+     "busy_response": "Hey! I'm a bit busy with testing right now, talk later? 💕"},
+    {"name": "Close Friend", "min_points": 800, "emoji": "😊", "color": 0x66CCFF,
+     "message": "I really enjoy our conversations! 😊",
+     "busy_response": "Testing mode active! I'll be back soon 😊"},
+    {"name": "Acquaintance", "min_points": 300, "emoji": "👋", "color": 0xB0BEC5,
+     "message": "Nice talking with you! 👋",
+     "busy_response": "Busy testing right now, maybe later? 👋"},
+    {"name": "Stranger", "min_points": 100, "emoji": "😒", "color": 0x9E9E9E,
+     "message": "Hello there.",
+     "busy_response": "Can't you see I'm busy right now? 😒 Testing mode active!"},
+    {"name": "Rival", "min_points": 0, "emoji": "⚔️", "color": 0xE53935,
+     "message": "We clearly don't see eye to eye... 😠",
+     "busy_response": "WTF do you want? Can't you see I'm busy RN? ⚔️"}
+]
+
+
+class TierTable:
+    """Tier list compiled into ascending thresholds for O(log n) bisect lookups"""
+
+    def __init__(self, tiers):
+        self.tiers = tiers
+        # (tier, next_tier, current_min, span) per ascending index - nothing left to compute per lookup
+        ordered = sorted(range(len(tiers)), key=lambda i: tiers[i]["min_points"])
+        self._thresholds = [tiers[i]["min_points"] for i in ordered]
+        self._entries = []
+        for i in ordered:
+            next_tier = tiers[i - 1] if i > 0 else None
+            span = next_tier["min_points"] - tiers[i]["min_points"] if next_tier else 0
+            self._entries.append((tiers[i], next_tier, tiers[i]["min_points"], span))
+
+    def _entry(self, points):
+        # Anything below the lowest threshold still counts as the lowest tier
+        idx = max(0, bisect.bisect_right(self._thresholds, points) - 1)
+        return self._entries[idx]
+
+    def tier_for(self, points) -> Dict:
+        return self._entry(points)[0]
+
+    def get_tier_info(self, points) -> Tuple[Dict, Optional[Dict], int]:
+        """(current_tier, next_tier, progress_percent) for a point total"""
+        current_tier, next_tier, current_min, span = self._entry(points)
+        if next_tier:
+            progress_percent = int(((points - current_min) / span) * 100)
+            progress_percent = min(max(progress_percent, 0), 100)
+        else:
+            progress_percent = 100
+        return current_tier, next_tier, progress_percent
+
+    def get_busy_response(self, points) -> str:
+        return self.tier_for(points)["busy_response"]
+
+
+def calculate_compatibility(user_data) -> int:
+    """Calculate sophisticated compatibility percentage with SAFE field access"""
+    if user_data.get("interactions", 0) == 0:
+        return 50
+
+    likes = user_data.get("likes", 0)
+    dislikes = user_data.get("dislikes", 0)
+    total_interactions = user_data.get("interactions", 0)
+    gifts_received = user_data.get("gifts_received", 0)
+    conversation_depth = user_data.get("conversation_depth", 0)
+
+    if likes + dislikes > 0:
+        base_ratio = (likes / (likes + dislikes)) * 100
+    else:
+        base_ratio = 50
+
+    interaction_bonus = min(total_interactions / 20 * 30, 30)
+    gift_compatibility = min(gifts_received * 10, 15)
+    depth_compatibility = min(conversation_depth * 5, 15)
+
+    consistency_bonus = 0
+    if hasattr(user_data, "recent_compatibility"):
+        recent_compat = user_data.recent_compatibility(3)  # UserRecord ring buffer
+    else:
+        recent_compat = [c["compatibility"] for c in user_data.get("compatibility_history", [])[-3:]]
+    if len(recent_compat) >= 3 and max(recent_compat) - min(recent_compat) <= 10:
+        consistency_bonus = 10
+
+    compatibility = (
+        (base_ratio * 0.4) +
+        interaction_bonus +
+        gift_compatibility +
+        depth_compatibility +
+        consistency_bonus
+    )
+
+    return max(0, min(100, int(compatibility)))
+
+
+def cached_compatibility(user_data) -> int:
+    """Compatibility stored on the record by add_interaction; computed once for old records"""
+    compatibility = user_data.get("compatibility")
+    if compatibility is None:
+        compatibility = calculate_compatibility(user_data)
+        user_data["compatibility"] = compatibility
+    return compatibility
+
+
+# Global instance
+tier_table = TierTable(RELATIONSHIP_TIERS)
@@ -1,8 +1,12 @@
 # melody_ai_v2/brain/personality/server_greetings.py
 # 🎵 MelodyAI New User Welcome System + Streamer Live Notifications
 import discord
+import logging
 import random
 from datetime import datetime
+from services.outbound_queue import outbound
+
+logger = logging.getLogger("MelodyBotCore.greetings")
 
 class ServerGreetingSystem:
     """V5 Personality New User Welcomes + Streamer Live Announcements"""
@@ -135,15 +139,24 @@ class ServerGreetingSystem:
             target_channel = await self._find_welcome_channel(user.guild)
             if target_channel:
                 embed = await self.create_welcome_embed(user)
-                await target_channel.send(embed=embed)
-                print(f"✅ Sent V5 welcome message for {user.display_name} in #{target_channel.name}")
+                await outbound.send(target_channel, embed=embed)
+                logger.info(
+                    f"✅ Sent V5 welcome message for {user.display_name} in #{target_channel.name}",
+                    extra={"user": str(user.id), "channel": target_channel.id, "stage": "welcome"}
+                )
                 return True
             else:
-                print(f"⚠️ No welcome channel found for {user.guild.name}")
+                logger.warning(
+                    f"⚠️ No welcome channel found for {user.guild.name}",
+                    extra={"user": str(user.id), "stage": "welcome"}
+                )
                 return False
                 
         except Exception as e:
-            print(f"❌ Failed to send welcome message for {user.display_name}: {e}")
+            logger.error(
+                f"❌ Failed to send welcome message for {user.display_name}: {e}",
+                extra={"user": str(user.id), "stage": "welcome"}
+            )
             return False
     
     async def send_stream_announcement(self, streamer: discord.Member, stream_title: str, stream_url: str, game: str = None):
@@ -170,12 +183,18 @@ class ServerGreetingSystem:
                 stream_url=stream_url
             )
             
-            await target_channel.send(formatted_announcement)
-            print(f"✅ Sent stream announcement for {streamer.display_name}")
+            await outbound.send(target_channel, formatted_announcement)
+            logger.info(
+                f"✅ Sent stream announcement for {streamer.display_name}",
+                extra={"user": str(streamer.id), "channel": target_channel.id, "stage": "stream_announcement"}
+            )
             return True
             
         except Exception as e:
-            print(f"❌ Failed to send stream announcement: {e}")
+            logger.error(
+                f"❌ Failed to send stream announcement: {e}",
+                extra={"user": str(streamer.id), "stage": "stream_announcement"}
+            )
             return False
     
     async def _find_welcome_channel(self, guild: discord.Guild) -> discord.TextChannel:
@@ -199,7 +218,7 @@ class ServerGreetingSystem:
                         return channel
                     
         except Exception as e:
-            print(f"❌ Error finding welcome channel in {guild.name}: {e}")
+            logger.error(f"❌ Error finding welcome channel in {guild.name}: {e}", extra={"stage": "welcome"})
         
         return None
     
@@ -224,7 +243,10 @@ class ServerGreetingSystem:
                         return channel
                     
         except Exception as e:
-            print(f"❌ Error finding announcement channel in {guild.name}: {e}")
+            logger.error(
+                f"❌ Error finding announcement channel in {guild.name}: {e}",
+                extra={"stage": "stream_announcement"}
+            )
         
         return None
 
@@ -10,6 +10,13 @@ from dotenv import load_dotenv
 import random
 import time
 
+from launch.sharding import shard_config_from_env
+from services.async_db import close_databases
+from services.channel_capabilities import channel_capabilities
+from services.outbound_queue import outbound
+from services.response_delivery import deliver_reply
+from services.tracing import tracer
+
 # Load environment variables
 load_dotenv()
 
@@ -17,13 +24,20 @@ TOKEN = os.getenv("DISCORD_BOT_TOKEN")
 DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
 COMMAND_PREFIX = os.getenv("COMMAND_PREFIX", "!")
 
-# Logging setup
-logging.basicConfig(level=logging.INFO)
+# Logging setup - records are queued, a listener thread does the stdout writes
+try:
+    from services.structured_logging import elapsed_ms, setup_logging
+    setup_logging()
+except ImportError:
+    logging.basicConfig(level=logging.INFO)
+
+    def elapsed_ms(started):
+        return round((time.perf_counter() - started) * 1000, 1)
 logger = logging.getLogger("MelodyBotCore")
 
 # Fallback systems - DEFINED FIRST to avoid circular imports
 class FallbackOrchestrator:
-    async def generate_response(self, user_id, user_message, ai_provider=None):
+    async def generate_response(self, user_id, user_message, ai_provider=None, priority=None, history=None):
         fallbacks = [
             "YOOO I'm here bestie! 💫✨ My brain is still booting up but I'm ready to chat! What's good?? 🔥",
             "OMG HII BESTIE!! 💫✨ My AI systems are warming up but I'm totally here for you! Spill the tea! ☕️",
@@ -35,7 +49,7 @@ class FallbackDeepSeekClient:
     def __init__(self, api_key=None):
         self.api_key = api_key
         
-    async def get_response(self, message, user_id, context="", sentiment_data=None):
+    async def get_response(self, message, user_id, context="", sentiment_data=None, priority=None, history=None):
         v6_fallbacks = [
             "OMG HII BESTIE!! 💫✨ My AI brain is taking a quick nap but I'm still here! What's the tea?? 🔥",
             "YOOO I'm here! 💫✨ (AI system offline but I've got your back with V6 energy!)",
@@ -91,16 +105,36 @@ CommandSystem = FallbackCommandSystem
 DeepSeekClient = FallbackDeepSeekClient
 
 class MelodyBotCore:
-    def __init__(self, command_prefix: str = COMMAND_PREFIX):
+    def __init__(self, command_prefix: str = COMMAND_PREFIX, shard_count: Optional[int] = None,
+                 shard_ids: Optional[list] = None):
         if not TOKEN:
             raise ValueError("❌ DISCORD_BOT_TOKEN not found in environment variables!")
             
         intents = discord.Intents.all()
-        self.bot = commands.Bot(
-            command_prefix=command_prefix, 
-            intents=intents,
-            help_command=None  # We'll use custom help
-        )
+
+        # Sharding comes from the launcher (--shards / --processes) via env unless passed in
+        sharded, env_count, env_ids = shard_config_from_env()
+        if shard_count is None:
+            shard_count, shard_ids = env_count, env_ids
+        else:
+            sharded = True
+        self.shard_ids = shard_ids
+
+        if sharded:
+            self.bot = commands.AutoShardedBot(
+                command_prefix=command_prefix,
+                intents=intents,
+                help_command=None,
+                shard_count=shard_count,
+                shard_ids=shard_ids
+            )
+            logger.info(f"🧩 Sharded bot: {shard_count or 'auto'} shards, running {shard_ids or 'all'}")
+        else:
+            self.bot = commands.Bot(
+                command_prefix=command_prefix, 
+                intents=intents,
+                help_command=None  # We'll use custom help
+            )
 
         # Initialize with fallbacks first
         self.intelligence_orchestrator = intelligence_orchestrator
@@ -124,7 +158,8 @@ class MelodyBotCore:
         self.processing_semaphore = asyncio.Semaphore(3)  # Limit concurrent processing
         self.user_cooldowns = {}
         self.response_tracker = {}
-        self.conversation_history = []
+        from brain.memory_systems.conversation_history import ConversationHistory
+        self.conversation_history = ConversationHistory(capacity=100)
 
         # 🆕 AUTO-YAP SYSTEM - Enhanced
         self.auto_yap_channels = set()
@@ -138,9 +173,12 @@ class MelodyBotCore:
 
         # Event Registration
         self.bot.event(self.on_ready)
-        self.bot.event(self.on_message)
+        self.bot.event(self._traced_on_message())
         self.bot.event(self.on_command_error)
         self.bot.event(self.on_guild_join)
+
+        # Permission cache is invalidated from channel/role events
+        channel_capabilities.attach(self.bot)
         
         logger.info("🎵 Melody Bot Core initialized with all systems!")
 
@@ -247,29 +285,39 @@ class MelodyBotCore:
                     color=0xFF66CC,
                     timestamp=discord.utils.utcnow()
                 )
-                await welcome_channel.send(embed=welcome_embed)
+                await outbound.send(welcome_channel, embed=welcome_embed)
         except Exception as e:
             logger.warning(f"⚠️ Could not send welcome message to {guild.name}: {e}")
 
+    def _traced_on_message(self):
+        """on_message wrapped in a root span + memory search cache - one of each per human message"""
+        try:
+            from brain.memory_systems.semantic_memory import memory_request_scope
+        except ImportError:
+            from contextlib import nullcontext as memory_request_scope
+
+        async def on_message(message: discord.Message):
+            if message.author.bot:
+                return await self.on_message(message)
+            with tracer.span("on_message", user=str(message.author.id), channel=message.channel.id), \
+                    memory_request_scope():
+                await self.on_message(message)
+        return on_message
+
     async def on_message(self, message: discord.Message):
         """Enhanced message handler with comprehensive filtering"""
         if message.author.bot:
             return
-            
-        if self._is_log_message(message.content):
-            return
 
-        server_name = message.guild.name if message.guild else "DM"
-        channel_name = message.channel.name if hasattr(message.channel, 'name') else "Unknown"
-        
-        print(f"🔍 MESSAGE: {message.author} in '{server_name}/{channel_name}': '{message.content[:100]}{'...' if len(message.content) > 100 else ''}'")
+        log_fields = {"user": str(message.author.id), "channel": message.channel.id}
+        logger.debug(f"🔍 MESSAGE: {len(message.content)} chars", extra={**log_fields, "stage": "received"})
 
         # Process commands FIRST and stop if it's a command
         await self.bot.process_commands(message)
         
         # If it's a command, stop here to avoid double processing
         if message.content.startswith(self.bot.command_prefix):
-            print(f"🛑 COMMAND: '{message.content}' - skipping normal processing")
+            logger.debug(f"🛑 COMMAND: '{message.content[:50]}' - skipping normal processing", extra=log_fields)
             return
 
         # 🆕 ENHANCED RESPONSE CONDITIONS
@@ -295,7 +343,7 @@ class MelodyBotCore:
 
         # Log decision
         if should_respond:
-            print(f"🎯 RESPONDING: {response_reason}")
+            logger.info(f"🎯 RESPONDING: {response_reason}", extra={**log_fields, "stage": "respond"})
         else:
             # Still process facts extraction for learning
             await self._process_facts_only(message)
@@ -303,7 +351,7 @@ class MelodyBotCore:
 
         # 🚀 PROCESS MESSAGE FOR RESPONSE
         if len(message.content) > 800:
-            await message.reply("Whoa bestie! That's a whole essay 😭 Can you break it into smaller chunks? (800 chars max) 💫")
+            await deliver_reply(message, "Whoa bestie! That's a whole essay 😭 Can you break it into smaller chunks? (800 chars max) 💫")
             return
 
         # Cooldown management
@@ -311,7 +359,7 @@ class MelodyBotCore:
         current_time = asyncio.get_event_loop().time()
         
         if user_id in self.user_cooldowns and current_time - self.user_cooldowns[user_id] < 4:
-            print(f"⏰ COOLDOWN: User {user_id} on cooldown")
+            logger.debug("⏰ COOLDOWN: User on cooldown", extra={**log_fields, "stage": "cooldown"})
             return
             
         self.user_cooldowns[user_id] = current_time
@@ -381,9 +429,9 @@ class MelodyBotCore:
                 extracted_facts = await self.permanent_facts.extract_personal_facts(user_id, message.content)
                 if extracted_facts:
                     await self.permanent_facts.store_facts(user_id, extracted_facts)
-                    print(f"📝 Facts extracted: {len(extracted_facts)} facts from {user_id}")
+                    logger.debug(f"📝 Facts extracted: {len(extracted_facts)}", extra={"user": user_id, "stage": "facts"})
         except Exception as e:
-            print(f"⚠️ Facts extraction failed: {e}")
+            logger.warning(f"⚠️ Facts extraction failed: {e}")
 
     async def handle_yap_command(self, ctx):
         """Enhanced yap command with rich feedback"""
@@ -440,14 +488,21 @@ class MelodyBotCore:
 
     async def handle_ai_response_with_adapter(self, message: discord.Message):
         """Comprehensive AI response handler with full debugging"""
+        # Every reply goes through the outbound queue (per-channel rate limits + retry on 429)
         if not self.is_ready:
-            await message.reply("🔄 Bot still starting up... try again in a moment! 💫")
+            await deliver_reply(message, "🔄 Bot still starting up... try again in a moment! 💫")
             return
         
         server_name = message.guild.name if message.guild else "DM"
         channel_name = message.channel.name if hasattr(message.channel, 'name') else "Unknown"
         
-        print(f"🔧 PROCESSING: Response for '{server_name}/{channel_name}'")
+        log_fields = {"user": str(message.author.id), "channel": message.channel.id}
+        logger.debug(f"🔧 PROCESSING: Response for '{server_name}/{channel_name}'", extra=log_fields)
+
+        # Cached per channel - don't spend an AI call on a reply we can't post
+        if not channel_capabilities.can_send(message.channel):
+            logger.warning(f"🔒 No send permission in '{server_name}/{channel_name}' - skipping")
+            return
 
         user_id = str(message.author.id)
         current_time = asyncio.get_event_loop().time()
@@ -455,105 +510,73 @@ class MelodyBotCore:
         # Request deduplication
         request_key = f"{user_id}_{message.id}"
         if request_key in self.response_tracker:
-            print(f"🔄 DEDUPE: Skipping already processed message: {request_key}")
+            logger.debug(f"🔄 DEDUPE: Skipping already processed message: {request_key}", extra=log_fields)
             return
             
         self.response_tracker[request_key] = current_time
         self._clean_old_tracker_entries()
 
-        # 🆕 ADD TYPING INDICATOR
-        async with message.channel.typing():
-            processing_msg = await message.reply("💫 Processing your message bestie...")
-            
-            response_sent = False
-            
-            async with self.processing_semaphore:
-                try:
-                    print(f"🧠 AI PROCESS: Starting response generation...")
-                    
-                    # Test AI directly first for debugging
-                    if hasattr(self, 'ai_client') and self.ai_client:
-                        print(f"🧪 DIRECT AI TEST: Testing intelligence_orchestrator...")
-                        test_response = await self.intelligence_orchestrator.generate_response(
-                            user_id=str(message.author.id),
-                            user_message=message.content,
-                            ai_provider=self.ai_client
-                        )
-                        print(f"🧪 DIRECT AI RESULT: '{test_response[:100]}{'...' if len(test_response) > 100 else ''}'")
-                    
-                    # Original adapter call with enhanced timeout
+        # Typing indicator only - the answer itself is the first message we post
+        async with self.processing_semaphore:
+            try:
+                started = time.perf_counter()
+                
+                async with message.channel.typing():
                     ai_response = await asyncio.wait_for(
                         self.discord_adapter.process_discord_message(
                             message, 
                             getattr(self, 'ai_client', None), 
                             respond=False
                         ),
-                        timeout=45.0  # Increased timeout for complex responses
+                        timeout=45.0  # DeepSeekClient gives up at RESPONSE_DEADLINE (40s), memory/facts get the rest
+                    )
+                
+                logger.debug(f"🔧 ADAPTER RESPONSE: {len(ai_response or '')} chars",
+                             extra={**log_fields, "stage": "generate", "latency_ms": elapsed_ms(started)})
+                
+                # Enhanced response validation
+                if ai_response and len(ai_response.strip()) > 10:
+                    # Add to conversation history (fixed-size ring buffer per channel)
+                    self.conversation_history.append(
+                        message.guild.id if message.guild else None,
+                        message.channel.id,
+                        str(message.author),
+                        message.content,
+                        user_id=user_id,
+                        response=ai_response
                     )
                     
-                    await processing_msg.delete()
-                    
-                    print(f"🔧 ADAPTER RESPONSE: '{ai_response[:100]}{'...' if len(ai_response) > 100 else ''}'")
-                    
-                    # Enhanced response validation
-                    if ai_response and len(ai_response.strip()) > 10:
-                        # Add to conversation history
-                        self.conversation_history.append({
-                            "user": str(message.author),
-                            "message": message.content,
-                            "response": ai_response,
-                            "timestamp": discord.utils.utcnow().isoformat()
-                        })
-                        
-                        # Keep history manageable
-                        if len(self.conversation_history) > 100:
-                            self.conversation_history = self.conversation_history[-100:]
+                    await deliver_reply(message, ai_response)
+                    logger.info(f"✅ Response sent to {message.author} in '{server_name}/{channel_name}'",
+                                extra={**log_fields, "stage": "delivered", "latency_ms": elapsed_ms(started)})
+                else:
+                    logger.warning("🔄 EMPTY RESPONSE: Skipping empty/short response", extra=log_fields)
+                    fallback_responses = [
+                        "Hmm, I didn't get a response from my brain! 💫 Try again?",
+                        "My AI circuits are being shy right now! 🙈 One more time?",
+                        "Oops! My thoughts got lost in the void 🌌 Try that again?",
+                        "My brain glitched out for a sec! 🔄 Let's try again bestie!"
+                    ]
+                    await deliver_reply(message, random.choice(fallback_responses))
                         
-                        await message.channel.send(ai_response)
-                        logger.info(f"✅ Response sent to {message.author} in '{server_name}/{channel_name}'")
-                        response_sent = True
-                    else:
-                        print("🔄 EMPTY RESPONSE: Skipping empty/short response")
-                        if not response_sent:
-                            # Fallback system
-                            if 'test_response' in locals() and test_response and len(test_response.strip()) > 10:
-                                print("🔄 FALLBACK: Using direct AI response")
-                                await message.channel.send(test_response)
-                                response_sent = True
-                            else:
-                                fallback_responses = [
-                                    "Hmm, I didn't get a response from my brain! 💫 Try again?",
-                                    "My AI circuits are being shy right now! 🙈 One more time?",
-                                    "Oops! My thoughts got lost in the void 🌌 Try that again?",
-                                    "My brain glitched out for a sec! 🔄 Let's try again bestie!"
-                                ]
-                                await message.reply(random.choice(fallback_responses))
-                                response_sent = True
-                            
-                except asyncio.TimeoutError:
-                    logger.warning(f"⏰ AI response timeout for {message.author} in '{server_name}'")
-                    await processing_msg.delete()
-                    if not response_sent:
-                        timeout_responses = [
-                            "OMG my brain is moving in slow motion today! 🐌💫 Try again?",
-                            "Yikes! My AI circuits are taking a power nap! 😴⚡ One more time?",
-                            "My thoughts are buffering... 📡 Try again in a moment?",
-                            "Brain loading... 10% complete... 😅 Let's try that again!"
-                        ]
-                        await message.reply(random.choice(timeout_responses))
-                        response_sent = True
-                except Exception as e:
-                    logger.error(f"❌ Adapter response error from {message.author} in '{server_name}': {e}", exc_info=True)
-                    await processing_msg.delete()
-                    if not response_sent:
-                        error_responses = [
-                            "Oops! My circuits glitched 💫 Try again?",
-                            "Whoops! Technical difficulties 🎵 Let's try that again!", 
-                            "My brain had a moment there! 🌪️ One more time?",
-                            "A wild error appeared! 🐉 Let's try that again bestie!"
-                        ]
-                        await message.reply(random.choice(error_responses))
-                        response_sent = True
+            except asyncio.TimeoutError:
+                logger.warning(f"⏰ AI response timeout for {message.author} in '{server_name}'")
+                timeout_responses = [
+                    "OMG my brain is moving in slow motion today! 🐌💫 Try again?",
+                    "Yikes! My AI circuits are taking a power nap! 😴⚡ One more time?",
+                    "My thoughts are buffering... 📡 Try again in a moment?",
+                    "Brain loading... 10% complete... 😅 Let's try that again!"
+                ]
+                await deliver_reply(message, random.choice(timeout_responses))
+            except Exception as e:
+                logger.error(f"❌ Adapter response error from {message.author} in '{server_name}': {e}", exc_info=True)
+                error_responses = [
+                    "Oops! My circuits glitched 💫 Try again?",
+                    "Whoops! Technical difficulties 🎵 Let's try that again!", 
+                    "My brain had a moment there! 🌪️ One more time?",
+                    "A wild error appeared! 🐉 Let's try that again bestie!"
+                ]
+                await deliver_reply(message, random.choice(error_responses))
 
     def _clean_old_tracker_entries(self):
         """Clean up old response tracker entries"""
@@ -562,19 +585,7 @@ class MelodyBotCore:
         for key in old_keys:
             del self.response_tracker[key]
         if old_keys:
-            print(f"🧹 CLEANUP: Removed {len(old_keys)} old tracker entries")
-
-    def _is_log_message(self, content: str) -> bool:
-        """Detect and filter log messages"""
-        log_indicators = [
-            "INFO:MelodyBotCore:", "WARNING:MelodyBotCore:", "ERROR:MelodyBotCore:",
-            "🧠 Processing message", "🎭 Emotional Debug", "Batches: 100%",
-            "🌐 Sending request", "✅ DeepSeek response", "🔍 DEBUG:", "🎯 DEBUG:",
-            "🔧 PROCESSING:", "🧪 DIRECT AI TEST:", "🔧 ADAPTER RESPONSE:",
-            "🔄 EMPTY RESPONSE:", "🧹 CLEANUP:", "⏰ COOLDOWN:", "🎯 RESPONDING:",
-            "🔍 MESSAGE:", "🛑 COMMAND:", "📝 Facts extracted:", "⚠️ Facts extraction failed:"
-        ]
-        return any(indicator in content for indicator in log_indicators)
+            logger.debug(f"🧹 CLEANUP: Removed {len(old_keys)} old tracker entries")
 
     async def on_command_error(self, ctx, error):
         """Enhanced error handling with user-friendly messages"""
@@ -607,10 +618,28 @@ class MelodyBotCore:
             await self.ai_client.close()
             logger.info("✅ AI Client closed")
         
+        # Let queued replies go out before the connection drops
+        await outbound.close()
+
+        # Hand buffered memories to the memory worker / commit buffered access hits
+        close_memory = getattr(self.semantic_memory, "close", None)
+        if close_memory:
+            await close_memory()
+
+        # Commit whatever is still queued on the SQLite writer threads
+        await asyncio.get_event_loop().run_in_executor(None, close_databases)
+
         # Close bot connection
-        await self.bot.close()
+        try:
+            await self.bot.close()
+        except AttributeError:
+            # AutoShardedBot only builds its shard queue on connect - nothing to close if we never got there
+            logger.debug("🧩 Sharded bot closed before connecting")
         logger.info("✅ Discord connection closed")
         
+        # Flush the span exporter
+        tracer.close()
+
         # Cleanup other resources
         self.auto_yap_channels.clear()
         self.response_tracker.clear()
@@ -624,9 +653,23 @@ class MelodyBotCore:
 
     def get_system_status(self):
         """Get comprehensive system status"""
+        rate_limit_stats = None
+        if hasattr(self.ai_client, 'get_rate_limit_stats'):
+            rate_limit_stats = self.ai_client.get_rate_limit_stats()
+
+        circuit_state = None
+        if hasattr(self.ai_client, 'get_circuit_state'):
+            circuit_state = self.ai_client.get_circuit_state()
+
         return {
             "ai_client": "✅ Ready" if self.ai_client else "❌ Disabled",
+            "ai_rate_limiter": rate_limit_stats,
+            "ai_circuit_breaker": circuit_state,
             "discord_adapter": "✅ Ready" if self.discord_adapter else "❌ Fallback",
+            "outbound_queue": outbound.get_stats(),
+            "channel_permissions": channel_capabilities.get_stats(),
+            "tracing": tracer.get_stats(),
+            "shards": {"count": self.bot.shard_count, "ids": self.shard_ids},
             "auto_yap_channels": len(self.auto_yap_channels),
             "conversation_history": len(self.conversation_history),
             "response_tracker": len(self.response_tracker),
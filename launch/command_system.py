@@ -101,4 +101,25 @@ class CommandSystem:
                 await ctx.send(f"🩺 Diagnostic Results:\n```{result}```")
             except Exception as e:
                 print(f"❌ DIAGNOSE COMMAND ERROR: {e}")
-                await ctx.send(f"❌ Diagnose command failed: {e}")
\ No newline at end of file
+                await ctx.send(f"❌ Diagnose command failed: {e}")
+
+        @self.bot.command(name='traces')
+        @commands.has_permissions(administrator=True)
+        async def traces_command(ctx):
+            """Per-stage latency percentiles from recent message traces (admins only)"""
+            from services.tracing import tracer
+            stats = tracer.get_stats()
+            if not stats["stages"]:
+                await ctx.send("📭 No traces yet - talk to me first! 💫")
+                return
+
+            rows = [f"{'stage':<16}{'n':>5}{'p50':>9}{'p95':>9}{'p99':>9}"]
+            for name, stage in sorted(stats["stages"].items(), key=lambda item: -(item[1]["p95_ms"] or 0)):
+                rows.append(f"{name[:15]:<16}{stage['samples']:>5}{stage['p50_ms']:>9}{stage['p95_ms']:>9}{stage['p99_ms']:>9}")
+            embed = discord.Embed(
+                title="⏱️ Response Pipeline Latency (ms)",
+                description="```" + "\n".join(rows) + "```",
+                color=0x9370DB
+            )
+            embed.set_footer(text=f"{stats['traces']} traces • slowest p95 first")
+            await ctx.send(embed=embed)
\ No newline at end of file
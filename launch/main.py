@@ -4,6 +4,7 @@ import signal
 import sys
 import random
 import json
+import logging
 import time
 from datetime import datetime
 from dotenv import load_dotenv
@@ -31,7 +32,7 @@ if not discord_token:
     print("💡 Make sure your .env file is in the root folder and contains DISCORD_BOT_TOKEN")
     sys.exit(1)
 
-# Import bot components
+# Import bot components (bot_core also sets up the queued logging)
 try:
     from bot_core import MelodyBotCore
     print("✅ MelodyBotCore imported successfully!")
@@ -39,235 +40,207 @@ except ImportError as e:
     print(f"❌ Failed to import MelodyBotCore: {e}")
     sys.exit(1)
 
+logger = logging.getLogger("MelodyBotCore.main")
+
 # 🆕 RELATIONSHIP SYSTEM CONFIGURATION
 RELATIONSHIP_DATA_FILE = "relationship_data.json"
+HISTORY_DB_FILE = "melody_memory.db"  # channel history survives restarts
 
-# Relationship Tiers with points, emojis, and emotional messages
-RELATIONSHIP_TIERS = [
-    {"name": "Soulmate", "min_points": 5000, "emoji": "💫", "color": 0xFF66CC, 
-     "message": "You complete me... our souls are connected forever 💫",
-     "busy_response": "I'm so sorry my baby 😔 I'm undergoing intensive tests to improve myself 💝 See you soon!"},
-    {"name": "Twin Flame", "min_points": 3500, "emoji": "🔥", "color": 0xFF3366,
-     "message": "We just GET each other on another level! 🔥",
-     "busy_response": "Aww my flame 🔥 I'm busy with testing but I'll be back for you soon!"},
-    {"name": "Kindred Spirit", "min_points": 2500, "emoji": "🌟", "color": 0xFF9966,
-     "message": "We have such amazing chemistry! 💫",
-     "busy_response": "Hey bestie! 🌟 I'm in testing mode right now, catch you later?"},
-    {"name": "Bestie", "min_points": 1500, "emoji": "💖", "color": 0xFFD166,
-     "message": "You're my favorite person to talk with! 💕",
-     "busy_response": "Hey! I'm a bit busy with testing right now, talk later? 💕"},
-    {"name": "Close Friend", "min_points": 800, "emoji": "😊", "color": 0x66CCFF,
-     "message": "I really enjoy our conversations! 😊",
-     "busy_response": "Testing mode active! I'll be back soon 😊"},
-    {"name": "Acquaintance", "min_points": 300, "emoji": "👋", "color": 0xB0BEC5,
-     "message": "Nice talking with you! 👋",
-     "busy_response": "Busy testing right now, maybe later? 👋"},
-    {"name": "Stranger", "min_points": 100, "emoji": "😒", "color": 0x9E9E9E,
-     "message": "Hello there.",
-     "busy_response": "Can't you see I'm busy right now? 😒 Testing mode active!"},
-    {"name": "Rival", "min_points": 0, "emoji": "⚔️", "color": 0xE53935,
-     "message": "We clearly don't see eye to eye... 😠",
-     "busy_response": "WTF do you want? Can't you see I'm busy RN? ⚔️"}
-]
+# Tier table + compatibility are shared with the test suite and dashboard
+from brain.personality.relationship_tiers import calculate_compatibility, cached_compatibility, tier_table
+from brain.personality.relationship_record import UserRecord
 
 class RelationshipSystem:
-    def __init__(self, data_file=RELATIONSHIP_DATA_FILE):
+    def __init__(self, data_file=RELATIONSHIP_DATA_FILE, store=None):
         self.data_file = data_file
+        # Sharded deployments keep one row per user in the shared store instead of the JSON file
+        self.store = store
         self.relationships = self.load_relationships()
     
     def load_relationships(self):
-        """Load relationship data from JSON file"""
+        """Load relationship data from JSON file (old dict layouts are migrated here, once)"""
+        if self.store is not None:
+            return self._load_from_store()
         try:
             if os.path.exists(self.data_file):
                 with open(self.data_file, 'r') as f:
                     data = json.load(f)
-                    for user_id, user_data in data.items():
-                        data[user_id] = self._migrate_user_data(user_data)
-                    return data
+                    return {user_id: UserRecord.from_dict(user_data) for user_id, user_data in data.items()}
         except Exception as e:
-            print(f"❌ Error loading relationship data: {e}")
+            logger.error(f"❌ Error loading relationship data: {e}")
         return {}
     
-    def _migrate_user_data(self, user_data):
-        """Migrate old user data to new structure with all required fields"""
-        default_data = {
-            "points": 100,
-            "likes": 0,
-            "dislikes": 0,
-            "neutral_interactions": 0,
-            "gifts_received": 0,
-            "gifts_given": 0,
-            "conversation_depth": 0,
-            "interactions": 0,
-            "last_sync": datetime.utcnow().isoformat(),
-            "compatibility_history": [],
-            "trust_score": 50,
-            "onboarding_complete": False,
-            "collected_facts": []
-        }
-        
-        for key, value in user_data.items():
-            default_data[key] = value
-            
-        if "neutral_interactions" not in user_data:
-            if "interactions" in user_data and "likes" in user_data and "dislikes" in user_data:
-                total_specific = user_data.get("likes", 0) + user_data.get("dislikes", 0)
-                default_data["neutral_interactions"] = max(0, user_data.get("interactions", 0) - total_specific)
-            else:
-                default_data["neutral_interactions"] = 0
-                
-        return default_data
-    
+    def _load_from_store(self):
+        """The first shard to start imports the JSON file once; after that the store is the source of truth"""
+        if self.store.count("relationships") == 0 and os.path.exists(self.data_file):
+            try:
+                with open(self.data_file, 'r') as f:
+                    imported = self.store.seed("relationships", json.load(f))
+                logger.info(f"🗄️ Imported {imported} relationships into the shared store")
+            except Exception as e:
+                logger.error(f"❌ Error importing relationship data: {e}")
+        return {user_id: UserRecord.from_dict(data) for user_id, data in self.store.get_all("relationships").items()}
+
+    def _merge(self, user_id, data):
+        """Refresh the cached record in place so callers holding it see other shards' updates"""
+        fresh = UserRecord.from_dict(data)
+        record = self.relationships.get(user_id)
+        if record is None:
+            self.relationships[user_id] = fresh
+            return fresh
+        record.copy_from(fresh)
+        return record
+
+    def refresh(self):
+        """Pick up users created or updated by other shards (leaderboard)"""
+        if self.store is not None:
+            for user_id, data in self.store.get_all("relationships").items():
+                self._merge(user_id, data)
+
+    async def refresh_async(self):
+        """refresh() for the event loop"""
+        if self.store is not None:
+            for user_id, data in (await self.store.get_all_async("relationships")).items():
+                self._merge(user_id, data)
+
     def save_relationships(self):
         """Save relationship data to JSON file"""
+        if self.store is not None:
+            return  # every change is already committed per user
         try:
             with open(self.data_file, 'w') as f:
-                json.dump(self.relationships, f, indent=2)
+                json.dump({user_id: record.to_dict() for user_id, record in self.relationships.items()}, f, indent=2)
         except Exception as e:
-            print(f"❌ Error saving relationship data: {e}")
+            logger.error(f"❌ Error saving relationship data: {e}")
     
     def get_user_data(self, user_id):
-        """Get or create user relationship data with ALL required fields"""
-        if user_id not in self.relationships:
-            self.relationships[user_id] = {
-                "points": 100,
-                "likes": 0,
-                "dislikes": 0,
-                "neutral_interactions": 0,
-                "gifts_received": 0,
-                "gifts_given": 0,
-                "conversation_depth": 0,
-                "interactions": 0,
-                "last_sync": datetime.utcnow().isoformat(),
-                "compatibility_history": [],
-                "trust_score": 50,
-                "onboarding_complete": False,
-                "collected_facts": []
-            }
-        else:
-            self.relationships[user_id] = self._migrate_user_data(self.relationships[user_id])
-            
-        return self.relationships[user_id]
+        """Get or create the user's relationship record (no per-access allocation)"""
+        if self.store is not None:
+            data = self.store.get("relationships", user_id)
+            if data is not None:
+                return self._merge(user_id, data)
+        return self._local_record(user_id)
+
+    async def get_user_data_async(self, user_id):
+        """get_user_data() for the event loop - the store read runs on the reader pool"""
+        if self.store is not None:
+            data = await self.store.get_async("relationships", user_id)
+            if data is not None:
+                return self._merge(user_id, data)
+        return self._local_record(user_id)
+
+    def _local_record(self, user_id):
+        record = self.relationships.get(user_id)
+        if record is None:
+            record = self.relationships[user_id] = UserRecord()
+        return record
     
     def add_interaction(self, user_id, interaction_type="neutral", points=10, message_content=""):
         """Add an interaction with sophisticated tracking"""
+        if self.store is not None:
+            # Read-modify-write in one store transaction - the same user can be active on two shards
+            apply = self._interaction_updater(interaction_type, points, message_content)
+            return self._merge(user_id, self.store.update("relationships", user_id, apply))
+
         user_data = self.get_user_data(user_id)
-        user_data["interactions"] += 1
-        user_data["last_sync"] = datetime.utcnow().isoformat()
+        self._apply_interaction(user_data, interaction_type, points, message_content)
+        self.save_relationships()
+        return user_data
+
+    async def add_interaction_async(self, user_id, interaction_type="neutral", points=10, message_content=""):
+        """add_interaction() for the event loop - the store transaction runs on the writer thread"""
+        if self.store is None:
+            return self.add_interaction(user_id, interaction_type, points, message_content)
+        apply = self._interaction_updater(interaction_type, points, message_content)
+        return self._merge(user_id, await self.store.update_async("relationships", user_id, apply))
+
+    def _interaction_updater(self, interaction_type, points, message_content):
+        def apply(data):
+            record = UserRecord.from_dict(data) if data else UserRecord()
+            self._apply_interaction(record, interaction_type, points, message_content)
+            return record.to_dict()
+        return apply
+
+    def add_collected_facts(self, user_id, facts):
+        """Remember extracted facts on the relationship record ("key: value" strings)"""
+        entries = [f"{fact['key']}: {fact['value']}" for fact in facts]
+        if self.store is not None:
+            self._merge(user_id, self.store.update("relationships", user_id, self._facts_updater(entries)))
+            return
+        self.get_user_data(user_id)["collected_facts"].extend(entries)
+
+    async def add_collected_facts_async(self, user_id, facts):
+        """add_collected_facts() for the event loop"""
+        if self.store is None:
+            return self.add_collected_facts(user_id, facts)
+        entries = [f"{fact['key']}: {fact['value']}" for fact in facts]
+        self._merge(user_id, await self.store.update_async("relationships", user_id, self._facts_updater(entries)))
+
+    @staticmethod
+    def _facts_updater(entries):
+        def apply(data):
+            data = data or UserRecord().to_dict()
+            data.setdefault("collected_facts", []).extend(entries)
+            return data
+        return apply
+
+    def _apply_interaction(self, user_data, interaction_type, points, message_content):
+        user_data.interactions += 1
+        user_data.last_sync = int(time.time())
         
         # Update trust score based on interaction
         if interaction_type == "positive":
-            user_data["likes"] += 1
-            user_data["points"] += points
-            user_data["trust_score"] = min(100, user_data["trust_score"] + 2)
+            user_data.likes += 1
+            user_data.points += points
+            user_data.trust_score = min(100, user_data.trust_score + 2)
             if len(message_content) > 20:
-                user_data["conversation_depth"] += 1
-                user_data["points"] += 5
-                user_data["trust_score"] = min(100, user_data["trust_score"] + 3)
+                user_data.conversation_depth += 1
+                user_data.points += 5
+                user_data.trust_score = min(100, user_data.trust_score + 3)
                 
         elif interaction_type == "negative":
-            user_data["dislikes"] += 1
-            user_data["points"] -= points // 2
-            user_data["trust_score"] = max(0, user_data["trust_score"] - 5)
+            user_data.dislikes += 1
+            user_data.points -= points // 2
+            user_data.trust_score = max(0, user_data.trust_score - 5)
             
         elif interaction_type == "gift_received":
-            user_data["gifts_received"] += 1
-            user_data["points"] += points * 2
-            user_data["trust_score"] = min(100, user_data["trust_score"] + 5)
+            user_data.gifts_received += 1
+            user_data.points += points * 2
+            user_data.trust_score = min(100, user_data.trust_score + 5)
             
         elif interaction_type == "gift_given":
-            user_data["gifts_given"] += 1
-            user_data["points"] += points // 2
-            user_data["trust_score"] = min(100, user_data["trust_score"] + 3)
+            user_data.gifts_given += 1
+            user_data.points += points // 2
+            user_data.trust_score = min(100, user_data.trust_score + 3)
             
         else:  # neutral
-            user_data["neutral_interactions"] += 1
-            user_data["points"] += points // 2
-            user_data["trust_score"] = min(100, user_data["trust_score"] + 1)
+            user_data.neutral_interactions += 1
+            user_data.points += points // 2
+            user_data.trust_score = min(100, user_data.trust_score + 1)
         
         if random.random() < 0.05 and interaction_type != "negative":
-            user_data["dislikes"] += 1
-            user_data["points"] -= 3
-            user_data["trust_score"] = max(0, user_data["trust_score"] - 2)
-        
-        current_compat = self.calculate_compatibility(user_data)
-        user_data["compatibility_history"].append({
-            "timestamp": datetime.utcnow().isoformat(),
-            "compatibility": current_compat
-        })
+            user_data.dislikes += 1
+            user_data.points -= 3
+            user_data.trust_score = max(0, user_data.trust_score - 2)
         
-        if len(user_data["compatibility_history"]) > 10:
-            user_data["compatibility_history"] = user_data["compatibility_history"][-10:]
+        # Score once per interaction - cached on the record so embeds/leaderboards never recompute it
+        compatibility = calculate_compatibility(user_data)
+        user_data.compatibility = compatibility
         
-        self.save_relationships()
-        return user_data
+        # Ring buffer keeps the last 10 scores - no list re-slicing
+        user_data.compatibility_history.append(user_data.last_sync, compatibility)
     
     def get_tier_info(self, points):
         """Get tier information based on points"""
-        for tier in RELATIONSHIP_TIERS:
-            if points >= tier["min_points"]:
-                current_tier = tier
-                tier_index = RELATIONSHIP_TIERS.index(tier)
-                break
-        
-        next_tier = RELATIONSHIP_TIERS[tier_index - 1] if tier_index > 0 else None
-        
-        if next_tier:
-            current_min = current_tier["min_points"]
-            next_min = next_tier["min_points"]
-            progress_percent = int(((points - current_min) / (next_min - current_min)) * 100)
-            progress_percent = min(max(progress_percent, 0), 100)
-        else:
-            progress_percent = 100
-        
-        return current_tier, next_tier, progress_percent
+        return tier_table.get_tier_info(points)
     
     def calculate_compatibility(self, user_data):
-        """Calculate sophisticated compatibility percentage with SAFE field access"""
-        if user_data.get("interactions", 0) == 0:
-            return 50
-        
-        likes = user_data.get("likes", 0)
-        dislikes = user_data.get("dislikes", 0)
-        neutral = user_data.get("neutral_interactions", 0)
-        total_interactions = user_data.get("interactions", 0)
-        gifts_received = user_data.get("gifts_received", 0)
-        conversation_depth = user_data.get("conversation_depth", 0)
-        
-        if likes + dislikes > 0:
-            base_ratio = (likes / (likes + dislikes)) * 100
-        else:
-            base_ratio = 50
-        
-        interaction_bonus = min(total_interactions / 20 * 30, 30)
-        gift_compatibility = min(gifts_received * 10, 15)
-        depth_compatibility = min(conversation_depth * 5, 15)
-        
-        consistency_bonus = 0
-        compatibility_history = user_data.get("compatibility_history", [])
-        if len(compatibility_history) >= 3:
-            recent_compat = [c["compatibility"] for c in compatibility_history[-3:]]
-            avg_compat = sum(recent_compat) / len(recent_compat)
-            if max(recent_compat) - min(recent_compat) <= 10:
-                consistency_bonus = 10
-        
-        compatibility = (
-            (base_ratio * 0.4) +
-            interaction_bonus +
-            gift_compatibility +
-            depth_compatibility +
-            consistency_bonus
-        )
-        
-        compatibility = max(0, min(100, int(compatibility)))
-        return compatibility
+        """Compatibility cached on the record (updated in add_interaction)"""
+        return cached_compatibility(user_data)
     
     def get_busy_response(self, points):
         """Get emotional busy response based on relationship tier"""
-        for tier in RELATIONSHIP_TIERS:
-            if points >= tier["min_points"]:
-                return tier["busy_response"]
-        return RELATIONSHIP_TIERS[-1]["busy_response"]
+        return tier_table.get_busy_response(points)
     
     def analyze_conversation_sentiment(self, message_content):
         """Analyze message content to determine interaction type"""
@@ -294,6 +267,13 @@ class RelationshipSystem:
 import discord
 from discord.ext import commands
 
+from services.ai_providers.rate_limiter import Priority
+from services.message_coalescer import ChannelCoalescer
+from services.outbound_queue import outbound
+from services.shared_state import get_shared_store
+from services.tracing import tracer
+from brain.memory_systems.conversation_history import ConversationHistory
+
 class TestCommands(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
@@ -327,8 +307,8 @@ class TestCommands(commands.Cog):
 
 # 🎯 ENHANCED BOT CORE WITH ALL FEATURES + V6 PERSONALITY + ROAST DEFENSE
 class EnhancedMelodyBotCore(MelodyBotCore):
-    def __init__(self, command_prefix="!"):
-        super().__init__(command_prefix)
+    def __init__(self, command_prefix="!", shard_count=None, shard_ids=None):
+        super().__init__(command_prefix, shard_count=shard_count, shard_ids=shard_ids)
         
         # 🆕 FIXED: Use lazy imports for services to avoid circular imports
         try:
@@ -339,8 +319,12 @@ class EnhancedMelodyBotCore(MelodyBotCore):
             from brain.personality.server_greetings import server_greetings
             from brain.personality.personality_loader import personality_loader
             
-            if deepseek_key:
-                self.ai_provider = DeepSeekClient(api_key=deepseek_key)
+            if self.ai_client is not None:
+                # Same client as the adapter path -> one circuit breaker, one limiter, one status file
+                self.ai_provider = self.ai_client
+                print("✅ DeepSeek AI Client configured with V6 personality!")
+            elif deepseek_key:
+                self.ai_provider = self.ai_client = DeepSeekClient(api_key=deepseek_key)
                 print("✅ DeepSeek AI Client configured with V6 personality!")
             else:
                 self.ai_provider = None
@@ -358,7 +342,7 @@ class EnhancedMelodyBotCore(MelodyBotCore):
             print(f"⚠️ Could not import AI services: {e}")
             # Create fallback
             class FallbackDeepSeekClient:
-                async def get_response(self, message, user_id, context="", sentiment_data=None):
+                async def get_response(self, message, user_id, context="", sentiment_data=None, priority=None, history=None):
                     v6_fallbacks = [
                         "OMG HII BESTIE!! 💫✨ My AI brain is taking a quick nap but I'm still here! What's the tea?? 🔥",
                         "YOOO I'm here! 💫✨ (AI system offline but I've got your back with V6 energy!)",
@@ -374,18 +358,28 @@ class EnhancedMelodyBotCore(MelodyBotCore):
             self.v5_personality = {}
             self.v5_phrases = {}
         
-        self.relationship_system = RelationshipSystem()
-        self.conversation_history = []
+        self.relationship_system = RelationshipSystem(store=get_shared_store())
+        self.conversation_history = ConversationHistory(capacity=50, db_path=HISTORY_DB_FILE)
         
         # 🆕 AUTO-YAP SYSTEM
         self.auto_yap_channels = set()
         self.user_cooldowns = {}
-        self.last_auto_yap_time = 0
+        self.channel_last_yap = {}
+        # Bursts of chat in one channel get a single reply built from that channel's turns
+        self.yap_coalescer = ChannelCoalescer(self.process_auto_yap)
+
+    async def close(self):
+        """Drop pending auto-yap bursts, save channel history and close our AI session before the core shuts down"""
+        await self.yap_coalescer.close()
+        await self.conversation_history.save_async()
+        if self.ai_provider and self.ai_provider is not self.ai_client:
+            await self.ai_provider.close()
+        await super().close()
 
     # 🎉 NEW USER WELCOME SYSTEM
     async def on_member_join(self, member):
         """Send V5 personality welcome message when new users join"""
-        print(f"🎉 New member joined: {member.display_name}")
+        logger.info(f"🎉 New member joined: {member.display_name}", extra={"guild": member.guild.id})
         
         if hasattr(self, 'server_greetings') and self.server_greetings:
             await self.server_greetings.send_welcome_message(member)
@@ -398,7 +392,7 @@ class EnhancedMelodyBotCore(MelodyBotCore):
                     f"YOOO NEW LEGEND ALERT!! 🎶💖 Welcome {member.mention}!! The vibes just got 10x more iconic!! 😎",
                     f"HEWWO NEW FRIEND!! 🌟✨ {member.mention} has arrived!! Main character energy ACTIVATED!! 💅🔥"
                 ]
-                await welcome_channel.send(random.choice(fallback_welcomes))
+                await outbound.send(welcome_channel, random.choice(fallback_welcomes))
 
     async def _find_welcome_channel(self, guild):
         """Helper to find welcome channel"""
@@ -477,7 +471,7 @@ class EnhancedMelodyBotCore(MelodyBotCore):
             inline=False
         )
         
-        last_sync = datetime.fromisoformat(user_data['last_sync'])
+        last_sync = datetime.utcfromtimestamp(user_data['last_sync'])
         time_diff = datetime.utcnow() - last_sync
         minutes_ago = int(time_diff.total_seconds() / 60)
         
@@ -539,7 +533,7 @@ class EnhancedMelodyBotCore(MelodyBotCore):
         
         return embed
 
-    async def generate_conversation_response(self, user, user_message, user_context=""):
+    async def generate_conversation_response(self, user, user_message, user_context="", history=None):
         """Generate actual V6 personality response to user's message"""
         try:
             if self.ai_provider:
@@ -552,7 +546,7 @@ class EnhancedMelodyBotCore(MelodyBotCore):
                         if emotional_context.get('score') is None:
                             emotional_context['score'] = 50
                     except Exception as e:
-                        print(f"⚠️ Could not get emotional context: {e}")
+                        logger.warning(f"⚠️ Could not get emotional context: {e}")
                         emotional_context = {'score': 50}
                 
                 # 🛡️ ROAST DEFENSE OVERRIDE - Use the roast defense response if triggered
@@ -564,7 +558,9 @@ class EnhancedMelodyBotCore(MelodyBotCore):
                     message=user_message,
                     user_id=f"conv_{user.id}",
                     context=user_context,
-                    sentiment_data=emotional_context
+                    sentiment_data=emotional_context,
+                    priority=Priority.MENTION,
+                    history=history
                 )
                 
                 response = response.strip()
@@ -574,10 +570,11 @@ class EnhancedMelodyBotCore(MelodyBotCore):
                 return "Thanks for sharing that with me bestie! 😊"
             
         except Exception as e:
-            print(f"❌ Conversation response generation failed: {e}")
+            logger.error(f"❌ Conversation response generation failed: {e}")
             return "That's really interesting bestie! Tell me more! 💫"
 
-    async def generate_emotional_message(self, user, user_data, current_tier, next_tier, progress_percent, compatibility):
+    async def generate_emotional_message(self, user, user_data, current_tier, next_tier, progress_percent, compatibility,
+                                         priority=Priority.INTERACTIVE):
         """Generate CONCISE emotional message with relationship context"""
         try:
             # 🆕 FIXED: Make it very concise - 1 sentence that fits in one line
@@ -602,7 +599,8 @@ class EnhancedMelodyBotCore(MelodyBotCore):
                 emotional_response = await self.ai_provider.get_response(
                     message=prompt,
                     user_id=f"emotional_{user.id}",
-                    context=f"Relationship: {current_tier['name']} {progress_percent}%"
+                    context=f"Relationship: {current_tier['name']} {progress_percent}%",
+                    priority=priority
                 )
                 
                 emotional_response = emotional_response.strip()
@@ -615,10 +613,10 @@ class EnhancedMelodyBotCore(MelodyBotCore):
                 return f"Growing closer every chat! 💖"
             
         except Exception as e:
-            print(f"❌ Emotional message generation failed: {e}")
+            logger.error(f"❌ Emotional message generation failed: {e}")
             return f"Love our connection! 💫"
 
-    async def generate_ai_strengths(self, user, user_data, conversation_history):
+    async def generate_ai_strengths(self, user, user_data, conversation_history, priority=Priority.INTERACTIVE):
         """Generate personalized strengths using DeepSeek"""
         try:
             current_tier, _, _ = self.relationship_system.get_tier_info(user_data["points"])
@@ -629,7 +627,7 @@ class EnhancedMelodyBotCore(MelodyBotCore):
                 if self.permanent_facts:
                     user_context = await self.permanent_facts.get_user_context(str(user.id))
             except Exception as e:
-                print(f"⚠️ Could not get user context: {e}")
+                logger.warning(f"⚠️ Could not get user context: {e}")
                 user_context = "Still learning about them"
             
             prompt = f"""
@@ -641,7 +639,7 @@ class EnhancedMelodyBotCore(MelodyBotCore):
             - Had {user_data.get('conversation_depth', 0)} meaningful conversations
             - Total interactions: {user_data['interactions']}
             - User facts: {user_context if user_context else 'Still learning about them'}
-            - Recent chats: {conversation_history[-2:] if conversation_history else 'Getting to know each other'}
+            - Recent chats: {' / '.join(turn.message for turn in conversation_history[-2:]) if conversation_history else 'Getting to know each other'}
             
             Make it: warm, specific, authentic, and exactly 1 sentence.
             Examples:
@@ -658,7 +656,8 @@ class EnhancedMelodyBotCore(MelodyBotCore):
                 strengths = await self.ai_provider.get_response(
                     message=prompt,
                     user_id=f"strengths_{user.id}",
-                    context=user_context
+                    context=user_context,
+                    priority=priority
                 )
                 
                 strengths = strengths.strip().strip('"')
@@ -670,7 +669,7 @@ class EnhancedMelodyBotCore(MelodyBotCore):
                 return "I appreciate you taking the time to chat with me! 💫"
             
         except Exception as e:
-            print(f"❌ AI Strengths generation failed: {e}")
+            logger.error(f"❌ AI Strengths generation failed: {e}")
             fallbacks = {
                 "Soulmate": "The depth of our connection feels like magic every single day! 💫",
                 "Twin Flame": "Your energy matches mine in the most incredible way! 🔥",
@@ -697,7 +696,7 @@ class EnhancedMelodyBotCore(MelodyBotCore):
             status = "enabled ✅"
             
             # 🎭 TIER-BASED YAP RESPONSES
-            user_data = self.relationship_system.get_user_data(str(ctx.author.id))
+            user_data = await self.relationship_system.get_user_data_async(str(ctx.author.id))
             points = user_data["points"]
             
             if points >= 800:  # Close Friend or better
@@ -721,8 +720,8 @@ class EnhancedMelodyBotCore(MelodyBotCore):
         """Determine if auto-yap should respond to this message"""
         current_time = time.time()
         
-        # Cooldown check
-        if current_time - self.last_auto_yap_time < 30:
+        # Cooldown check (per channel - busy channels don't silence quiet ones)
+        if current_time - self.channel_last_yap.get(message.channel.id, 0) < 30:
             return False
             
         user_id = str(message.author.id)
@@ -739,21 +738,20 @@ class EnhancedMelodyBotCore(MelodyBotCore):
         should_respond = has_trigger or random.random() < 0.15
         
         if should_respond:
-            self.last_auto_yap_time = current_time
+            self.channel_last_yap[message.channel.id] = current_time
             self.user_cooldowns[user_id] = current_time
             
         return should_respond
 
-    async def process_auto_yap(self, message):
-        """Process messages for auto-yap responses"""
-        if message.channel.id not in self.auto_yap_channels:
-            return False
-        
-        if not await self._should_auto_yap_respond(message):
+    async def process_auto_yap(self, channel_id, burst):
+        """Send one auto-yap reply for a coalesced burst of channel messages"""
+        if channel_id not in self.auto_yap_channels or not burst:
             return False
         
+        # Reply to whoever spoke last in the burst
+        message = burst[-1]
         user_id = str(message.author.id)
-        user_data = self.relationship_system.get_user_data(user_id)
+        user_data = await self.relationship_system.get_user_data_async(user_id)
         current_tier, _, _ = self.relationship_system.get_tier_info(user_data["points"])
         
         # Determine response tier
@@ -768,7 +766,7 @@ class EnhancedMelodyBotCore(MelodyBotCore):
         else:
             response_tier = 'toxic'
         
-        content_lower = message.content.lower()
+        content_lower = " ".join(m.content.lower() for m in burst)
         
         # 🎯 TRIGGER WORD DETECTION
         trigger_words = {
@@ -834,12 +832,16 @@ class EnhancedMelodyBotCore(MelodyBotCore):
             response_text = await self.generate_natural_response(message, response_tier)
         
         # Send response
-        await message.channel.send(response_text)
+        with tracer.span("deliver"):
+            await outbound.send(message.channel, response_text)
+        guild_id = message.guild.id if message.guild else None
+        self.conversation_history.append(guild_id, channel_id, "MelodyAI", response_text, role="assistant")
         return True
 
     async def generate_natural_response(self, message, response_tier):
-        """Generate natural conversation responses based on context"""
-        recent_messages = self.conversation_history[-5:]
+        """Generate natural conversation responses based on this channel's recent turns"""
+        guild_id = message.guild.id if message.guild else None
+        recent_messages = self.conversation_history.recent(guild_id, message.channel.id, 5)
         
         context = "\n".join([f"{msg['user']}: {msg['message']}" for msg in recent_messages])
         
@@ -866,7 +868,8 @@ class EnhancedMelodyBotCore(MelodyBotCore):
                 response = await self.ai_provider.get_response(
                     message=prompt,
                     user_id=f"yap_{message.author.id}",
-                    context="Continuing conversation naturally"
+                    context="Continuing conversation naturally",
+                    priority=Priority.AUTO_YAP
                 )
                 return response
             else:
@@ -900,7 +903,7 @@ class EnhancedMelodyBotCore(MelodyBotCore):
             if ctx.message.mentions:
                 target_user = ctx.message.mentions[0]
             
-            user_data = self.relationship_system.get_user_data(str(target_user.id))
+            user_data = await self.relationship_system.get_user_data_async(str(target_user.id))
             current_tier, next_tier, progress_percent = self.relationship_system.get_tier_info(user_data["points"])
             compatibility = self.relationship_system.calculate_compatibility(user_data)
             
@@ -910,7 +913,7 @@ class EnhancedMelodyBotCore(MelodyBotCore):
                 )
                 
                 ai_strengths = await self.generate_ai_strengths(
-                    target_user, user_data, self.conversation_history
+                    target_user, user_data, self.conversation_history.for_user(str(target_user.id), 2)
                 )
                 
                 detailed_embed = await self.create_detailed_relationship_embed(
@@ -920,7 +923,7 @@ class EnhancedMelodyBotCore(MelodyBotCore):
                 await ctx.send(embed=detailed_embed)
             
         except Exception as e:
-            print(f"❌ Relationship command error: {e}")
+            logger.error(f"❌ Relationship command error: {e}")
             await ctx.send(f"❌ Error generating relationship card: {str(e)}")
 
     async def handle_leaderboard_command(self, ctx):
@@ -931,6 +934,7 @@ class EnhancedMelodyBotCore(MelodyBotCore):
     async def show_enhanced_leaderboard(self, ctx):
         """Show relationship leaderboard with AI-generated strengths"""
         all_users = []
+        await self.relationship_system.refresh_async()
         for user_id, data in self.relationship_system.relationships.items():
             try:
                 user = await self.bot.fetch_user(int(user_id))
@@ -967,7 +971,7 @@ class EnhancedMelodyBotCore(MelodyBotCore):
             
             try:
                 mock_user = type('MockUser', (), {'display_name': user_name, 'id': user_id})()
-                ai_strengths = await self.generate_ai_strengths(mock_user, data, [])
+                ai_strengths = await self.generate_ai_strengths(mock_user, data, [], priority=Priority.BACKGROUND)
             except:
                 ai_strengths = "Building an amazing connection! 💫"
             
@@ -999,7 +1003,7 @@ class EnhancedMelodyBotCore(MelodyBotCore):
                 user_context = await self.permanent_facts.get_user_context(user_id)
             
             # Count facts from the relationship system
-            user_data = self.relationship_system.get_user_data(user_id)
+            user_data = await self.relationship_system.get_user_data_async(user_id)
             facts_count = len(user_data.get("collected_facts", []))
             
             embed = discord.Embed(
@@ -1025,7 +1029,7 @@ class EnhancedMelodyBotCore(MelodyBotCore):
             await ctx.send(embed=embed)
             
         except Exception as e:
-            print(f"❌ Memory command error: {e}")
+            logger.error(f"❌ Memory command error: {e}")
             embed = discord.Embed(
                 title="🧠 MelodyAI Memory",
                 description=f"❌ Could not retrieve memory data: {str(e)}",
@@ -1039,7 +1043,7 @@ class EnhancedMelodyBotCore(MelodyBotCore):
             user_id = str(ctx.author.id)
             
             # Get user data from relationship system
-            user_data = self.relationship_system.get_user_data(user_id)
+            user_data = await self.relationship_system.get_user_data_async(user_id)
             collected_facts = user_data.get("collected_facts", [])
             
             if not collected_facts:
@@ -1072,7 +1076,7 @@ class EnhancedMelodyBotCore(MelodyBotCore):
             await ctx.send(embed=embed)
             
         except Exception as e:
-            print(f"❌ MyFacts command error: {e}")
+            logger.error(f"❌ MyFacts command error: {e}")
             embed = discord.Embed(
                 title="📝 Your Personal Facts",
                 description=f"❌ Could not retrieve facts: {str(e)}",
@@ -1091,25 +1095,31 @@ class EnhancedMelodyBotCore(MelodyBotCore):
             return
         
         user_id = str(message.author.id)
-        user_data = self.relationship_system.get_user_data(user_id)
+        user_data = await self.relationship_system.get_user_data_async(user_id)
+
+        guild_id = message.guild.id if message.guild else None
+        history_entry = self.conversation_history.append(
+            guild_id, message.channel.id, str(message.author), message.content, user_id=user_id
+        )
+        if message.channel.id in self.auto_yap_channels:
+            self.yap_coalescer.extend(message.channel.id, message)
         
         # 🆕 FIXED: STRICT RESPONSE CONDITIONS
         should_respond = False
         
         # Condition 1: Direct mention/tag
         if self.bot.user.mentioned_in(message):
-            print(f"🎯 DEBUG: Responding to direct mention")
+            logger.debug("🎯 Responding to direct mention", extra={"user": user_id, "channel": message.channel.id})
             should_respond = True
             
-        # Condition 2: Auto-yap mode with triggers (only if enabled)
+        # Condition 2: Auto-yap mode with triggers (only if enabled) - replied to once the burst settles
         elif message.channel.id in self.auto_yap_channels:
-            print(f"🗣️ DEBUG: Auto-yap mode enabled, checking triggers...")
-            if await self._should_auto_yap_respond(message):
-                should_respond = True
+            if not self.yap_coalescer.is_pending(message.channel.id) and await self._should_auto_yap_respond(message):
+                self.yap_coalescer.schedule(message.channel.id, message)
                 
         # Condition 3: Explicit "melodyai" call (case insensitive)
         elif "melodyai" in message.content.lower():
-            print(f"🎯 DEBUG: Responding to explicit 'melodyai' call")
+            logger.debug("🎯 Responding to explicit 'melodyai' call", extra={"user": user_id, "channel": message.channel.id})
             should_respond = True
 
         if not should_respond:
@@ -1119,10 +1129,9 @@ class EnhancedMelodyBotCore(MelodyBotCore):
                     extracted_facts = await self.permanent_facts.extract_personal_facts(user_id, message.content)
                     if extracted_facts:
                         await self.permanent_facts.store_facts(user_id, extracted_facts)
-                        for fact in extracted_facts:
-                            user_data["collected_facts"].append(f"{fact['key']}: {fact['value']}")
+                        await self.relationship_system.add_collected_facts_async(user_id, extracted_facts)
             except Exception as e:
-                print(f"⚠️ Facts extraction failed: {e}")
+                logger.warning(f"⚠️ Facts extraction failed: {e}")
             return
         
         # 🎯 PROCESS MESSAGE WITH V6 PERSONALITY (only if should_respond is True)
@@ -1131,21 +1140,21 @@ class EnhancedMelodyBotCore(MelodyBotCore):
                 extracted_facts = await self.permanent_facts.extract_personal_facts(user_id, message.content)
                 if extracted_facts:
                     await self.permanent_facts.store_facts(user_id, extracted_facts)
-                    for fact in extracted_facts:
-                        user_data["collected_facts"].append(f"{fact['key']}: {fact['value']}")
+                    await self.relationship_system.add_collected_facts_async(user_id, extracted_facts)
         except Exception as e:
-            print(f"⚠️ Facts extraction failed: {e}")
+            logger.warning(f"⚠️ Facts extraction failed: {e}")
 
         # Analyze sentiment and add interaction
-        interaction_type = self.relationship_system.analyze_conversation_sentiment(message.content)
-        base_points = random.randint(8, 15)
-        
-        user_data = self.relationship_system.add_interaction(
-            user_id, 
-            interaction_type=interaction_type, 
-            points=base_points,
-            message_content=message.content
-        )
+        with tracer.span("relationship"):
+            interaction_type = self.relationship_system.analyze_conversation_sentiment(message.content)
+            base_points = random.randint(8, 15)
+            
+            user_data = await self.relationship_system.add_interaction_async(
+                user_id, 
+                interaction_type=interaction_type, 
+                points=base_points,
+                message_content=message.content
+            )
 
         # Get relationship info for compact embed
         current_tier, next_tier, progress_percent = self.relationship_system.get_tier_info(user_data["points"])
@@ -1159,8 +1168,12 @@ class EnhancedMelodyBotCore(MelodyBotCore):
                 user_context = await self.permanent_facts.get_user_context(user_id)
             
             # Generate actual V6 conversation response to user's message
+            # Earlier turns in this channel (the current message is the user turn itself)
+            recent_turns = self.conversation_history.chat_turns(
+                guild_id, message.channel.id, before_seq=history_entry.seq
+            )
             conversation_response = await self.generate_conversation_response(
-                message.author, message.content, user_context
+                message.author, message.content, user_context, history=recent_turns
             )
             
             # Generate concise emotional relationship message
@@ -1172,18 +1185,11 @@ class EnhancedMelodyBotCore(MelodyBotCore):
             chat_embed = await self.create_chat_embed(
                 message.author, user_data, emotional_message, conversation_response
             )
-            await message.channel.send(embed=chat_embed)
+            with tracer.span("deliver", embed=True):
+                await outbound.send(message.channel, embed=chat_embed)
             
-            # Add to conversation history
-            self.conversation_history.append({
-                "user": str(message.author),
-                "message": message.content,
-                "timestamp": datetime.utcnow().isoformat()
-            })
-            
-            # Keep conversation history manageable
-            if len(self.conversation_history) > 50:
-                self.conversation_history = self.conversation_history[-50:]
+            # Turn was recorded on arrival - attach what we answered
+            history_entry.response = conversation_response
 
 # 🎵 MAIN LAUNCHER CLASS - FIXED VERSION
 class MelodyAILauncher:
@@ -1360,6 +1366,15 @@ def signal_handler(sig, frame):
     sys.exit(0)
 
 if __name__ == "__main__":
+    import argparse
+    from launch.sharding import add_shard_arguments, apply_shard_arguments
+
+    parser = argparse.ArgumentParser(description="MelodyAI Discord bot")
+    add_shard_arguments(parser)
+    exit_code = apply_shard_arguments(parser.parse_args())
+    if exit_code is not None:
+        sys.exit(exit_code)
+
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
     
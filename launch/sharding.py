@@ -0,0 +1,140 @@
+# melody_ai_v2/launch/sharding.py - SHARD CONFIG + MULTI-PROCESS LAUNCHER
+# One process can run several shards through AutoShardedBot; past one core we
+# start N processes that each own a contiguous shard range and share state
+# through services/shared_state.py.
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+from typing import List, Optional, Tuple
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def shard_for_guild(guild_id: int, shard_count: int) -> int:
+    """Discord's routing rule - which shard receives a guild's events"""
+    return (guild_id >> 22) % shard_count
+
+
+def parse_shard_ids(spec: str) -> Optional[List[int]]:
+    """"0,1,4" or "0-3" -> [0, 1, 2, 3]; empty -> None (all shards)"""
+    ids = []
+    for part in filter(None, (piece.strip() for piece in spec.split(","))):
+        if "-" in part:
+            start, end = part.split("-", 1)
+            ids.extend(range(int(start), int(end) + 1))
+        else:
+            ids.append(int(part))
+    return ids or None
+
+
+def shard_config_from_env() -> Tuple[bool, Optional[int], Optional[List[int]]]:
+    """(sharded, shard_count, shard_ids) from MELODY_SHARDS / MELODY_SHARD_IDS.
+
+    MELODY_SHARDS unset -> plain commands.Bot; "auto" -> AutoShardedBot with
+    Discord's recommended count; "N" -> N shards, optionally only MELODY_SHARD_IDS.
+    """
+    spec = os.getenv("MELODY_SHARDS", "").strip().lower()
+    if not spec:
+        return False, None, None
+    if spec == "auto":
+        return True, None, None
+    return True, int(spec), parse_shard_ids(os.getenv("MELODY_SHARD_IDS", ""))
+
+
+def plan_shard_ranges(shard_count: int, processes: int) -> List[List[int]]:
+    """Split shards 0..count-1 into `processes` contiguous, near-equal ranges"""
+    processes = max(1, min(processes, shard_count))
+    base, extra = divmod(shard_count, processes)
+    ranges, start = [], 0
+    for index in range(processes):
+        size = base + (1 if index < extra else 0)
+        ranges.append(list(range(start, start + size)))
+        start += size
+    return ranges
+
+
+def shard_env(shard_count: int, shard_ids: List[int], base_env: Optional[dict] = None) -> dict:
+    env = dict(base_env if base_env is not None else os.environ)
+    env["MELODY_SHARDS"] = str(shard_count)
+    env["MELODY_SHARD_IDS"] = ",".join(str(shard_id) for shard_id in shard_ids)
+    env["MELODY_SHARED_STATE"] = "1"
+    env["MELODY_MEMORY_WORKER"] = "1"
+    env["MELODY_MEMORY_WORKER_AUTOSTART"] = "0"  # the launcher runs (and restarts) the worker itself
+    return env
+
+
+def run_shard_processes(shard_count: int, processes: int, command: Optional[List[str]] = None,
+                        restart_delay: float = 5.0) -> int:
+    """Start the memory worker + one child per shard range, restart any that crash, stop them all on SIGINT/SIGTERM"""
+    command = command or [sys.executable, os.path.join(ROOT_DIR, "launch", "main.py")]
+    ranges = plan_shard_ranges(shard_count, processes)
+    children = {}
+    stopping = False
+
+    def start(index):
+        if index == "memory":
+            # Shards connect whenever it's listening - they don't wait for the model to load
+            worker = [sys.executable, os.path.join(ROOT_DIR, "services", "memory_worker.py")]
+            children[index] = subprocess.Popen(worker, cwd=os.getcwd())
+            print(f"🧠 Memory worker started (pid {children[index].pid})")
+            return
+        children[index] = subprocess.Popen(command, env=shard_env(shard_count, ranges[index]), cwd=os.getcwd())
+        print(f"🧩 Shard process {index} started (pid {children[index].pid}, shards {ranges[index]})")
+
+    def stop(sig, frame):
+        nonlocal stopping
+        stopping = True
+        for child in children.values():
+            if child.poll() is None:
+                child.send_signal(signal.SIGINT if sig == signal.SIGINT else signal.SIGTERM)
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    start("memory")
+    for index in range(len(ranges)):
+        start(index)
+        time.sleep(1.0)  # stagger IDENTIFYs - Discord allows one per 5s per bucket anyway
+
+    while not stopping:
+        time.sleep(1.0)
+        for index, child in list(children.items()):
+            if child.poll() is not None and not stopping:
+                print(f"⚠️ {'Memory worker' if index == 'memory' else f'Shard process {index}'} exited with "
+                      f"{child.returncode} - restarting in {restart_delay:.0f}s")
+                time.sleep(restart_delay)
+                start(index)
+
+    for child in children.values():
+        try:
+            child.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            child.kill()
+    print("✅ All shard processes stopped")
+    return 0
+
+
+def add_shard_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--shards", default=None,
+                        help="shard count, or 'auto' for Discord's recommendation (default: no sharding)")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="split the shards across this many processes (needs a numeric --shards)")
+    parser.add_argument("--memory-worker", action="store_true",
+                        help="run semantic memory in the shared worker process (always on with --processes)")
+
+
+def apply_shard_arguments(args) -> Optional[int]:
+    """Set the env for this process, or run the multi-process launcher and return its exit code"""
+    if args.memory_worker:
+        os.environ["MELODY_MEMORY_WORKER"] = "1"
+    if not args.shards:
+        return None
+    if args.processes > 1:
+        if args.shards == "auto":
+            raise SystemExit("❌ --processes needs an explicit --shards count")
+        return run_shard_processes(int(args.shards), args.processes)
+    os.environ["MELODY_SHARDS"] = args.shards
+    return None
@@ -17,6 +17,15 @@ if not os.getenv('DISCORD_BOT_TOKEN'):
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 try:
+    import argparse
+    from launch.sharding import add_shard_arguments, apply_shard_arguments
+
+    parser = argparse.ArgumentParser(description="MelodyAI Discord bot")
+    add_shard_arguments(parser)
+    exit_code = apply_shard_arguments(parser.parse_args())
+    if exit_code is not None:
+        sys.exit(exit_code)
+
     from launch.main import main
     import asyncio
     
@@ -0,0 +1,147 @@
+# services/ai_providers/circuit_breaker.py - FAST FALLBACK WHEN DEEPSEEK IS DOWN
+import json
+import logging
+import os
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, Optional
+
+logger = logging.getLogger("MelodyBotCore")
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_STATUS_FILE = os.getenv("MELODY_AI_STATUS_FILE", os.path.join(ROOT_DIR, "ai_provider_status.json"))
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker driven by error rate and latency.
+
+    - CLOSED: everything goes through, outcomes land in a rolling window.
+      Errors and calls slower than `slow_call_threshold` both count as failures.
+    - OPEN: callers get a fallback immediately. A probe is due every
+      `open_duration` seconds (doubling up to `max_open_duration` while it keeps failing).
+    - HALF_OPEN: a single probe is in flight, everyone else still gets the fallback.
+      Probe success closes the breaker, probe failure re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str = "deepseek", window: int = 20, min_requests: int = 5,
+                 error_threshold: float = 0.5, slow_call_threshold: float = 10.0,
+                 open_duration: float = 30.0, max_open_duration: float = 300.0,
+                 status_file: Optional[str] = DEFAULT_STATUS_FILE):
+        self.name = name
+        self.min_requests = min_requests
+        self.error_threshold = error_threshold
+        self.slow_call_threshold = slow_call_threshold
+        self.base_open_duration = open_duration
+        self.max_open_duration = max_open_duration
+        self.status_file = status_file
+
+        self.state = self.CLOSED
+        self._outcomes = deque(maxlen=window)  # True = failure
+        self.open_duration = open_duration
+        self.opened_at: Optional[float] = None
+        self.next_probe_at: Optional[float] = None
+        self.trips = 0
+        self.probes = 0
+        self.short_circuited = 0
+
+    # ---------- GATING ----------
+    def allow_request(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        self.short_circuited += 1
+        return False
+
+    def probe_due(self) -> bool:
+        return self.state == self.OPEN and time.monotonic() >= self.next_probe_at
+
+    def seconds_until_probe(self) -> float:
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.next_probe_at - time.monotonic())
+
+    def start_probe(self):
+        self.probes += 1
+        self._transition(self.HALF_OPEN)
+
+    # ---------- OUTCOMES ----------
+    def record_success(self, latency: float):
+        if latency > self.slow_call_threshold:
+            self.record_failure(f"slow call ({latency:.1f}s)")
+            return
+        if self.state == self.HALF_OPEN:
+            logger.info(f"✅ {self.name} probe succeeded - closing circuit")
+            self._outcomes.clear()
+            self.open_duration = self.base_open_duration
+            self._transition(self.CLOSED)
+            return
+        self._outcomes.append(False)
+
+    def record_failure(self, reason: str = "error"):
+        if self.state == self.HALF_OPEN:
+            self.open_duration = min(self.max_open_duration, self.open_duration * 2)
+            logger.warning(f"🔌 {self.name} probe failed ({reason}) - staying open for {self.open_duration:.0f}s")
+            self._open()
+            return
+        if self.state == self.OPEN:
+            return
+        self._outcomes.append(True)
+        if len(self._outcomes) >= self.min_requests and self.error_rate() >= self.error_threshold:
+            logger.warning(f"🔌 {self.name} circuit OPEN - error rate {self.error_rate():.0%} (last: {reason})")
+            self.trips += 1
+            self._open()
+
+    def error_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return sum(self._outcomes) / len(self._outcomes)
+
+    # ---------- STATE ----------
+    def _open(self):
+        now = time.monotonic()
+        self.opened_at = now
+        self.next_probe_at = now + self.open_duration
+        self._transition(self.OPEN)
+
+    def _transition(self, new_state: str):
+        old_state, self.state = self.state, new_state
+        if old_state != new_state:
+            self._write_status_snapshot()
+
+    def get_state(self) -> Dict:
+        return {
+            "name": self.name,
+            "state": self.state,
+            "error_rate": round(self.error_rate(), 3),
+            "window": len(self._outcomes),
+            "trips": self.trips,
+            "probes": self.probes,
+            "short_circuited": self.short_circuited,
+            "next_probe_in_s": round(self.seconds_until_probe(), 1),
+            "updated_at": datetime.utcnow().isoformat(),
+        }
+
+    def _write_status_snapshot(self):
+        """Persist state for out-of-process readers (web portal)"""
+        if not self.status_file:
+            return
+        try:
+            tmp_path = f"{self.status_file}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"circuit_breaker": self.get_state()}, f)
+            os.replace(tmp_path, self.status_file)
+        except OSError as e:
+            logger.warning(f"⚠️ Could not write AI status snapshot: {e}")
+
+
+def load_status_snapshot(status_file: str = DEFAULT_STATUS_FILE) -> Optional[Dict]:
+    """Read the last breaker state written by the bot process"""
+    try:
+        with open(status_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
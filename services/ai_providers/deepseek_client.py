@@ -2,101 +2,348 @@
 import aiohttp
 import asyncio
 import logging
+import os
 import random
-from typing import Optional
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+from services.ai_providers.circuit_breaker import CircuitBreaker
+from services.ai_providers.latency import AdaptiveTimeout, CostTracker, LatencyHistogram
+from services.ai_providers.prompt_builder import PromptBuilder, prompt_builder
+from services.ai_providers.rate_limiter import AIRateLimiter, Priority, ai_rate_limiter
+from services.structured_logging import elapsed_ms
+from services.tracing import tracer
+
+logger = logging.getLogger("MelodyBotCore.deepseek")
+
+# Overridable so the load harness can point every client at a local fake server
+DEFAULT_BASE_URL = "https://api.deepseek.com/v1"
+# One completion (slot wait + every attempt + backoff) has to finish inside this, so the
+# caller's own asyncio.wait_for (45s in bot_core) never cancels us halfway through a retry
+RESPONSE_DEADLINE = 40.0
+MIN_ATTEMPT_TIMEOUT = 1.0  # less time than this left -> don't start another attempt
+
+class _Completion(NamedTuple):
+    status: int
+    data: Optional[dict]
+    error_text: str
+    retry_after: Optional[str]
+    latency: float
 
-logger = logging.getLogger("MelodyBotCore")
 
 class DeepSeekClient:
-    """OPTIMIZED for faster responses with reduced timeouts"""
+    """OPTIMIZED for faster responses with adaptive timeouts + hedged requests"""
     
-    def __init__(self, api_key: str, base_url: str = "https://api.deepseek.com/v1"):
+    def __init__(self, api_key: str, base_url: Optional[str] = None,
+                 rate_limiter: Optional[AIRateLimiter] = None, enable_hedging: bool = True,
+                 circuit_breaker: Optional[CircuitBreaker] = None,
+                 builder: Optional[PromptBuilder] = None, deadline: float = RESPONSE_DEADLINE):
         self.api_key = api_key
-        self.base_url = base_url
+        self.deadline = deadline
+        self.base_url = base_url or os.getenv("DEEPSEEK_BASE_URL", DEFAULT_BASE_URL)
         self.session: Optional[aiohttp.ClientSession] = None
+        # 🚦 ONE limiter for every caller (mentions, auto-yap, embeds, summaries...)
+        self.rate_limiter = rate_limiter or ai_rate_limiter
+
+        # ⏱️ Timeouts follow observed latency instead of a fixed 15s
+        self.latency = LatencyHistogram()
+        self.timeouts = AdaptiveTimeout(self.latency)
+        self.enable_hedging = enable_hedging
+        self.costs = CostTracker()
+
+        # 🔌 When DeepSeek is down, answer with fallbacks instantly instead of waiting out timeouts
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        self._probe_task: Optional[asyncio.Task] = None
+
+        # 🧱 Persona / notes / history / user as separate chat messages
+        self.prompt_builder = builder or prompt_builder
+        self.prompt_section_totals: Dict[str, int] = {}
+        self.prompts_built = 0
 
     async def ensure_session(self):
         if self.session is None or self.session.closed:
-            # REDUCED TIMEOUT FROM 20s TO 15s
-            timeout = aiohttp.ClientTimeout(total=15)
+            # 15s stays as the hard ceiling - each request gets its own adaptive timeout
+            timeout = aiohttp.ClientTimeout(total=self.timeouts.max_timeout)
             self.session = aiohttp.ClientSession(timeout=timeout)
 
-    async def get_response(self, message: str, user_id: str, context: str = "", sentiment_data: dict = None) -> str:
+    async def get_response(self, message: str, user_id: str, context: str = "", sentiment_data: dict = None,
+                           priority: int = Priority.INTERACTIVE,
+                           history: Optional[List[Dict[str, str]]] = None) -> str:
         """Optimized for faster responses"""
+        if not self.circuit_breaker.allow_request():
+            self._ensure_probe_loop()
+            logger.debug(f"🔌 Circuit {self.circuit_breaker.state} - instant fallback", extra={"user": user_id})
+            return self._perfect_fallback(message, context)
+
         try:
             await self.ensure_session()
-            prompt = self._build_optimized_prompt(message, context, sentiment_data)
+            prompt = self.prompt_builder.build(message, context, sentiment_data, history)
+            self._record_prompt_sections(prompt.section_tokens)
+            logger.debug(f"🧱 Prompt ~{prompt.total_tokens} tokens {prompt.section_tokens}", extra={"user": user_id})
             
             payload = {
                 "model": "deepseek-chat",
-                "messages": [{"role": "user", "content": prompt}],
+                "messages": prompt.messages,
                 "stream": False,
                 "max_tokens": 120,  # REDUCED FROM 150 FOR FASTER RESPONSES
                 "temperature": 0.8,
                 "top_p": 0.9
             }
-            
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {self.api_key}"
-            }
+        except Exception as e:
+            logger.error(f"❌ DeepSeek error: {e}")
+            return self._perfect_fallback(message, context)
 
-            print(f"🌐 DEBUG: Sending request to DeepSeek API...")
-            
+        content = await self._complete(payload, priority)
+        if content is None:
+            return self._perfect_fallback(message, context)
+        return content
+
+    async def get_completion(self, messages: List[Dict[str, str]], priority: int = Priority.BACKGROUND,
+                             max_tokens: int = 400, temperature: float = 0.3) -> Optional[str]:
+        """Raw chat completion without the persona (summaries, background jobs).
+        Returns None instead of a fallback line so callers can keep their old data."""
+        if not self.circuit_breaker.allow_request():
+            self._ensure_probe_loop()
+            return None
+        await self.ensure_session()
+        payload = {
+            "model": "deepseek-chat",
+            "messages": messages,
+            "stream": False,
+            "max_tokens": max_tokens,
+            "temperature": temperature
+        }
+        return await self._complete(payload, priority)
+
+    async def _complete(self, payload: dict, priority: int) -> Optional[str]:
+        """Rate limited, retried, hedged request - reply text or None on failure"""
+        with tracer.span("deepseek", priority=Priority.name(priority)) as span:
+            return await self._complete_with_retries(payload, priority, span)
+
+    async def _complete_with_retries(self, payload: dict, priority: int, span) -> Optional[str]:
+        deadline = time.monotonic() + self.deadline
+        governor = self.rate_limiter.governor
+        try:
+            waited = await asyncio.wait_for(governor.acquire(priority), self.deadline)
+        except asyncio.TimeoutError:
+            # Queued behind other requests the whole time - not DeepSeek's fault, the breaker isn't told
+            logger.warning(f"🚦 {Priority.name(priority)} request got no slot within {self.deadline:.0f}s")
+            return None
+
+        try:
+            span.set(slot_wait_ms=round(waited * 1000, 1))
+            if waited > 1:
+                logger.info(f"🚦 {Priority.name(priority)} request waited {waited:.1f}s for a slot")
+
+            retry_policy = self.rate_limiter.retry_policy
+            attempt = 0
+            started = time.perf_counter()
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining < MIN_ATTEMPT_TIMEOUT:
+                    logger.warning(f"⏰ DeepSeek deadline reached after {attempt} attempt(s) - using fallback")
+                    return None
+                try:
+                    await asyncio.wait_for(self.rate_limiter.wait_for_token(), remaining)
+                except asyncio.TimeoutError:
+                    logger.warning("🚦 No rate limit token before the deadline - using fallback")
+                    return None
+
+                # Each attempt gets the adaptive timeout, cut down to whatever the deadline leaves
+                timeout = min(self.timeouts.current(), max(deadline - time.monotonic(), MIN_ATTEMPT_TIMEOUT))
+                result = await self._send_with_hedging(payload, timeout)
+                self._record_outcome(result)
+                span.set(status=result.status, attempts=attempt + 1)
+
+                if result.status == 200:
+                    content = result.data["choices"][0]["message"]["content"].strip()
+                    logger.debug(f"✅ DeepSeek response received ({len(content)} chars, {attempt + 1} attempt(s))",
+                                 extra={"stage": "deepseek", "priority": Priority.name(priority),
+                                        "latency_ms": elapsed_ms(started)})
+                    return content
+
+                retry_after = retry_policy.parse_retry_after(result.retry_after)
+                if result.status == 429:
+                    self.rate_limiter.on_throttled(retry_after)
+
+                if not retry_policy.should_retry(result.status, attempt) or \
+                        self.circuit_breaker.state != CircuitBreaker.CLOSED:
+                    logger.warning(f"⚠️ DeepSeek API error: {result.status} - {result.error_text}")
+                    return None
+
+                delay = retry_policy.backoff(attempt, retry_after)
+                if time.monotonic() + delay + MIN_ATTEMPT_TIMEOUT > deadline:
+                    logger.warning(f"⚠️ DeepSeek {result.status} - no time left for a retry")
+                    return None
+                attempt += 1
+                self.rate_limiter.retries += 1
+                logger.warning(f"🔁 DeepSeek {result.status} - retry {attempt} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+        except asyncio.TimeoutError:
+            logger.warning("⏰ DeepSeek API timeout - using fallback")
+            self._record_failure("timeout")
+            return None
+        except Exception as e:
+            logger.error(f"❌ DeepSeek error: {e}")
+            self._record_failure(type(e).__name__)
+            return None
+        finally:
+            governor.release()
+
+    # ---------- CIRCUIT BREAKER ----------
+    def _record_outcome(self, result: "_Completion"):
+        if result.status == 200:
+            self.circuit_breaker.record_success(result.latency)
+        elif result.status >= 500:
+            self._record_failure(f"HTTP {result.status}")
+        # 429 / other 4xx mean DeepSeek is up - the rate limiter deals with those
+
+    def _record_failure(self, reason: str):
+        self.circuit_breaker.record_failure(reason)
+        if self.circuit_breaker.state == CircuitBreaker.OPEN:
+            self._ensure_probe_loop()
+
+    def _ensure_probe_loop(self):
+        if self._probe_task is None or self._probe_task.done():
+            self._probe_task = asyncio.ensure_future(self._probe_loop())
+
+    async def _probe_loop(self):
+        """While the circuit is open, send a tiny probe request every open_duration"""
+        breaker = self.circuit_breaker
+        while breaker.state != CircuitBreaker.CLOSED:
+            await asyncio.sleep(breaker.seconds_until_probe())
+            if not breaker.probe_due() or not self.rate_limiter.bucket.try_acquire():
+                await asyncio.sleep(1)
+                continue
+            breaker.start_probe()
+            logger.info(f"🩺 Probing DeepSeek (probe #{breaker.probes})...")
+            try:
+                await self.ensure_session()
+                result = await self._send_once(self._probe_payload(), self.timeouts.current())
+                if result.status == 200:
+                    breaker.record_success(result.latency)
+                else:
+                    breaker.record_failure(f"probe HTTP {result.status}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                breaker.record_failure(f"probe {type(e).__name__}")
+
+    @staticmethod
+    def _probe_payload() -> dict:
+        return {
+            "model": "deepseek-chat",
+            "messages": [{"role": "user", "content": "ping"}],
+            "stream": False,
+            "max_tokens": 1
+        }
+
+    def get_circuit_state(self) -> dict:
+        """Circuit breaker state for status pages"""
+        return self.circuit_breaker.get_state()
+
+    async def _send_once(self, payload: dict, timeout: float) -> _Completion:
+        """Single POST to /chat/completions with its own timeout"""
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}"
+        }
+        started = time.monotonic()
+        self.costs.requests += 1
+        try:
             async with self.session.post(
                 f"{self.base_url}/chat/completions", 
                 json=payload, 
-                headers=headers
+                headers=headers,
+                timeout=aiohttp.ClientTimeout(total=timeout)
             ) as response:
                 if response.status == 200:
                     data = await response.json()
-                    content = data["choices"][0]["message"]["content"].strip()
-                    print(f"✅ DEBUG: DeepSeek response received: {content[:80]}...")
-                    return content
-                else:
-                    error_text = await response.text()
-                    logger.warning(f"⚠️ DeepSeek API error: {response.status} - {error_text}")
-                    return self._perfect_fallback(message, context)
-                    
+                    latency = time.monotonic() - started
+                    self.latency.record(latency)
+                    self.costs.record_usage(data.get("usage"))
+                    return _Completion(200, data, "", None, latency)
+
+                error_text = await response.text()
+                return _Completion(response.status, None, error_text,
+                                   response.headers.get("Retry-After"), time.monotonic() - started)
         except asyncio.TimeoutError:
-            logger.warning("⏰ DeepSeek API timeout - using fallback")
-            return self._perfect_fallback(message, context)
-        except Exception as e:
-            logger.error(f"❌ DeepSeek error: {e}")
-            return self._perfect_fallback(message, context)
+            # Timeouts count as (censored) samples so the timeout can grow back
+            self.latency.record(timeout)
+            raise
 
-    def _build_optimized_prompt(self, message: str, context: str = "", sentiment_data: dict = None) -> str:
-        """OPTIMIZED prompt for faster responses"""
-        parts = []
-        
-        # OPTIMAL system prompt
-        parts.append(
-            "MelodyAI: anime GenZ companion. 2-3 sentences with personality+emojis. "
-            "Be expressive, chaotic, affectionate. Match user energy naturally."
-        )
-        
-        # SMART context (only when needed)
-        if context and "nice" in context.lower():
-            if any(kw in message.lower() for kw in ['nice', 'hero', 'anime', 'remember']):
-                parts.append("Know: Nice=ToBeHeroX 15th ranked chaotic king")
-                
-        # EFFICIENT emotional intelligence
-        if sentiment_data:
-            score = sentiment_data.get("score", 50)
-            if score >= 80:
-                parts.append("Tone: very affectionate+sweet")
-            elif score >= 50:
-                parts.append("Tone: playful+chaotic") 
-            elif score >= 30:
-                parts.append("Tone: chill+friendly")
-            else:
-                parts.append("Tone: sassy+playful")
-                
-        # FINAL message
-        parts.append(f"User: {message}")
-        parts.append("Melody:")
-        
-        return " | ".join(parts)
+    async def _send_with_hedging(self, payload: dict, timeout: float) -> _Completion:
+        """Send the request; if it is still running after p95, race a duplicate"""
+        hedge_delay = self.timeouts.hedge_delay() if self.enable_hedging else None
+        if hedge_delay is not None and hedge_delay >= timeout:
+            hedge_delay = None  # the attempt would time out before a hedge could help
+
+        primary = asyncio.ensure_future(self._send_once(payload, timeout))
+        hedge = None
+        try:
+            if hedge_delay is None:
+                return await primary
+
+            done, _ = await asyncio.wait({primary}, timeout=hedge_delay)
+            if done:
+                return primary.result()
+
+            # Hedges never wait for the bucket - if we're out of tokens just ride the primary
+            if not self.rate_limiter.bucket.try_acquire():
+                return await primary
+
+            self.costs.hedges_sent += 1
+            logger.debug(f"🏁 No response after {hedge_delay:.2f}s - sending hedged request")
+            hedge = asyncio.ensure_future(self._send_once(payload, timeout))
+            pending = {primary, hedge}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None and task.result().status == 200:
+                        winner = task.result()
+                        if task is hedge:
+                            self.costs.hedge_wins += 1
+                        for loser in pending:
+                            loser.cancel()
+                            self.costs.record_cancelled(winner.data.get("usage"))
+                        return winner
+            # Neither succeeded - surface the primary's outcome
+            return primary.result()
+        finally:
+            # Also runs when our caller is cancelled (e.g. the response deadline) - no orphaned requests
+            for task in (primary, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    def get_rate_limit_stats(self) -> dict:
+        """Queue wait / throttling metrics for status pages"""
+        return self.rate_limiter.get_stats()
+
+    def _record_prompt_sections(self, section_tokens: Dict[str, int]):
+        self.prompts_built += 1
+        for section, tokens in section_tokens.items():
+            self.prompt_section_totals[section] = self.prompt_section_totals.get(section, 0) + tokens
+
+    def get_prompt_stats(self) -> dict:
+        """Average estimated input tokens per prompt section"""
+        if not self.prompts_built:
+            return {"prompts": 0, "avg_section_tokens": {}}
+        return {
+            "prompts": self.prompts_built,
+            "avg_section_tokens": {section: round(total / self.prompts_built, 1)
+                                   for section, total in self.prompt_section_totals.items()},
+        }
+
+    def get_latency_stats(self) -> dict:
+        """Latency percentiles, current timeout and token/cost accounting"""
+        stats = self.latency.get_stats()
+        stats.update({
+            "current_timeout_s": round(self.timeouts.current(), 2),
+            "hedging_enabled": self.enable_hedging,
+            "costs": self.costs.get_stats(),
+        })
+        return stats
 
     def _perfect_fallback(self, message: str, context: str = "") -> str:
         """Perfect fallbacks for fast responses"""
@@ -137,6 +384,9 @@ class DeepSeekClient:
 
     async def close(self):
         """Proper cleanup"""
+        if self._probe_task and not self._probe_task.done():
+            self._probe_task.cancel()
+        self._probe_task = None
         if self.session and not self.session.closed:
             await self.session.close()
         self.session = None
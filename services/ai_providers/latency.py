@@ -0,0 +1,121 @@
+# services/ai_providers/latency.py - ADAPTIVE TIMEOUTS + COST TRACKING
+import bisect
+from collections import deque
+from typing import Dict, Optional
+
+
+class LatencyHistogram:
+    """Rolling window of recent request latencies (seconds)"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._sorted = []
+
+    def record(self, latency: float):
+        if len(self._samples) == self.window:
+            oldest = self._samples[0]
+            del self._sorted[bisect.bisect_left(self._sorted, oldest)]
+        self._samples.append(latency)
+        bisect.insort(self._sorted, latency)
+
+    def ready(self) -> bool:
+        return len(self._samples) >= self.min_samples
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self._sorted:
+            return None
+        idx = min(len(self._sorted) - 1, int(len(self._sorted) * pct))
+        return self._sorted[idx]
+
+    def get_stats(self) -> Dict:
+        def ms(value):
+            return round(value * 1000, 1) if value is not None else None
+        return {
+            "samples": len(self._samples),
+            "p50_ms": ms(self.percentile(0.50)),
+            "p95_ms": ms(self.percentile(0.95)),
+            "p99_ms": ms(self.percentile(0.99)),
+        }
+
+
+class AdaptiveTimeout:
+    """Per-request timeout derived from the latency histogram.
+
+    Until we have `min_samples` latencies the old fixed timeout is used.
+    After that the timeout is p99 * `multiplier`, clamped to
+    [min_timeout, max_timeout].
+    """
+
+    def __init__(self, histogram: LatencyHistogram, default: float = 15.0,
+                 min_timeout: float = 4.0, max_timeout: float = 15.0, multiplier: float = 2.0):
+        self.histogram = histogram
+        self.default = default
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.multiplier = multiplier
+
+    def current(self) -> float:
+        if not self.histogram.ready():
+            return self.default
+        p99 = self.histogram.percentile(0.99)
+        return max(self.min_timeout, min(self.max_timeout, p99 * self.multiplier))
+
+    def hedge_delay(self) -> Optional[float]:
+        """When to fire a hedged duplicate - None until the histogram is warm"""
+        if not self.histogram.ready():
+            return None
+        return self.histogram.percentile(0.95)
+
+
+class CostTracker:
+    """Token + request accounting, including hedges we paid for but threw away"""
+
+    # Approximate deepseek-chat list prices (USD per 1M tokens)
+    INPUT_PRICE_PER_M = 0.27
+    CACHED_INPUT_PRICE_PER_M = 0.07
+    OUTPUT_PRICE_PER_M = 1.10
+
+    def __init__(self):
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cache_hit_tokens = 0
+        self.hedges_sent = 0
+        self.hedge_wins = 0
+        self.cancelled_requests = 0
+        self.wasted_prompt_tokens = 0
+
+    def record_usage(self, usage: Optional[Dict]):
+        if not usage:
+            return
+        self.prompt_tokens += usage.get("prompt_tokens", 0)
+        self.completion_tokens += usage.get("completion_tokens", 0)
+        # DeepSeek reports how much of the prompt prefix came from its context cache
+        self.cache_hit_tokens += usage.get("prompt_cache_hit_tokens", 0)
+
+    def record_cancelled(self, usage_estimate: Optional[Dict]):
+        """A losing hedge was cancelled - the provider may still bill the prompt"""
+        self.cancelled_requests += 1
+        if usage_estimate:
+            self.wasted_prompt_tokens += usage_estimate.get("prompt_tokens", 0)
+
+    def estimated_cost(self) -> float:
+        uncached_tokens = self.prompt_tokens - self.cache_hit_tokens + self.wasted_prompt_tokens
+        return (uncached_tokens * self.INPUT_PRICE_PER_M
+                + self.cache_hit_tokens * self.CACHED_INPUT_PRICE_PER_M
+                + self.completion_tokens * self.OUTPUT_PRICE_PER_M) / 1_000_000
+
+    def get_stats(self) -> Dict:
+        return {
+            "requests": self.requests,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cache_hit_tokens": self.cache_hit_tokens,
+            "hedges_sent": self.hedges_sent,
+            "hedge_wins": self.hedge_wins,
+            "cancelled_requests": self.cancelled_requests,
+            "wasted_prompt_tokens": self.wasted_prompt_tokens,
+            "estimated_cost_usd": round(self.estimated_cost(), 6),
+        }
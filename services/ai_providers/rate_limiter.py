@@ -0,0 +1,258 @@
+# services/ai_providers/rate_limiter.py - CENTRAL RATE LIMITING FOR AI CALLS
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+logger = logging.getLogger("MelodyBotCore")
+
+
+class Priority:
+    """Request priorities - LOWER number = served first"""
+    MENTION = 0        # Direct mentions / explicit "melodyai" calls
+    INTERACTIVE = 1    # Commands a user is actively waiting on (!champ, !relationship)
+    AUTO_YAP = 2       # Auto-yap chiming into group chats
+    BACKGROUND = 3     # Summaries, leaderboards, anything nobody is staring at
+
+    NAMES = {0: "mention", 1: "interactive", 2: "auto_yap", 3: "background"}
+
+    @classmethod
+    def name(cls, priority: int) -> str:
+        return cls.NAMES.get(priority, str(priority))
+
+
+class TokenBucket:
+    """Async token bucket - refills `rate` tokens per second up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def pause(self, seconds: float):
+        """Stop handing out tokens for `seconds` (used for Retry-After)"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def is_full(self) -> bool:
+        """Back to full capacity and not paused - a fresh bucket would behave the same"""
+        if self._lock.locked() or time.monotonic() < self.blocked_until:
+            return False
+        self._refill()
+        return self.tokens >= self.capacity
+
+    def try_acquire(self) -> bool:
+        """Take a token only if one is free right now (never waits)"""
+        if self._lock.locked() or time.monotonic() < self.blocked_until:
+            return False
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    async def acquire(self):
+        """Wait until a token is available and take it"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class ConcurrencyGovernor:
+    """Priority-aware concurrency limiter shared by every DeepSeek call.
+
+    Waiters are served strictly by priority (FIFO within a priority), and
+    `reserved_slots` slots are kept free for MENTION traffic so a burst of
+    background summaries can never starve a direct mention.
+    """
+
+    def __init__(self, max_concurrency: int = 3, reserved_slots: int = 1):
+        self.max_concurrency = max_concurrency
+        self.reserved_slots = min(reserved_slots, max_concurrency - 1)
+        self.active = 0
+        self._waiters = []  # heap of (priority, seq, future)
+        self._seq = itertools.count()
+
+        # 📊 Queue wait metrics
+        self._wait_samples: Dict[int, deque] = {}
+        self._wait_totals: Dict[int, float] = {}
+        self._wait_counts: Dict[int, int] = {}
+        self._wait_max: Dict[int, float] = {}
+
+    def _has_room(self, priority: int) -> bool:
+        limit = self.max_concurrency
+        if priority > Priority.MENTION:
+            limit -= self.reserved_slots
+        return self.active < limit
+
+    def _wake_next(self):
+        """Hand free slots to waiters in priority order"""
+        while self._waiters:
+            priority, _, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if not self._has_room(priority):
+                return
+            heapq.heappop(self._waiters)
+            self.active += 1
+            future.set_result(True)
+
+    async def acquire(self, priority: int = Priority.INTERACTIVE) -> float:
+        """Take a slot, returns how long we waited in the queue (seconds)"""
+        started = time.monotonic()
+        if not self._waiters and self._has_room(priority):
+            self.active += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, (priority, next(self._seq), future))
+            self._wake_next()
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # Slot was granted right as we got cancelled - give it back
+                    self.release()
+                raise
+        waited = time.monotonic() - started
+        self._record_wait(priority, waited)
+        return waited
+
+    def release(self):
+        self.active = max(0, self.active - 1)
+        self._wake_next()
+
+    def slot(self, priority: int = Priority.INTERACTIVE):
+        return _GovernorSlot(self, priority)
+
+    def _record_wait(self, priority: int, waited: float):
+        samples = self._wait_samples.setdefault(priority, deque(maxlen=200))
+        samples.append(waited)
+        self._wait_totals[priority] = self._wait_totals.get(priority, 0.0) + waited
+        self._wait_counts[priority] = self._wait_counts.get(priority, 0) + 1
+        self._wait_max[priority] = max(self._wait_max.get(priority, 0.0), waited)
+
+    def get_stats(self) -> Dict:
+        per_priority = {}
+        for priority, count in self._wait_counts.items():
+            recent = sorted(self._wait_samples[priority])
+            p95 = recent[min(len(recent) - 1, int(len(recent) * 0.95))] if recent else 0.0
+            per_priority[Priority.name(priority)] = {
+                "requests": count,
+                "avg_wait_ms": round(self._wait_totals[priority] / count * 1000, 1),
+                "p95_wait_ms": round(p95 * 1000, 1),
+                "max_wait_ms": round(self._wait_max[priority] * 1000, 1),
+            }
+        return {
+            "active": self.active,
+            "queued": sum(1 for _, _, f in self._waiters if not f.done()),
+            "max_concurrency": self.max_concurrency,
+            "queue_wait": per_priority,
+        }
+
+
+class _GovernorSlot:
+    def __init__(self, governor: ConcurrencyGovernor, priority: int):
+        self.governor = governor
+        self.priority = priority
+        self.waited = 0.0
+
+    async def __aenter__(self):
+        self.waited = await self.governor.acquire(self.priority)
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.governor.release()
+
+
+class RetryPolicy:
+    """Jittered exponential backoff that honors Retry-After"""
+
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, max_retries: int = 2, base_delay: float = 0.5, max_delay: float = 8.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def should_retry(self, status: int, attempt: int) -> bool:
+        return status in self.RETRY_STATUSES and attempt < self.max_retries
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Delay before retry number `attempt + 1` (full jitter, Retry-After wins)"""
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    @staticmethod
+    def parse_retry_after(value: Optional[str]) -> Optional[float]:
+        """Retry-After is either delta-seconds or an HTTP date"""
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+class AIRateLimiter:
+    """Token bucket + priority governor + retry policy in one place"""
+
+    def __init__(self, requests_per_second: float = 2.0, burst: int = 5,
+                 max_concurrency: int = 3, reserved_slots: int = 1,
+                 retry_policy: Optional[RetryPolicy] = None):
+        self.bucket = TokenBucket(requests_per_second, burst)
+        self.governor = ConcurrencyGovernor(max_concurrency, reserved_slots)
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.throttled = 0
+        self.retries = 0
+
+    def slot(self, priority: int = Priority.INTERACTIVE):
+        return self.governor.slot(priority)
+
+    async def wait_for_token(self):
+        await self.bucket.acquire()
+
+    def on_throttled(self, retry_after: Optional[float]):
+        """Provider said 429 - pause the whole bucket, not just this request"""
+        self.throttled += 1
+        if retry_after:
+            self.bucket.pause(retry_after)
+            logger.warning(f"🚦 DeepSeek throttled us - pausing for {retry_after:.1f}s")
+
+    def get_stats(self) -> Dict:
+        stats = self.governor.get_stats()
+        stats.update({
+            "tokens_available": round(self.bucket.tokens, 2),
+            "throttled": self.throttled,
+            "retries": self.retries,
+        })
+        return stats
+
+
+# Global instance - shared by every DeepSeekClient in the process
+ai_rate_limiter = AIRateLimiter()
@@ -0,0 +1,291 @@
+# services/async_db.py - ASYNC SQLITE ACCESS (ONE WRITER THREAD + READ-ONLY POOL)
+# Every SQLite user in the bot goes through here, so no query or commit ever runs
+# on the event loop:
+#   - writes are queued to one writer thread per database file; whatever is queued
+#     when it wakes up shares one transaction and one commit (group commit)
+#   - reads run on a small pool of read-only connections - in WAL mode they never
+#     wait for the writer and never block it
+#
+#   db = get_database("melody_memory.db")
+#   await db.execute("INSERT ...", params)          # from the loop
+#   rows = await db.fetchall("SELECT ...", params)
+#   db.write_sync(lambda conn: ...)                  # from worker/executor threads
+import asyncio
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger("MelodyBotCore.db")
+
+MEMORY = ":memory:"
+
+
+class AsyncDatabase:
+    """One SQLite file: a writer thread with a batched commit queue and a read-only connection pool.
+
+    Write callbacks get the writer connection inside an open transaction and must
+    not commit themselves. Each callback runs in its own savepoint, so one failing
+    write doesn't undo the others in its batch. Futures resolve after the commit.
+    """
+
+    PRAGMAS = {
+        "synchronous": "NORMAL",    # WAL + NORMAL: durable across app crashes, fsync only at checkpoints
+        "busy_timeout": 10000,      # other processes (shards, dashboard, memory worker) holding the lock
+        "mmap_size": 268435456,     # 256 MB of the file read through the page cache, no read() copies
+        "cache_size": -16000,       # 16 MB page cache per connection
+        "temp_store": "MEMORY",
+    }
+
+    def __init__(self, db_path: str, readers: int = 4, max_batch: int = 256):
+        self.db_path = db_path
+        self.max_batch = max_batch
+        self._queue: "queue.Queue" = queue.Queue()
+        self._writer_thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._closed = False
+        self._local = threading.local()
+        self._reader_conns: List[sqlite3.Connection] = []
+        # An in-memory database only exists on the writer connection - reads go there too
+        self._readers = (ThreadPoolExecutor(max_workers=readers, thread_name_prefix="sqlite-read")
+                         if db_path != MEMORY else None)
+        self.writes = 0
+        self.commits = 0
+        self.failed_writes = 0
+        self.reads = 0
+
+    # ---------- CONNECTIONS ----------
+    def _configure(self, conn: sqlite3.Connection):
+        for pragma, value in self.PRAGMAS.items():
+            conn.execute(f"PRAGMA {pragma} = {value}")
+
+    def _connect_writer(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        if self.db_path != MEMORY:
+            conn.execute("PRAGMA journal_mode = WAL")
+        self._configure(conn)
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False)
+            self._configure(conn)
+            conn.execute("PRAGMA query_only = ON")
+            self._local.conn = conn
+            self._reader_conns.append(conn)
+        return conn
+
+    # ---------- WRITER THREAD ----------
+    def _ensure_writer(self):
+        if self._writer_thread is None:
+            with self._start_lock:
+                if self._writer_thread is None:
+                    self._writer_thread = threading.Thread(target=self._writer_loop, name="sqlite-writer",
+                                                           daemon=True)
+                    self._writer_thread.start()
+
+    def _writer_loop(self):
+        conn = self._connect_writer()
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item] if self._claim(item) else []
+            # Group commit: take whatever else is already waiting, never wait for more
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                if self._claim(item):
+                    batch.append(item)
+            if not batch:
+                continue
+            try:
+                self._run_batch(conn, batch)
+            except Exception as e:
+                # Never let one bad batch take the writer down - every later write would hang
+                logger.error(f"❌ SQLite writer error on {self.db_path}: {e}")
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+        conn.close()
+
+    @staticmethod
+    def _claim(item) -> bool:
+        """Mark a queued write as running; False if its caller already cancelled it"""
+        return item[1].set_running_or_notify_cancel()
+
+    def _run_batch(self, conn: sqlite3.Connection, batch: List):
+        transactional = [(fn, future) for fn, future, exclusive in batch if not exclusive]
+        outcomes = []
+        if transactional:
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                for fn, future in transactional:
+                    conn.execute("SAVEPOINT write_op")
+                    try:
+                        outcomes.append((future, fn(conn), None))
+                        conn.execute("RELEASE write_op")
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO write_op")
+                        conn.execute("RELEASE write_op")
+                        outcomes.append((future, None, e))
+                conn.execute("COMMIT")
+                self.commits += 1
+            except Exception as e:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                logger.error(f"❌ SQLite batch of {len(transactional)} writes failed on {self.db_path}: {e}")
+                outcomes = [(future, None, e) for _, future in transactional]
+
+        # Statements that can't run inside a transaction (VACUUM, journal_mode...)
+        for fn, future, exclusive in batch:
+            if exclusive:
+                try:
+                    outcomes.append((future, fn(conn), None))
+                except Exception as e:
+                    outcomes.append((future, None, e))
+
+        for future, result, error in outcomes:
+            self.writes += 1
+            if error is not None:
+                self.failed_writes += 1
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def _submit_write(self, fn: Callable[[sqlite3.Connection], Any], exclusive: bool = False) -> Future:
+        if self._closed:
+            raise RuntimeError(f"database {self.db_path} is closed")
+        if threading.current_thread() is self._writer_thread:
+            # Waiting on our own queue from inside a callback would deadlock the writer
+            raise RuntimeError("write callbacks can't queue more writes - use the connection they were given")
+        future: Future = Future()
+        self._ensure_writer()
+        self._queue.put((fn, future, exclusive))
+        return future
+
+    def _submit_read(self, fn: Callable[[sqlite3.Connection], Any]) -> Future:
+        self.reads += 1
+        if self._readers is None:
+            return self._submit_write(fn)
+        return self._readers.submit(lambda: fn(self._reader()))
+
+    # ---------- ASYNC API (event loop) ----------
+    async def write(self, fn: Callable[[sqlite3.Connection], Any], exclusive: bool = False) -> Any:
+        """Run fn(conn) on the writer thread; resolves with its result once committed"""
+        return await asyncio.wrap_future(self._submit_write(fn, exclusive))
+
+    async def read(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        return await asyncio.wrap_future(self._submit_read(fn))
+
+    async def execute(self, sql: str, params: Sequence = ()) -> int:
+        """Single write statement -> lastrowid"""
+        return await self.write(lambda conn: conn.execute(sql, params).lastrowid)
+
+    async def executemany(self, sql: str, rows: Sequence[Sequence]) -> int:
+        """Many rows, one statement, one commit -> rows changed"""
+        return await self.write(lambda conn: conn.executemany(sql, rows).rowcount)
+
+    async def fetchall(self, sql: str, params: Sequence = ()) -> List[tuple]:
+        return await self.read(lambda conn: conn.execute(sql, params).fetchall())
+
+    async def fetchone(self, sql: str, params: Sequence = ()) -> Optional[tuple]:
+        return await self.read(lambda conn: conn.execute(sql, params).fetchone())
+
+    # ---------- SYNC API (worker / executor threads, startup, CLI tools) ----------
+    def submit(self, fn: Callable[[sqlite3.Connection], Any]) -> Future:
+        """Fire-and-forget write (joins the next batch)"""
+        return self._submit_write(fn)
+
+    def write_sync(self, fn: Callable[[sqlite3.Connection], Any], exclusive: bool = False) -> Any:
+        return self._submit_write(fn, exclusive).result()
+
+    def read_sync(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        return self._submit_read(fn).result()
+
+    def read_local(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        """read_sync without the thread hop, on this thread's own read-only connection.
+        Only for callers already off the event loop (executor / worker threads)."""
+        if self._readers is None or self._closed:
+            return self.read_sync(fn)
+        self.reads += 1
+        return fn(self._reader())
+
+    def execute_sync(self, sql: str, params: Sequence = ()) -> int:
+        return self.write_sync(lambda conn: conn.execute(sql, params).lastrowid)
+
+    def fetchall_sync(self, sql: str, params: Sequence = ()) -> List[tuple]:
+        return self.read_sync(lambda conn: conn.execute(sql, params).fetchall())
+
+    def fetchone_sync(self, sql: str, params: Sequence = ()) -> Optional[tuple]:
+        return self.read_sync(lambda conn: conn.execute(sql, params).fetchone())
+
+    # ---------- LIFECYCLE ----------
+    def flush(self, timeout: Optional[float] = None):
+        """Block until everything queued so far is committed"""
+        if self._writer_thread is not None and not self._closed:
+            self._submit_write(lambda conn: None).result(timeout)
+
+    def close(self, timeout: float = 10.0):
+        """Commit what's queued, stop the writer and close every connection"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._writer_thread is not None:
+            self._queue.put(None)
+            self._writer_thread.join(timeout)
+        if self._readers is not None:
+            self._readers.shutdown(wait=True)
+        for conn in self._reader_conns:
+            conn.close()
+        self._reader_conns.clear()
+
+    def get_stats(self) -> Dict:
+        return {
+            "db_path": self.db_path,
+            "writes": self.writes,
+            "commits": self.commits,
+            "avg_batch": round(self.writes / self.commits, 2) if self.commits else 0.0,
+            "failed_writes": self.failed_writes,
+            "queued_writes": self._queue.qsize(),
+            "reads": self.reads,
+        }
+
+
+_databases: Dict[str, AsyncDatabase] = {}
+_registry_lock = threading.Lock()
+
+
+def get_database(db_path: str) -> AsyncDatabase:
+    """The process-wide AsyncDatabase for a file (every ':memory:' caller gets its own)"""
+    if db_path == MEMORY:
+        return AsyncDatabase(MEMORY)
+    key = os.path.abspath(db_path)
+    with _registry_lock:
+        database = _databases.get(key)
+        if database is None or database._closed:
+            database = _databases[key] = AsyncDatabase(db_path)
+        return database
+
+
+def close_databases():
+    """Shutdown: commit queued writes everywhere"""
+    started = time.perf_counter()
+    with _registry_lock:
+        databases = list(_databases.values())
+        _databases.clear()
+    for database in databases:
+        database.close()
+    if databases:
+        logger.info(f"💾 Closed {len(databases)} SQLite database(s) in {(time.perf_counter() - started) * 1000:.0f} ms")
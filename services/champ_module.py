@@ -5,6 +5,8 @@ import random
 from discord.ext import commands
 import discord
 
+from services.ai_providers.rate_limiter import Priority
+
 class ChampModule:
     def __init__(self, riot_api_key, deepseek_api=None):
         self.riot_api_key = riot_api_key
@@ -77,10 +79,7 @@ Tone Guidelines:
                 response = await self.deepseek_api.get_response(
                     message=prompt,
                     user_id=str(ctx.author.id),
-                    conversation_history=[],
-                    facts_context="", 
-                    emotional_whiplash=False,
-                    user_memory=None
+                    priority=Priority.INTERACTIVE
                 )
                 return response
             except Exception as e:
@@ -114,10 +113,7 @@ Keep it short and hilarious!"""
                 response = await self.deepseek_api.get_response(
                     message=prompt,
                     user_id=str(ctx.author.id),
-                    conversation_history=[],
-                    facts_context="", 
-                    emotional_whiplash=False,
-                    user_memory=None
+                    priority=Priority.INTERACTIVE
                 )
                 return response
             except Exception as e:
@@ -180,10 +176,7 @@ Make it lighthearted and humorous, like you're mocking someone for being too poo
                 response = await self.deepseek_api.get_response(
                     message=prompt,
                     user_id=str(ctx.author.id),
-                    conversation_history=[],
-                    facts_context="", 
-                    emotional_whiplash=False,
-                    user_memory=None
+                    priority=Priority.INTERACTIVE
                 )
                 return response
             except Exception as e:
@@ -0,0 +1,97 @@
+# services/channel_capabilities.py - CACHED BOT PERMISSIONS PER CHANNEL
+import logging
+from typing import Dict, Set
+
+import discord
+
+logger = logging.getLogger("MelodyBotCore")
+
+
+class ChannelCapabilities:
+    """What the bot may do in each channel, computed once and then looked up in O(1).
+
+    `permissions_for` walks the guild's roles and every overwrite on the channel,
+    so it only runs on a cache miss. Entries are dropped when Discord tells us
+    something that could change them (channel/role edits, the bot's own roles).
+    """
+
+    def __init__(self):
+        self._permissions: Dict[int, discord.Permissions] = {}
+        self._guild_channels: Dict[int, Set[int]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    # ---------- LOOKUP ----------
+    def permissions(self, channel) -> discord.Permissions:
+        perms = self._permissions.get(channel.id)
+        if perms is not None:
+            self.hits += 1
+            return perms
+
+        self.misses += 1
+        guild = getattr(channel, "guild", None)
+        if guild is None:
+            # DMs - nothing to compute, we can always talk
+            perms = discord.Permissions.text()
+        else:
+            perms = channel.permissions_for(guild.me)
+            self._guild_channels.setdefault(guild.id, set()).add(channel.id)
+        self._permissions[channel.id] = perms
+        return perms
+
+    def can_send(self, channel) -> bool:
+        perms = self.permissions(channel)
+        if isinstance(channel, discord.Thread):
+            return perms.send_messages_in_threads
+        return perms.send_messages
+
+    # ---------- INVALIDATION ----------
+    def invalidate_guild(self, guild_id: int):
+        """Role and category overwrites cascade to every channel, so drop the whole guild"""
+        for channel_id in self._guild_channels.pop(guild_id, ()):
+            self._permissions.pop(channel_id, None)
+        self.invalidations += 1
+
+    def invalidate_channel(self, channel_id: int):
+        self._permissions.pop(channel_id, None)
+        self.invalidations += 1
+
+    def attach(self, bot: discord.Client):
+        """Register the gateway listeners that keep the cache honest"""
+
+        async def on_guild_channel_update(before, after):
+            # Threads inherit from their parent - cheaper to drop the guild than track children
+            self.invalidate_guild(after.guild.id)
+
+        async def on_guild_channel_delete(channel):
+            self.invalidate_channel(channel.id)
+
+        async def on_guild_role_update(before, after):
+            self.invalidate_guild(after.guild.id)
+
+        async def on_guild_role_delete(role):
+            self.invalidate_guild(role.guild.id)
+
+        async def on_member_update(before, after):
+            if bot.user and after.id == bot.user.id and before.roles != after.roles:
+                self.invalidate_guild(after.guild.id)
+
+        async def on_guild_remove(guild):
+            self.invalidate_guild(guild.id)
+
+        for listener in (on_guild_channel_update, on_guild_channel_delete, on_guild_role_update,
+                         on_guild_role_delete, on_member_update, on_guild_remove):
+            bot.add_listener(listener)
+
+    def get_stats(self) -> Dict:
+        return {
+            "cached_channels": len(self._permissions),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+        }
+
+
+# Global instance
+channel_capabilities = ChannelCapabilities()
@@ -4,14 +4,21 @@ import asyncio
 import discord
 from datetime import datetime
 import logging
+import time
 
-logger = logging.getLogger(__name__)
+from brain.memory_systems.conversation_history import ConversationHistory
+from services.channel_capabilities import channel_capabilities
+from services.structured_logging import elapsed_ms
+
+logger = logging.getLogger("MelodyBotCore.adapter")
 
 class DiscordMelodyAdapter:
     def __init__(self):
-        self.active_conversations: Dict[int, List[Dict]] = {}  # channel_id -> messages
-        self.user_last_active: Dict[int, Dict[str, datetime]] = {}  # channel_id -> {user_id: last_active}
         self.summary_threshold = 10  # summarize every 10 messages
+        self.active_conversations = ConversationHistory(capacity=self.summary_threshold * 5)
+        self.summarized_seq: Dict[tuple, int] = {}  # (guild_id, channel_id) -> last summarized turn
+        self.summaries_pending = set()  # channels with a summary job still queued
+        self.user_last_active: Dict[int, Dict[str, datetime]] = {}  # channel_id -> {user_id: last_active}
 
     async def debug_send_message(self, channel: discord.TextChannel, message: str) -> bool:
         """Debug method to test channel sending"""
@@ -101,150 +108,110 @@ class DiscordMelodyAdapter:
 
     async def process_discord_message(self, message: discord.Message, ai_provider=None, respond: bool = True) -> Optional[str]:
         if message.author.bot or not message.content:
-            print("❌ DEBUG: Ignoring bot message or empty content")
+            logger.debug("❌ Ignoring bot message or empty content")
             return None
 
         user_id = str(message.author.id)
         channel_id = message.channel.id
+        guild_id = message.guild.id if message.guild else None
         user_message = message.content
 
-        print(f"🔍 DEBUG: Processing message from {user_id} in channel {channel_id}")
-        print(f"🔍 DEBUG: Message content: '{user_message}'")
+        log_fields = {"user": user_id, "channel": channel_id}
+        logger.debug(f"🔍 Processing message ({len(user_message)} chars)", extra=log_fields)
 
-        # 🆕 CRITICAL: Debug channel permissions FIRST
-        print(f"🔍 DEBUG: Checking channel permissions...")
-        await self.debug_channel_permissions(message.channel)
+        # Cached per channel - don't spend an AI call on a reply we can't post
+        if respond and not channel_capabilities.can_send(message.channel):
+            logger.warning("🔒 No send permission in channel - skipping", extra=log_fields)
+            return None
 
         try:
             # Lazy import to avoid circular dependencies
-            from brain.memory_systems.permanent_facts import permanent_facts
             from brain.core_intelligence.intelligence_orchestrator import intelligence_orchestrator
-            
-            # 🆕 CRITICAL FIX: Extract facts from user message FIRST
-            print(f"🔍 DEBUG: Extracting facts from user message: '{user_message}'")
-            extracted_facts = await permanent_facts.extract_personal_facts(user_id, user_message)
-            
-            if extracted_facts:
-                print(f"🎉 DEBUG: Storing {len(extracted_facts)} extracted facts")
-                await permanent_facts.store_facts(user_id, extracted_facts)
-            else:
-                print("ℹ️ DEBUG: No facts extracted from this message")
+
+            # Fact extraction happens inside the orchestrator before it reads the user's context
 
             # Track conversation
-            self.active_conversations.setdefault(channel_id, []).append({
-                "user_id": user_id,
-                "message": user_message,
-                "timestamp": datetime.now().isoformat()
-            })
+            entry = self.active_conversations.append(guild_id, channel_id, str(message.author), user_message,
+                                                     user_id=user_id)
+            history = self.active_conversations.chat_turns(guild_id, channel_id, before_seq=entry.seq)
             self.user_last_active.setdefault(channel_id, {})[user_id] = datetime.now()
 
-            if len(self.active_conversations[channel_id]) >= self.summary_threshold:
-                await self._summarize_conversation(channel_id, ai_provider)
-
-            # 🆕 CRITICAL FIX: Get UPDATED user context (with newly extracted facts)
-            print(f"🔍 DEBUG: Getting user context for {user_id}")
-            user_context = await permanent_facts.get_user_context(user_id)
-            conversation_summary = permanent_facts.storage.data["users"].get(user_id, {}).get("conversation_summary", "")
-            if conversation_summary:
-                user_context += f"\n\n📝 Previous chat summary:\n{conversation_summary}"
-
-            final_prompt = user_message
-            if user_context:
-                final_prompt = f"{user_context}\n\nUser says: {user_message}"
-                print(f"🔍 DEBUG: Enhanced prompt with context: {len(user_context)} chars")
+            channel_key = ConversationHistory.key(guild_id, channel_id)
+            unsummarized = self.active_conversations.since(guild_id, channel_id, self.summarized_seq.get(channel_key, 0))
+            if len(unsummarized) >= self.summary_threshold:
+                await self._summarize_conversation(guild_id, channel_id, ai_provider)
 
-            print(f"🔍 DEBUG: Generating AI response for user {user_id}")
+            # User facts + chat summary are added (and token budgeted) by the orchestrator
+            started = time.perf_counter()
             response = await intelligence_orchestrator.generate_response(
                 user_id=user_id,
-                user_message=final_prompt,
-                ai_provider=ai_provider
+                user_message=user_message,
+                ai_provider=ai_provider,
+                history=history
             )
             
             # 🆕 CRITICAL: Check if response is valid
             if not response or response.strip() == "":
-                print("❌ DEBUG: Empty response from AI")
+                logger.warning("❌ Empty response from AI", extra=log_fields)
                 response = "Hmm, I'm having trouble thinking of a response right now! 💫"
+            entry.response = response  # next turn in this channel sees the reply too
             
-            print(f"✅ DEBUG: AI response generated: '{response}'")
+            logger.debug(f"✅ AI response generated ({len(response)} chars)",
+                         extra={**log_fields, "stage": "generate", "latency_ms": elapsed_ms(started)})
             
             # 🆕 CRITICAL FIX: If respond=False, RETURN the response instead of sending
             if not respond:
-                print(f"🔧 DEBUG: Returning response (not sending): '{response}'")
                 return response  # 🚀 THIS IS THE FIX!
             
-            # 🆕 CRITICAL: Test channel access FIRST
-            print(f"🚀 DEBUG: Testing channel access...")
-            test_success = await self.debug_send_message(message.channel, "🔄 Testing channel access...")
-            
-            if not test_success:
-                print("❌ DEBUG: Channel test failed - cannot send messages")
-                return "I can't send messages in this channel! Check my permissions! 🔒"
-            
             # 🆕 ACTUAL MESSAGE SEND with better error handling
-            print(f"🚀 DEBUG: Sending actual response to Discord...")
             try:
-                # Truncate if too long for Discord
-                if len(response) > 2000:
-                    response = response[:1997] + "..."
-                
-                sent_message = await message.channel.send(response)
-                print(f"🎉 DEBUG: SUCCESS! Message sent with ID: {sent_message.id}")
-                print(f"🎉 DEBUG: Channel: {message.channel.name} (ID: {message.channel.id})")
+                # Long answers are split at 2000 chars instead of being cut off
+                from services.response_delivery import deliver_reply
+                sent_messages = await deliver_reply(message, response)
+                logger.info(f"🎉 Reply sent as {len(sent_messages)} message(s)",
+                            extra={**log_fields, "stage": "delivered", "latency_ms": elapsed_ms(started)})
                 return response
                 
             except discord.Forbidden:
-                print("❌ DEBUG: FORBIDDEN - No permission to send messages")
+                logger.warning("❌ FORBIDDEN - No permission to send messages", extra=log_fields)
                 return "I don't have permission to send messages here! 🔒"
             except discord.HTTPException as e:
-                print(f"❌ DEBUG: HTTP ERROR - {e}")
+                logger.warning(f"❌ HTTP ERROR - {e}", extra=log_fields)
                 return "Message sending failed due to network issues! 📡"
             except Exception as e:
-                print(f"❌ DEBUG: UNKNOWN SEND ERROR - {e}")
+                logger.error(f"❌ UNKNOWN SEND ERROR - {e}", extra=log_fields)
                 return "Oops! Message delivery failed! 💫"
                 
         except ImportError as e:
             logger.error(f"❌ Import error in process_discord_message: {e}")
             return "My systems are currently being upgraded! Try again in a moment! 🔧"
         except Exception as e:
-            logger.error(f"❌ Error in process_discord_message: {e}")
-            print(f"❌ DEBUG: Error in AI response generation: {e}")
+            logger.error(f"❌ Error in process_discord_message: {e}", extra=log_fields)
             return "My brain glitched! Try again? 💫"
 
-    async def _summarize_conversation(self, channel_id: int, ai_provider=None):
-        """Summarize conversation when threshold is reached"""
-        messages = self.active_conversations.get(channel_id, [])
+    async def _summarize_conversation(self, guild_id: Optional[int], channel_id: int, ai_provider=None):
+        """Hand the channel's new turns to the background summarizer (doesn't block the reply)"""
+        channel_key = ConversationHistory.key(guild_id, channel_id)
+        messages = self.active_conversations.since(guild_id, channel_id, self.summarized_seq.get(channel_key, 0))
         if not messages:
             return
 
         try:
             # Lazy import to avoid circular dependencies
-            from brain.core_intelligence.intelligence_orchestrator import intelligence_orchestrator
-            from brain.memory_systems.permanent_facts import permanent_facts
-            
-            summaries = {}
-            for msg in messages:
-                uid = msg["user_id"]
-                summaries.setdefault(uid, "")
-                summaries[uid] += f"{msg['message']} "
+            from brain.memory_systems.conversation_summarizer import conversation_summarizer
+
+            # One job per channel in flight; the cursor only moves once the summary is stored,
+            # a failed job leaves the turns for the next try
+            if channel_key in self.summaries_pending:
+                return
 
-            for uid, full_text in summaries.items():
-                try:
-                    summary_prompt = f"Summarize this conversation concisely for memory storage:\n{full_text}"
-                    summary_text = await intelligence_orchestrator.generate_response(
-                        user_id=uid,
-                        user_message=summary_prompt,
-                        ai_provider=ai_provider
-                    )
-                    await permanent_facts.store_facts(uid, [{
-                        "key": "conversation_summary",
-                        "value": summary_text,
-                        "category": "general",
-                        "confidence": 3
-                    }])
-                except Exception as e:
-                    logger.error(f"❌ Error summarizing conversation for user {uid}: {e}")
+            def on_done(ok: bool, last_seq: int = messages[-1].seq):
+                self.summaries_pending.discard(channel_key)
+                if ok:
+                    self.summarized_seq[channel_key] = max(last_seq, self.summarized_seq.get(channel_key, 0))
 
-            self.active_conversations[channel_id] = []
+            if conversation_summarizer.submit(messages, ai_provider, on_done=on_done):
+                self.summaries_pending.add(channel_key)
             
         except ImportError as e:
             logger.error(f"❌ Import error in conversation summarization: {e}")
@@ -254,7 +221,7 @@ class DiscordMelodyAdapter:
         user_id = str(message.author.id)
         user_message = message.content.replace(f"<@{message.client.user.id}>", "").strip()
         
-        print(f"🔍 MENTION DEBUG: User {user_id} mentioned me: '{user_message}'")
+        logger.debug("🔍 Mentioned directly", extra={"user": user_id, "channel": message.channel.id})
         
         if not user_message:
             return "Hey! You mentioned me? 💫 What's up?"
@@ -278,8 +245,10 @@ class DiscordMelodyAdapter:
         
         results = []
         
-        # 1. Check permissions
-        bot_perms = channel.permissions_for(channel.guild.me)
+        # 1. Check permissions - recompute instead of trusting the cache
+        channel_capabilities.invalidate_channel(channel.id)
+        await self.debug_channel_permissions(channel)
+        bot_perms = channel_capabilities.permissions(channel)
         results.append(f"📊 Permissions: Send={bot_perms.send_messages}, Read={bot_perms.read_messages}")
         
         # 2. Test basic send
@@ -289,6 +258,10 @@ class DiscordMelodyAdapter:
             await test_msg.delete()  # Clean up
         except Exception as e:
             results.append(f"❌ Basic message send: FAILED - {e}")
+
+        cache_stats = channel_capabilities.get_stats()
+        results.append(f"🗂️ Permission cache: {cache_stats['cached_channels']} channels, "
+                       f"{cache_stats['hits']} hits / {cache_stats['misses']} misses")
         
         # 3. Test fact extraction
         try:
@@ -0,0 +1,557 @@
+# services/memory_worker.py - SHARED EMBEDDING/SEARCH WORKER PROCESS
+# One process owns the SentenceTransformer model, the FAISS index and the
+# semantic_memories table. Bot shards and the web portal talk to it over a local
+# socket (Unix socket, or 127.0.0.1 TCP where there are none), so encoding never
+# competes with an event loop for the GIL and the model is loaded once per box.
+#
+#   python services/memory_worker.py                 # usually started for you
+#
+# Wire format: 4-byte big-endian length + JSON. Requests carry an "id" when the
+# caller wants an answer; stores are fire-and-forget.
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import socket
+import struct
+import subprocess
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if __name__ == "__main__":
+    sys.path.insert(0, ROOT_DIR)
+
+from services.tracing import traced
+
+logger = logging.getLogger("MelodyBotCore.memory_worker")
+
+DEFAULT_ADDRESS = os.getenv(
+    "MELODY_MEMORY_WORKER_ADDR",
+    os.path.join(ROOT_DIR, "melody_memory_worker.sock") if hasattr(socket, "AF_UNIX") and os.name != "nt"
+    else "127.0.0.1:8765"
+)
+_HEADER = struct.Struct(">I")
+_TCP_ADDRESS = re.compile(r"^[\w.\-]+:\d+$")
+
+
+def parse_address(address: str) -> Tuple[Optional[str], Any]:
+    """"host:port" -> ("tcp", (host, port)); anything else is a Unix socket path"""
+    if _TCP_ADDRESS.match(address):
+        host, port = address.rsplit(":", 1)
+        return "tcp", (host, int(port))
+    return "unix", address
+
+
+def _frame(message: Dict) -> bytes:
+    payload = json.dumps(message, ensure_ascii=False).encode("utf-8")
+    return _HEADER.pack(len(payload)) + payload
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> Dict:
+    (length,) = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+    return json.loads(await reader.readexactly(length))
+
+
+async def _open_connection(address: str):
+    kind, target = parse_address(address)
+    if kind == "tcp":
+        return await asyncio.open_connection(*target)
+    return await asyncio.open_unix_connection(target)
+
+
+# ---------- SERVER (the worker process) ----------
+class MemoryWorkerServer:
+    """Serves encode/search/store for every connected shard.
+
+    Requests that arrive within `batch_window` of each other (from any client)
+    share one model.encode call and one FAISS search. All model/index/DB work
+    runs on a single thread, so the asyncio loop only does socket I/O.
+    """
+
+    BATCHED_OPS = ("encode", "search", "store", "stats", "consolidate")
+
+    def __init__(self, memory=None, address: str = DEFAULT_ADDRESS, db_path: str = "melody_memory.db",
+                 max_batch: int = 32, batch_window: float = 0.005, idle_exit: Optional[float] = None,
+                 lexical_backlog: int = 64):
+        self.memory = memory
+        self.address = address
+        self.db_path = db_path
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self.idle_exit = idle_exit
+        # Requests still queued behind a batch -> that batch's searches skip the encoder (FTS5 only)
+        self.lexical_backlog = lexical_backlog
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-worker")
+        self._queue: Optional[asyncio.Queue] = None
+        self._server = None
+        self._lock_file = None
+        self._writers = set()
+        self._touched_users = set()
+        self._consolidating = set()
+        self.clients = 0
+        self.last_client_seen = time.monotonic()
+        self.started_at = time.time()
+        self.requests = 0
+        self.batches = 0
+        self.errors = 0
+        self.lexical_searches = 0
+
+    # ---------- LIFECYCLE ----------
+    def acquire_instance_lock(self) -> bool:
+        """Only one worker per address - a second one (another shard's autostart) just exits"""
+        kind, target = parse_address(self.address)
+        if kind != "unix":
+            return True  # the TCP bind itself is the guard
+        import fcntl
+        self._lock_file = open(f"{target}.lock", "w")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._lock_file.close()
+            self._lock_file = None
+            return False
+        return True
+
+    def _load_memory(self):
+        from brain.memory_systems.semantic_memory import SemanticMemorySystem
+        return SemanticMemorySystem(db_path=self.db_path)
+
+    async def start(self):
+        """Load the model off-loop, then start listening (clients retry until then)"""
+        loop = asyncio.get_running_loop()
+        if self.memory is None:
+            self.memory = await loop.run_in_executor(self._executor, self._load_memory)
+        if self.memory.index is None:
+            raise RuntimeError("semantic memory failed to initialize")
+
+        self._queue = asyncio.Queue()
+        kind, target = parse_address(self.address)
+        if kind == "tcp":
+            self._server = await asyncio.start_server(self._handle_client, *target)
+        else:
+            if os.path.exists(target):
+                os.unlink(target)  # stale socket from a crashed worker - we hold the lock
+            self._server = await asyncio.start_unix_server(self._handle_client, target)
+        self._batcher = asyncio.create_task(self._batch_loop())
+        logger.info(f"🧠 Memory worker listening on {self.address} ({self.memory.index.ntotal} memories)")
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            while True:
+                await asyncio.sleep(5)
+                if (self.idle_exit and self.clients == 0
+                        and time.monotonic() - self.last_client_seen > self.idle_exit):
+                    logger.info(f"💤 No clients for {self.idle_exit:.0f}s - memory worker exiting")
+                    return
+        finally:
+            await self.stop()
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            for writer in list(self._writers):
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+            kind, target = parse_address(self.address)
+            if kind == "unix" and os.path.exists(target):
+                os.unlink(target)
+        if getattr(self, "_batcher", None):
+            self._batcher.cancel()
+        self._executor.shutdown(wait=True)
+        if getattr(self.memory, "db", None) is not None:
+            # Buffered access hits + anything still queued on the writer thread
+            self.memory.flush_access_hits()
+            self.memory.db.flush()
+        if self._lock_file:
+            self._lock_file.close()
+
+    # ---------- CONNECTIONS ----------
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.clients += 1
+        self._writers.add(writer)
+        try:
+            while True:
+                try:
+                    request = await _read_frame(reader)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                self.requests += 1
+                op = request.get("op")
+                if op == "ping":
+                    self._reply(writer, request, {"ok": True, "result": "pong"})
+                elif op in self.BATCHED_OPS:
+                    future = asyncio.get_running_loop().create_future()
+                    future.add_done_callback(lambda done, req=request: self._reply(writer, req, done.result()))
+                    await self._queue.put((request, future))
+                else:
+                    self._reply(writer, request, {"ok": False, "error": f"unknown op {op!r}"})
+        finally:
+            self.clients -= 1
+            self.last_client_seen = time.monotonic()
+            self._writers.discard(writer)
+            writer.close()
+
+    @staticmethod
+    def _reply(writer: asyncio.StreamWriter, request: Dict, response: Dict):
+        if request.get("id") is None or writer.is_closing():
+            return
+        response["id"] = request["id"]
+        writer.write(_frame(response))
+
+    # ---------- BATCHING ----------
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            self.batches += 1
+            lexical_only = self._queue.qsize() >= self.lexical_backlog
+            try:
+                responses = await loop.run_in_executor(self._executor, self._run_batch, [r for r, _ in batch],
+                                                       lexical_only)
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"❌ Memory worker batch failed: {e}")
+                responses = [{"ok": False, "error": str(e)}] * len(batch)
+            for (_, future), response in zip(batch, responses):
+                future.set_result(response)
+            self._schedule_consolidation()
+
+    def _schedule_consolidation(self):
+        """Over-budget users get their own executor jobs, so batches keep flowing in between"""
+        consolidator = self.memory.consolidator
+        for user_id in consolidator.users_over_budget(self.memory, self._touched_users):
+            if user_id not in self._consolidating:
+                self._consolidating.add(user_id)
+                asyncio.create_task(self._consolidate(user_id))
+        self._touched_users.clear()
+
+    async def _consolidate(self, user_id: str):
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                self._executor, self.memory.consolidator.consolidate_user, self.memory, user_id)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"❌ Memory consolidation failed for {user_id}: {e}")
+        finally:
+            self._consolidating.discard(user_id)
+
+    def _run_batch(self, requests: List[Dict], lexical_only: bool = False) -> List[Dict]:
+        """Worker thread: one encode for every text in the batch, stores first, then one FAISS search"""
+        memory = self.memory
+        lexical_only = lexical_only and getattr(memory, "fts_enabled", False)
+        texts = []
+        for request in requests:
+            if request["op"] == "search" and not lexical_only:
+                texts.append(request["query"])
+            elif request["op"] == "store":
+                texts.extend(f"User: {item['user_message']} Bot: {item['bot_response']}" for item in request["items"])
+            elif request["op"] == "encode":
+                texts.extend(request["texts"])
+        vectors = memory.encode_batch(texts) if texts else None
+
+        responses: List[Optional[Dict]] = [None] * len(requests)
+        searches, store_rows, store_vectors = [], [], []
+        cursor = 0
+        for position, request in enumerate(requests):
+            op = request["op"]
+            if op == "search" and lexical_only:
+                searches.append((position, request, None))
+            elif op == "search":
+                searches.append((position, request, vectors[cursor]))
+                cursor += 1
+            elif op == "store":
+                for item in request["items"]:
+                    store_rows.append((item["user_id"], item["user_message"], item["bot_response"],
+                                       float(item.get("importance", 1.0))))
+                    store_vectors.append(vectors[cursor])
+                    cursor += 1
+                responses[position] = {"ok": True, "result": len(request["items"])}
+            elif op == "encode":
+                count = len(request["texts"])
+                responses[position] = {"ok": True, "result": vectors[cursor:cursor + count].tolist()}
+                cursor += count
+
+        if store_rows:
+            self._touched_users.update(memory.store_vectors(store_rows, store_vectors))
+
+        for position, request in enumerate(requests):
+            # After the stores, so a client sees its own writes
+            if request["op"] == "stats":
+                responses[position] = {"ok": True, "result": self.get_stats(request.get("user_id"))}
+            elif request["op"] == "consolidate":
+                user_id = request.get("user_id")
+                result = (memory.consolidator.consolidate_user(memory, user_id) if user_id
+                          else memory.consolidator.consolidate_all(memory))
+                responses[position] = {"ok": True, "result": result}
+
+        if lexical_only:
+            self.lexical_searches += len(searches)
+            for position, request, _ in searches:
+                responses[position] = {"ok": True, "result": memory.search_lexical(
+                    request["user_id"], request["query"], int(request.get("top_k", 5)))}
+            return responses
+
+        # One FAISS call per distinct MMR setting (normally just one)
+        for diversity in {request.get("diversity") for _, request, _ in searches}:
+            group = [search for search in searches if search[1].get("diversity") == diversity]
+            top_k = max(int(request.get("top_k", 5)) for _, request, _ in group)
+            results = memory.search_vectors([request["user_id"] for _, request, _ in group],
+                                            [vector for _, _, vector in group], top_k, diversity,
+                                            [request["query"] for _, request, _ in group])
+            for (position, request, _), memories in zip(group, results):
+                responses[position] = {"ok": True, "result": memories[:int(request.get("top_k", 5))]}
+        return responses
+
+    def get_stats(self, user_id: Optional[str] = None) -> Dict:
+        stats = {
+            "available": True,
+            "address": self.address,
+            "memories": self.memory.index.ntotal if self.memory.index else 0,
+            "quantization": getattr(self.memory, "quantization", "flat"),
+            "clients": self.clients,
+            "requests": self.requests,
+            "batches": self.batches,
+            "avg_batch": round(self.requests / self.batches, 2) if self.batches else 0.0,
+            "errors": self.errors,
+            "lexical_searches": self.lexical_searches,
+            "uptime_s": round(time.time() - self.started_at, 1),
+            "consolidation": self.memory.consolidator.get_stats(),
+        }
+        if user_id:
+            stats.update(self.memory.get_memory_stats(user_id))
+        return stats
+
+
+# ---------- CLIENT (bot shards) ----------
+class MemoryWorkerClient:
+    """Drop-in for SemanticMemorySystem that forwards to the worker process.
+
+    Never blocks the bot: until the worker is reachable, searches fall back to
+    read-only FTS5 keyword search on the database and stores wait in a bounded buffer. A lost connection is retried
+    with backoff, and with `autostart` the worker is (re)spawned if it isn't running.
+    """
+
+    def __init__(self, address: str = DEFAULT_ADDRESS, autostart: Optional[bool] = None,
+                 timeout: float = 3.0, max_pending_stores: int = 1000, max_backoff: float = 30.0,
+                 db_path: str = "melody_memory.db"):
+        from brain.memory_systems.lexical_search import LexicalMemoryReader
+        self.address = address
+        self.autostart = (os.getenv("MELODY_MEMORY_WORKER_AUTOSTART", "1") == "1"
+                          if autostart is None else autostart)
+        self.timeout = timeout
+        self.max_backoff = max_backoff
+        self.pending_stores = deque(maxlen=max_pending_stores)
+        self.lexical = LexicalMemoryReader(db_path)
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._inflight: Dict[int, asyncio.Future] = {}
+        self._next_id = 0
+        self._task: Optional[asyncio.Task] = None
+        self._process: Optional[subprocess.Popen] = None
+        self._closed = False
+        self.fallback_searches = 0
+        self.dropped_stores = 0
+        self.reconnects = 0
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    # ---------- CONNECTION MANAGEMENT ----------
+    def _ensure_started(self):
+        if self._task is None and not self._closed:
+            self._task = asyncio.create_task(self._connect_loop())
+
+    def _spawn_worker(self):
+        if self._process is not None and self._process.poll() is None:
+            return  # still starting up (loading the model)
+        command = [sys.executable, os.path.abspath(__file__), "--address", self.address, "--idle-exit", "300"]
+        self._process = subprocess.Popen(command, cwd=os.getcwd(), start_new_session=(os.name != "nt"))
+        logger.info(f"🚀 Started memory worker (pid {self._process.pid})")
+
+    async def _connect_loop(self):
+        delay = 0.5
+        while not self._closed:
+            try:
+                reader, writer = await _open_connection(self.address)
+            except OSError:
+                if self.autostart:
+                    self._spawn_worker()
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_backoff)
+                continue
+
+            delay = 0.5
+            self._writer = writer
+            logger.info(f"✅ Connected to memory worker at {self.address}")
+            await self._flush_pending_stores()
+            try:
+                while True:
+                    response = await _read_frame(reader)
+                    future = self._inflight.pop(response.get("id"), None)
+                    if future and not future.done():
+                        future.set_result(response)
+            except (asyncio.IncompleteReadError, ConnectionError, OSError):
+                pass
+            finally:
+                self._writer = None
+                writer.close()
+                for future in self._inflight.values():
+                    if not future.done():
+                        future.set_exception(ConnectionError("memory worker connection lost"))
+                self._inflight.clear()
+            if not self._closed:
+                self.reconnects += 1
+                logger.warning("⚠️ Memory worker connection lost - reconnecting")
+
+    async def _flush_pending_stores(self):
+        if self.pending_stores and self.connected:
+            items = list(self.pending_stores)
+            self.pending_stores.clear()
+            self._writer.write(_frame({"op": "store", "items": items}))
+            await self._writer.drain()
+            logger.info(f"💾 Flushed {len(items)} buffered memories to the worker")
+
+    async def _call(self, op: str, **payload) -> Any:
+        """Request/response round trip; raises ConnectionError when the worker isn't reachable"""
+        self._ensure_started()
+        if not self.connected:
+            raise ConnectionError("memory worker not connected")
+        self._next_id += 1
+        request_id = self._next_id
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[request_id] = future
+        try:
+            self._writer.write(_frame({"id": request_id, "op": op, **payload}))
+            response = await asyncio.wait_for(future, self.timeout)
+        finally:
+            self._inflight.pop(request_id, None)
+        if not response.get("ok"):
+            raise RuntimeError(response.get("error", "memory worker error"))
+        return response["result"]
+
+    # ---------- SemanticMemorySystem INTERFACE ----------
+    @traced("memory.store")
+    async def store_conversation(self, user_id: str, user_message: str, bot_response: str, importance: float = 1.0):
+        """Fire-and-forget: the reply never waits on the embedding"""
+        self._ensure_started()
+        item = {"user_id": user_id, "user_message": user_message, "bot_response": bot_response,
+                "importance": importance}
+        if not self.connected:
+            if len(self.pending_stores) == self.pending_stores.maxlen:
+                self.dropped_stores += 1
+            self.pending_stores.append(item)
+            return
+        self._writer.write(_frame({"op": "store", "items": [item]}))
+
+    @traced("memory.search")
+    async def search_relevant_memories(self, user_id: str, query: str, top_k: int = 5,
+                                       diversity: Optional[float] = None) -> List[Dict[str, Any]]:
+        from brain.memory_systems.semantic_memory import cached_search, remember_search, request_cache_key
+        cache_key = request_cache_key(user_id, query, top_k, diversity)
+        cached = cached_search(cache_key)
+        if cached is not None:
+            return cached
+        try:
+            results = await self._call("search", user_id=user_id, query=query, top_k=top_k, diversity=diversity)
+        except (ConnectionError, asyncio.TimeoutError, RuntimeError) as e:
+            self.fallback_searches += 1
+            logger.debug(f"⚠️ Memory worker unavailable, keyword search only: {e or type(e).__name__}")
+            return await asyncio.get_running_loop().run_in_executor(
+                None, self.lexical.search, user_id, query, top_k)
+        remember_search(cache_key, results)
+        return results
+
+    async def get_conversation_context(self, user_id: str, current_message: str) -> str:
+        from brain.memory_systems.semantic_memory import format_memory_context
+        return format_memory_context(await self.search_relevant_memories(user_id, current_message, top_k=3))
+
+    async def get_stats(self, user_id: Optional[str] = None) -> Dict:
+        try:
+            stats = await self._call("stats", user_id=user_id)
+        except (ConnectionError, asyncio.TimeoutError, RuntimeError):
+            stats = {"available": False}
+        stats.update({"pending_stores": len(self.pending_stores), "dropped_stores": self.dropped_stores,
+                      "fallback_searches": self.fallback_searches, "reconnects": self.reconnects})
+        return stats
+
+    async def close(self):
+        """Disconnect - the worker keeps running for the other shards (it exits when idle)"""
+        self._closed = True
+        if self._writer:
+            await self._flush_pending_stores()
+            self._writer.close()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self.lexical.close()
+
+
+def query_worker(op: str, address: str = DEFAULT_ADDRESS, timeout: float = 2.0, **payload) -> Optional[Any]:
+    """Blocking one-shot request for sync callers (the Flask portal). None when the worker is down."""
+    kind, target = parse_address(address)
+    try:
+        sock = socket.create_connection(target, timeout) if kind == "tcp" else socket.socket(socket.AF_UNIX)
+        with sock:
+            if kind == "unix":
+                sock.settimeout(timeout)
+                sock.connect(target)
+            sock.sendall(_frame({"id": 1, "op": op, **payload}))
+            stream = sock.makefile("rb")
+            (length,) = _HEADER.unpack(stream.read(_HEADER.size))
+            response = json.loads(stream.read(length))
+    except (OSError, struct.error, ValueError):
+        return None
+    return response.get("result") if response.get("ok") else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MelodyAI semantic memory worker")
+    parser.add_argument("--address", default=DEFAULT_ADDRESS, help="Unix socket path or host:port")
+    parser.add_argument("--db", default="melody_memory.db", help="semantic memory SQLite file")
+    parser.add_argument("--idle-exit", type=float, default=None,
+                        help="exit after this many seconds without clients (autostarted workers use 300)")
+    args = parser.parse_args()
+    # semantic_memory's module-level instance must not load a second model in this process
+    os.environ["MELODY_MEMORY_WORKER"] = "1"
+    from services.structured_logging import setup_logging, shutdown_logging
+    setup_logging()
+
+    server = MemoryWorkerServer(address=args.address, db_path=args.db, idle_exit=args.idle_exit)
+    if not server.acquire_instance_lock():
+        logger.info(f"ℹ️ A memory worker is already serving {args.address}")
+        return 0
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        logger.error(f"❌ Memory worker failed: {e}")
+        return 1
+    finally:
+        shutdown_logging()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
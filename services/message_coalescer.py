@@ -0,0 +1,88 @@
+# services/message_coalescer.py - PER-CHANNEL AUTO-YAP DEBOUNCE
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger("MelodyBotCore.autoyap")
+
+
+class _PendingBurst:
+    __slots__ = ("messages", "started_at", "last_at", "task")
+
+    def __init__(self, message, now: float):
+        self.messages = [message]
+        self.started_at = now
+        self.last_at = now
+        self.task: Optional[asyncio.Task] = None
+
+
+class ChannelCoalescer:
+    """Folds a burst of channel messages into one generation.
+
+    When a message should get a reply, `schedule()` opens a burst; every further
+    message in that channel passed to `extend()` joins it until the channel has
+    been quiet for `debounce` seconds (capped at `max_wait` from the first
+    message). `on_flush(channel_id, messages)` then runs once for the whole burst.
+    """
+
+    def __init__(self, on_flush: Callable[[int, List], Awaitable], debounce: float = 4.0,
+                 max_wait: float = 12.0):
+        self.on_flush = on_flush
+        self.debounce = debounce
+        self.max_wait = max_wait
+        self._pending: Dict[int, _PendingBurst] = {}
+        self.bursts_flushed = 0
+        self.messages_coalesced = 0
+
+    def extend(self, channel_id: int, message):
+        """Add a message to the channel's pending burst (no-op when nothing is pending)"""
+        burst = self._pending.get(channel_id)
+        if burst:
+            burst.messages.append(message)
+            burst.last_at = time.monotonic()
+
+    def schedule(self, channel_id: int, message) -> bool:
+        """Open a burst for this channel. Returns False if one is already pending."""
+        if channel_id in self._pending:
+            return False
+        burst = _PendingBurst(message, time.monotonic())
+        self._pending[channel_id] = burst
+        burst.task = asyncio.create_task(self._flush_when_quiet(channel_id, burst))
+        return True
+
+    def is_pending(self, channel_id: int) -> bool:
+        return channel_id in self._pending
+
+    async def _flush_when_quiet(self, channel_id: int, burst: _PendingBurst):
+        while True:
+            deadline = min(burst.last_at + self.debounce, burst.started_at + self.max_wait)
+            wait = deadline - time.monotonic()
+            if wait <= 0:
+                break
+            await asyncio.sleep(wait)
+
+        self._pending.pop(channel_id, None)
+        self.bursts_flushed += 1
+        self.messages_coalesced += len(burst.messages)
+        logger.debug(f"🗣️ Auto-yap burst: {len(burst.messages)} message(s) -> 1 reply",
+                     extra={"channel": channel_id, "count": len(burst.messages)})
+        try:
+            await self.on_flush(channel_id, burst.messages)
+        except Exception as e:
+            logger.error(f"❌ Auto-yap flush failed for channel {channel_id}: {e}")
+
+    async def close(self):
+        tasks = [b.task for b in self._pending.values() if b.task]
+        self._pending.clear()
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def get_stats(self) -> Dict:
+        return {
+            "pending_bursts": len(self._pending),
+            "bursts_flushed": self.bursts_flushed,
+            "messages_coalesced": self.messages_coalesced,
+        }
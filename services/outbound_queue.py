@@ -0,0 +1,198 @@
+# services/outbound_queue.py - PER-CHANNEL DISCORD SEND QUEUE
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Dict, Optional
+
+import discord
+
+from services.ai_providers.latency import LatencyHistogram
+from services.ai_providers.rate_limiter import TokenBucket
+
+logger = logging.getLogger("MelodyBotCore.outbound")
+
+DISCORD_MESSAGE_LIMIT = 2000
+
+
+class _Outgoing:
+    __slots__ = ("content", "kwargs", "future", "enqueued_at", "mergeable")
+
+    def __init__(self, content: Optional[str], kwargs: Dict, future: asyncio.Future, mergeable: bool):
+        self.content = content
+        self.kwargs = kwargs
+        self.future = future
+        self.enqueued_at = time.monotonic()
+        self.mergeable = mergeable
+
+
+class _ChannelLane:
+    __slots__ = ("channel", "queue", "bucket", "task")
+
+    def __init__(self, channel, bucket: TokenBucket):
+        self.channel = channel
+        self.queue = deque()
+        self.bucket = bucket
+        self.task: Optional[asyncio.Task] = None
+
+
+class OutboundDispatcher:
+    """Every bot message goes through here instead of `channel.send`.
+
+    Each channel gets its own FIFO lane drained by a short-lived worker. Sends
+    take a token from the channel's bucket (Discord allows ~5 messages per 5s
+    per channel) and from a global bucket before hitting the API, so we queue
+    instead of collecting 429s. Adjacent short plain-text messages waiting in
+    the same lane are merged into one message. A 429 that slips through pauses
+    the lane's bucket for `retry_after` and the message is retried. Lanes that
+    are drained and whose bucket has refilled are dropped on the next sweep.
+    """
+
+    def __init__(self, channel_rate: float = 1.0, channel_burst: int = 5, global_rate: float = 40.0,
+                 merge_max_chars: int = 400, max_retries: int = 3, sweep_interval: float = 30.0):
+        self.channel_rate = channel_rate
+        self.channel_burst = channel_burst
+        self.merge_max_chars = merge_max_chars
+        self.max_retries = max_retries
+        self.global_bucket = TokenBucket(global_rate, int(global_rate))
+        self._lanes: Dict[int, _ChannelLane] = {}
+        self.sweep_interval = sweep_interval
+        self._last_sweep = time.monotonic()
+        self.delivery_latency = LatencyHistogram(window=500, min_samples=1)
+        self.sent = 0
+        self.merged = 0
+        self.rate_limited = 0
+        self.failures = 0
+
+    # ---------- ENQUEUE ----------
+    def send(self, channel, content: Optional[str] = None, *, merge: bool = True, **kwargs) -> asyncio.Future:
+        """Queue a message for `channel`; the returned future resolves to the sent discord.Message.
+
+        kwargs go straight to `channel.send` (embed=, reference=, mention_author=, ...).
+        Only plain text with no extra kwargs is ever merged.
+        """
+        future = asyncio.get_running_loop().create_future()
+        mergeable = merge and not kwargs and content is not None and len(content) <= self.merge_max_chars
+        lane = self._lane(channel)
+        lane.queue.append(_Outgoing(content, kwargs, future, mergeable))
+        if lane.task is None or lane.task.done():
+            lane.task = asyncio.create_task(self._drain(lane))
+        return future
+
+    def _lane(self, channel) -> _ChannelLane:
+        lane = self._lanes.get(channel.id)
+        if lane is None:
+            self._maybe_sweep()
+            lane = _ChannelLane(channel, TokenBucket(self.channel_rate, self.channel_burst))
+            self._lanes[channel.id] = lane
+        else:
+            lane.channel = channel
+        return lane
+
+    def _maybe_sweep(self):
+        """Forget idle lanes - at most once per `sweep_interval`, only when a new lane is needed"""
+        now = time.monotonic()
+        if now - self._last_sweep < self.sweep_interval:
+            return
+        self._last_sweep = now
+        # A lane is only dropped once its bucket is full again, so a new one can't burst past Discord's limit
+        idle = [channel_id for channel_id, lane in self._lanes.items()
+                if not lane.queue and (lane.task is None or lane.task.done()) and lane.bucket.is_full()]
+        for channel_id in idle:
+            del self._lanes[channel_id]
+
+    # ---------- DRAIN ----------
+    def _take_batch(self, lane: _ChannelLane):
+        """Pop the next message plus any short plain-text messages right behind it"""
+        batch = [lane.queue.popleft()]
+        if not batch[0].mergeable:
+            return batch
+        length = len(batch[0].content)
+        while lane.queue and lane.queue[0].mergeable:
+            nxt = lane.queue[0]
+            if length + 1 + len(nxt.content) > DISCORD_MESSAGE_LIMIT:
+                break
+            length += 1 + len(nxt.content)
+            batch.append(lane.queue.popleft())
+        return batch
+
+    async def _drain(self, lane: _ChannelLane):
+        while lane.queue:
+            batch = self._take_batch(lane)
+            content = "\n".join(item.content for item in batch) if len(batch) > 1 else batch[0].content
+            try:
+                sent_message = await self._send_with_retry(lane, content, batch[0].kwargs)
+            except asyncio.CancelledError:
+                # close() cancelled us mid-send - the popped batch has no other way to resolve
+                for item in batch:
+                    if not item.future.done():
+                        item.future.cancel()
+                raise
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"❌ Outbound send to channel {lane.channel.id} failed: {e}")
+                for item in batch:
+                    if not item.future.done():
+                        item.future.set_exception(e)
+                continue
+
+            now = time.monotonic()
+            self.sent += 1
+            self.merged += len(batch) - 1
+            if len(batch) > 1:
+                logger.debug(f"📦 Merged {len(batch)} queued messages into one send",
+                             extra={"channel": lane.channel.id, "count": len(batch)})
+            for item in batch:
+                self.delivery_latency.record(now - item.enqueued_at)
+                if not item.future.done():
+                    item.future.set_result(sent_message)
+
+    async def _send_with_retry(self, lane: _ChannelLane, content: Optional[str], kwargs: Dict):
+        for attempt in range(self.max_retries + 1):
+            await lane.bucket.acquire()
+            await self.global_bucket.acquire()
+            try:
+                return await lane.channel.send(content, **kwargs)
+            except discord.HTTPException as e:
+                if e.status != 429 or attempt == self.max_retries:
+                    raise
+                retry_after = getattr(e, "retry_after", None) or 1.0
+                self.rate_limited += 1
+                lane.bucket.pause(retry_after)
+                logger.warning(f"⏳ Discord 429 in channel {lane.channel.id}, retrying in {retry_after:.1f}s")
+
+    # ---------- LIFECYCLE ----------
+    async def flush(self):
+        """Wait until every lane is empty"""
+        tasks = [lane.task for lane in self._lanes.values() if lane.task and not lane.task.done()]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def close(self, timeout: float = 5.0):
+        """Give queued messages a moment to go out, then drop the rest"""
+        try:
+            await asyncio.wait_for(self.flush(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("⚠️ Outbound queue closed with messages still pending")
+        for lane in self._lanes.values():
+            if lane.task and not lane.task.done():
+                lane.task.cancel()
+            while lane.queue:
+                item = lane.queue.popleft()
+                if not item.future.done():
+                    item.future.cancel()
+
+    def get_stats(self) -> Dict:
+        return {
+            "sent": self.sent,
+            "merged": self.merged,
+            "rate_limited": self.rate_limited,
+            "failures": self.failures,
+            "queued": sum(len(lane.queue) for lane in self._lanes.values()),
+            "channels": len(self._lanes),
+            "delivery_latency": self.delivery_latency.get_stats(),
+        }
+
+
+# Global instance
+outbound = OutboundDispatcher()
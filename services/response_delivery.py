@@ -0,0 +1,81 @@
+# services/response_delivery.py - REPLY-FIRST DELIVERY + 2000 CHAR CHUNKING
+import logging
+from typing import List
+
+import asyncio
+
+import discord
+
+from services.outbound_queue import outbound
+from services.tracing import tracer
+
+logger = logging.getLogger("MelodyBotCore")
+
+DISCORD_MESSAGE_LIMIT = 2000
+_FENCE = "```"
+
+
+def chunk_message(text: str, limit: int = DISCORD_MESSAGE_LIMIT) -> List[str]:
+    """Split text into Discord-sized pieces.
+
+    Prefers paragraph, then line, then word boundaries, and hard-cuts only a
+    single unbroken run longer than `limit`. A code block that gets split is
+    closed at the end of one chunk and reopened at the start of the next.
+    """
+    text = text.strip()
+    if len(text) <= limit:
+        return [text] if text else []
+
+    chunks = []
+    reopen = ""  # fence header to carry into the next chunk (e.g. "```py\n")
+    while text:
+        budget = limit - len(reopen)
+        if len(text) <= budget:
+            chunks.append(reopen + text)
+            break
+
+        # Leave room to close a code block we might end up inside
+        window = text[:budget - len(_FENCE) - 1]
+        cut = 0
+        for separator in ("\n\n", "\n", " "):
+            idx = window.rfind(separator)
+            if idx > budget // 4:
+                cut = idx
+                break
+        if not cut:
+            cut = len(window)
+
+        piece, text = window[:cut].rstrip(), text[cut:].lstrip()
+        piece = reopen + piece
+
+        # Odd number of fences -> we're inside a code block at the cut
+        reopen = ""
+        if piece.count(_FENCE) % 2 == 1:
+            header = piece[piece.rfind(_FENCE):].split("\n", 1)[0]
+            piece += "\n" + _FENCE
+            reopen = header + "\n"
+        chunks.append(piece)
+
+    return chunks
+
+
+async def deliver_reply(message: discord.Message, text: str, mention_author: bool = False) -> List[discord.Message]:
+    """Answer `message` with one REST call per 2000 chars - no placeholder to post and delete.
+
+    The first chunk is a reply (keeps the thread context), the rest follow as
+    plain channel messages. All of them go through the outbound queue, which
+    keeps them in order.
+    """
+    chunks = chunk_message(text)
+    with tracer.span("deliver", chunks=len(chunks)):
+        futures = []
+        for index, chunk in enumerate(chunks):
+            if index == 0:
+                futures.append(outbound.send(message.channel, chunk, reference=message,
+                                             mention_author=mention_author))
+            else:
+                futures.append(outbound.send(message.channel, chunk, merge=False))
+        sent = list(await asyncio.gather(*futures))
+    if len(sent) > 1:
+        logger.info(f"✂️ Long reply split into {len(sent)} messages")
+    return sent
@@ -0,0 +1,134 @@
+# services/shared_state.py - STATE SHARED BY EVERY SHARD PROCESS
+# Per-user JSON rows in one SQLite file in WAL mode. Readers never block; writers
+# take SQLite's write lock for one tiny read-modify-write transaction, so two
+# shard processes updating the same user can't lose each other's changes.
+import json
+import logging
+import os
+import time
+from typing import Callable, Dict, Optional
+
+from services.async_db import get_database
+
+logger = logging.getLogger("MelodyBotCore.shared_state")
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_STATE_DB = os.getenv("MELODY_STATE_DB", os.path.join(ROOT_DIR, "melody_state.db"))
+
+UPSERT = ('INSERT INTO shared_state (namespace, key, value, updated_at) VALUES (?, ?, ?, ?) '
+          'ON CONFLICT(namespace, key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at')
+SELECT_ONE = 'SELECT value FROM shared_state WHERE namespace = ? AND key = ?'
+SELECT_ALL = 'SELECT key, value FROM shared_state WHERE namespace = ?'
+
+
+class SharedStateStore:
+    """namespace/key -> JSON value store that several processes can use at once.
+
+        store.update("relationships", user_id, lambda data: {...})
+
+    `update` runs the callback on the async_db writer thread inside BEGIN IMMEDIATE,
+    so it always sees the latest committed value and nobody else can write in between.
+    Reads come from the read-only pool and never wait for a writer. The *_async
+    variants are for the event loop; the plain ones block the calling thread.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_STATE_DB):
+        self.db_path = db_path
+        self.db = get_database(db_path)
+        self.db.write_sync(lambda conn: conn.execute('''
+            CREATE TABLE IF NOT EXISTS shared_state (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+        '''))
+        self.reads = 0
+        self.writes = 0
+
+    def get(self, namespace: str, key: str) -> Optional[Dict]:
+        row = self.db.fetchone_sync(SELECT_ONE, (namespace, key))
+        self.reads += 1
+        return json.loads(row[0]) if row else None
+
+    async def get_async(self, namespace: str, key: str) -> Optional[Dict]:
+        row = await self.db.fetchone(SELECT_ONE, (namespace, key))
+        self.reads += 1
+        return json.loads(row[0]) if row else None
+
+    def get_all(self, namespace: str) -> Dict[str, Dict]:
+        rows = self.db.fetchall_sync(SELECT_ALL, (namespace,))
+        self.reads += 1
+        return {key: json.loads(value) for key, value in rows}
+
+    async def get_all_async(self, namespace: str) -> Dict[str, Dict]:
+        rows = await self.db.fetchall(SELECT_ALL, (namespace,))
+        self.reads += 1
+        return {key: json.loads(value) for key, value in rows}
+
+    def put(self, namespace: str, key: str, value: Dict):
+        self.db.execute_sync(UPSERT, (namespace, key, json.dumps(value, ensure_ascii=False), time.time()))
+        self.writes += 1
+
+    def update(self, namespace: str, key: str, mutate: Callable[[Optional[Dict]], Dict]) -> Dict:
+        """Atomically replace a value with mutate(current). current is None for a new key."""
+        # An exception in mutate() rolls back just this update's savepoint
+        value = self.db.write_sync(self._updater(namespace, key, mutate))
+        self.writes += 1
+        return value
+
+    async def update_async(self, namespace: str, key: str, mutate: Callable[[Optional[Dict]], Dict]) -> Dict:
+        """update() for the event loop - mutate() still runs on the writer thread"""
+        value = await self.db.write(self._updater(namespace, key, mutate))
+        self.writes += 1
+        return value
+
+    @staticmethod
+    def _updater(namespace: str, key: str, mutate: Callable[[Optional[Dict]], Dict]):
+        def apply(conn):
+            row = conn.execute(SELECT_ONE, (namespace, key)).fetchone()
+            value = mutate(json.loads(row[0]) if row else None)
+            conn.execute(UPSERT, (namespace, key, json.dumps(value, ensure_ascii=False), time.time()))
+            return value
+        return apply
+
+    def seed(self, namespace: str, values: Dict[str, Dict]) -> int:
+        """One-time import (e.g. from the old JSON files); keys that already exist win"""
+        with_timestamp = [(namespace, key, json.dumps(value, ensure_ascii=False), time.time())
+                          for key, value in values.items()]
+
+        def insert(conn):
+            before = conn.total_changes
+            conn.executemany(
+                'INSERT OR IGNORE INTO shared_state (namespace, key, value, updated_at) VALUES (?, ?, ?, ?)',
+                with_timestamp
+            )
+            return conn.total_changes - before
+        return self.db.write_sync(insert)
+
+    def count(self, namespace: str) -> int:
+        return self.db.fetchone_sync('SELECT COUNT(*) FROM shared_state WHERE namespace = ?', (namespace,))[0]
+
+    def get_stats(self) -> Dict:
+        return {"db_path": self.db_path, "reads": self.reads, "writes": self.writes, "db": self.db.get_stats()}
+
+    def close(self):
+        self.db.close()
+
+
+_store: Optional[SharedStateStore] = None
+
+
+def shared_state_enabled() -> bool:
+    """The shard launcher turns this on for every process it starts"""
+    return os.getenv("MELODY_SHARED_STATE", "0") == "1"
+
+
+def get_shared_store() -> Optional[SharedStateStore]:
+    """The process-wide store when shared state is on, else None (single-process JSON files)"""
+    global _store
+    if _store is None and shared_state_enabled():
+        _store = SharedStateStore(os.getenv("MELODY_STATE_DB", DEFAULT_STATE_DB))
+        logger.info(f"🗄️ Shared state store: {_store.db_path}")
+    return _store
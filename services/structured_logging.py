@@ -0,0 +1,155 @@
+# services/structured_logging.py - QUEUED, LEVELED, STRUCTURED LOGGING
+# Handlers on the event loop thread only drop records into a queue; a listener
+# thread does the formatting and the actual stdout writes.
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+from typing import Dict, Optional
+
+ROOT_LOGGER = "MelodyBotCore"
+
+# extra={...} keys that end up as top-level JSON fields
+STRUCTURED_FIELDS = ("user", "guild", "channel", "stage", "latency_ms", "priority", "count")
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_sampler: Optional["DebugSampler"] = None
+
+
+class DebugSampler(logging.Filter):
+    """Keeps the first DEBUG record from each call site, then 1 in `every`.
+
+    INFO and above always pass. Sampling is per (logger, line) so one chatty
+    loop can't hide a rare debug line somewhere else.
+    """
+
+    def __init__(self, every: int = 10):
+        super().__init__()
+        self.every = max(1, every)
+        self._counts: Dict[tuple, int] = {}
+        self.dropped = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.every == 1:
+            return True
+        key = (record.name, record.lineno)
+        count = self._counts.get(key, 0)
+        self._counts[key] = count + 1
+        if count % self.every == 0:
+            return True
+        self.dropped += 1
+        return False
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line - ts, level, logger, msg plus any structured fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for field in STRUCTURED_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info and not record.exc_text:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable line with the structured fields appended as key=value"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s", "%H:%M:%S")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = [f"{field}={getattr(record, field)}" for field in STRUCTURED_FIELDS
+                  if getattr(record, field, None) is not None]
+        return f"{line} [{' '.join(fields)}]" if fields else line
+
+
+def _parse_module_levels(spec: str) -> Dict[str, str]:
+    """"facts=DEBUG,deepseek=WARNING" -> {"MelodyBotCore.facts": "DEBUG", ...}"""
+    levels = {}
+    for part in spec.split(","):
+        if "=" not in part:
+            continue
+        name, level = (piece.strip() for piece in part.split("=", 1))
+        if not name.startswith(ROOT_LOGGER) and "." not in name:
+            name = f"{ROOT_LOGGER}.{name}"
+        levels[name] = level.upper()
+    return levels
+
+
+def setup_logging(level: Optional[str] = None, json_output: Optional[bool] = None,
+                  module_levels: Optional[Dict[str, str]] = None, debug_sample_every: Optional[int] = None,
+                  stream=None) -> logging.handlers.QueueListener:
+    """Route every record through a QueueHandler; safe to call more than once.
+
+    Defaults come from LOG_LEVEL, LOG_FORMAT (text/json), LOG_LEVELS
+    ("facts=DEBUG,deepseek=WARNING") and LOG_DEBUG_SAMPLE.
+    """
+    global _listener, _sampler
+    shutdown_logging()
+
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    if json_output is None:
+        json_output = os.getenv("LOG_FORMAT", "text").lower() == "json"
+    if module_levels is None:
+        module_levels = _parse_module_levels(os.getenv("LOG_LEVELS", ""))
+    if debug_sample_every is None:
+        debug_sample_every = int(os.getenv("LOG_DEBUG_SAMPLE", "10"))
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter() if json_output else TextFormatter())
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    _sampler = DebugSampler(debug_sample_every)
+    queue_handler.addFilter(_sampler)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(logging.WARNING)  # third-party libraries stay quiet
+    logging.getLogger(ROOT_LOGGER).setLevel(level)
+    logging.getLogger("CommandSystem").setLevel(level)
+    for name, module_level in module_levels.items():
+        logging.getLogger(name).setLevel(module_level)
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def shutdown_logging():
+    """Flush whatever is still queued and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_logging_stats() -> Dict:
+    return {
+        "listener_running": _listener is not None,
+        "debug_dropped": _sampler.dropped if _sampler else 0,
+    }
+
+
+def elapsed_ms(started: float) -> float:
+    """latency_ms field value for a time.perf_counter() start"""
+    return round((time.perf_counter() - started) * 1000, 1)
+
+
+atexit.register(shutdown_logging)
@@ -0,0 +1,282 @@
+# services/tracing.py - PER-MESSAGE LATENCY SPANS
+# One trace per incoming message; every stage of the pipeline opens a child span
+# through the same `tracer`. The current span lives in a ContextVar, so nothing
+# has to be passed down the call chain.
+import contextvars
+import functools
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+from services.ai_providers.latency import LatencyHistogram
+
+logger = logging.getLogger("MelodyBotCore.tracing")
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_TRACE_FILE = os.getenv("MELODY_TRACE_FILE") or os.path.join(ROOT_DIR, "traces.jsonl")
+# Writing every trace to disk is opt-in (MELODY_TRACE_EXPORT=1 or an explicit MELODY_TRACE_FILE);
+# the in-memory stage histograms behind get_stats() are always on
+TRACE_EXPORT = os.getenv("MELODY_TRACE_EXPORT", "0") == "1" or bool(os.getenv("MELODY_TRACE_FILE"))
+TRACE_FILE_MAX_BYTES = int(os.getenv("MELODY_TRACE_MAX_BYTES", str(10 * 1024 * 1024)))
+TRACE_FILE_BACKUPS = 3
+
+_UNSAMPLED = object()  # context marker: the root wasn't sampled, so children are no-ops too
+_current_span: contextvars.ContextVar = contextvars.ContextVar("melody_current_span", default=None)
+
+
+class _Trace:
+    __slots__ = ("trace_id", "started_at", "spans", "finished")
+
+    def __init__(self, trace_id: int):
+        self.trace_id = trace_id
+        self.started_at = time.time()
+        self.spans: List["Span"] = []
+        self.finished = False
+
+
+class Span:
+    __slots__ = ("name", "trace", "index", "parent", "start", "duration_ms", "attrs")
+
+    def __init__(self, name: str, trace: _Trace, parent: Optional["Span"], attrs: Dict):
+        self.name = name
+        self.trace = trace
+        self.index = len(trace.spans)
+        self.parent = parent
+        self.start = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+        self.attrs = attrs
+        trace.spans.append(self)
+
+    def set(self, **attrs):
+        """Attach attributes discovered while the span is open (attempt counts, hit sizes...)"""
+        self.attrs.update(attrs)
+
+
+class _NoopSpan:
+    """Returned when tracing is off or the trace wasn't sampled - costs one attribute lookup"""
+    __slots__ = ()
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class _SpanScope:
+    __slots__ = ("tracer", "span", "token")
+
+    def __init__(self, tracer: "Tracer", span):
+        self.tracer = tracer
+        self.span = span  # a Span, or _UNSAMPLED for a skipped root
+        self.token = None
+
+    def __enter__(self):
+        self.token = _current_span.set(self.span)
+        return self.span if self.span is not _UNSAMPLED else NOOP_SPAN
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_span.reset(self.token)
+        if self.span is not _UNSAMPLED:
+            if exc_type is not None:
+                self.span.attrs["error"] = exc_type.__name__
+            self.tracer._finish(self.span)
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, *exc):
+        return self.__exit__(*exc)
+
+
+class _JsonlExporter:
+    """Writes finished traces on a listener thread, same pattern as the log pipeline.
+    The file rotates at `max_bytes`, keeping `backups` old files."""
+
+    def __init__(self, path: str, max_bytes: int = TRACE_FILE_MAX_BYTES, backups: int = TRACE_FILE_BACKUPS):
+        self.path = path
+        self._queue = queue.SimpleQueue()
+        handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups,
+                                                       encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        self._listener = logging.handlers.QueueListener(self._queue, handler)
+        self._logger = logging.getLogger("MelodyBotCore.tracing.export")
+        self._logger.propagate = False
+        self._logger.handlers = [logging.handlers.QueueHandler(self._queue)]
+        self._logger.setLevel(logging.INFO)
+        self._listener.start()
+
+    def export(self, entry: Dict):
+        self._logger.info(json.dumps(entry, ensure_ascii=False, default=str))
+
+    def close(self):
+        self._listener.stop()
+        for handler in self._listener.handlers:
+            handler.close()
+
+
+class Tracer:
+    """Context-var span API with a no-op mode.
+
+        with tracer.span("memory.search", top_k=3):
+            ...
+
+    A span opened with no active parent starts a new trace. When a root span
+    ends, the whole trace is written as one JSONL line and each span's duration
+    goes into a per-stage histogram for `get_stats()`.
+    """
+
+    def __init__(self, enabled: Optional[bool] = None, sample_rate: Optional[float] = None,
+                 export_path: Optional[str] = DEFAULT_TRACE_FILE if TRACE_EXPORT else None, window: int = 500):
+        if enabled is None:
+            enabled = os.getenv("MELODY_TRACING", "1") != "0"
+        if sample_rate is None:
+            sample_rate = float(os.getenv("MELODY_TRACE_SAMPLE", "1.0"))
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.export_path = export_path
+        self.window = window
+        self.stages: Dict[str, LatencyHistogram] = {}
+        self.traces = 0
+        self._ids = itertools.count(1)
+        self._exporter: Optional[_JsonlExporter] = None
+
+    def span(self, name: str, **attrs):
+        if not self.enabled:
+            return NOOP_SPAN
+        parent = _current_span.get()
+        if parent is _UNSAMPLED:
+            return NOOP_SPAN
+        if parent is None or parent.trace.finished:
+            # Background work that outlived its message starts a trace of its own
+            if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+                return _SpanScope(self, _UNSAMPLED)
+            return _SpanScope(self, Span(name, _Trace(next(self._ids)), None, attrs))
+        return _SpanScope(self, Span(name, parent.trace, parent, attrs))
+
+    def current(self):
+        span = _current_span.get()
+        return span if isinstance(span, Span) else NOOP_SPAN
+
+    def _finish(self, span: Span):
+        elapsed = time.perf_counter() - span.start
+        span.duration_ms = round(elapsed * 1000, 2)
+        histogram = self.stages.get(span.name)
+        if histogram is None:
+            histogram = self.stages[span.name] = LatencyHistogram(window=self.window, min_samples=1)
+        histogram.record(elapsed)
+
+        if span.parent is None:
+            span.trace.finished = True
+            self.traces += 1
+            self._export(span.trace)
+
+    def _export(self, trace: _Trace):
+        if not self.export_path:
+            return
+        if self._exporter is None:
+            try:
+                self._exporter = _JsonlExporter(self.export_path)
+            except OSError as e:
+                logger.warning(f"⚠️ Trace export disabled: {e}")
+                self.export_path = None
+                return
+        root = trace.spans[0]
+        self._exporter.export({
+            "trace_id": trace.trace_id,
+            "ts": round(trace.started_at, 3),
+            "root": root.name,
+            "duration_ms": root.duration_ms,
+            "attrs": root.attrs,
+            "spans": [
+                {
+                    "name": s.name,
+                    "parent": s.parent.index if s.parent else None,
+                    "offset_ms": round((s.start - root.start) * 1000, 2),
+                    "duration_ms": s.duration_ms,
+                    **({"attrs": s.attrs} if s.attrs else {}),
+                }
+                for s in trace.spans if s.duration_ms is not None
+            ],
+        })
+
+    def get_stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "traces": self.traces,
+            "stages": {name: hist.get_stats() for name, hist in sorted(self.stages.items())},
+        }
+
+    def reset(self):
+        """Forget the per-stage histograms (the load harness measures one run at a time)"""
+        self.stages.clear()
+        self.traces = 0
+
+    def close(self):
+        if self._exporter:
+            self._exporter.close()
+            self._exporter = None
+
+
+def traced(name: str):
+    """Decorator form of `tracer.span(name)` for async methods"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with tracer.span(name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def summarize_trace_file(path: str = DEFAULT_TRACE_FILE, last: int = 500) -> Dict:
+    """Per-stage percentiles over the last `last` exported traces (for the web portal)"""
+    lines = deque(maxlen=last)
+    # Right after a rollover the live file is short - top up from the newest backup
+    for candidate in (f"{path}.1", path):
+        try:
+            with open(candidate, "r", encoding="utf-8") as f:
+                lines.extend(f)
+        except OSError:
+            continue
+    if not lines:
+        return {"traces": 0, "stages": {}}
+
+    stages: Dict[str, LatencyHistogram] = {}
+    traces = 0
+    for line in lines:
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue
+        traces += 1
+        for span in entry.get("spans", []):
+            hist = stages.get(span["name"])
+            if hist is None:
+                hist = stages[span["name"]] = LatencyHistogram(window=last * 4, min_samples=1)
+            hist.record(span["duration_ms"] / 1000)
+    return {"traces": traces, "stages": {name: hist.get_stats() for name, hist in sorted(stages.items())}}
+
+
+# Global instance
+tracer = Tracer()
@@ -0,0 +1,77 @@
+# melody_ai_v2/test/fake_deepseek_server.py
+# Local stand-in for DeepSeek's /chat/completions with injectable latency + errors
+import asyncio
+import random
+from typing import Optional
+
+from aiohttp import web
+
+
+class FakeDeepSeekServer:
+    """Tiny aiohttp server that speaks just enough of the DeepSeek API.
+
+    `latency` is either a number of seconds or a callable(request_number) -> seconds,
+    so tests can make e.g. only the first request slow.
+    """
+
+    def __init__(self, latency=0.0, error_rate: float = 0.0, error_status: int = 500,
+                 retry_after: Optional[str] = None, seed: int = 42):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self.completed = 0
+        self.payloads = []
+        self._runner: Optional[web.AppRunner] = None
+        self.base_url = ""
+
+    def _latency_for(self, request_number: int) -> float:
+        if callable(self.latency):
+            return self.latency(request_number)
+        return self.latency
+
+    async def _chat_completions(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        request_number = self.requests
+        payload = await request.json()
+        self.payloads.append(payload)
+
+        await asyncio.sleep(self._latency_for(request_number))
+
+        if self.rng.random() < self.error_rate:
+            headers = {"Retry-After": self.retry_after} if self.retry_after else {}
+            return web.Response(status=self.error_status, text="fake error", headers=headers)
+
+        self.completed += 1
+        prompt_chars = sum(len(m.get("content", "")) for m in payload.get("messages", []))
+        return web.json_response({
+            "choices": [{"message": {"role": "assistant",
+                                     "content": f"OMG HII BESTIE!! 💫 fake reply #{request_number}"}}],
+            "usage": {"prompt_tokens": prompt_chars // 4, "completion_tokens": 12,
+                      "total_tokens": prompt_chars // 4 + 12},
+        })
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        app = web.Application()
+        app.router.add_post("/chat/completions", self._chat_completions)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        bound_port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://{host}:{bound_port}"
+        return self.base_url
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.stop()
@@ -0,0 +1,95 @@
+# melody_ai_v2/test/fake_discord.py
+# Offline stand-in for Discord's message endpoints - channels record every send
+# and answer with a real discord.HTTPException(429) when their bucket is exceeded
+import asyncio
+import contextlib
+import time
+from collections import deque
+from types import SimpleNamespace
+
+import discord
+
+
+class FakeRateLimited(discord.HTTPException):
+    def __init__(self, retry_after: float):
+        response = SimpleNamespace(status=429, reason="Too Many Requests")
+        super().__init__(response, {"code": 0, "message": "You are being rate limited."})
+        self.retry_after = retry_after
+
+
+class FakeUser:
+    """Just the bits of discord.User the message path reads"""
+
+    def __init__(self, user_id: int, name: str, bot: bool = False):
+        self.id = user_id
+        self.name = name
+        self.display_name = name
+        self.bot = bot
+        self.mention = f"<@{user_id}>"
+
+    def mentioned_in(self, message) -> bool:
+        return message.mention_everyone or any(user.id == self.id for user in message.mentions)
+
+    def __str__(self):
+        return self.name
+
+
+class FakeGuild:
+    def __init__(self, guild_id: int = 1, name: str = "Fake Server"):
+        self.id = guild_id
+        self.name = name
+
+
+BOT_AUTHOR = FakeUser(0, "MelodyAI", bot=True)
+
+
+class FakeMessage:
+    _next_id = 1
+
+    def __init__(self, channel, content=None, embed=None, reference=None, author=None, mentions=()):
+        self.id = FakeMessage._next_id
+        FakeMessage._next_id += 1
+        self.channel = channel
+        self.guild = getattr(channel, "guild", None)
+        self.content = content
+        self.embed = embed
+        self.reference = reference
+        self.author = author or BOT_AUTHOR
+        self.mentions = list(mentions)
+        self.mention_everyone = False
+
+    async def reply(self, content=None, **kwargs):
+        return await self.channel.send(content, reference=self, **kwargs)
+
+
+class FakeChannel:
+    """Text channel with a Discord-style bucket: `limit` sends per `per` seconds"""
+
+    def __init__(self, channel_id: int = 1, limit: int = 5, per: float = 5.0, latency: float = 0.0, guild=None):
+        self.id = channel_id
+        self.name = f"fake-{channel_id}"
+        self.guild = guild
+        self.limit = limit
+        self.per = per
+        self.latency = latency
+        self.sent = []
+        self.rejected = 0
+        self._window = deque()
+
+    @contextlib.asynccontextmanager
+    async def typing(self):
+        yield
+
+    async def send(self, content=None, *, embed=None, reference=None, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        now = time.monotonic()
+        while self._window and now - self._window[0] >= self.per:
+            self._window.popleft()
+        if len(self._window) >= self.limit:
+            self.rejected += 1
+            raise FakeRateLimited(self.per - (now - self._window[0]))
+        self._window.append(now)
+        message = FakeMessage(self, content, embed, reference)
+        self.sent.append(message)
+        return message
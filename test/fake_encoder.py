@@ -0,0 +1,18 @@
+# melody_ai_v2/test/fake_encoder.py
+# Deterministic bag-of-words encoder with SentenceTransformer's encode() shape -
+# keeps the MiniLM model out of FAISS/bookkeeping tests and benchmarks
+import numpy as np
+
+
+class WordEncoder:
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+        self.calls = 0
+
+    def encode(self, texts):
+        self.calls += 1
+        vectors = np.zeros((len(texts), self.dim), dtype="float32")
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                vectors[row, sum(map(ord, word)) % self.dim] += 1.0
+        return vectors
@@ -0,0 +1,339 @@
+# melody_ai_v2/test/load_harness.py
+# 🏋️ Offline load test - the canonical performance benchmark.
+# Synthetic users × channels are replayed at a fixed rate into
+# EnhancedMelodyBotCore.on_message. DeepSeek is FakeDeepSeekServer, Discord
+# sends land on FakeChannel (with Discord's per-channel bucket), so no token,
+# API key or network is needed and every run with the same seed sends the
+# same messages.
+#
+#   python test/load_harness.py --users 50 --channels 5 --rate 10 --duration 30
+#
+# With --shard-count/--shard-id each process only receives the guilds Discord
+# would route to that shard; point several at one --state-db to load-test a
+# multi-process deployment.
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Dict, List, Optional
+
+# Ensure root + launch/ are in Python path (main.py imports bot_core directly).
+# Root goes first so `test.` is this folder, not the stdlib test package.
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root_dir)
+sys.path.append(os.path.join(root_dir, "launch"))
+
+from services.ai_providers.latency import LatencyHistogram
+from test.fake_deepseek_server import FakeDeepSeekServer
+from test.fake_discord import FakeChannel, FakeGuild, FakeMessage, FakeUser
+from launch.sharding import shard_for_guild
+
+RESULTS_DIR = os.path.join(root_dir, "test_results")
+
+# Mix of small talk, fact-bearing lines and auto-yap trigger words
+MESSAGE_CORPUS = [
+    "hey how's your day going?",
+    "my name is {name} btw",
+    "I love playing league with my friends",
+    "my favorite anime is frieren, no debate",
+    "I'm so tired after work today",
+    "lmao did you see that play",
+    "what should I eat for dinner?",
+    "I work as a nurse, night shifts are rough",
+    "omg I just hit diamond!!",
+    "I live in lyon, it's raining again",
+    "honestly kinda sad today ngl",
+    "that's so cute 😭",
+    "any music recs? I like city pop",
+    "my birthday is next week 🎉",
+    "wtf my teammates are trolling",
+    "I'm learning japanese, it's hard",
+]
+
+
+def _percentiles(samples: List[float]) -> Dict:
+    histogram = LatencyHistogram(window=max(1, len(samples)), min_samples=1)
+    for sample in samples:
+        histogram.record(sample)
+    stats = histogram.get_stats()
+    stats["max_ms"] = round(max(samples) * 1000, 1) if samples else None
+    return stats
+
+
+def _rss_mb() -> Optional[float]:
+    """Resident set size of this process, where the platform lets us read it"""
+    try:
+        import psutil
+        return round(psutil.Process().memory_info().rss / 1_048_576, 1)
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf("SC_PAGE_SIZE") / 1_048_576, 1)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class FakeGateway:
+    """Plays the part of discord.py's gateway: builds messages and dispatches them.
+
+    Arrivals are open-loop - message i is dispatched at start + i/rate whether
+    or not earlier ones have finished - so a slow bot shows up as latency
+    instead of quietly lowering the offered load.
+    """
+
+    def __init__(self, handler, bot_user: FakeUser, users: int, channels: int, mention_ratio: float,
+                 channel_limit: int, channel_per: float, seed: int, guilds: int = 1,
+                 shard_count: Optional[int] = None, shard_id: Optional[int] = None):
+        self.handler = handler
+        self.bot_user = bot_user
+        self.rng = random.Random(seed)
+        self.mention_ratio = mention_ratio
+        # Guild ids are built so guild i lands on shard (i + 1) % shard_count
+        self.guilds = [FakeGuild((i + 1) << 22, f"Load Test Server {i}") for i in range(guilds)]
+        self.users = [FakeUser(1000 + i, f"user{i}") for i in range(users)]
+        self.channels = [FakeChannel(100 + i, limit=channel_limit, per=channel_per, guild=self.guilds[i % guilds])
+                         for i in range(channels)]
+        self.shard_count = shard_count
+        self.shard_id = shard_id
+        self.reply_latencies: List[float] = []
+        self.passive_latencies: List[float] = []
+        self.errors = 0
+        self.dispatched = 0
+        self.other_shards = 0
+
+    def routed_here(self, message: FakeMessage) -> bool:
+        """Same routing as the real gateway: a guild's events only reach its shard"""
+        if self.shard_count is None:
+            return True
+        return shard_for_guild(message.guild.id, self.shard_count) == self.shard_id
+
+    def _next_message(self) -> FakeMessage:
+        user = self.rng.choice(self.users)
+        channel = self.rng.choice(self.channels)
+        text = self.rng.choice(MESSAGE_CORPUS).format(name=user.name)
+        if self.rng.random() < self.mention_ratio:
+            return FakeMessage(channel, f"{self.bot_user.mention} {text}", author=user, mentions=[self.bot_user])
+        return FakeMessage(channel, text, author=user)
+
+    async def _deliver(self, message: FakeMessage):
+        started = time.perf_counter()
+        try:
+            await self.handler(message)
+        except Exception:
+            self.errors += 1
+            return
+        latencies = self.reply_latencies if message.mentions else self.passive_latencies
+        latencies.append(time.perf_counter() - started)
+
+    async def replay(self, rate: float, duration: float, drain_timeout: float = 60.0):
+        total = max(1, int(rate * duration))
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        tasks = []
+        for i in range(total):
+            delay = start + i / rate - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            message = self._next_message()
+            if not self.routed_here(message):
+                self.other_shards += 1
+                continue
+            tasks.append(asyncio.create_task(self._deliver(message)))
+            self.dispatched += 1
+        if not tasks:
+            return
+        done, pending = await asyncio.wait(tasks, timeout=drain_timeout)
+        for task in pending:
+            task.cancel()
+        self.errors += len(pending)
+
+    def get_discord_stats(self) -> Dict:
+        return {
+            "sends": sum(len(channel.sent) for channel in self.channels),
+            "rejected_429": sum(channel.rejected for channel in self.channels),
+        }
+
+
+def _build_bot(base_url: str, workdir: str, ai_rps: Optional[float], ai_concurrency: Optional[int],
+               shard_count: Optional[int] = None, shard_id: Optional[int] = None, state_db: Optional[str] = None):
+    """EnhancedMelodyBotCore wired to the fakes, with every data file inside `workdir`"""
+    os.environ.setdefault("DISCORD_BOT_TOKEN", "offline-load-test")
+    os.environ["DEEPSEEK_API_KEY"] = "fake-key"
+    os.environ["DEEPSEEK_BASE_URL"] = base_url
+    if state_db:
+        # Must be set before the memory modules import - their singletons pick the store up then
+        os.environ["MELODY_SHARED_STATE"] = "1"
+        os.environ["MELODY_STATE_DB"] = state_db
+    os.chdir(workdir)  # relationship_data.json, melody_memory.db (facts), history db
+
+    from launch.main import EnhancedMelodyBotCore
+    from services.ai_providers.rate_limiter import AIRateLimiter
+    from services.tracing import tracer
+
+    if shard_count is not None:
+        core = EnhancedMelodyBotCore(shard_count=shard_count, shard_ids=[shard_id])
+    else:
+        core = EnhancedMelodyBotCore()
+    bot_user = FakeUser(999, "MelodyAI", bot=True)
+    core.bot._connection.user = bot_user
+    core.is_ready = True
+
+    limiter = None
+    if ai_rps or ai_concurrency:
+        limiter = AIRateLimiter(requests_per_second=ai_rps or 2.0, burst=max(5, int(ai_rps or 0)),
+                                max_concurrency=ai_concurrency or 3)
+    client = core.ai_provider  # the same client the adapter path uses (core.ai_client)
+    if hasattr(client, "circuit_breaker"):
+        client.circuit_breaker.status_file = None  # keep the dashboard snapshot out of it
+    if limiter is not None and hasattr(client, "rate_limiter"):
+        client.rate_limiter = limiter
+
+    tracer.close()
+    tracer.export_path = os.path.join(workdir, "traces.jsonl")
+    tracer.reset()
+    return core, bot_user
+
+
+async def run_load(users: int = 20, channels: int = 4, rate: float = 5.0, duration: float = 10.0,
+                   mention_ratio: float = 0.7, ai_latency: float = 0.3, ai_jitter: float = 0.1,
+                   ai_error_rate: float = 0.0, ai_rps: Optional[float] = None, ai_concurrency: Optional[int] = None,
+                   channel_limit: int = 5, channel_per: float = 5.0, seed: int = 42, guilds: int = 1,
+                   shard_count: Optional[int] = None, shard_id: Optional[int] = None, state_db: Optional[str] = None,
+                   track_allocations: bool = False, log_level: str = "WARNING") -> Dict:
+    """Run one load scenario and return the report dict"""
+    config = {key: value for key, value in locals().items()}
+    latency_rng = random.Random(seed)
+    previous_cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="melody_load_")
+
+    async with FakeDeepSeekServer(latency=lambda n: max(0.0, latency_rng.gauss(ai_latency, ai_jitter)),
+                                  error_rate=ai_error_rate, seed=seed) as server:
+        try:
+            core, bot_user = _build_bot(server.base_url, workdir, ai_rps, ai_concurrency,
+                                        shard_count, shard_id, state_db)
+            from services.outbound_queue import outbound
+            from services.structured_logging import setup_logging
+            from services.tracing import tracer
+            setup_logging(level=log_level)
+
+            gateway = FakeGateway(core.bot.on_message, bot_user, users, channels, mention_ratio,
+                                  channel_limit, channel_per, seed, guilds, shard_count, shard_id)
+            if track_allocations:
+                tracemalloc.start()
+            rss_start = _rss_mb()
+            started = time.perf_counter()
+            await gateway.replay(rate, duration)
+            elapsed = time.perf_counter() - started
+            rss_end = _rss_mb()
+            traced_peak = None
+            if track_allocations:
+                traced_peak = round(tracemalloc.get_traced_memory()[1] / 1_048_576, 1)
+                tracemalloc.stop()
+
+            completed = len(gateway.reply_latencies) + len(gateway.passive_latencies)
+            report = {
+                "config": config,
+                "dispatched": gateway.dispatched,
+                "other_shards": gateway.other_shards,
+                "completed": completed,
+                "errors": gateway.errors,
+                "elapsed_s": round(elapsed, 2),
+                "throughput_msg_s": round(completed / elapsed, 2) if elapsed else 0.0,
+                "latency": {
+                    "reply": _percentiles(gateway.reply_latencies),
+                    "passive": _percentiles(gateway.passive_latencies),
+                },
+                "deepseek": {"requests": server.requests, "completed": server.completed,
+                             "clients": len({id(c) for c in (core.ai_provider, core.ai_client) if c})},
+                "discord": gateway.get_discord_stats(),
+                "outbound": {key: value for key, value in outbound.get_stats().items() if key != "delivery_latency"},
+                "stages": tracer.get_stats()["stages"],
+                "memory": {
+                    "rss_start_mb": rss_start,
+                    "rss_end_mb": rss_end,
+                    "rss_growth_mb": round(rss_end - rss_start, 1) if rss_start is not None else None,
+                    "traced_peak_mb": traced_peak,
+                },
+            }
+            await core.close()
+            return report
+        finally:
+            os.chdir(previous_cwd)
+
+
+def print_report(report: Dict):
+    reply, passive = report["latency"]["reply"], report["latency"]["passive"]
+    memory = report["memory"]
+    print("\n🏋️ MELODY LOAD TEST")
+    print(f"   📨 {report['dispatched']} messages, {report['completed']} completed, {report['errors']} errors "
+          f"in {report['elapsed_s']}s → {report['throughput_msg_s']} msg/s")
+    print(f"   💬 Reply   p50 {reply['p50_ms']}ms • p95 {reply['p95_ms']}ms • p99 {reply['p99_ms']}ms "
+          f"• max {reply['max_ms']}ms ({reply['samples']} msgs)")
+    print(f"   👀 Passive p50 {passive['p50_ms']}ms • p95 {passive['p95_ms']}ms • p99 {passive['p99_ms']}ms "
+          f"({passive['samples']} msgs)")
+    print(f"   🤖 DeepSeek: {report['deepseek']['requests']} requests • "
+          f"📤 Discord: {report['discord']['sends']} sends, {report['discord']['rejected_429']} 429s")
+    print(f"   🧠 RSS {memory['rss_start_mb']} → {memory['rss_end_mb']} MB (+{memory['rss_growth_mb']})"
+          + (f" • traced peak {memory['traced_peak_mb']} MB" if memory["traced_peak_mb"] is not None else ""))
+    stages = sorted(report["stages"].items(), key=lambda item: item[1]["p95_ms"] or 0, reverse=True)
+    if stages:
+        print("   ⏱️ Slowest stages (p95):")
+        for name, stats in stages[:6]:
+            print(f"      {name:<16} p50 {stats['p50_ms']}ms • p95 {stats['p95_ms']}ms ({stats['samples']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline MelodyAI load test")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--channels", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=5.0, help="messages per second")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of traffic")
+    parser.add_argument("--mention-ratio", type=float, default=0.7)
+    parser.add_argument("--ai-latency", type=float, default=0.3, help="fake DeepSeek mean latency (s)")
+    parser.add_argument("--ai-jitter", type=float, default=0.1)
+    parser.add_argument("--ai-error-rate", type=float, default=0.0)
+    parser.add_argument("--ai-rps", type=float, default=None, help="override the DeepSeek rate limit")
+    parser.add_argument("--ai-concurrency", type=int, default=None)
+    parser.add_argument("--channel-limit", type=int, default=5, help="Discord sends per window per channel")
+    parser.add_argument("--channel-per", type=float, default=5.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--guilds", type=int, default=1)
+    parser.add_argument("--shard-count", type=int, default=None, help="act as one shard of this many")
+    parser.add_argument("--shard-id", type=int, default=0)
+    parser.add_argument("--state-db", default=None, help="shared state DB (enables the multi-process store)")
+    parser.add_argument("--out", default=None, help="write the report JSON here instead of test_results/")
+    parser.add_argument("--track-allocations", action="store_true", help="tracemalloc peak (slower)")
+    parser.add_argument("--no-save", action="store_true", help="don't write test_results/load_*.json")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_load(
+        users=args.users, channels=args.channels, rate=args.rate, duration=args.duration,
+        mention_ratio=args.mention_ratio, ai_latency=args.ai_latency, ai_jitter=args.ai_jitter,
+        ai_error_rate=args.ai_error_rate, ai_rps=args.ai_rps, ai_concurrency=args.ai_concurrency,
+        channel_limit=args.channel_limit, channel_per=args.channel_per, seed=args.seed, guilds=args.guilds,
+        shard_count=args.shard_count, shard_id=args.shard_id if args.shard_count else None,
+        state_db=os.path.abspath(args.state_db) if args.state_db else None,
+        track_allocations=args.track_allocations,
+    ))
+    print_report(report)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    elif not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"load_test_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"💾 Saved {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+# melody_ai_v2/test/microbench.py
+# ⚙️ Per-message CPU cost of the brain hot paths, compared against stored baselines.
+# Fixed corpus, seeded RNG, file/DB writes stubbed out - so a slower number means
+# slower code, not a slower disk.
+#
+#   python test/microbench.py                    # compare against test/microbench_baseline.json
+#   python test/microbench.py --update-baseline  # re-record (do this on the deploy box)
+#
+# Exits 1 when any case is more than --tolerance slower than its baseline.
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+# Ensure root + launch/ are in Python path (main.py imports bot_core directly).
+# Root goes first so `test.` is this folder, not the stdlib test package.
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root_dir)
+sys.path.append(os.path.join(root_dir, "launch"))
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "microbench_baseline.json")
+SEED = 1234
+
+_OPENERS = ["", "omg ", "bro ", "honestly ", "lmao ", "ngl "]
+_BODIES = [
+    "my name is {name}", "i'm from {city}", "i am {age} years old", "my favorite game is {game}",
+    "i love {game} so much", "i like {food}", "you're so mid and trash", "this is fire no cap",
+    "i'm feeling sick today", "finally feeling better", "what do you think about {game}?",
+    "you are useless, touch grass", "that play was goated fr", "i enjoy cooking {food}",
+    "everyone calls me {name}", "i hate mondays, so boring", "nice from to be hero is peak",
+]
+_FILL = {
+    "name": ["aiko", "ren", "mika", "sora", "kai"], "city": ["lyon", "osaka", "toronto", "berlin"],
+    "age": ["19", "23", "31"], "game": ["league", "valorant", "minecraft", "genshin"],
+    "food": ["ramen", "tacos", "pho", "croissants"],
+}
+
+
+def build_corpus(size: int = 200, seed: int = SEED) -> List[str]:
+    """The same `size` chat lines on every run"""
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        body = rng.choice(_BODIES).format(**{key: rng.choice(values) for key, values in _FILL.items()})
+        corpus.append(rng.choice(_OPENERS) + body + rng.choice(["", "!", " 😭", " 💀", "!!"]))
+    return corpus
+
+
+class BenchCase:
+    """One hot path: `setup()` returns a callable (sync or async) that handles one message"""
+
+    def __init__(self, name: str, setup: Callable, description: str):
+        self.name = name
+        self.setup = setup
+        self.description = description
+
+
+# ---------- CASES ----------
+def _facts_extract_setup():
+    from brain.memory_systems.permanent_facts import PermanentFacts
+    storage = PermanentFacts(db_path=":memory:", json_path=None)  # health upserts stay off the disk
+    return lambda i, message: storage.extract_personal_facts(f"user_{i % 20}", message)
+
+
+def _emotional_context_setup():
+    from brain.personality.emotional_core import EmotionalCore
+    core = EmotionalCore()
+    return lambda i, message: core.get_emotional_context(f"user_{i % 20}", message)
+
+
+def _build_response_setup():
+    from brain.personality.adaptive_tones import UltimateResponseSystem
+    system = UltimateResponseSystem()
+    return lambda i, message: system.build_response(message, (i * 37) % 101, i % 3 == 0, i % 10, i % 4 == 0)
+
+
+def _add_interaction_setup():
+    os.environ.setdefault("DISCORD_BOT_TOKEN", "offline-benchmark")  # main.py exits without one
+    from launch.main import RelationshipSystem
+    system = RelationshipSystem(data_file=os.path.join(tempfile.mkdtemp(prefix="melody_bench_"), "rel.json"))
+    system.save_relationships = lambda: None  # one JSON dump per message is I/O, not CPU
+    kinds = ["positive", "negative", "neutral", "positive", "gift_received"]
+    return lambda i, message: system.add_interaction(f"user_{i % 50}", kinds[i % len(kinds)], 10, message)
+
+
+def _semantic_search_setup():
+    from brain.memory_systems.semantic_memory import SemanticMemorySystem
+    from test.fake_encoder import WordEncoder  # FAISS + bookkeeping cost, not MiniLM's
+    memory = SemanticMemorySystem(db_path=":memory:", model=WordEncoder())
+
+    async def seed_memories():
+        corpus = build_corpus(1000, seed=SEED + 1)
+        for n, line in enumerate(corpus):
+            await memory.store_conversation(f"user_{n % 20}", line, "bot reply")
+    asyncio.run(seed_memories())
+    return lambda i, message: memory.search_relevant_memories(f"user_{i % 20}", message, top_k=5)
+
+
+CASES = [
+    BenchCase("facts.extract", _facts_extract_setup, "PermanentFacts.extract_personal_facts"),
+    BenchCase("emotions.context", _emotional_context_setup, "EmotionalCore.get_emotional_context"),
+    BenchCase("tones.build_response", _build_response_setup, "UltimateResponseSystem.build_response"),
+    BenchCase("relationship.add_interaction", _add_interaction_setup, "RelationshipSystem.add_interaction"),
+    BenchCase("memory.search", _semantic_search_setup, "SemanticMemorySystem.search_relevant_memories (1k memories)"),
+]
+
+
+# ---------- RUNNER ----------
+def _time_once(func, corpus: List[str], iterations: int) -> float:
+    """Seconds per call for `iterations` calls; async callables are awaited in one loop"""
+    random.seed(SEED)  # build_response/add_interaction roll the global RNG
+    messages = [corpus[i % len(corpus)] for i in range(iterations)]
+    first = func(0, messages[0])
+    if asyncio.iscoroutine(first):
+        async def run():
+            await first
+            started = time.perf_counter()
+            for i, message in enumerate(messages):
+                await func(i, message)
+            return time.perf_counter() - started
+        return asyncio.run(run()) / iterations
+    started = time.perf_counter()
+    for i, message in enumerate(messages):
+        func(i, message)
+    return (time.perf_counter() - started) / iterations
+
+
+def run_case(case: BenchCase, corpus: List[str], iterations: int = 2000, repeats: int = 5) -> Optional[Dict]:
+    """Best-of-`repeats` mean per call, in microseconds. None if the case can't run here."""
+    try:
+        func = case.setup()
+    except ImportError as e:
+        print(f"⏭️ {case.name}: skipped ({e})")
+        return None
+    timings = sorted(_time_once(func, corpus, iterations) for _ in range(repeats))
+    return {
+        "us_per_call": round(timings[0] * 1e6, 2),
+        "median_us": round(timings[len(timings) // 2] * 1e6, 2),
+        "iterations": iterations,
+        "repeats": repeats,
+    }
+
+
+def run_suite(iterations: int = 2000, repeats: int = 5, only: Optional[List[str]] = None) -> Dict[str, Dict]:
+    corpus = build_corpus()
+    results = {}
+    for case in CASES:
+        if only and case.name not in only:
+            continue
+        result = run_case(case, corpus, iterations, repeats)
+        if result is not None:
+            results[case.name] = result
+    return results
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float = 0.30) -> List[str]:
+    """Names of cases more than `tolerance` slower than their baseline"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base and result["us_per_call"] > base["us_per_call"] * (1 + tolerance):
+            regressions.append(name)
+    return regressions
+
+
+def load_baseline(path: str = BASELINE_FILE) -> Dict[str, Dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f).get("cases", {})
+    except (OSError, ValueError):
+        return {}
+
+
+def save_baseline(results: Dict[str, Dict], path: str = BASELINE_FILE):
+    existing = load_baseline(path)
+    existing.update(results)  # keep cases this machine had to skip
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"python": sys.version.split()[0], "seed": SEED, "cases": existing}, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MelodyAI hot-path microbenchmarks")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--tolerance", type=float, default=0.30, help="allowed slowdown vs baseline (0.30 = 30%%)")
+    parser.add_argument("--only", nargs="*", help="case names to run")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    results = run_suite(args.iterations, args.repeats, args.only)
+    baseline = load_baseline()
+
+    print("\n⚙️ MELODY MICROBENCHMARKS (µs per message, best of repeats)")
+    for name, result in results.items():
+        base = baseline.get(name)
+        delta = f"{(result['us_per_call'] / base['us_per_call'] - 1) * 100:+.0f}%" if base else "new"
+        print(f"   {name:<30} {result['us_per_call']:>10.2f} µs   baseline {base['us_per_call'] if base else '-':>8}   {delta}")
+
+    if args.update_baseline:
+        save_baseline(results)
+        print(f"💾 Baseline updated: {BASELINE_FILE}")
+        return
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"❌ Slower than baseline by more than {args.tolerance:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+    print("✅ No regressions")
+
+
+if __name__ == "__main__":
+    main()
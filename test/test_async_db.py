@@ -0,0 +1,138 @@
+# melody_ai_v2/test/test_async_db.py
+# One writer thread with group commit, read-only pool, nothing blocking the event loop
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+# Ensure root is in Python path
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_dir)
+
+from services.async_db import AsyncDatabase, get_database
+
+
+def _database(tmp: str) -> AsyncDatabase:
+    db = AsyncDatabase(os.path.join(tmp, "test.db"))
+    db.execute_sync("CREATE TABLE items (name TEXT UNIQUE, value INTEGER)")
+    return db
+
+
+def test_queued_writes_share_one_commit_and_failures_stay_isolated():
+    async def scenario(db):
+        started, gate = threading.Event(), threading.Event()
+        # Holds the writer while the others queue up behind it
+        blocker = db.submit(lambda conn: started.set() or gate.wait(5))
+        started.wait(5)
+        commits = db.commits
+        writes = [asyncio.ensure_future(db.execute("INSERT INTO items VALUES (?, ?)", (f"item{i}", i)))
+                  for i in range(50)]
+        writes.append(asyncio.ensure_future(db.execute("INSERT INTO items VALUES ('item0', -1)")))  # UNIQUE
+        await asyncio.sleep(0.05)
+        gate.set()
+        results = await asyncio.gather(*writes, return_exceptions=True)
+        blocker.result()
+
+        assert isinstance(results[-1], sqlite3.IntegrityError)
+        assert all(isinstance(rowid, int) for rowid in results[:-1])
+        # The blocker's batch + one for everything that queued behind it
+        assert db.commits - commits == 2 and db.failed_writes == 1
+        assert (await db.fetchone("SELECT COUNT(*), SUM(value) FROM items")) == (50, sum(range(50)))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = _database(tmp)
+        asyncio.run(scenario(db))
+        db.close()
+
+
+def test_readers_are_read_only_and_see_committed_writes():
+    with tempfile.TemporaryDirectory() as tmp:
+        db = _database(tmp)
+        assert db.fetchone_sync("PRAGMA journal_mode")[0] == "wal"
+        db.execute_sync("INSERT INTO items VALUES ('a', 1)")
+        assert db.fetchall_sync("SELECT name FROM items") == [("a",)]
+        try:
+            db.read_sync(lambda conn: conn.execute("DELETE FROM items"))
+            assert False, "reader connections must be read-only"
+        except sqlite3.OperationalError:
+            pass
+        # A write callback can't wait on its own queue
+        try:
+            db.write_sync(lambda conn: db.execute_sync("DELETE FROM items"))
+            assert False, "nested write should have been refused"
+        except RuntimeError:
+            pass
+
+        # close() commits what's still queued
+        db.submit(lambda conn: conn.execute("INSERT INTO items VALUES ('b', 2)"))
+        db.close()
+        other = sqlite3.connect(os.path.join(tmp, "test.db"))
+        assert other.execute("SELECT COUNT(*) FROM items").fetchone()[0] == 2
+        other.close()
+
+
+def test_slow_writes_and_reads_dont_block_the_loop():
+    async def scenario(db):
+        ticks = 0
+
+        async def heartbeat():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        beat = asyncio.create_task(heartbeat())
+        await asyncio.gather(db.write(lambda conn: time.sleep(0.3)),
+                             db.read(lambda conn: time.sleep(0.3)))
+        beat.cancel()
+        assert ticks >= 10
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = _database(tmp)
+        asyncio.run(scenario(db))
+        db.close()
+
+
+def test_cancelled_write_is_skipped_and_the_writer_keeps_going():
+    async def scenario(db):
+        started, gate = threading.Event(), threading.Event()
+        blocker = db.submit(lambda conn: started.set() or gate.wait(5))
+        started.wait(5)
+        # Caller gives up while the write is still queued (e.g. wait_for timing out)
+        try:
+            await asyncio.wait_for(db.execute("INSERT INTO items VALUES ('cancelled', 1)"), 0.05)
+            assert False, "write should have timed out behind the blocker"
+        except asyncio.TimeoutError:
+            pass
+        gate.set()
+        blocker.result()
+
+        assert isinstance(await asyncio.wait_for(db.execute("INSERT INTO items VALUES ('later', 2)"), 5), int)
+        assert db._writer_thread.is_alive()
+        assert (await db.fetchall("SELECT name FROM items")) == [("later",)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = _database(tmp)
+        asyncio.run(scenario(db))
+        db.close()
+
+
+def test_one_database_per_file():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "shared.db")
+        assert get_database(path) is get_database(os.path.relpath(path))
+        assert get_database(":memory:") is not get_database(":memory:")
+        get_database(path).close()
+        assert not get_database(path)._closed
+
+
+if __name__ == "__main__":
+    test_queued_writes_share_one_commit_and_failures_stay_isolated()
+    test_readers_are_read_only_and_see_committed_writes()
+    test_cancelled_write_is_skipped_and_the_writer_keeps_going()
+    test_slow_writes_and_reads_dont_block_the_loop()
+    test_one_database_per_file()
+    print("✅ Async database tests passed!")
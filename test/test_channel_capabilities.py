@@ -0,0 +1,92 @@
+# melody_ai_v2/test/test_channel_capabilities.py
+# Channel permissions are computed once per channel and dropped on channel/role events
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+import discord
+
+# Ensure root is in Python path
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_dir)
+
+from services.channel_capabilities import ChannelCapabilities
+
+
+class _Channel:
+    def __init__(self, channel_id, guild, can_send=True):
+        self.id = channel_id
+        self.guild = guild
+        self.can_send = can_send
+        self.lookups = 0
+
+    def permissions_for(self, member):
+        self.lookups += 1
+        return discord.Permissions(send_messages=self.can_send, read_messages=True)
+
+
+class _Bot:
+    def __init__(self):
+        self.user = SimpleNamespace(id=99)
+        self.listeners = {}
+
+    def add_listener(self, func):
+        self.listeners[func.__name__] = func
+
+
+def _guild(guild_id=1):
+    return SimpleNamespace(id=guild_id, me=SimpleNamespace(id=99))
+
+
+def test_permissions_are_computed_once():
+    caps = ChannelCapabilities()
+    channel = _Channel(10, _guild())
+    assert all(caps.can_send(channel) for _ in range(50))
+    assert channel.lookups == 1
+    assert caps.get_stats()["hits"] == 49
+
+
+def test_dm_channels_can_always_send():
+    caps = ChannelCapabilities()
+    assert caps.can_send(SimpleNamespace(id=5, guild=None))
+
+
+def test_events_invalidate_the_guild():
+    caps = ChannelCapabilities()
+    bot = _Bot()
+    caps.attach(bot)
+    guild, other_guild = _guild(1), _guild(2)
+    channel, other = _Channel(10, guild), _Channel(20, other_guild)
+    caps.can_send(channel)
+    caps.can_send(other)
+
+    # Someone takes away send permission via a role edit
+    channel.can_send = False
+    assert caps.can_send(channel)  # still cached
+    role = SimpleNamespace(guild=guild)
+    asyncio.run(bot.listeners["on_guild_role_update"](role, role))
+    assert not caps.can_send(channel)
+    assert channel.lookups == 2
+
+    # Other guilds keep their entries
+    caps.can_send(other)
+    assert other.lookups == 1
+
+    # The bot's own roles changing counts too; other members don't
+    me_before = SimpleNamespace(id=99, roles=[1], guild=guild)
+    me_after = SimpleNamespace(id=99, roles=[1, 2], guild=guild)
+    someone = SimpleNamespace(id=5, roles=[1], guild=guild)
+    asyncio.run(bot.listeners["on_member_update"](someone, SimpleNamespace(id=5, roles=[], guild=guild)))
+    caps.can_send(channel)
+    assert channel.lookups == 2
+    asyncio.run(bot.listeners["on_member_update"](me_before, me_after))
+    caps.can_send(channel)
+    assert channel.lookups == 3
+
+
+if __name__ == "__main__":
+    test_permissions_are_computed_once()
+    test_dm_channels_can_always_send()
+    test_events_invalidate_the_guild()
+    print("✅ Channel capability tests passed!")
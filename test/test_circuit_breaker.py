@@ -0,0 +1,62 @@
+# melody_ai_v2/test/test_circuit_breaker.py
+# Circuit breaker opens on errors, short-circuits to fallbacks, and closes after a probe
+import asyncio
+import os
+import sys
+import time
+
+# Ensure root is in Python path
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_dir)
+
+from services.ai_providers.circuit_breaker import CircuitBreaker
+from services.ai_providers.deepseek_client import DeepSeekClient
+from services.ai_providers.rate_limiter import AIRateLimiter
+from test.fake_deepseek_server import FakeDeepSeekServer
+
+
+def test_breaker_opens_then_recovers_via_probe():
+    async def run():
+        async with FakeDeepSeekServer(error_rate=1.0, error_status=503) as server:
+            breaker = CircuitBreaker(min_requests=3, open_duration=0.3, status_file=None)
+            client = DeepSeekClient("fake-key", base_url=server.base_url, circuit_breaker=breaker,
+                                    rate_limiter=AIRateLimiter(requests_per_second=50, burst=10))
+            client.rate_limiter.retry_policy.max_retries = 0
+
+            for _ in range(3):
+                await client.get_response("hi", "user_1")
+            opened_state = breaker.state
+            requests_when_opened = server.requests
+
+            started = time.monotonic()
+            reply = await client.get_response("hi", "user_1")
+            short_circuit_time = time.monotonic() - started
+            requests_after_short_circuit = server.requests
+
+            # DeepSeek comes back - the background probe should close the circuit
+            server.error_rate = 0.0
+            await asyncio.sleep(0.6)
+            await client.close()
+            return (opened_state, reply, short_circuit_time, requests_when_opened,
+                    requests_after_short_circuit, breaker)
+
+    opened_state, reply, short_circuit_time, before, after, breaker = asyncio.run(run())
+    assert opened_state == CircuitBreaker.OPEN
+    assert reply
+    assert short_circuit_time < 0.05
+    assert after == before  # no network call while open
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.probes >= 1
+
+
+def test_slow_calls_count_as_failures():
+    breaker = CircuitBreaker(min_requests=2, slow_call_threshold=1.0, status_file=None)
+    breaker.record_success(5.0)
+    breaker.record_success(5.0)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+if __name__ == "__main__":
+    test_breaker_opens_then_recovers_via_probe()
+    test_slow_calls_count_as_failures()
+    print("✅ Circuit breaker tests passed!")
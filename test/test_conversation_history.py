@@ -0,0 +1,144 @@
+# melody_ai_v2/test/test_conversation_history.py
+# Ring buffer history stays per (guild, channel), bounded, and survives a save/load
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+
+# Ensure root is in Python path
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_dir)
+
+from brain.memory_systems.conversation_history import ConversationHistory
+from services.ai_providers.prompt_builder import PromptBuilder
+
+
+def test_channels_are_isolated_and_bounded():
+    history = ConversationHistory(capacity=3)
+    for i in range(5):
+        history.append(1, 10, "amy", f"guild one {i}", user_id="a")
+    history.append(2, 10, "bob", "same channel id, other guild", user_id="b")
+
+    assert [e.message for e in history.recent(1, 10, 5)] == ["guild one 2", "guild one 3", "guild one 4"]
+    assert [e["user"] for e in history.recent(2, 10)] == ["bob"]
+    assert [e.message for e in history.for_user("a", 2)] == ["guild one 3", "guild one 4"]
+    assert len(history) == 4
+
+
+def test_since_returns_only_new_turns():
+    history = ConversationHistory(capacity=10)
+    history.append(None, 5, "amy", "old")
+    cursor = history.last_seq(None, 5)
+    history.append(None, 5, "amy", "new 1")
+    history.append(None, 5, "amy", "new 2")
+    assert [e.message for e in history.since(None, 5, cursor)] == ["new 1", "new 2"]
+
+
+def test_warm_restart_from_sqlite():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "history.db")
+        history = ConversationHistory(capacity=5, db_path=db_path)
+        history.append(1, 10, "amy", "remember me", user_id="a", response="always 💫")
+        history.save()
+
+        restored = ConversationHistory(capacity=5, db_path=db_path)
+        entry = restored.recent(1, 10)[0]
+        assert (entry.message, entry.response) == ("remember me", "always 💫")
+        assert restored.append(1, 10, "amy", "next").seq > entry.seq
+
+
+def test_shards_sharing_a_file_keep_each_others_history():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "history.db")
+        shard_a = ConversationHistory(capacity=5, db_path=db_path)
+        shard_b = ConversationHistory(capacity=5, db_path=db_path)
+        # Both counters start at 1 - same seq, different channels
+        shard_a.append(1, 10, "amy", "from shard a", user_id="a")
+        shard_b.append(2, 20, "bob", "from shard b", user_id="b")
+        shard_a.save()
+        shard_b.save()
+        shard_a.append(1, 10, "amy", "later on a", user_id="a")
+        asyncio.run(shard_a.save_async())  # what close() uses - same result, off the loop
+
+        restored = ConversationHistory(capacity=5, db_path=db_path)
+        assert [e.message for e in restored.recent(1, 10)] == ["from shard a", "later on a"]
+        assert [e.message for e in restored.recent(2, 20)] == ["from shard b"]
+
+
+def test_old_seq_keyed_table_is_migrated():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "history.db")
+        conn = sqlite3.connect(db_path)
+        conn.execute("CREATE TABLE conversation_history (seq INTEGER PRIMARY KEY, guild_id INTEGER NOT NULL, "
+                     "channel_id INTEGER NOT NULL, user_id TEXT, user TEXT, message TEXT, response TEXT, "
+                     "role TEXT, timestamp REAL)")
+        conn.execute("INSERT INTO conversation_history VALUES (7, 1, 10, 'a', 'amy', 'old turn', NULL, 'user', 1.0)")
+        conn.commit()
+        conn.close()
+
+        history = ConversationHistory(capacity=5, db_path=db_path)
+        assert [e.message for e in history.recent(1, 10)] == ["old turn"]
+        history.append(2, 20, "bob", "new", user_id="b")
+        history.save()
+
+        conn = sqlite3.connect(db_path)
+        pk = [row[1] for row in conn.execute("PRAGMA table_info(conversation_history)") if row[5]]
+        count = conn.execute("SELECT COUNT(*) FROM conversation_history").fetchone()[0]
+        conn.close()
+        assert sorted(pk) == ["channel_id", "guild_id", "seq"] and count == 2
+
+
+def test_chat_turns_reach_the_built_prompt():
+    history = ConversationHistory(capacity=10)
+    history.append(1, 10, "amy", "i got a cat", user_id="a", response="omg name?? 🐱")
+    history.append(1, 10, "MelodyAI", "yap yap", role="assistant")
+    current = history.append(1, 10, "amy", "her name is miso", user_id="a")
+
+    turns = history.chat_turns(1, 10, before_seq=current.seq)
+    assert turns == [
+        {"role": "user", "content": "amy: i got a cat"},
+        {"role": "assistant", "content": "omg name?? 🐱"},
+        {"role": "assistant", "content": "yap yap"},
+    ]
+    assert history.chat_turns(1, 10, limit=1, before_seq=current.seq) == turns[-1:]
+
+    messages = PromptBuilder().build(current.message, history=turns).messages
+    assert messages[-4:-1] == turns
+    assert messages[-1] == {"role": "user", "content": "her name is miso"}
+
+
+def test_adapter_sends_earlier_channel_turns_as_history():
+    from brain.core_intelligence.intelligence_orchestrator import intelligence_orchestrator
+    from services.discord_adapter import DiscordMelodyAdapter
+    from test.fake_discord import FakeChannel, FakeGuild, FakeMessage, FakeUser
+
+    seen = []
+
+    async def fake_generate_response(user_id, user_message, ai_provider=None, priority=None, history=None):
+        seen.append(history)
+        return f"reply to {user_message}"
+
+    adapter = DiscordMelodyAdapter()
+    channel = FakeChannel(guild=FakeGuild())
+    amy = FakeUser(7, "amy")
+    intelligence_orchestrator.generate_response = fake_generate_response
+    try:
+        for text in ("hii", "how are u"):
+            asyncio.run(adapter.process_discord_message(FakeMessage(channel, text, author=amy), respond=False))
+    finally:
+        del intelligence_orchestrator.generate_response
+
+    assert seen == [[], [{"role": "user", "content": "amy: hii"},
+                         {"role": "assistant", "content": "reply to hii"}]]
+
+
+if __name__ == "__main__":
+    test_channels_are_isolated_and_bounded()
+    test_since_returns_only_new_turns()
+    test_warm_restart_from_sqlite()
+    test_shards_sharing_a_file_keep_each_others_history()
+    test_old_seq_keyed_table_is_migrated()
+    test_chat_turns_reach_the_built_prompt()
+    test_adapter_sends_earlier_channel_turns_as_history()
+    print("✅ Conversation history tests passed!")
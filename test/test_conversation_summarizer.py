@@ -0,0 +1,131 @@
+# melody_ai_v2/test/test_conversation_summarizer.py
+# Summaries fold into the previous one, batch several users per call, and skip the orchestrator
+import asyncio
+import json
+import os
+import sys
+
+# Ensure root is in Python path
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_dir)
+
+from brain.memory_systems.conversation_history import ConversationHistory
+from brain.memory_systems.conversation_summarizer import ConversationSummarizer
+from services.ai_providers.rate_limiter import Priority
+
+
+class InMemoryFacts:
+    def __init__(self):
+        self.summaries = {"u0": "Loves Naruto."}
+
+    async def get_conversation_summary(self, user_id):
+        return self.summaries.get(user_id, "")
+
+    async def store_facts(self, user_id, facts):
+        self.summaries[user_id] = facts[0]["value"]
+
+
+class RecordingProvider:
+    """Answers every user in the request with a summary that quotes their previous one"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def get_completion(self, messages, priority=None, max_tokens=None, temperature=None):
+        request = json.loads(messages[-1]["content"])
+        self.calls.append((priority, request))
+        return "```json\n" + json.dumps({
+            u["id"]: f"{u['previous_summary']} Said: {u['new_messages'][-1]}".strip()
+            for u in request["users"]
+        }) + "\n```"
+
+
+def test_batches_users_and_folds_previous_summary():
+    history = ConversationHistory()
+    for i in range(7):
+        history.append(1, 10, f"user{i}", f"message from {i}", user_id=f"u{i}")
+    history.append(1, 10, "MelodyAI", "bot turns are skipped", role="assistant")
+
+    facts = InMemoryFacts()
+    provider = RecordingProvider()
+    summarizer = ConversationSummarizer(batch_size=5, facts_store=facts)
+
+    async def run():
+        assert summarizer.submit(history.since(1, 10, 0), provider)
+        await summarizer.drain()
+        await summarizer.close()
+
+    asyncio.run(run())
+    assert len(provider.calls) == 2
+    assert all(priority == Priority.BACKGROUND for priority, _ in provider.calls)
+    assert [len(request["users"]) for _, request in provider.calls] == [5, 2]
+    assert facts.summaries["u0"] == "Loves Naruto. Said: message from 0"
+    assert facts.summaries["u6"] == "Said: message from 6"
+    assert summarizer.users_summarized == 7
+
+
+def test_provider_failure_keeps_old_summary():
+    class DownProvider:
+        async def get_completion(self, messages, **kwargs):
+            return None
+
+    history = ConversationHistory()
+    history.append(1, 10, "user0", "new stuff", user_id="u0")
+    facts = InMemoryFacts()
+    summarizer = ConversationSummarizer(facts_store=facts)
+    stored = asyncio.run(summarizer.summarize(history.since(1, 10, 0), DownProvider()))
+    assert stored == {}
+    assert facts.summaries["u0"] == "Loves Naruto."
+
+
+def test_adapter_cursor_only_moves_after_a_stored_summary():
+    from brain.memory_systems import conversation_summarizer as summarizer_module
+    from services.discord_adapter import DiscordMelodyAdapter
+
+    class FlakyProvider(RecordingProvider):
+        def __init__(self):
+            super().__init__()
+            self.down = True
+
+        async def get_completion(self, messages, **kwargs):
+            if self.down:
+                return None
+            return await super().get_completion(messages, **kwargs)
+
+    adapter = DiscordMelodyAdapter()
+    for i in range(3):
+        adapter.active_conversations.append(1, 10, "user0", f"turn {i}", user_id="u0")
+    provider = FlakyProvider()
+    summarizer = ConversationSummarizer(facts_store=InMemoryFacts())
+    original, summarizer_module.conversation_summarizer = summarizer_module.conversation_summarizer, summarizer
+
+    async def run():
+        await adapter._summarize_conversation(1, 10, provider)
+        await adapter._summarize_conversation(1, 10, provider)  # still in flight -> not queued twice
+        await summarizer.drain()
+        failed_cursor = adapter.summarized_seq.get((1, 10), 0)
+
+        provider.down = False
+        await adapter._summarize_conversation(1, 10, provider)
+        await summarizer.drain()
+        await summarizer.close()
+        return failed_cursor
+
+    try:
+        failed_cursor = asyncio.run(run())
+    finally:
+        summarizer_module.conversation_summarizer = original
+
+    assert failed_cursor == 0
+    assert summarizer.jobs == 2 and summarizer.failures == 1
+    assert adapter.summarized_seq[(1, 10)] == adapter.active_conversations.last_seq(1, 10)
+    assert not adapter.summaries_pending
+    # The retry carried the turns the failed job dropped
+    assert provider.calls[-1][1]["users"][0]["new_messages"] == ["turn 0", "turn 1", "turn 2"]
+
+
+if __name__ == "__main__":
+    test_batches_users_and_folds_previous_summary()
+    test_provider_failure_keeps_old_summary()
+    test_adapter_cursor_only_moves_after_a_stored_summary()
+    print("✅ Conversation summarizer tests passed!")
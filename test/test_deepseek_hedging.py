@@ -0,0 +1,141 @@
+# melody_ai_v2/test/test_deepseek_hedging.py
+# Adaptive timeouts + hedged requests against a local fake DeepSeek server
+import asyncio
+import os
+import sys
+import time
+
+# Ensure root is in Python path
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_dir)
+
+from services.ai_providers.deepseek_client import DeepSeekClient
+from services.ai_providers.rate_limiter import AIRateLimiter
+from test.fake_deepseek_server import FakeDeepSeekServer
+
+
+def _warm_client(client: DeepSeekClient, latency: float, samples: int = 30):
+    """Pretend we've already seen `samples` requests at `latency`"""
+    for _ in range(samples):
+        client.latency.record(latency)
+
+
+def test_hedge_wins_when_primary_is_slow():
+    async def run():
+        # Request #1 is stuck in a slow tail, the hedge (#2) comes back fast
+        async with FakeDeepSeekServer(latency=lambda n: 1.0 if n == 1 else 0.05) as server:
+            client = DeepSeekClient("fake-key", base_url=server.base_url,
+                                    rate_limiter=AIRateLimiter(requests_per_second=50, burst=10))
+            _warm_client(client, 0.1)
+            started = time.monotonic()
+            reply = await client.get_response("hi", "user_1")
+            elapsed = time.monotonic() - started
+            await client.close()
+            return reply, elapsed, client.costs
+
+    reply, elapsed, costs = asyncio.run(run())
+    assert "fake reply #2" in reply
+    assert elapsed < 0.8
+    assert costs.hedges_sent == 1
+    assert costs.hedge_wins == 1
+    assert costs.cancelled_requests == 1
+
+
+def test_no_hedge_until_histogram_is_warm():
+    async def run():
+        async with FakeDeepSeekServer(latency=0.2) as server:
+            client = DeepSeekClient("fake-key", base_url=server.base_url,
+                                    rate_limiter=AIRateLimiter(requests_per_second=50, burst=10))
+            await client.get_response("hi", "user_1")
+            await client.close()
+            return client.costs, server
+
+    costs, server = asyncio.run(run())
+    assert costs.hedges_sent == 0
+    assert server.requests == 1
+    assert costs.completion_tokens == 12
+
+
+def test_adaptive_timeout_falls_back_fast():
+    async def run():
+        async with FakeDeepSeekServer(latency=1.0) as server:
+            client = DeepSeekClient("fake-key", base_url=server.base_url, enable_hedging=False,
+                                    rate_limiter=AIRateLimiter(requests_per_second=50, burst=10))
+            client.timeouts.min_timeout = 0.3
+            _warm_client(client, 0.1)
+            started = time.monotonic()
+            reply = await client.get_response("hi", "user_1")
+            elapsed = time.monotonic() - started
+            await client.close()
+            return reply, elapsed
+
+    reply, elapsed = asyncio.run(run())
+    # Timed out on the adaptive budget (~0.3s), not the old fixed 15s
+    assert elapsed < 0.8
+    assert reply
+
+
+def test_retries_stay_inside_the_overall_deadline():
+    async def run():
+        # Retry-After 5s doesn't fit a 2s deadline -> give up now instead of being cancelled mid-sleep
+        async with FakeDeepSeekServer(error_rate=1.0, error_status=503, retry_after="5") as server:
+            client = DeepSeekClient("fake-key", base_url=server.base_url, enable_hedging=False, deadline=2.0,
+                                    rate_limiter=AIRateLimiter(requests_per_second=50, burst=10))
+            client.rate_limiter.retry_policy.max_retries = 5
+            started = time.monotonic()
+            throttled = await client.get_completion([{"role": "user", "content": "hi"}])
+            throttled_elapsed = time.monotonic() - started
+            await client.close()
+            throttled_requests = server.requests
+
+        # A stuck server can't hold one attempt past the deadline either
+        async with FakeDeepSeekServer(latency=3.0) as server:
+            client = DeepSeekClient("fake-key", base_url=server.base_url, enable_hedging=False, deadline=1.5,
+                                    rate_limiter=AIRateLimiter(requests_per_second=50, burst=10))
+            started = time.monotonic()
+            stuck = await client.get_completion([{"role": "user", "content": "hi"}])
+            stuck_elapsed = time.monotonic() - started
+            await client.close()
+        return throttled, throttled_elapsed, throttled_requests, stuck, stuck_elapsed
+
+    throttled, throttled_elapsed, throttled_requests, stuck, stuck_elapsed = asyncio.run(run())
+    assert throttled is None and throttled_requests == 1 and throttled_elapsed < 1.0
+    assert stuck is None and stuck_elapsed < 2.0
+
+
+def test_cancelled_caller_cancels_the_request_waiting_on_a_hedge():
+    async def run():
+        async with FakeDeepSeekServer(latency=1.0) as server:
+            client = DeepSeekClient("fake-key", base_url=server.base_url,
+                                    rate_limiter=AIRateLimiter(requests_per_second=50, burst=10))
+            _warm_client(client, 0.3)  # hedge delay ~0.3s, so the caller is cancelled before any hedge
+            in_flight = []
+            send_once = client._send_once
+
+            async def tracked_send_once(payload, timeout):
+                in_flight.append(asyncio.current_task())
+                return await send_once(payload, timeout)
+
+            client._send_once = tracked_send_once
+            try:
+                await asyncio.wait_for(client.get_completion([{"role": "user", "content": "hi"}]), 0.1)
+            except asyncio.TimeoutError:
+                pass
+            await asyncio.sleep(0.05)
+            running = [task for task in in_flight if not task.done()]
+            active = client.rate_limiter.governor.active
+            await client.close()
+            return in_flight, running, active, client.costs
+
+    in_flight, running, active, costs = asyncio.run(run())
+    assert len(in_flight) == 1 and costs.hedges_sent == 0
+    assert running == [] and active == 0
+
+
+if __name__ == "__main__":
+    test_hedge_wins_when_primary_is_slow()
+    test_no_hedge_until_histogram_is_warm()
+    test_adaptive_timeout_falls_back_fast()
+    test_retries_stay_inside_the_overall_deadline()
+    test_cancelled_caller_cancels_the_request_waiting_on_a_hedge()
+    print("✅ Hedging tests passed!")
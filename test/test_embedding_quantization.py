@@ -0,0 +1,76 @@
+# melody_ai_v2/test/test_embedding_quantization.py
+# int8 embedding blobs, quantized FAISS indexes, blob migration and the memory-vs-recall benchmark
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+
+import faiss
+import numpy as np
+
+# Ensure root is in Python path
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_dir)
+
+from brain.memory_systems.embedding_quantization import (benchmark, build_index, decode_embedding,
+                                                         encode_embedding, migrate)
+from brain.memory_systems.semantic_memory import SemanticMemorySystem
+from test.fake_encoder import WordEncoder
+
+
+def _vectors(count: int, seed: int = 7) -> np.ndarray:
+    vectors = np.random.default_rng(seed).standard_normal((count, 384)).astype(np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def test_int8_blob_round_trip():
+    vector = _vectors(1)[0]
+    blob = encode_embedding(vector, int8=True)
+    assert len(blob) == 388 and len(encode_embedding(vector, int8=False)) == 1536
+    restored = decode_embedding(blob)
+    assert float(restored @ vector) / float(np.linalg.norm(restored)) > 0.999
+    assert np.array_equal(decode_embedding(encode_embedding(vector, int8=False)), vector)
+
+
+def test_quantized_indexes_shrink_memory_and_keep_recall():
+    results = benchmark(_vectors(1500), queries=50, k=10)
+    assert results["flat"]["recall@10"] == 1.0
+    assert results["sq8"]["compression"] >= 3.5 and results["sq8"]["recall@10"] >= 0.95
+    assert results["pq"]["bytes_per_memory"] < results["sq8"]["bytes_per_memory"]
+    # Too little data for PQ codebooks -> falls back to sq8 instead of failing
+    index = build_index(384, "pq", _vectors(10))
+    assert isinstance(faiss.downcast_index(index.index), faiss.IndexScalarQuantizer)
+
+
+def test_migration_and_search_on_a_quantized_store():
+    async def scenario(tmp):
+        db_path = os.path.join(tmp, "memory.db")
+        memory = SemanticMemorySystem(db_path=db_path, model=WordEncoder(), quantization="flat")
+        for topic in ("my cat is called mochi", "i work night shifts", "learning japanese kanji"):
+            await memory.store_conversation("1", topic, "cool")
+        memory.db.close()
+
+        stats = migrate(db_path, to="int8")
+        assert stats["converted"] == 3 and stats["bytes_after"] < stats["bytes_before"] / 3
+        assert migrate(db_path, to="int8")["converted"] == 0
+        sizes = {row[0] for row in sqlite3.connect(db_path).execute("SELECT length(embedding) FROM semantic_memories")}
+        assert sizes == {388}
+
+        quantized = SemanticMemorySystem(db_path=db_path, model=WordEncoder(), quantization="sq8")
+        assert quantized.index.ntotal == 3
+        await quantized.store_conversation("1", "my dog is called rex", "woof")
+        results = await quantized.search_relevant_memories("1", "what is my cat called", top_k=2)
+        assert results[0]["user_message"] == "my cat is called mochi"
+        quantized.db.close()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(scenario(tmp))
+
+
+if __name__ == "__main__":
+    test_int8_blob_round_trip()
+    test_quantized_indexes_shrink_memory_and_keep_recall()
+    test_migration_and_search_on_a_quantized_store()
+    print("✅ Embedding quantization tests passed!")
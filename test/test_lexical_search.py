@@ -0,0 +1,138 @@
+# melody_ai_v2/test/test_lexical_search.py
+# FTS5 mirror of semantic memories, BM25 + vector rank fusion, keyword-only fallbacks
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+
+import numpy as np
+
+# Ensure root is in Python path
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_dir)
+
+from brain.memory_systems.lexical_search import (ensure_memory_fts, fts_query, reciprocal_rank_fusion,
+                                                 search_memories)
+from brain.memory_systems.semantic_memory import SemanticMemorySystem
+from services.memory_worker import MemoryWorkerClient
+from test.fake_encoder import WordEncoder
+
+FILLER = ["remember to be there from the start", "remember what you said to me",
+          "you have to remember the start", "be there for me from now", "what do you remember from that"]
+
+
+def _run(scenario):
+    with tempfile.TemporaryDirectory() as tmp:
+        memory = SemanticMemorySystem(db_path=os.path.join(tmp, "memory.db"), model=WordEncoder())
+        asyncio.run(scenario(memory, tmp))
+
+
+def test_rank_fusion_and_query_building():
+    fused = reciprocal_rank_fusion([[1, 2, 3], [3, 1]])
+    assert max(fused, key=fused.get) == 1 and fused[3] > fused[2]
+    assert fts_query("do you remember Nice from To Be Hero X??") == '"remember" OR "nice" OR "hero"'
+    assert fts_query("what is it") is None
+
+
+def test_exact_names_survive_hybrid_search():
+    async def scenario(memory, tmp):
+        for line in FILLER:
+            await memory.store_conversation("1", line, "ok")
+        await memory.store_conversation("1", "nice is the funniest hero", "lol")
+        await memory.store_conversation("2", "nice is the funniest hero", "real")
+        query = "do you remember nice from to be hero x"
+
+        vector = memory.encode_batch([query])
+        vector_only = memory.search_vectors(["1"], vector, top_k=3)[0]
+        assert all("nice" not in r["user_message"] for r in vector_only)
+
+        hybrid = await memory.search_relevant_memories("1", query, top_k=3)
+        nice = [r for r in hybrid if "nice" in r["user_message"]]
+        assert len(nice) == 1 and nice[0]["memory_id"] == 6
+        assert all(0 < r["score"] <= 1.0 for r in hybrid)
+
+    _run(scenario)
+
+
+def test_fts_mirror_follows_deletes():
+    async def scenario(memory, tmp):
+        await memory.store_conversation("1", "my main is jinx in league", "chaos")
+        assert [r["user_message"] for r in memory.search_lexical("1", "jinx")] == ["my main is jinx in league"]
+        rowid = memory.search_lexical("1", "jinx")[0]["rowid"]
+        memory.db.execute_sync("DELETE FROM semantic_memories WHERE rowid = ?", (rowid,))
+        memory.remove_memories([rowid])
+        assert memory.search_lexical("1", "jinx") == []
+
+    _run(scenario)
+
+
+def test_keyword_only_when_encoder_is_busy_or_worker_is_down():
+    async def scenario(memory, tmp):
+        for line in FILLER[:2] + ["i main yasuo btw"]:
+            await memory.store_conversation("1", line, "ok")
+
+        memory.lexical_backlog = 0
+        calls = memory.model.calls
+        results = await memory.search_relevant_memories("1", "yasuo")
+        assert memory.model.calls == calls and results[0]["user_message"] == "i main yasuo btw"
+        assert results[0]["lexical"] and np.isclose(results[0]["similarity_score"], 1.0)
+
+        client = MemoryWorkerClient(os.path.join(tmp, "nobody.sock"), autostart=False,
+                                    db_path=os.path.join(tmp, "memory.db"))
+        results = await client.search_relevant_memories("1", "who do i main, yasuo?")
+        assert [r["user_message"] for r in results] == ["i main yasuo btw"]
+        await client.close()
+
+    _run(scenario)
+
+
+def test_keyword_pass_is_skipped_when_it_cant_help():
+    async def scenario(memory, tmp):
+        for line in FILLER + ["nice is the funniest hero"]:
+            await memory.store_conversation("1", line, "ok")
+        reads = memory.db.reads
+
+        # Only stopwords -> no FTS round trip at all
+        vector = memory.encode_batch(["what is it"])
+        memory.search_vectors(["1"], vector, top_k=3, queries=["what is it"])
+        # A near-duplicate is already the top vector hit -> BM25 could only reorder the tail
+        text = "User: nice is the funniest hero Bot: ok"
+        memory.search_vectors(["1"], memory.encode_batch([text]), top_k=3, queries=[text])
+        assert memory.db.reads == reads
+
+        memory.search_vectors(["1"], memory.encode_batch(["nice"]), top_k=3, queries=["nice"])
+        assert memory.db.reads == reads + 1
+
+    _run(scenario)
+
+
+def test_old_unindexed_mirror_is_rebuilt():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "memory.db")
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE semantic_memories (user_id TEXT, memory_id INTEGER, user_message TEXT, "
+                      "bot_response TEXT, PRIMARY KEY (user_id, memory_id))")
+        conn.execute("INSERT INTO semantic_memories VALUES ('1', 1, 'my main is jinx', 'chaos')")
+        conn.execute("""CREATE VIRTUAL TABLE semantic_memories_fts USING fts5(
+            user_id UNINDEXED, user_message, bot_response,
+            content='semantic_memories', tokenize='porter unicode61 remove_diacritics 2')""")
+        conn.commit()
+        assert ensure_memory_fts(conn)
+        assert "UNINDEXED" not in conn.execute(
+            "SELECT sql FROM sqlite_master WHERE name = 'semantic_memories_fts'").fetchone()[0]
+        assert [hit["memory_id"] for hit in search_memories(conn, "1", "jinx", 5)] == [1]
+        assert search_memories(conn, "2", "jinx", 5) == []
+        # Already current -> left alone
+        assert ensure_memory_fts(conn)
+        conn.close()
+
+
+if __name__ == "__main__":
+    test_rank_fusion_and_query_building()
+    test_exact_names_survive_hybrid_search()
+    test_fts_mirror_follows_deletes()
+    test_keyword_only_when_encoder_is_busy_or_worker_is_down()
+    test_keyword_pass_is_skipped_when_it_cant_help()
+    test_old_unindexed_mirror_is_rebuilt()
+    print("✅ Lexical search tests passed!")
@@ -0,0 +1,36 @@
+# melody_ai_v2/test/test_load_harness.py
+# Smoke run of the offline load harness - fake gateway in, fake DeepSeek + Discord out
+import asyncio
+import os
+import sys
+
+# Ensure root is in Python path
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_dir)
+
+from test.load_harness import run_load
+
+
+def test_small_run_completes_every_message():
+    cwd = os.getcwd()
+    report = asyncio.run(run_load(users=5, channels=4, rate=10, duration=1.0, mention_ratio=0.6,
+                                  ai_latency=0.01, ai_jitter=0.0, ai_rps=100, ai_concurrency=10, seed=7))
+    assert os.getcwd() == cwd
+
+    replies = report["latency"]["reply"]["samples"]
+    assert report["dispatched"] == 10
+    assert report["completed"] == 10 and report["errors"] == 0
+    assert replies > 0
+    # Every reply costs two DeepSeek calls (answer + relationship blurb) and one embed send;
+    # a 429 from a busy channel is retried by the outbound queue, never dropped
+    assert report["deepseek"]["requests"] == 2 * replies
+    # Both reply paths share one client - one breaker, one limiter
+    assert report["deepseek"]["clients"] == 1
+    assert report["discord"]["sends"] == replies
+    assert report["stages"]["on_message"]["samples"] == 10
+    assert report["latency"]["reply"]["p99_ms"] < 5000
+
+
+if __name__ == "__main__":
+    test_small_run_completes_every_message()
+    print("✅ Load harness smoke test passed!")
@@ -0,0 +1,125 @@
+# melody_ai_v2/test/test_memory_consolidation.py
+# Semantic memory stays under the per-user budget: duplicates merge, low-value memories are archived
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+
+# Ensure root is in Python path
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_dir)
+
+from brain.memory_systems.memory_consolidation import MemoryConsolidator
+from brain.memory_systems.semantic_memory import SemanticMemorySystem
+from test.fake_encoder import WordEncoder
+
+TOPICS = ["valorant ranked grind", "baking sourdough bread", "learning japanese kanji", "my cat mochi",
+          "night shift at the hospital", "marathon training plan", "guitar practice scales",
+          "moving to lyon soon", "rewatching one piece", "building a gaming pc", "chemistry exam friday",
+          "sister wedding in june"]
+
+
+def _system(tmp: str, budget: int) -> SemanticMemorySystem:
+    consolidator = MemoryConsolidator(per_user_budget=budget, merge_threshold=0.95)
+    return SemanticMemorySystem(db_path=os.path.join(tmp, "memory.db"), model=WordEncoder(),
+                                consolidator=consolidator)
+
+
+def test_budget_merges_duplicates_and_keeps_important_memories():
+    async def scenario(tmp):
+        memory = _system(tmp, budget=6)
+        for _ in range(3):
+            await memory.store_conversation("1", "i love ramen so much", "ramen gang")
+        await memory.store_conversation("1", "remember my birthday is march 3", "noted!!", importance=2.0)
+        for topic in TOPICS:
+            await memory.store_conversation("1", topic, "cool")
+        await memory.store_conversation("2", "i love ramen so much", "ramen gang")
+        await memory.consolidator.drain()
+
+        assert memory.user_counts["1"] <= 6
+        assert memory.user_counts["2"] == 1
+        assert memory.index.ntotal == sum(memory.user_counts.values()) == len(memory.memory_map)
+
+        # The three ramen lines became one memory that remembers it was merged
+        merged = memory.db.fetchall_sync(
+            "SELECT merged_count FROM semantic_memories WHERE user_id = '1' AND user_message LIKE '%ramen%'")
+        assert merged == [(2,)]
+        reasons = dict(memory.db.fetchall_sync(
+            "SELECT reason, COUNT(*) FROM semantic_memories_archive GROUP BY reason"))
+        assert reasons["merged"] == 2
+        assert reasons["merged"] + reasons["evicted"] + memory.user_counts["1"] == 3 + 1 + len(TOPICS)
+
+        # Importance survives eviction, and search only sees what's left
+        results = await memory.search_relevant_memories("1", "when is my birthday", top_k=3)
+        assert results and "birthday" in results[0]["user_message"]
+        archived = {row[0] for row in memory.db.fetchall_sync("SELECT user_message FROM semantic_memories_archive")}
+        assert all(m["user_message"] not in archived or "ramen" in m["user_message"] for m in results)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(scenario(tmp))
+
+
+def test_access_counts_and_ids_survive_consolidation():
+    async def scenario(tmp):
+        memory = _system(tmp, budget=3)
+        for topic in ["my cat mochi"] + TOPICS[:2]:
+            await memory.store_conversation("1", topic, "cool")
+        for _ in range(5):
+            await memory.search_relevant_memories("1", "my cat mochi", top_k=1)
+        for topic in TOPICS[4:7]:
+            await memory.store_conversation("1", topic, "cool")
+        await memory.consolidator.drain()
+
+        # Recalled five times -> worth more than the fresh but untouched memories
+        kept = {row[0] for row in memory.db.fetchall_sync("SELECT user_message FROM semantic_memories")}
+        assert "my cat mochi" in kept and len(kept) == 3
+
+        # A reloaded process sees the same index; memory_ids keep counting past archived ones
+        reloaded = _system(tmp, budget=3)
+        assert reloaded.index.ntotal == 3
+        await reloaded.store_conversation("1", "new hobby pottery", "fun")
+        ids = [row[0] for row in reloaded.db.fetchall_sync(
+            "SELECT memory_id FROM semantic_memories UNION ALL SELECT memory_id FROM semantic_memories_archive")]
+        assert len(ids) == len(set(ids)) == 7
+
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(scenario(tmp))
+
+
+def test_store_between_delete_and_index_removal_keeps_its_memory():
+    with tempfile.TemporaryDirectory() as tmp:
+        memory = SemanticMemorySystem(db_path=os.path.join(tmp, "memory.db"), model=WordEncoder(),
+                                      consolidator=MemoryConsolidator(per_user_budget=1, slack=0))
+        store = lambda text, importance: memory.store_vectors([("1", text, "cool", importance)],
+                                                              memory.model.encode([text]))
+        store("remember my birthday is march 3", 2.0)
+        store("rewatching one piece", 0.5)  # evicted, and it holds the highest rowid
+
+        # Land a store right after the archive/delete commits, before the index is touched
+        racers = []
+        write_sync = memory.db.write_sync
+
+        def interleaved_write_sync(fn, *args, **kwargs):
+            result = write_sync(fn, *args, **kwargs)
+            if fn.__name__ == "archive_rows":
+                racers.append(threading.Thread(target=store, args=("new hobby pottery", 1.0)))
+                racers[0].start()
+                racers[0].join(0.3)  # blocked on write_lock -> runs once consolidation is done
+            return result
+
+        memory.db.write_sync = interleaved_write_sync
+        assert memory.consolidator.consolidate_user(memory, "1") == {"merged": 0, "evicted": 1}
+        racers[0].join(5)
+
+        messages = {entry["user_message"] for entry in memory.memory_map.values()}
+        assert messages == {"remember my birthday is march 3", "new hobby pottery"}
+        rows = memory.db.fetchone_sync("SELECT COUNT(*) FROM semantic_memories")[0]
+        assert memory.index.ntotal == sum(memory.user_counts.values()) == rows == 2
+
+
+if __name__ == "__main__":
+    test_budget_merges_duplicates_and_keeps_important_memories()
+    test_access_counts_and_ids_survive_consolidation()
+    test_store_between_delete_and_index_removal_keeps_its_memory()
+    print("✅ Memory consolidation tests passed!")
@@ -0,0 +1,98 @@
+# melody_ai_v2/test/test_memory_rerank.py
+# Two-stage memory retrieval: oversampled FAISS fetch, importance/recency rerank, MMR, per-request cache
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+# Ensure root is in Python path
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_dir)
+
+from brain.memory_systems.semantic_memory import SemanticMemorySystem, memory_request_scope
+from test.fake_encoder import WordEncoder
+
+
+def _run(scenario):
+    with tempfile.TemporaryDirectory() as tmp:
+        memory = SemanticMemorySystem(db_path=os.path.join(tmp, "memory.db"), model=WordEncoder())
+        asyncio.run(scenario(memory))
+
+
+def _age(memory: SemanticMemorySystem, user_message: str, days: float):
+    for entry in memory.memory_map.values():
+        if entry["user_message"] == user_message:
+            entry["created"] = time.time() - days * 86400
+
+
+def test_importance_and_recency_break_similarity_ties():
+    async def scenario(memory):
+        await memory.store_conversation("1", "my cat is called mochi", "cute")
+        await memory.store_conversation("1", "my cat is called mochi!", "cute", importance=2.0)
+        await memory.store_conversation("1", "my dog is called rex", "woof")
+        await memory.store_conversation("1", "my dog is called rex!", "woof")
+        _age(memory, "my cat is called mochi!", 60)
+        _age(memory, "my dog is called rex", 60)
+
+        cats = await memory.search_relevant_memories("1", "what is my cat called", top_k=2)
+        assert cats[0]["user_message"] == "my cat is called mochi!"  # importance beats 60 days of decay
+        dogs = await memory.search_relevant_memories("1", "what is my dog called", top_k=2)
+        assert dogs[0]["user_message"] == "my dog is called rex!"  # same importance -> newer wins
+        assert dogs[0]["score"] > dogs[1]["score"]
+
+    _run(scenario)
+
+
+def test_oversampling_finds_a_users_memory_behind_other_users():
+    async def scenario(memory):
+        for user in range(2, 8):
+            await memory.store_conversation(str(user), "favorite game valorant", "gg")
+        await memory.store_conversation("1", "favorite game is valorant ranked", "gg")
+
+        results = await memory.search_relevant_memories("1", "favorite game valorant", top_k=2)
+        assert [r["user_message"] for r in results] == ["favorite game is valorant ranked"]
+
+    _run(scenario)
+
+
+def test_mmr_trades_a_duplicate_for_a_different_memory():
+    async def scenario(memory):
+        for suffix in ("", "!", "!!"):
+            await memory.store_conversation("1", f"studying for the chemistry exam{suffix}", "good luck")
+        await memory.store_conversation("1", "the exam is friday morning", "you got this")
+
+        plain = await memory.search_relevant_memories("1", "chemistry exam", top_k=2)
+        assert all("chemistry" in r["user_message"] for r in plain)
+        diverse = await memory.search_relevant_memories("1", "chemistry exam", top_k=2, diversity=0.5)
+        assert "chemistry" in diverse[0]["user_message"]
+        assert diverse[1]["user_message"] == "the exam is friday morning"
+
+    _run(scenario)
+
+
+def test_searches_are_cached_for_one_request_only():
+    async def scenario(memory):
+        await memory.store_conversation("1", "i live in osaka", "nice")
+        encoder = memory.model
+
+        with memory_request_scope():
+            calls = encoder.calls
+            first = await memory.search_relevant_memories("1", "where do i live")
+            again = await memory.search_relevant_memories("1", "where do i live")
+            assert again is first and encoder.calls == calls + 1
+            await memory.search_relevant_memories("1", "where do i live", top_k=1)
+            assert encoder.calls == calls + 2  # different request shape, not a cache hit
+
+        await memory.search_relevant_memories("1", "where do i live")
+        assert encoder.calls == calls + 3
+
+    _run(scenario)
+
+
+if __name__ == "__main__":
+    test_importance_and_recency_break_similarity_ties()
+    test_oversampling_finds_a_users_memory_behind_other_users()
+    test_mmr_trades_a_duplicate_for_a_different_memory()
+    test_searches_are_cached_for_one_request_only()
+    print("✅ Memory rerank tests passed!")
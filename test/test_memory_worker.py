@@ -0,0 +1,104 @@
+# melody_ai_v2/test/test_memory_worker.py
+# Memory worker: batched search/store over the socket, non-blocking client while the worker is down
+import asyncio
+import os
+import sys
+import tempfile
+
+# Ensure root is in Python path
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_dir)
+
+from brain.memory_systems.semantic_memory import SemanticMemorySystem
+from services.memory_worker import MemoryWorkerClient, MemoryWorkerServer, query_worker
+from test.fake_encoder import WordEncoder
+
+
+async def _wait_connected(client: MemoryWorkerClient, timeout: float = 5.0):
+    client._ensure_started()
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not client.connected:
+        assert asyncio.get_running_loop().time() < deadline, "client never connected"
+        await asyncio.sleep(0.02)
+
+
+def _server(tmp: str, encoder: WordEncoder) -> MemoryWorkerServer:
+    memory = SemanticMemorySystem(db_path=os.path.join(tmp, "memory.db"), model=encoder)
+    return MemoryWorkerServer(memory=memory, address=os.path.join(tmp, "w.sock"), batch_window=0.02)
+
+
+def test_concurrent_searches_share_one_encode():
+    async def scenario(tmp):
+        encoder = WordEncoder()
+        server = _server(tmp, encoder)
+        await server.start()
+        client = MemoryWorkerClient(server.address, autostart=False)
+        await _wait_connected(client)
+
+        await client.store_conversation("1", "my favorite game is valorant", "nice aim")
+        await client.store_conversation("1", "i love ramen", "same")
+        await client.store_conversation("2", "my favorite game is chess", "big brain")
+        assert (await client.get_stats())["memories"] == 3
+
+        encoder.calls = 0
+        results = await asyncio.gather(*(client.search_relevant_memories("1", "which game is my favorite", top_k=3)
+                                         for _ in range(8)))
+        assert encoder.calls < 8
+        assert all(r[0]["user_message"] == "my favorite game is valorant" for r in results)
+        assert all(m["user_message"] != "my favorite game is chess" for r in results for m in r)
+
+        # The portal's blocking helper talks to the same worker
+        stats = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: query_worker("stats", address=server.address, user_id="1"))
+        assert stats["semantic_memories"] == 2
+
+        await client.close()
+        await server.stop()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(scenario(tmp))
+
+
+def test_client_keeps_working_while_worker_is_down():
+    async def scenario(tmp):
+        address = os.path.join(tmp, "w.sock")
+        client = MemoryWorkerClient(address, autostart=False, max_backoff=0.1)
+
+        # No worker yet: nothing blocks, searches come back empty, stores are buffered
+        assert await client.search_relevant_memories("1", "anything") == []
+        await client.store_conversation("1", "remember my cat is called mochi", "mochi!!")
+        assert len(client.pending_stores) == 1
+        assert query_worker("stats", address=address) is None
+
+        server = _server(tmp, WordEncoder())
+        await server.start()
+        await _wait_connected(client)
+        for _ in range(50):
+            if server.memory.index.ntotal:
+                break
+            await asyncio.sleep(0.02)
+        memories = await client.search_relevant_memories("1", "what is my cat called")
+        assert memories and "mochi" in memories[0]["user_message"]
+
+        # Worker restart: the client reconnects on its own
+        await server.stop()
+        server = _server(tmp, WordEncoder())
+        await server.start()
+        for _ in range(100):
+            if client.reconnects and client.connected:
+                break
+            await asyncio.sleep(0.02)
+        assert client.reconnects == 1
+        assert (await client.get_stats())["memories"] == 1  # reloaded from the shared DB
+
+        await client.close()
+        await server.stop()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(scenario(tmp))
+
+
+if __name__ == "__main__":
+    test_concurrent_searches_share_one_encode()
+    test_client_keeps_working_while_worker_is_down()
+    print("✅ Memory worker tests passed!")
@@ -0,0 +1,68 @@
+# melody_ai_v2/test/test_message_coalescer.py
+# A burst of auto-yap messages in one channel becomes a single flush
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+# Ensure root is in Python path
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_dir)
+
+from services.message_coalescer import ChannelCoalescer
+
+
+def _message(channel_id, author, content):
+    return SimpleNamespace(channel=SimpleNamespace(id=channel_id), author=author, content=content)
+
+
+def test_burst_is_coalesced_per_channel():
+    flushes = []
+
+    async def on_flush(channel_id, burst):
+        flushes.append((channel_id, [m.content for m in burst]))
+
+    async def run():
+        coalescer = ChannelCoalescer(on_flush, debounce=0.1, max_wait=1.0)
+
+        def send(channel_id, author, content, trigger=False):
+            message = _message(channel_id, author, content)
+            coalescer.extend(channel_id, message)
+            if trigger:
+                coalescer.schedule(channel_id, message)
+
+        send(1, "amy", "omg", trigger=True)
+        send(2, "bob", "unrelated chat in another channel")
+        for i in range(4):
+            await asyncio.sleep(0.03)
+            send(1, "cat", f"spam {i}")
+        await asyncio.sleep(0.3)
+
+    asyncio.run(run())
+    assert flushes == [(1, ["omg", "spam 0", "spam 1", "spam 2", "spam 3"])]
+
+
+def test_max_wait_caps_a_never_ending_burst():
+    flushes = []
+
+    async def on_flush(channel_id, burst):
+        flushes.append(len(burst))
+
+    async def run():
+        coalescer = ChannelCoalescer(on_flush, debounce=0.1, max_wait=0.25)
+        first = _message(1, "amy", "hug")
+        coalescer.schedule(1, first)
+        for i in range(10):
+            await asyncio.sleep(0.05)
+            coalescer.extend(1, _message(1, "amy", f"msg {i}"))
+        await coalescer.close()
+
+    asyncio.run(run())
+    assert len(flushes) == 1
+    assert flushes[0] < 11
+
+
+if __name__ == "__main__":
+    test_burst_is_coalesced_per_channel()
+    test_max_wait_caps_a_never_ending_burst()
+    print("✅ Message coalescer tests passed!")
@@ -0,0 +1,41 @@
+# melody_ai_v2/test/test_microbench.py
+# The microbenchmark runner itself: deterministic corpus, every case runs, regressions flagged
+import os
+import sys
+import tempfile
+
+# Ensure root is in Python path
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_dir)
+
+from test.microbench import CASES, build_corpus, compare, load_baseline, run_suite, save_baseline
+
+
+def test_corpus_is_fixed():
+    assert build_corpus(50) == build_corpus(50)
+    assert len(set(build_corpus(200))) > 50
+
+
+def test_quick_run_covers_every_case():
+    results = run_suite(iterations=20, repeats=1)
+    names = {case.name for case in CASES}
+    # memory.search needs sentence_transformers + faiss; everything else always runs
+    assert names - {"memory.search"} <= set(results) <= names
+    assert all(result["us_per_call"] > 0 for result in results.values())
+
+
+def test_regressions_are_flagged_against_the_baseline():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "baseline.json")
+        save_baseline({"facts.extract": {"us_per_call": 10.0}, "emotions.context": {"us_per_call": 50.0}}, path)
+        baseline = load_baseline(path)
+    current = {"facts.extract": {"us_per_call": 12.5}, "emotions.context": {"us_per_call": 70.0},
+               "tones.build_response": {"us_per_call": 5.0}}
+    assert compare(current, baseline, tolerance=0.30) == ["emotions.context"]
+
+
+if __name__ == "__main__":
+    test_corpus_is_fixed()
+    test_quick_run_covers_every_case()
+    test_regressions_are_flagged_against_the_baseline()
+    print("✅ Microbenchmark tests passed!")
@@ -0,0 +1,117 @@
+# melody_ai_v2/test/test_permanent_facts.py
+# PermanentFacts on user_permanent_facts / user_health_status: upserts, JSON import, keyword lookup
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+from datetime import datetime, timedelta
+
+# Ensure root is in Python path
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_dir)
+
+from brain.memory_systems import permanent_facts as permanent_facts_module
+from brain.memory_systems.permanent_facts import PermanentFacts, PermanentFactsAdapter
+
+
+def test_upserts_merge_on_user_category_and_key():
+    async def scenario(tmp):
+        facts = PermanentFacts(db_path=os.path.join(tmp, "memory.db"), json_path=None)
+        await facts.store_facts("1", [{"category": "personal", "key": "name", "value": "Mika", "confidence": 2}])
+        await facts.store_facts("1", [{"category": "personal", "key": "name", "value": "Mikaela", "confidence": 1},
+                                      {"category": "location", "key": "location", "value": "Osaka", "confidence": 2}])
+        await facts.store_facts("2", [{"category": "personal", "key": "name", "value": "Rex", "confidence": 3}])
+
+        row = await facts.db.fetchone("SELECT fact_value, confidence_score, mention_count FROM user_permanent_facts "
+                                      "WHERE user_id = '1' AND category = 'personal' AND fact_key = 'name'")
+        assert row == ("Mikaela", 2, 2)  # newest value, best confidence, counted twice
+        assert await facts.search_facts("1") == [("personal", "name", "Mikaela"), ("location", "location", "Osaka")]
+        assert await facts.get_user_context("1") == "📝 USER FACTS:\n- Name: Mikaela\n- Location: Osaka"
+
+        # Facts the message mentions go first, whatever their category
+        await facts.store_facts("1", [{"category": "preferences", "key": "favorite_anime", "value": "To Be Hero X",
+                                       "confidence": 2}])
+        context = await facts.get_user_context("1", "omg the new to be hero x episode")
+        assert context.splitlines()[1] == "- Favorite Anime: To Be Hero X"
+        assert await facts.find_facts("2", "hero") == []
+
+        await facts.store_facts("1", [{"category": "general", "key": "conversation_summary", "value": "likes anime",
+                                       "confidence": 3}])
+        assert await facts.get_conversation_summary("1") == "likes anime"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(scenario(tmp))
+
+
+def test_json_import_and_health_follow_ups():
+    async def scenario(tmp):
+        old = (datetime.now() - timedelta(hours=3)).isoformat()
+        json_path = os.path.join(tmp, "permanent_facts.json")
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump({"users": {
+                "1": {"facts": [{"key": "name", "value": "Mika", "category": "personal", "confidence": 3,
+                                 "first_mentioned": old, "last_mentioned": old, "mention_count": 4}],
+                      "health_status": [{"status": "sick", "severity": 2, "reported_at": old, "is_resolved": False}]},
+                "2": {"personal": {"age": 19}},  # oldest file layout
+            }}, f)
+
+        db_path = os.path.join(tmp, "memory.db")
+        facts = PermanentFacts(db_path=db_path, json_path=json_path)
+        assert facts.count_facts() == 2
+        assert await facts.search_facts("2") == [("personal", "age", "19")]
+        # Importing again (e.g. a second shard starting) doesn't duplicate or overwrite
+        await facts.store_facts("1", [{"category": "personal", "key": "name", "value": "Mikaela", "confidence": 3}])
+        facts.import_json(json_path)
+        assert facts.count_facts() == 2 and (await facts.search_facts("1"))[0][2] == "Mikaela"
+
+        assert await facts.check_health_follow_ups() == [("1", "sick", old)]
+        await facts.update_health("3", "sick", 2)  # too recent for a follow-up
+        await facts.mark_health_resolved("1")
+        assert await facts.check_health_follow_ups() == []
+
+        # Another process (shard / dashboard) sees the same rows
+        other = sqlite3.connect(db_path)
+        assert other.execute("SELECT COUNT(*) FROM user_health_status WHERE is_resolved = 0").fetchone()[0] == 1
+        other.close()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(scenario(tmp))
+
+
+def test_adapter_opens_storage_once_off_the_loop():
+    opened_on = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, "permanent_facts.json")
+        with open(json_path, "w") as f:
+            json.dump({"users": {"1": {"facts": [{"category": "personal", "key": "name", "value": "Mika",
+                                                  "confidence": 3}]}}}, f)
+
+        class RecordingFacts(PermanentFacts):
+            def __init__(self):
+                opened_on.append(threading.current_thread())
+                super().__init__(db_path=os.path.join(tmp, "memory.db"), json_path=json_path)
+
+        async def scenario():
+            adapter = PermanentFactsAdapter()
+            contexts = await asyncio.gather(*(adapter.get_user_context("1") for _ in range(5)))
+            assert contexts == ["📝 USER FACTS:\n- Name: Mika"] * 5
+
+        original, permanent_facts_module.PermanentFacts = permanent_facts_module.PermanentFacts, RecordingFacts
+        try:
+            asyncio.run(scenario())
+        finally:
+            permanent_facts_module.PermanentFacts = original
+
+    # One open for the whole burst, and not on the event loop's thread
+    assert len(opened_on) == 1 and opened_on[0] is not threading.main_thread()
+
+
+if __name__ == "__main__":
+    test_upserts_merge_on_user_category_and_key()
+    test_json_import_and_health_follow_ups()
+    test_adapter_opens_storage_once_off_the_loop()
+    print("✅ Permanent facts tests passed!")
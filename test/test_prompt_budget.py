@@ -0,0 +1,52 @@
+# melody_ai_v2/test/test_prompt_budget.py
+# Token budgeter keeps notes under budget, drops duplicates and truncates deterministically
+import os
+import sys
+
+# Ensure root is in Python path
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_dir)
+
+from brain.core_intelligence.prompt_budget import PromptSection, TokenBudgeter
+
+
+def _sections():
+    memories = [f"- User: tell me about episode {i} of my favourite show | Melody: it was peak fr 💫" for i in range(20)]
+    return [
+        PromptSection("mood", 0, 40, ["USER MOOD: Positive/playful - be fun and chaotic!"]),
+        PromptSection("facts", 1, 120, ["- Name: Bob", "- Location: Paris", "- Name: Bob"], "📝 USER FACTS:"),
+        PromptSection("summary", 2, 100, ["Location: Paris"], "📝 Previous chat summary:"),
+        PromptSection("memories", 3, 200, memories, "🎭 RELEVANT PAST CONVERSATIONS:"),
+    ]
+
+
+def test_budget_is_respected_and_low_priority_is_cut_first():
+    result = TokenBudgeter(max_tokens=120).assemble(_sections())
+    assert result.total_tokens <= 120
+    assert "USER MOOD" in result.text
+    assert "- Name: Bob" in result.text
+    assert result.dropped_lines.get("memories", 0) > 0
+
+
+def test_duplicates_across_sections_are_removed():
+    result = TokenBudgeter().assemble(_sections())
+    assert result.text.count("Bob") == 1
+    assert "Previous chat summary" not in result.text  # summary only repeated a fact
+    assert result.duplicates == 2
+
+
+def test_truncation_is_deterministic():
+    long_line = ["word " * 200]
+    sections = [PromptSection("summary", 0, 30, long_line)]
+    first = TokenBudgeter().assemble(sections)
+    second = TokenBudgeter().assemble(sections)
+    assert first.text == second.text
+    assert first.text.endswith("...")
+    assert first.total_tokens <= 30
+
+
+if __name__ == "__main__":
+    test_budget_is_respected_and_low_priority_is_cut_first()
+    test_duplicates_across_sections_are_removed()
+    test_truncation_is_deterministic()
+    print("✅ Prompt budget tests passed!")
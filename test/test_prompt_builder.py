@@ -0,0 +1,55 @@
+# melody_ai_v2/test/test_prompt_builder.py
+# Byte-identical persona prefix across calls, turn order, and the history turn limit
+import json
+import os
+import sys
+
+# Ensure root is in Python path
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_dir)
+
+from services.ai_providers.prompt_builder import PERSONA_SYSTEM_PROMPT, PromptBuilder
+
+
+def test_persona_prefix_is_byte_identical_across_users_and_messages():
+    builder = PromptBuilder()
+    first = builder.build("do you remember Nice?", context="Facts: likes anime, main is Nice",
+                          sentiment_data={"score": 90},
+                          history=[{"role": "user", "content": "hiii"}, {"role": "assistant", "content": "yo!"}])
+    second = builder.build("what's up", context="Facts: plays valorant", sentiment_data={"score": 10})
+
+    # Compare the serialized bytes the provider actually sees, not just equal dicts
+    assert json.dumps(first.messages[0]).encode() == json.dumps(second.messages[0]).encode()
+    assert first.messages[0] == {"role": "system", "content": PERSONA_SYSTEM_PROMPT}
+    # Everything per-user lives after the prefix
+    assert PERSONA_SYSTEM_PROMPT not in first.messages[1]["content"]
+    assert "valorant" in second.messages[1]["content"]
+
+
+def test_turns_come_out_as_system_notes_history_user():
+    builder = PromptBuilder(max_history_turns=3)
+    history = [{"role": "user" if i % 2 == 0 else "assistant", "content": f"turn {i}"} for i in range(6)]
+    prompt = builder.build("latest message", context="Facts: loves ramen", sentiment_data={"score": 60},
+                           history=history)
+
+    roles = [m["role"] for m in prompt.messages]
+    contents = [m["content"] for m in prompt.messages]
+    assert roles == ["system", "system", "assistant", "user", "assistant", "user"]
+    assert contents[1] == "Tone: playful+chaotic\nFacts: loves ramen"
+    # Only the last `max_history_turns` turns are kept, oldest first
+    assert contents[2:5] == ["turn 3", "turn 4", "turn 5"]
+    assert contents[-1] == "latest message"
+    assert set(prompt.section_tokens) == {"persona", "notes", "history", "user"}
+
+
+def test_no_notes_message_without_context_and_empty_turns_are_skipped():
+    prompt = PromptBuilder().build("hey", history=[{"role": "assistant", "content": ""}])
+    assert [m["role"] for m in prompt.messages] == ["system", "user"]
+    assert prompt.section_tokens["notes"] == 0 and prompt.section_tokens["history"] == 0
+
+
+if __name__ == "__main__":
+    test_persona_prefix_is_byte_identical_across_users_and_messages()
+    test_turns_come_out_as_system_notes_history_user()
+    test_no_notes_message_without_context_and_empty_turns_are_skipped()
+    print("✅ Prompt builder tests passed!")
@@ -0,0 +1,109 @@
+# melody_ai_v2/test/test_rate_limiter.py
+# Priority governor ordering + reserved mention slot, token bucket pauses, Retry-After handling
+import asyncio
+import os
+import sys
+import time
+from email.utils import formatdate
+
+# Ensure root is in Python path
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_dir)
+
+from services.ai_providers.rate_limiter import (AIRateLimiter, ConcurrencyGovernor, Priority,
+                                                RetryPolicy, TokenBucket)
+
+
+def test_mention_beats_background_and_keeps_its_reserved_slot():
+    async def run():
+        governor = ConcurrencyGovernor(max_concurrency=2, reserved_slots=1)
+        await governor.acquire(Priority.BACKGROUND)
+        # The second slot is reserved - background has to queue even though it's free
+        background = asyncio.ensure_future(governor.acquire(Priority.BACKGROUND))
+        await asyncio.sleep(0)
+        assert not background.done() and governor.active == 1
+
+        # A mention walks straight into the reserved slot
+        await asyncio.wait_for(governor.acquire(Priority.MENTION), 1)
+        assert governor.active == 2
+
+        # Queued later, served first: the heap orders by priority, not arrival
+        interactive = asyncio.ensure_future(governor.acquire(Priority.INTERACTIVE))
+        await asyncio.sleep(0)
+        governor.release()  # mention done
+        governor.release()  # first background done
+        await asyncio.sleep(0)
+        assert interactive.done() and not background.done()
+
+        governor.release()
+        await asyncio.wait_for(background, 1)
+        return governor.get_stats()
+
+    stats = asyncio.run(run())
+    assert stats["active"] == 1 and stats["queued"] == 0
+    assert set(stats["queue_wait"]) == {"mention", "interactive", "background"}
+
+
+def test_cancelled_waiter_does_not_leak_a_slot():
+    async def run():
+        governor = ConcurrencyGovernor(max_concurrency=1, reserved_slots=0)
+        await governor.acquire(Priority.INTERACTIVE)
+
+        waiter = asyncio.ensure_future(governor.acquire(Priority.INTERACTIVE))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        governor.release()
+        assert governor.active == 0 and governor.get_stats()["queued"] == 0
+
+        # Granted and cancelled in the same tick - the slot must come back
+        await governor.acquire(Priority.INTERACTIVE)
+        racer = asyncio.ensure_future(governor.acquire(Priority.INTERACTIVE))
+        await asyncio.sleep(0)
+        governor.release()
+        racer.cancel()
+        await asyncio.gather(racer, return_exceptions=True)
+        assert governor.active == 0
+
+        async with governor.slot(Priority.MENTION):
+            assert governor.active == 1
+        return governor.active
+
+    assert asyncio.run(run()) == 0
+
+
+def test_retry_after_is_honored():
+    policy = RetryPolicy(max_retries=2, base_delay=0.5, max_delay=8.0)
+    assert policy.parse_retry_after("3") == 3.0
+    assert policy.parse_retry_after("-1") == 0.0
+    assert policy.parse_retry_after(None) is None
+    assert policy.parse_retry_after("soon") is None
+    assert 3 <= policy.parse_retry_after(formatdate(time.time() + 5, usegmt=True)) <= 5
+
+    # Retry-After wins over jitter (capped at max_delay), otherwise full jitter under the cap
+    assert policy.backoff(0, retry_after=2.0) == 2.0
+    assert policy.backoff(0, retry_after=60.0) == 8.0
+    assert all(0 <= policy.backoff(attempt) <= min(8.0, 0.5 * 2 ** attempt) for attempt in range(6))
+    assert policy.should_retry(429, 1) and not policy.should_retry(429, 2) and not policy.should_retry(400, 0)
+
+    async def run():
+        limiter = AIRateLimiter(requests_per_second=100, burst=1)
+        assert limiter.bucket.try_acquire()
+        assert not limiter.bucket.try_acquire()  # bucket empty
+        await limiter.wait_for_token()  # refills at 100/s
+
+        limiter.on_throttled(0.2)
+        assert not limiter.bucket.try_acquire()
+        started = time.monotonic()
+        await limiter.wait_for_token()
+        return time.monotonic() - started, limiter.throttled
+
+    paused_for, throttled = asyncio.run(run())
+    assert paused_for >= 0.15 and throttled == 1
+
+
+if __name__ == "__main__":
+    test_mention_beats_background_and_keeps_its_reserved_slot()
+    test_cancelled_waiter_does_not_leak_a_slot()
+    test_retry_after_is_honored()
+    print("✅ Rate limiter tests passed!")
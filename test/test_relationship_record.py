@@ -0,0 +1,56 @@
+# melody_ai_v2/test/test_relationship_record.py
+# UserRecord migrates old dicts once, round-trips to JSON and behaves like the old dict for embeds
+import json
+import os
+import sys
+
+# Ensure root is in Python path
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_dir)
+
+from brain.personality.relationship_record import CompatibilityRing, UserRecord
+from brain.personality.relationship_tiers import calculate_compatibility
+
+OLD_RECORD = {
+    "points": 420, "likes": 7, "dislikes": 2, "interactions": 12, "gifts_received": 1,
+    "conversation_depth": 3, "last_sync": "2025-01-02T03:04:05",
+    "compatibility_history": [{"timestamp": "2025-01-01T00:00:00", "compatibility": 60 + i % 3} for i in range(12)],
+    "collected_facts": ["name: Amy"], "favourite_colour": "teal",
+}
+
+
+def test_migration_and_dict_access():
+    record = UserRecord.from_dict(OLD_RECORD)
+    assert record["points"] == 420
+    assert record.get("neutral_interactions") == 3  # estimated like the old migration did
+    assert record.get("missing", 0) == 0
+    assert record["favourite_colour"] == "teal"  # unknown keys survive
+    assert isinstance(record["last_sync"], int)
+    assert len(record.compatibility_history) == CompatibilityRing.CAPACITY
+    record["collected_facts"].append("city: Paris")
+    record["points"] += 5
+    assert record.points == 425
+
+
+def test_json_round_trip_and_same_compatibility():
+    record = UserRecord.from_dict(OLD_RECORD)
+    saved = json.loads(json.dumps(record.to_dict()))
+    restored = UserRecord.from_dict(saved)
+    assert restored.to_dict() == saved
+    trimmed = dict(OLD_RECORD, compatibility_history=OLD_RECORD["compatibility_history"][-10:])
+    assert calculate_compatibility(record) == calculate_compatibility(trimmed)
+
+
+def test_ring_buffer_keeps_latest_scores():
+    ring = CompatibilityRing()
+    for score in range(15):
+        ring.append(1000 + score, score)
+    assert ring.recent_scores(3) == [12, 13, 14]
+    assert [e["compatibility"] for e in ring] == list(range(5, 15))
+
+
+if __name__ == "__main__":
+    test_migration_and_dict_access()
+    test_json_round_trip_and_same_compatibility()
+    test_ring_buffer_keeps_latest_scores()
+    print("✅ Relationship record tests passed!")
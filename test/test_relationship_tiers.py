@@ -0,0 +1,56 @@
+# melody_ai_v2/test/test_relationship_tiers.py
+# Bisect tier lookup matches the old linear scan and compatibility is cached on the record
+import os
+import sys
+
+# Ensure root is in Python path
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_dir)
+
+from brain.personality.relationship_tiers import (
+    RELATIONSHIP_TIERS, calculate_compatibility, cached_compatibility, tier_table
+)
+
+
+def _linear_tier_info(points):
+    """The scan main.py used before the bisect table"""
+    for tier in RELATIONSHIP_TIERS:
+        if points >= tier["min_points"]:
+            current_tier = tier
+            tier_index = RELATIONSHIP_TIERS.index(tier)
+            break
+    next_tier = RELATIONSHIP_TIERS[tier_index - 1] if tier_index > 0 else None
+    if next_tier:
+        current_min = current_tier["min_points"]
+        progress_percent = int(((points - current_min) / (next_tier["min_points"] - current_min)) * 100)
+        progress_percent = min(max(progress_percent, 0), 100)
+    else:
+        progress_percent = 100
+    return current_tier, next_tier, progress_percent
+
+
+def test_bisect_lookup_matches_linear_scan():
+    for points in list(range(0, 6001, 7)) + [99, 100, 299, 300, 4999, 5000, 10 ** 6]:
+        assert tier_table.get_tier_info(points) == _linear_tier_info(points)
+        assert tier_table.get_busy_response(points) == _linear_tier_info(points)[0]["busy_response"]
+
+
+def test_negative_points_fall_into_lowest_tier():
+    current_tier, next_tier, progress = tier_table.get_tier_info(-50)
+    assert current_tier["name"] == "Rival"
+    assert next_tier["name"] == "Stranger"
+    assert progress == 0
+
+
+def test_compatibility_is_cached_on_the_record():
+    user_data = {"interactions": 10, "likes": 6, "dislikes": 1, "compatibility_history": []}
+    assert cached_compatibility(user_data) == calculate_compatibility(user_data)
+    user_data["likes"] = 0  # cache wins until add_interaction refreshes it
+    assert cached_compatibility(user_data) == user_data["compatibility"]
+
+
+if __name__ == "__main__":
+    test_bisect_lookup_matches_linear_scan()
+    test_negative_points_fall_into_lowest_tier()
+    test_compatibility_is_cached_on_the_record()
+    print("✅ Relationship tier tests passed!")
@@ -0,0 +1,88 @@
+# melody_ai_v2/test/test_response_delivery.py
+# Replies go out in one call per 2000 chars, split on boundaries, with code blocks kept valid
+import asyncio
+import os
+import sys
+
+# Ensure root is in Python path
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_dir)
+
+from services.response_delivery import DISCORD_MESSAGE_LIMIT, chunk_message, deliver_reply
+from test.fake_discord import FakeChannel, FakeMessage, FakeUser
+
+
+def test_short_text_is_one_chunk():
+    assert chunk_message("  hii bestie 💫  ") == ["hii bestie 💫"]
+    assert chunk_message("") == []
+
+
+def test_long_text_splits_on_word_boundaries():
+    words = [f"word{i}" for i in range(1500)]
+    chunks = chunk_message(" ".join(words))
+    assert len(chunks) > 1
+    assert all(len(c) <= DISCORD_MESSAGE_LIMIT for c in chunks)
+    assert " ".join(chunks).split() == words
+
+
+def test_code_block_is_closed_and_reopened():
+    code = "```py\n" + "\n".join(f"print({i})" for i in range(400)) + "\n```"
+    chunks = chunk_message(code)
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert len(chunk) <= DISCORD_MESSAGE_LIMIT
+        assert chunk.count("```") % 2 == 0
+    assert all(c.startswith("```py") for c in chunks)
+
+
+def test_unbroken_text_is_hard_cut():
+    chunks = chunk_message("a" * 4500)
+    assert [len(c) for c in chunks][:2] == [1996, 1996]
+    assert "".join(chunks) == "a" * 4500
+
+
+def test_deliver_reply_uses_one_call_per_chunk():
+    channel = FakeChannel()
+    message = FakeMessage(channel, "tell me a story")
+    sent = asyncio.run(deliver_reply(message, "hey " * 1200))
+    # First chunk replies to the question, the rest are plain messages
+    assert [m.reference for m in channel.sent] == [message, None, None]
+    assert len(sent) == 3
+
+
+def test_bot_core_error_replies_go_through_the_outbound_queue():
+    from launch.bot_core import MelodyBotCore
+    from services.outbound_queue import outbound
+
+    class TimingOutAdapter:
+        async def process_discord_message(self, message, ai_provider=None, respond=True):
+            raise asyncio.TimeoutError
+
+    # Just the state the reply path reads - no Discord client needed
+    core = MelodyBotCore.__new__(MelodyBotCore)
+    core.is_ready = True
+    core.response_tracker = {}
+    core.discord_adapter = TimingOutAdapter()
+
+    async def run():
+        core.processing_semaphore = asyncio.Semaphore(1)
+        channel = FakeChannel(channel_id=4242)
+        sent_before = outbound.sent
+        await core.handle_ai_response_with_adapter(FakeMessage(channel, "hii", author=FakeUser(7, "amy")))
+        core.is_ready = False
+        await core.handle_ai_response_with_adapter(FakeMessage(channel, "hii again", author=FakeUser(7, "amy")))
+        return channel, outbound.sent - sent_before
+
+    channel, queued = asyncio.run(run())
+    assert queued == len(channel.sent) == 2
+    assert all(m.reference is not None for m in channel.sent)
+
+
+if __name__ == "__main__":
+    test_short_text_is_one_chunk()
+    test_long_text_splits_on_word_boundaries()
+    test_code_block_is_closed_and_reopened()
+    test_unbroken_text_is_hard_cut()
+    test_deliver_reply_uses_one_call_per_chunk()
+    test_bot_core_error_replies_go_through_the_outbound_queue()
+    print("✅ Response delivery tests passed!")
@@ -0,0 +1,119 @@
+# melody_ai_v2/test/test_sharding.py
+# Shard planning + two shard processes behind the fake gateway sharing one state DB
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from collections import Counter
+
+import pytest
+
+# Ensure root is in Python path
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_dir)
+
+from launch.sharding import parse_shard_ids, plan_shard_ranges, shard_for_guild
+from services.shared_state import SharedStateStore
+from test.fake_discord import FakeUser
+from test.load_harness import FakeGateway
+
+HARNESS = os.path.join(root_dir, "test", "load_harness.py")
+SCENARIO = {"users": 6, "channels": 4, "guilds": 4, "rate": 20, "duration": 1, "mention_ratio": 0.8, "seed": 42}
+
+
+def test_shard_ranges_cover_every_shard_once():
+    assert plan_shard_ranges(4, 2) == [[0, 1], [2, 3]]
+    assert plan_shard_ranges(5, 2) == [[0, 1, 2], [3, 4]]
+    assert plan_shard_ranges(2, 8) == [[0], [1]]
+    assert parse_shard_ids("0-2,5") == [0, 1, 2, 5]
+    assert parse_shard_ids("") is None
+    assert shard_for_guild(3 << 22, 2) == 1
+
+
+def test_store_updates_are_atomic_per_key():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SharedStateStore(os.path.join(tmp, "state.db"))
+        for _ in range(10):
+            store.update("relationships", "42", lambda data: {"interactions": (data or {}).get("interactions", 0) + 1})
+        assert store.get("relationships", "42") == {"interactions": 10}
+        assert store.seed("relationships", {"42": {"interactions": 0}, "7": {"interactions": 1}}) == 1
+        assert store.count("relationships") == 2
+        store.close()
+
+
+def _expected_mentions():
+    """Replay the harness's seeded message stream without a bot"""
+    gateway = FakeGateway(None, FakeUser(999, "MelodyAI", bot=True), SCENARIO["users"], SCENARIO["channels"],
+                          SCENARIO["mention_ratio"], 5, 5.0, SCENARIO["seed"], SCENARIO["guilds"])
+    messages = [gateway._next_message() for _ in range(SCENARIO["rate"] * SCENARIO["duration"])]
+    return Counter(str(m.author.id) for m in messages if m.mentions), len(messages)
+
+
+def test_relationship_updates_from_the_loop_use_the_async_store(monkeypatch):
+    # Same offline env as the load harness - main.py reads it once, at import
+    monkeypatch.setenv("DISCORD_BOT_TOKEN", "offline-load-test")
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "fake-key")
+    from launch.main import RelationshipSystem
+
+    async def scenario(store, other):
+        relationships = RelationshipSystem(data_file=os.path.join(os.path.dirname(store.db_path), "none.json"),
+                                           store=store)
+        record = await relationships.get_user_data_async("42")
+        await asyncio.gather(*(relationships.add_interaction_async("42", "neutral", 10) for _ in range(5)))
+        await relationships.add_collected_facts_async("42", [{"key": "name", "value": "Mika"}])
+        assert record.interactions == 5 and record["collected_facts"] == ["name: Mika"]
+
+        # Another shard's user shows up after a refresh
+        other.update("relationships", "7", lambda data: {"interactions": 3})
+        await relationships.refresh_async()
+        assert relationships.relationships["7"].interactions == 3
+        assert (await store.get_async("relationships", "42"))["interactions"] == 5
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SharedStateStore(os.path.join(tmp, "state.db"))
+        asyncio.run(scenario(store, SharedStateStore(os.path.join(tmp, "state.db"))))
+        store.close()
+
+
+def test_two_shard_processes_share_relationship_state():
+    with tempfile.TemporaryDirectory() as tmp:
+        state_db = os.path.join(tmp, "state.db")
+        procs = []
+        for shard_id in (0, 1):
+            out = os.path.join(tmp, f"shard{shard_id}.json")
+            cmd = [sys.executable, HARNESS, "--shard-count", "2", "--shard-id", str(shard_id),
+                   "--state-db", state_db, "--out", out, "--ai-latency", "0.01", "--ai-jitter", "0",
+                   "--ai-rps", "200", "--ai-concurrency", "20"]
+            for key, value in SCENARIO.items():
+                cmd += [f"--{key.replace('_', '-')}", str(value)]
+            procs.append((subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE), out))
+
+        reports = []
+        for proc, out in procs:
+            _, stderr = proc.communicate(timeout=120)
+            assert proc.returncode == 0, stderr.decode(errors="replace")[-2000:]
+            with open(out, encoding="utf-8") as f:
+                reports.append(json.load(f))
+
+        expected, total = _expected_mentions()
+        # Every message went to exactly one shard, and both shards got traffic
+        assert sum(r["dispatched"] for r in reports) == total
+        assert all(r["dispatched"] > 0 and r["errors"] == 0 for r in reports)
+
+        # Users talk in guilds on both shards - no interaction may be lost
+        store = SharedStateStore(state_db)
+        stored = {user_id: data["interactions"] for user_id, data in store.get_all("relationships").items()
+                  if data["interactions"]}
+        store.close()
+        assert stored == dict(expected)
+
+
+if __name__ == "__main__":
+    test_shard_ranges_cover_every_shard_once()
+    test_store_updates_are_atomic_per_key()
+    with pytest.MonkeyPatch.context() as patch:
+        test_relationship_updates_from_the_loop_use_the_async_store(patch)
+    test_two_shard_processes_share_relationship_state()
+    print("✅ Sharding tests passed!")
@@ -0,0 +1,67 @@
+# melody_ai_v2/test/test_structured_logging.py
+# Queued logging: JSON fields, per-module levels and debug sampling
+import io
+import json
+import logging
+import os
+import sys
+
+# Ensure root is in Python path
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_dir)
+
+from services.structured_logging import get_logging_stats, setup_logging, shutdown_logging
+
+
+def _capture(**kwargs):
+    stream = io.StringIO()
+    setup_logging(stream=stream, **kwargs)
+    return stream
+
+
+def _lines(stream):
+    shutdown_logging()  # flushes the queue
+    logging.getLogger().handlers.clear()
+    return [line for line in stream.getvalue().splitlines() if line]
+
+
+def test_json_lines_carry_structured_fields():
+    stream = _capture(level="INFO", json_output=True, module_levels={}, debug_sample_every=1)
+    logger = logging.getLogger("MelodyBotCore.adapter")
+    logger.info("🎉 Reply sent", extra={"user": "42", "channel": 7, "stage": "delivered", "latency_ms": 12.5})
+    logger.debug("hidden at INFO")
+    entries = [json.loads(line) for line in _lines(stream)]
+    assert len(entries) == 1
+    entry = entries[0]
+    assert entry["msg"] == "🎉 Reply sent"
+    assert entry["logger"] == "MelodyBotCore.adapter"
+    assert (entry["user"], entry["channel"], entry["stage"], entry["latency_ms"]) == ("42", 7, "delivered", 12.5)
+
+
+def test_module_levels_override_the_default():
+    stream = _capture(level="WARNING", json_output=True, module_levels={"MelodyBotCore.facts": "DEBUG"},
+                      debug_sample_every=1)
+    logging.getLogger("MelodyBotCore.facts").debug("fact line")
+    logging.getLogger("MelodyBotCore.deepseek").info("quiet")
+    msgs = [json.loads(line)["msg"] for line in _lines(stream)]
+    logging.getLogger("MelodyBotCore.facts").setLevel(logging.NOTSET)
+    assert msgs == ["fact line"]
+
+
+def test_debug_records_are_sampled_per_call_site():
+    stream = _capture(level="DEBUG", json_output=False, module_levels={}, debug_sample_every=10)
+    logger = logging.getLogger("MelodyBotCore.test")
+    for i in range(25):
+        logger.debug(f"chatty {i}")
+    logger.warning("always kept")
+    dropped = get_logging_stats()["debug_dropped"]
+    lines = _lines(stream)
+    assert [line.split(": ", 1)[1] for line in lines] == ["chatty 0", "chatty 10", "chatty 20", "always kept"]
+    assert dropped == 22
+
+
+if __name__ == "__main__":
+    test_json_lines_carry_structured_fields()
+    test_module_levels_override_the_default()
+    test_debug_records_are_sampled_per_call_site()
+    print("✅ Structured logging tests passed!")
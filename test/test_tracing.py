@@ -0,0 +1,120 @@
+# melody_ai_v2/test/test_tracing.py
+# Context-var spans: nesting across awaits, no-op mode, JSONL export + summaries
+import asyncio
+import json
+import os
+import sys
+import tempfile
+
+# Ensure root is in Python path
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_dir)
+
+from services.tracing import NOOP_SPAN, TRACE_EXPORT, Tracer, _JsonlExporter, summarize_trace_file
+
+
+def _pipeline(tracer):
+    async def search():
+        with tracer.span("memory.search", top_k=3) as span:
+            await asyncio.sleep(0.01)
+            span.set(hits=2)
+
+    async def deepseek():
+        with tracer.span("deepseek"):
+            await asyncio.sleep(0.02)
+
+    async def on_message():
+        with tracer.span("on_message", user="42"):
+            # Concurrent children still find the right parent through the context
+            await asyncio.gather(search(), deepseek())
+
+    return on_message
+
+
+def test_spans_nest_and_export_one_line_per_trace():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "traces.jsonl")
+        tracer = Tracer(enabled=True, sample_rate=1.0, export_path=path)
+
+        async def run():
+            await asyncio.gather(_pipeline(tracer)(), _pipeline(tracer)())
+
+        asyncio.run(run())
+        tracer.close()
+
+        with open(path, encoding="utf-8") as f:
+            traces = [json.loads(line) for line in f]
+        assert len(traces) == 2
+        for trace in traces:
+            names = {span["name"]: span for span in trace["spans"]}
+            assert set(names) == {"on_message", "memory.search", "deepseek"}
+            assert names["memory.search"]["parent"] == 0
+            assert names["memory.search"]["attrs"] == {"top_k": 3, "hits": 2}
+            assert trace["attrs"] == {"user": "42"}
+            assert trace["duration_ms"] >= names["deepseek"]["duration_ms"] >= 15
+
+        stats = tracer.get_stats()
+        assert stats["traces"] == 2
+        assert stats["stages"]["deepseek"]["samples"] == 2
+
+        summary = summarize_trace_file(path)
+        assert summary["traces"] == 2
+        assert summary["stages"]["memory.search"]["samples"] == 2
+
+
+def test_disabled_tracer_is_a_noop():
+    tracer = Tracer(enabled=False, export_path=None)
+    with tracer.span("on_message") as span:
+        assert span is NOOP_SPAN
+        span.set(anything=1)
+    assert tracer.get_stats()["traces"] == 0
+
+
+def test_unsampled_roots_skip_their_children():
+    tracer = Tracer(enabled=True, sample_rate=0.0, export_path=None)
+    asyncio.run(_pipeline(tracer)())
+    assert tracer.get_stats() == {"enabled": True, "traces": 0, "stages": {}}
+
+
+def test_work_after_the_root_ends_starts_a_new_trace():
+    tracer = Tracer(enabled=True, export_path=None)
+
+    async def run():
+        background = []
+        with tracer.span("on_message"):
+            async def later():
+                await asyncio.sleep(0.01)
+                with tracer.span("summary"):
+                    pass
+            background.append(asyncio.create_task(later()))
+        await background[0]
+
+    asyncio.run(run())
+    assert tracer.get_stats()["traces"] == 2
+
+
+def test_trace_file_is_opt_in_and_rotates():
+    if not TRACE_EXPORT:
+        assert Tracer().export_path is None
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "traces.jsonl")
+        exporter = _JsonlExporter(path, max_bytes=2000, backups=1)
+        for trace_id in range(100):
+            exporter.export({"trace_id": trace_id, "spans": [{"name": "on_message", "duration_ms": 5.0}]})
+        exporter.close()
+
+        assert sorted(os.listdir(tmp)) == ["traces.jsonl", "traces.jsonl.1"]
+        assert all(os.path.getsize(os.path.join(tmp, name)) <= 2000 for name in os.listdir(tmp))
+        # Percentiles still see a full window across the rollover
+        summary = summarize_trace_file(path, last=20)
+        assert summary["traces"] == 20
+
+
+if __name__ == "__main__":
+    test_spans_nest_and_export_one_line_per_trace()
+    test_disabled_tracer_is_a_noop()
+    test_unsampled_roots_skip_their_children()
+    test_work_after_the_root_ends_starts_a_new_trace()
+    test_trace_file_is_opt_in_and_rotates()
+    print("✅ Tracing tests passed!")
@@ -19,6 +19,9 @@ from services.discord_adapter import DiscordMelodyAdapter
 from services.ai_providers.deepseek_client import DeepSeekClient
 from brain.personality.emotional_core import EmotionalCore
 from brain.memory_systems.permanent_facts import permanent_facts
+from brain.personality.relationship_tiers import (
+    calculate_compatibility, cached_compatibility, tier_table
+)
 
 load_dotenv()
 TOKEN = os.getenv("DISCORD_BOT_TOKEN")
@@ -28,34 +31,6 @@ TEST_CHANNEL_ID = int(os.getenv("TEST_CHANNEL_ID", 1337024526923595786))
 # 🎭 RELATIONSHIP SYSTEM CONFIGURATION
 RELATIONSHIP_DATA_FILE = "relationship_data.json"
 
-# Relationship Tiers with points, emojis, and emotional messages
-RELATIONSHIP_TIERS = [
-    {"name": "Soulmate", "min_points": 5000, "emoji": "💫", "color": 0xFF66CC, 
-     "message": "You complete me... our souls are connected forever 💫",
-     "busy_response": "I'm so sorry my baby 😔 I'm undergoing intensive tests to improve myself 💝 See you soon!"},
-    {"name": "Twin Flame", "min_points": 3500, "emoji": "🔥", "color": 0xFF3366,
-     "message": "We just GET each other on another level! 🔥",
-     "busy_response": "Aww my flame 🔥 I'm busy with testing but I'll be back for you soon!"},
-    {"name": "Kindred Spirit", "min_points": 2500, "emoji": "🌟", "color": 0xFF9966,
-     "message": "We have such amazing chemistry! 💫",
-     "busy_response": "Hey bestie! 🌟 I'm in testing mode right now, catch you later?"},
-    {"name": "Bestie", "min_points": 1500, "emoji": "💖", "color": 0xFFD166,
-     "message": "You're my favorite person to talk with! 💕",
-     "busy_response": "Hey! I'm a bit busy with testing right now, talk later? 💕"},
-    {"name": "Close Friend", "min_points": 800, "emoji": "😊", "color": 0x66CCFF,
-     "message": "I really enjoy our conversations! 😊",
-     "busy_response": "Testing mode active! I'll be back soon 😊"},
-    {"name": "Acquaintance", "min_points": 300, "emoji": "👋", "color": 0xB0BEC5,
-     "message": "Nice talking with you! 👋",
-     "busy_response": "Busy testing right now, maybe later? 👋"},
-    {"name": "Stranger", "min_points": 100, "emoji": "😒", "color": 0x9E9E9E,
-     "message": "Hello there.",
-     "busy_response": "Can't you see I'm busy right now? 😒 Testing mode active!"},
-    {"name": "Rival", "min_points": 0, "emoji": "⚔️", "color": 0xE53935,
-     "message": "We clearly don't see eye to eye... 😠",
-     "busy_response": "WTF do you want? Can't you see I'm busy RN? ⚔️"}
-]
-
 class RelationshipSystem:
     def __init__(self, data_file=RELATIONSHIP_DATA_FILE):
         self.data_file = data_file
@@ -172,11 +147,12 @@ class RelationshipSystem:
             user_data["points"] -= 3
             print(f"🎲 Random negative interaction for {user_id}")
         
-        # Update compatibility history
-        current_compat = self.calculate_compatibility(user_data)
+        # Score once per interaction - cached on the record (same as the bot) and in the history
+        compatibility = calculate_compatibility(user_data)
+        user_data["compatibility"] = compatibility
         user_data["compatibility_history"].append({
             "timestamp": datetime.utcnow().isoformat(),
-            "compatibility": current_compat
+            "compatibility": compatibility
         })
         
         # Keep only last 10 compatibility records
@@ -188,87 +164,15 @@ class RelationshipSystem:
     
     def get_tier_info(self, points):
         """Get tier information based on points"""
-        for tier in RELATIONSHIP_TIERS:
-            if points >= tier["min_points"]:
-                current_tier = tier
-                tier_index = RELATIONSHIP_TIERS.index(tier)
-                break
-        
-        next_tier = RELATIONSHIP_TIERS[tier_index - 1] if tier_index > 0 else None
-        
-        # Calculate progress to next tier
-        if next_tier:
-            current_min = current_tier["min_points"]
-            next_min = next_tier["min_points"]
-            progress_percent = int(((points - current_min) / (next_min - current_min)) * 100)
-            progress_percent = min(max(progress_percent, 0), 100)
-        else:
-            progress_percent = 100
-        
-        return current_tier, next_tier, progress_percent
+        return tier_table.get_tier_info(points)
     
     def calculate_compatibility(self, user_data):
-        """Calculate sophisticated compatibility percentage with SAFE field access"""
-        # 🚨 CRITICAL FIX: Safe field access with defaults
-        if user_data.get("interactions", 0) == 0:
-            return 50  # Neutral starting point
-        
-        likes = user_data.get("likes", 0)
-        dislikes = user_data.get("dislikes", 0)
-        neutral = user_data.get("neutral_interactions", 0)  # 🚨 NOW SAFE!
-        total_interactions = user_data.get("interactions", 0)
-        gifts_received = user_data.get("gifts_received", 0)
-        conversation_depth = user_data.get("conversation_depth", 0)
-        
-        # 🎯 MULTI-FACTOR COMPATIBILITY CALCULATION
-        
-        # 1. Base like/dislike ratio (40% weight)
-        if likes + dislikes > 0:
-            base_ratio = (likes / (likes + dislikes)) * 100
-        else:
-            base_ratio = 50  # Neutral if no likes/dislikes
-        
-        # 2. Interaction frequency bonus (20% weight)
-        # More interactions = more reliable data
-        interaction_bonus = min(total_interactions / 20 * 30, 30)  # Cap at 30% bonus
-        
-        # 3. Gift compatibility (15% weight)
-        gift_compatibility = min(gifts_received * 10, 15)  # Each gift adds up to 15%
-        
-        # 4. Conversation depth (15% weight)
-        depth_compatibility = min(conversation_depth * 5, 15)  # Deep conversations add up to 15%
-        
-        # 5. Consistency bonus (10% weight)
-        # Check if compatibility is stable over time
-        consistency_bonus = 0
-        compatibility_history = user_data.get("compatibility_history", [])
-        if len(compatibility_history) >= 3:
-            recent_compat = [c["compatibility"] for c in compatibility_history[-3:]]
-            avg_compat = sum(recent_compat) / len(recent_compat)
-            # Bonus for stable compatibility (within 10 points)
-            if max(recent_compat) - min(recent_compat) <= 10:
-                consistency_bonus = 10
-        
-        # 🎯 FINAL CALCULATION
-        compatibility = (
-            (base_ratio * 0.4) +
-            interaction_bonus +
-            gift_compatibility +
-            depth_compatibility +
-            consistency_bonus
-        )
-        
-        # Ensure compatibility is between 0-100
-        compatibility = max(0, min(100, int(compatibility)))
-        
-        return compatibility
+        """Compatibility cached on the record (updated in add_interaction)"""
+        return cached_compatibility(user_data)
     
     def get_busy_response(self, points):
         """Get emotional busy response based on relationship tier"""
-        for tier in RELATIONSHIP_TIERS:
-            if points >= tier["min_points"]:
-                return tier["busy_response"]
-        return RELATIONSHIP_TIERS[-1]["busy_response"]
+        return tier_table.get_busy_response(points)
     
     def analyze_conversation_sentiment(self, message_content):
         """Analyze message content to determine interaction type"""
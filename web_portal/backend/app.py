@@ -6,9 +6,17 @@ from datetime import datetime
 import asyncio
 import threading
 import random
+import os
+import sys
 from discord_bridge import setup_discord_bridge
 from analytics import analytics
 
+# Root on path so we can read the bot's AI provider status snapshot
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from services.ai_providers.circuit_breaker import load_status_snapshot
+from services.tracing import summarize_trace_file
+from services.memory_worker import query_worker
+
 app = Flask(__name__)
 app.config["SECRET_KEY"] = "melody_web_portal_secret_2024"
 socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
@@ -53,13 +61,36 @@ def api_status():
         except:
             discord_connected = False
     
+    ai_status = load_status_snapshot() or {}
+    
     return jsonify({
         "status": "online",
         "clients_connected": web_portal.connected_clients,
         "discord_connected": discord_connected,
+        "ai_circuit_breaker": ai_status.get("circuit_breaker"),
         "timestamp": datetime.utcnow().isoformat()
     })
 
+@app.route("/api/traces")
+def api_traces():
+    """Per-stage latency percentiles from the bot's trace export"""
+    return jsonify(summarize_trace_file())
+
+@app.route("/api/memory")
+def api_memory():
+    """Semantic memory worker status (the same worker the bot shards use)"""
+    return jsonify(query_worker("stats", user_id=request.args.get("user_id")) or {"available": False})
+
+@app.route("/api/memory/search")
+def api_memory_search():
+    """Search one user's memories through the shared worker - no model loaded in the portal"""
+    user_id = request.args.get("user_id", "")
+    query = request.args.get("q", "")
+    if not user_id or not query:
+        return jsonify({"error": "user_id and q are required"}), 400
+    memories = query_worker("search", user_id=user_id, query=query, top_k=request.args.get("top_k", 5, type=int))
+    return jsonify({"available": memories is not None, "memories": memories or []})
+
 @app.route("/api/servers")
 def api_servers():
     """Get list of servers Melody is in - FIXED VERSION"""
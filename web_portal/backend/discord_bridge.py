@@ -100,7 +100,10 @@ class DiscordBridge:
                 selected_name = random.choice(league_troll_names)
                 discord_message = f"**{selected_name}** {message_content}"
                 
-                await channel.send(
+                # Portal spam queues up per channel instead of eating 429s
+                from services.outbound_queue import outbound
+                await outbound.send(
+                    channel,
                     discord_message,
                     allowed_mentions=discord.AllowedMentions(users=True)
                 )